@@ -0,0 +1,141 @@
+"""
+Бенчмарк ConcurrentKeyValueStore против KeyValueStore под одной общей блокировкой.
+
+Каждый поток выполняет свою детерминированную смесь операций (SET/GET/UNSET/COUNTS/FIND)
+над общим набором ключей. Отчёт — суммарные ops/sec для каждого числа потоков,
+отношение полос к общей блокировке и p99 задержки GET. Под GIL потоки Python
+не выполняют байткод параллельно, поэтому по пропускной способности полосы не
+выигрывают (COUNTS/FIND берут все блокировки); их польза — GET не ждёт писателей,
+а на сборках без GIL записи в разные полосы идут параллельно.
+
+Пример:
+    python -m benchmarks.concurrent_benchmark --threads 1 4 8 --ops 50000
+"""
+import argparse
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from benchmarks.store_benchmark import Operation, build_workload
+from utils.concurrent_store import DEFAULT_STRIPES, ConcurrentKeyValueStore
+from utils.key_value_store import KeyValueStore
+
+# Смесь с преобладанием чтения, типичная для встроенного кеша
+CONCURRENT_MIX = {
+    'SET': 20,
+    'GET': 70,
+    'UNSET': 4,
+    'COUNTS': 4,
+    'FIND': 2,
+}
+
+
+class GlobalLockStore:
+    """
+    Базовая линия: KeyValueStore, каждая операция которого выполняется под одной блокировкой.
+    """
+
+    def __init__(self) -> None:
+        self._store = KeyValueStore()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self._store, name)
+        lock = self._lock
+
+        def locked(*args: Any) -> Any:
+            with lock:
+                return method(*args)
+        return locked
+
+
+def run_threads(store, workloads: List[List[Operation]]) -> Tuple[float, List[float]]:
+    """
+    Выполняет нагрузки в отдельных потоках одновременно.
+    :param store: Хранилище
+    :param workloads: Операции для каждого потока
+    :return: (затраченные секунды, задержки всех GET в секундах)
+    """
+    start = threading.Barrier(len(workloads) + 1)
+    get_latencies: List[float] = []
+
+    def worker(operations: List[Operation]) -> None:
+        methods = {name: getattr(store, name.lower()) for name in CONCURRENT_MIX}
+        get = methods['GET']
+        clock = time.perf_counter
+        latencies = []
+        start.wait()
+        for name, *args in operations:
+            if name == 'GET':
+                started = clock()
+                get(*args)
+                latencies.append(clock() - started)
+            else:
+                methods[name](*args)
+        get_latencies.extend(latencies)
+
+    threads = [threading.Thread(target=worker, args=(operations,)) for operations in workloads]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    start.wait()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, get_latencies
+
+
+def run_benchmark(threads: Sequence[int] = (1, 4, 8), keys: int = 100000,
+                  cardinality: int = 1000, ops: int = 50000, stripes: int = DEFAULT_STRIPES,
+                  seed: int = 42) -> Dict[str, Any]:
+    """
+    Выполняет бенчмарк для каждого числа потоков; ops — операций на поток.
+    :return: Отчёт (сериализуемый в JSON)
+    """
+    report: Dict[str, Any] = {
+        'config': {'threads': list(threads), 'keys': keys, 'cardinality': cardinality,
+                   'ops': ops, 'stripes': stripes, 'seed': seed},
+        'results': {},
+    }
+    initial, _ = build_workload(keys, cardinality, 0, CONCURRENT_MIX, seed)
+    for count in threads:
+        workloads = [build_workload(keys, cardinality, ops, CONCURRENT_MIX, seed + number)[1]
+                     for number in range(count)]
+        result: Dict[str, float] = {}
+        for name, store in (('global_lock', GlobalLockStore()),
+                            ('striped', ConcurrentKeyValueStore(stripes=stripes))):
+            store.mset(initial)
+            elapsed, get_latencies = run_threads(store, workloads)
+            get_latencies.sort()
+            result[f'{name}_ops_per_sec'] = count * ops / elapsed
+            result[f'{name}_get_p99_us'] = get_latencies[int(len(get_latencies) * 0.99)] * 1e6
+        result['speedup'] = result['striped_ops_per_sec'] / result['global_lock_ops_per_sec']
+        report['results'][f'threads_{count}'] = result
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарк потокобезопасного хранилища')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8],
+                        help='Числа потоков для замера')
+    parser.add_argument('--keys', type=int, default=100000, help='Число ключей')
+    parser.add_argument('--cardinality', type=int, default=1000, help='Число различных значений')
+    parser.add_argument('--ops', type=int, default=50000, help='Число операций на поток')
+    parser.add_argument('--stripes', type=int, default=DEFAULT_STRIPES, help='Число полос блокировок')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора нагрузки')
+    parser.add_argument('--output', help='Записать отчёт в JSON-файл')
+    args = parser.parse_args(argv)
+    report = run_benchmark(args.threads, args.keys, args.cardinality, args.ops,
+                           args.stripes, args.seed)
+    for name, result in report['results'].items():
+        print(f"{name}: общая блокировка {result['global_lock_ops_per_sec']:.0f} ops/s, "
+              f"полосы {result['striped_ops_per_sec']:.0f} ops/s, "
+              f"отношение {result['speedup']:.2f}x; GET p99: "
+              f"{result['global_lock_get_p99_us']:.1f} / {result['striped_get_p99_us']:.1f} мкс")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+"""
+Бенчмарк накладных расходов разбора и выполнения команд.
+
+Одна и та же детерминированная смесь команд выполняется несколькими путями:
+- dispatcher: текстовая строка -> parse_command -> CommandDispatcher.dispatch с выводом в поток;
+- dispatcher_stats: то же с включённой статистикой команд (цена гистограмм задержек);
+- pipeline: байтовая строка -> CommandPipeline.execute -> write_reply в поток;
+- pipeline_values: CommandPipeline.execute без форматирования;
+- client: KeyValueClient.execute с типизированными результатами (встраивание).
+Для каждого пути отчёт — команды в секунду и среднее время на команду; накладные
+расходы пути — разница со временем прямых вызовов API хранилища (store).
+
+Пример:
+    python -m benchmarks.dispatch_benchmark --ops 200000
+"""
+import argparse
+import io
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+from benchmarks.store_benchmark import build_workload
+from utils.client import KeyValueClient
+from utils.command_dispatcher import CommandDispatcher
+from utils.command_pipeline import CommandPipeline, write_reply
+from utils.key_value_store import KeyValueStore
+from utils.read_command import parse_command
+from utils.stats import CommandStats
+
+# Смесь без транзакций: сравниваются только разбор, проверка и вывод
+DISPATCH_MIX = {
+    'SET': 40,
+    'GET': 45,
+    'UNSET': 5,
+    'COUNTS': 6,
+    'FIND': 4,
+}
+
+
+def _run_store(store: KeyValueStore, lines: List[str]) -> None:
+    calls: Dict[str, Callable[..., Any]] = {name: getattr(store, name.lower()) for name in DISPATCH_MIX}
+    for line in lines:
+        name, *args = line.split()
+        calls[name](*args)
+
+
+def _run_dispatcher(store: KeyValueStore, lines: List[str]) -> None:
+    dispatcher = CommandDispatcher(store, out=io.StringIO())
+    for line in lines:
+        dispatcher.dispatch(*parse_command(line))
+
+
+def _run_dispatcher_stats(store: KeyValueStore, lines: List[str]) -> None:
+    dispatcher = CommandDispatcher(store, out=io.StringIO(), stats=CommandStats())
+    for line in lines:
+        dispatcher.dispatch(*parse_command(line))
+
+
+def _run_pipeline(store: KeyValueStore, lines: List[bytes]) -> None:
+    out = io.StringIO()
+    write = out.write
+    execute = CommandPipeline(store).execute
+    for line in lines:
+        write_reply(write, execute(line))
+
+
+def _run_values(store: KeyValueStore, lines: List[bytes]) -> None:
+    execute = CommandPipeline(store).execute
+    for line in lines:
+        reply = execute(line)
+        if reply[0] == 'FIND':
+            for _ in reply[1]:
+                pass
+
+
+def _run_client(store: KeyValueStore, lines: List[str]) -> None:
+    execute = KeyValueClient(store).execute
+    for line in lines:
+        execute(line)
+
+
+def run_benchmark(keys: int = 10000, cardinality: int = 100, ops: int = 200000,
+                  seed: int = 42, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Выполняет бенчмарк всех путей; время каждого — лучшее из repeat прогонов.
+    :return: Отчёт (сериализуемый в JSON)
+    """
+    initial, operations = build_workload(keys, cardinality, ops, DISPATCH_MIX, seed)
+    text_lines = [' '.join(operation) + '\n' for operation in operations]
+    byte_lines = [line.encode('utf-8') for line in text_lines]
+    paths = {
+        'store': (_run_store, text_lines),
+        'dispatcher': (_run_dispatcher, text_lines),
+        'dispatcher_stats': (_run_dispatcher_stats, text_lines),
+        'pipeline': (_run_pipeline, byte_lines),
+        'pipeline_values': (_run_values, byte_lines),
+        'client': (_run_client, text_lines),
+    }
+    report: Dict[str, Any] = {
+        'config': {'keys': keys, 'cardinality': cardinality, 'ops': ops, 'seed': seed,
+                   'repeat': repeat},
+        'results': {},
+    }
+    for name, (runner, lines) in paths.items():
+        best = float('inf')
+        for _ in range(repeat):
+            store = KeyValueStore()
+            store.mset(initial)
+            started = time.perf_counter()
+            runner(store, lines)
+            best = min(best, time.perf_counter() - started)
+        report['results'][name] = {'ops_per_sec': ops / best, 'us_per_op': best / ops * 1e6}
+    base = report['results']['store']['us_per_op']
+    for result in report['results'].values():
+        result['overhead_us'] = result['us_per_op'] - base
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарк разбора и выполнения команд')
+    parser.add_argument('--keys', type=int, default=10000, help='Число ключей')
+    parser.add_argument('--cardinality', type=int, default=100, help='Число различных значений')
+    parser.add_argument('--ops', type=int, default=200000, help='Число команд')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора нагрузки')
+    parser.add_argument('--repeat', type=int, default=3, help='Число прогонов каждого пути')
+    parser.add_argument('--output', help='Записать отчёт в JSON-файл')
+    args = parser.parse_args(argv)
+    report = run_benchmark(args.keys, args.cardinality, args.ops, args.seed, args.repeat)
+    for name, result in report['results'].items():
+        print(f"{name}: {result['ops_per_sec']:.0f} ops/s, {result['us_per_op']:.2f} мкс/команда, "
+              f"накладные расходы {result['overhead_us']:.2f} мкс")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+"""
+Бенчмарк масштабирования ShardedStore по числу процессов-шардов.
+
+Одна и та же детерминированная смесь команд (SET/GET/UNSET/COUNTS/FIND)
+прогоняется в пакетном режиме через одно KeyValueStore и через ShardedStore
+с разным числом шардов; отчёт — команды в секунду и ускорение относительно
+одного процесса. Ускорение ограничено числом ядер машины (os.cpu_count()).
+
+Пример:
+    python -m benchmarks.sharded_benchmark --workers 1 2 4 --ops 500000
+"""
+import argparse
+import io
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from benchmarks.store_benchmark import build_workload
+from utils.batch_runner import run_batch
+from utils.command_dispatcher import CommandDispatcher
+from utils.key_value_store import KeyValueStore
+from utils.sharded_store import ShardedStore
+
+# Смесь без транзакций: рассылаемые команды есть, барьеров конвейера нет
+SHARDED_MIX = {
+    'SET': 45,
+    'GET': 45,
+    'UNSET': 5,
+    'COUNTS': 3,
+    'FIND': 2,
+}
+
+
+def run_lines(store, commands: str) -> float:
+    """
+    Выполняет команды в пакетном режиме и возвращает затраченное время.
+    :param store: KeyValueStore или ShardedStore
+    :param commands: Текст команд
+    :return: Секунды
+    """
+    with open(os.devnull, 'w', encoding='utf-8') as sink:
+        dispatcher = CommandDispatcher(store, out=sink)
+        started = time.perf_counter()
+        if isinstance(store, ShardedStore):
+            store.run_batch(dispatcher, io.StringIO(commands))
+        else:
+            run_batch(dispatcher, io.StringIO(commands))
+        return time.perf_counter() - started
+
+
+def run_benchmark(workers: Sequence[int] = (1, 2, 4), keys: int = 100000,
+                  cardinality: int = 1000, ops: int = 200000, seed: int = 42) -> Dict[str, Any]:
+    """
+    Выполняет бенчмарк для одного процесса и каждого числа шардов.
+    :return: Отчёт (сериализуемый в JSON)
+    """
+    initial, operations = build_workload(keys, cardinality, ops, SHARDED_MIX, seed)
+    commands = ''.join(' '.join(operation) + '\n' for operation in operations)
+    report: Dict[str, Any] = {
+        'config': {'workers': list(workers), 'keys': keys, 'cardinality': cardinality,
+                   'ops': ops, 'seed': seed, 'cpu_count': os.cpu_count()},
+        'results': {},
+    }
+    single = KeyValueStore()
+    single.mset(initial)
+    baseline = ops / run_lines(single, commands)
+    report['results']['single'] = {'ops_per_sec': baseline, 'speedup': 1.0}
+    for count in workers:
+        store = ShardedStore(workers=count)
+        try:
+            store.mset(initial)
+            ops_per_sec = ops / run_lines(store, commands)
+        finally:
+            store.close()
+        report['results'][f'shards_{count}'] = {'ops_per_sec': ops_per_sec,
+                                                 'speedup': ops_per_sec / baseline}
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарк шардированного хранилища')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='Числа шардов для замера')
+    parser.add_argument('--keys', type=int, default=100000, help='Число ключей')
+    parser.add_argument('--cardinality', type=int, default=1000, help='Число различных значений')
+    parser.add_argument('--ops', type=int, default=200000, help='Число команд')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора нагрузки')
+    parser.add_argument('--output', help='Записать отчёт в JSON-файл')
+    args = parser.parse_args(argv)
+    report = run_benchmark(args.workers, args.keys, args.cardinality, args.ops, args.seed)
+    for name, result in report['results'].items():
+        print(f"{name}: {result['ops_per_sec']:.0f} ops/s, ускорение {result['speedup']:.2f}x")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
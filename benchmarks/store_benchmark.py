@@ -0,0 +1,269 @@
+"""
+Воспроизводимый бенчмарк KeyValueStore и CommandDispatcher.
+
+Нагрузка: N ключей с заданным числом различных значений, заданная глубина
+вложенных транзакций и смесь операций SET/GET/UNSET/COUNTS/FIND/COMMIT/ROLLBACK.
+Одна и та же последовательность операций (фиксированный seed) прогоняется через
+API хранилища и через диспетчер команд. Отчёт — ops/sec, перцентили задержки
+и пиковая память (отдельным прогоном под tracemalloc) — пишется в JSON;
+с --compare результаты сравниваются с базовым JSON по порогу регрессии.
+
+Пример:
+    python -m benchmarks.store_benchmark --keys 100000 --depth 5 --output bench.json
+    python -m benchmarks.store_benchmark --compare bench.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from utils.command_dispatcher import CommandDispatcher
+from utils.key_value_store import KeyValueStore
+
+# Доли операций в смеси по умолчанию
+DEFAULT_MIX = {
+    'SET': 40,
+    'GET': 40,
+    'UNSET': 5,
+    'COUNTS': 6,
+    'FIND': 5,
+    'COMMIT': 2,
+    'ROLLBACK': 2,
+}
+
+Operation = Tuple[str, ...]
+
+
+def build_workload(keys: int, cardinality: int, ops: int, mix: Dict[str, int],
+                   seed: int) -> Tuple[List[Tuple[str, str]], List[Operation]]:
+    """
+    Строит детерминированную нагрузку.
+    :param keys: Число ключей
+    :param cardinality: Число различных значений
+    :param ops: Число операций в смеси
+    :param mix: Веса операций
+    :param seed: Seed генератора
+    :return: (начальные пары ключ-значение, последовательность операций)
+    """
+    rng = random.Random(seed)
+    initial = [(f'key{i}', f'value{i % cardinality}') for i in range(keys)]
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    operations: List[Operation] = []
+    for name in rng.choices(names, weights, k=ops):
+        if name in ('SET',):
+            operations.append((name, f'key{rng.randrange(keys)}', f'value{rng.randrange(cardinality)}'))
+        elif name in ('GET', 'UNSET'):
+            operations.append((name, f'key{rng.randrange(keys)}'))
+        elif name in ('COUNTS', 'FIND'):
+            operations.append((name, f'value{rng.randrange(cardinality)}'))
+        else:
+            operations.append((name,))
+    return initial, operations
+
+
+def store_runner(store: KeyValueStore) -> Callable[[Operation], Any]:
+    """
+    Исполнитель операций через API хранилища. COMMIT/ROLLBACK сразу открывают
+    новую транзакцию, чтобы глубина вложенности оставалась постоянной.
+    :param store: Хранилище
+    """
+    def run(operation: Operation) -> Any:
+        name = operation[0]
+        if name == 'SET':
+            return store.set(operation[1], operation[2])
+        if name == 'GET':
+            return store.get(operation[1])
+        if name == 'UNSET':
+            return store.unset(operation[1])
+        if name == 'COUNTS':
+            return store.counts(operation[1])
+        if name == 'FIND':
+            return store.find(operation[1])
+        if name == 'COMMIT':
+            store.commit()
+        else:
+            store.rollback()
+        return store.begin()
+    return run
+
+
+def dispatcher_runner(dispatcher: CommandDispatcher) -> Callable[[Operation], Any]:
+    """
+    Исполнитель операций через диспетчер команд (вывод отбрасывается).
+    :param dispatcher: Диспетчер
+    """
+    def run(operation: Operation) -> Any:
+        name = operation[0]
+        dispatcher.dispatch(name, list(operation[1:]))
+        if name in ('COMMIT', 'ROLLBACK'):
+            dispatcher.dispatch('BEGIN', [])
+    return run
+
+
+def percentile(sorted_values: Sequence[int], fraction: float) -> int:
+    """
+    Перцентиль по отсортированной выборке (метод ближайшего ранга).
+    :param sorted_values: Отсортированные значения
+    :param fraction: Доля (0..1)
+    """
+    if not sorted_values:
+        return 0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def prepare(target: str, initial: List[Tuple[str, str]], depth: int,
+            sink) -> Callable[[Operation], Any]:
+    """
+    Создаёт хранилище, загружает начальные данные и открывает depth транзакций.
+    :param target: 'store' или 'dispatcher'
+    :param initial: Начальные пары
+    :param depth: Глубина вложенности транзакций
+    :param sink: Поток для отбрасываемого вывода диспетчера
+    """
+    store = KeyValueStore()
+    store.mset(initial)
+    for _ in range(depth):
+        store.begin()
+    if target == 'store':
+        return store_runner(store)
+    return dispatcher_runner(CommandDispatcher(store, out=sink))
+
+
+def measure(target: str, initial: List[Tuple[str, str]], operations: List[Operation],
+            depth: int, sink) -> Dict[str, Any]:
+    """
+    Прогоняет нагрузку и считает пропускную способность и задержки по типам операций.
+    :return: Результаты для одной цели
+    """
+    run = prepare(target, initial, depth, sink)
+    latencies: Dict[str, List[int]] = {name: [] for name in DEFAULT_MIX}
+    clock = time.perf_counter_ns
+    started = clock()
+    for operation in operations:
+        op_started = clock()
+        run(operation)
+        latencies[operation[0]].append(clock() - op_started)
+    elapsed = (clock() - started) / 1e9
+    per_op: Dict[str, Dict[str, float]] = {}
+    for name, samples in latencies.items():
+        if not samples:
+            continue
+        samples.sort()
+        busy = sum(samples) / 1e9
+        per_op[name] = {
+            'count': len(samples),
+            'ops_per_sec': len(samples) / busy if busy else 0.0,
+            'p50_us': percentile(samples, 0.50) / 1e3,
+            'p90_us': percentile(samples, 0.90) / 1e3,
+            'p99_us': percentile(samples, 0.99) / 1e3,
+            'max_us': samples[-1] / 1e3,
+        }
+    tracemalloc.start()
+    run = prepare(target, initial, depth, sink)
+    for operation in operations:
+        run(operation)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'ops_per_sec': len(operations) / elapsed if elapsed else 0.0,
+        'elapsed_sec': elapsed,
+        'peak_memory_bytes': peak,
+        'ops': per_op,
+    }
+
+
+def run_benchmark(keys: int = 10000, cardinality: int = 100, depth: int = 3,
+                  ops: int = 50000, seed: int = 42,
+                  targets: Sequence[str] = ('store', 'dispatcher'),
+                  mix: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    Выполняет бенчмарк для выбранных целей.
+    :return: Отчёт (сериализуемый в JSON)
+    """
+    mix = dict(mix or DEFAULT_MIX)
+    initial, operations = build_workload(keys, cardinality, ops, mix, seed)
+    report: Dict[str, Any] = {
+        'config': {'keys': keys, 'cardinality': cardinality, 'depth': depth,
+                   'ops': ops, 'seed': seed, 'mix': mix},
+        'python': platform.python_version(),
+        'results': {},
+    }
+    with open(os.devnull, 'w', encoding='utf-8') as sink:
+        for target in targets:
+            report['results'][target] = measure(target, initial, operations, depth, sink)
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Сравнивает пропускную способность с базовым отчётом.
+    :param threshold: Допустимое относительное падение ops/sec (0.1 = 10%)
+    :return: Описания регрессий (пусто — регрессий нет)
+    """
+    regressions: List[str] = []
+    for target, result in report['results'].items():
+        base = baseline.get('results', {}).get(target)
+        if base is None:
+            continue
+        checks = [('total', result['ops_per_sec'], base['ops_per_sec'])]
+        for name, stats in result['ops'].items():
+            if name in base['ops']:
+                checks.append((name, stats['ops_per_sec'], base['ops'][name]['ops_per_sec']))
+        for name, current, previous in checks:
+            if previous and current < previous * (1 - threshold):
+                regressions.append(f'{target}.{name}: {current:.0f} ops/s против {previous:.0f} '
+                                   f'({(current / previous - 1) * 100:+.1f}%)')
+    return regressions
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """
+    Краткая текстовая сводка отчёта.
+    """
+    lines = []
+    for target, result in report['results'].items():
+        lines.append(f"{target}: {result['ops_per_sec']:.0f} ops/s, "
+                     f"пик памяти {result['peak_memory_bytes'] / 2**20:.1f} MiB")
+        for name, stats in result['ops'].items():
+            lines.append(f"  {name:<9}{stats['ops_per_sec']:>12.0f} ops/s  p50 {stats['p50_us']:.1f} us"
+                         f"  p99 {stats['p99_us']:.1f} us  max {stats['max_us']:.1f} us")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарк key-value хранилища')
+    parser.add_argument('--keys', type=int, default=10000, help='Число ключей')
+    parser.add_argument('--cardinality', type=int, default=100, help='Число различных значений')
+    parser.add_argument('--depth', type=int, default=3, help='Глубина вложенных транзакций')
+    parser.add_argument('--ops', type=int, default=50000, help='Число операций')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора нагрузки')
+    parser.add_argument('--target', action='append', choices=['store', 'dispatcher'],
+                        help='Цель (можно несколько; по умолчанию обе)')
+    parser.add_argument('--output', help='Записать отчёт в JSON-файл')
+    parser.add_argument('--compare', help='Базовый JSON-отчёт для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Допустимое падение ops/sec относительно базы (по умолчанию 0.10)')
+    args = parser.parse_args(argv)
+    report = run_benchmark(args.keys, args.cardinality, args.depth, args.ops, args.seed,
+                           args.target or ('store', 'dispatcher'))
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f'РЕГРЕССИЯ {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,116 @@
+import argparse
+import asyncio
+import os
+import sys
+from typing import List, Optional
 from utils.key_value_store import KeyValueStore
 from utils.command_dispatcher import CommandDispatcher
-from utils.logger_config import logger
+from utils.eviction import EVICTION_POLICIES
+from utils.logger_config import LOG_FORMATS, LOG_LEVELS, configure_logging, console, logger
 from utils.read_command import read_command
+from utils.batch_runner import run_batch
+from utils.snapshot import load_snapshot
+from utils.wal import WriteAheadLog
+from utils.server import ISOLATION_LEVELS, KeyValueServer
+from utils.replication import DEFAULT_BACKLOG_BYTES, ChangeFeed, Follower
+from utils.sharded_store import ShardedStore
+from utils.stats import DEFAULT_DUMP_INTERVAL, CommandStats, StatsDumper
+from utils.profiler import DEFAULT_PROFILE_PATH, DEFAULT_SAMPLE_INTERVAL_MS, DEFAULT_TOP, SamplingProfiler
 
+# Размер буферов ввода/вывода в пакетном режиме
+BATCH_BUFFER_SIZE = 1 << 20
 
-def main() -> None:
-    store = KeyValueStore()
-    dispatcher = CommandDispatcher(store)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Разбирает аргументы командной строки.
+    :param argv: Аргументы (по умолчанию sys.argv[1:])
+    """
+    parser = argparse.ArgumentParser(description='In-memory key-value хранилище с транзакциями')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--batch', dest='batch', action='store_true', default=None,
+                      help='Пакетный режим: команды из stdin без приглашений и справки')
+    mode.add_argument('--interactive', dest='batch', action='store_false',
+                      help='Интерактивный режим даже при перенаправленном stdin')
+    mode.add_argument('--server', action='store_true',
+                      help='Запустить TCP-сервер вместо чтения команд из stdin')
+    parser.add_argument('--host', default='127.0.0.1', help='Адрес TCP-сервера')
+    parser.add_argument('--port', type=int, default=7070, help='Порт TCP-сервера')
+    parser.add_argument('--isolation', choices=ISOLATION_LEVELS, default='read-committed',
+                        help='Изоляция транзакций соединений TCP-сервера (snapshot — снимок на момент BEGIN)')
+    parser.add_argument('--primary', action='store_true',
+                        help='Принимать реплики: передавать им снимок и зафиксированные изменения')
+    parser.add_argument('--replication-backlog', type=int, default=DEFAULT_BACKLOG_BYTES,
+                        metavar='BYTES', help='Объём последних изменений для продолжения '
+                                              'синхронизации реплик после обрыва')
+    parser.add_argument('--follow', metavar='HOST:PORT',
+                        help='Запустить сервер-реплику только для чтения основного сервера HOST:PORT; '
+                             '--snapshot хранит её снимок и смещение для продолжения после перезапуска')
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help='Файл снимка: загружается при старте, используется SAVE/LOAD по умолчанию')
+    parser.add_argument('--compact', action='store_true',
+                        help='Компактный режим памяти: интернирование одинаковых значений')
+    parser.add_argument('--max-keys', type=int, metavar='N',
+                        help='Максимальное количество ключей; лишние вытесняются политикой --eviction. '
+                             'С --workers делится между шардами поровну с округлением вниз')
+    parser.add_argument('--max-bytes', type=int, metavar='BYTES',
+                        help='Приблизительный бюджет памяти под ключи и значения; '
+                             'с --workers делится между шардами как --max-keys')
+    parser.add_argument('--eviction', choices=sorted(EVICTION_POLICIES), default='lru',
+                        help='Политика вытеснения при превышении лимита (по умолчанию lru)')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='Разбить хранилище на N процессов-шардов (пакетный и интерактивный режимы)')
+    parser.add_argument('--wal', metavar='PATH',
+                        help='Журнал упреждающей записи зафиксированных изменений')
+    parser.add_argument('--wal-sync-records', type=int, default=1000, metavar='N',
+                        help='fsync журнала после N записей (по умолчанию 1000)')
+    parser.add_argument('--wal-sync-ms', type=float, default=100, metavar='MS',
+                        help='fsync журнала не реже, чем раз в MS миллисекунд (0 — отключить)')
+    parser.add_argument('--wal-compact-bytes', type=int, default=64 << 20, metavar='BYTES',
+                        help='Свернуть журнал в снимок (--snapshot) при достижении этого размера')
+    parser.add_argument('--stats', action='store_true',
+                        help='Собирать счётчики и гистограммы задержек команд (команда STATS)')
+    parser.add_argument('--stats-file', metavar='PATH',
+                        help='Периодически записывать отчёт STATS в JSON-файл (включает --stats)')
+    parser.add_argument('--stats-interval', type=float, default=DEFAULT_DUMP_INTERVAL, metavar='SEC',
+                        help=f'Период записи --stats-file в секундах (по умолчанию {DEFAULT_DUMP_INTERVAL:g})')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='Профилировать с запуска; при выходе записать свёрнутые стеки в PATH '
+                             'и таблицу самых затратных функций в PATH.top.txt')
+    parser.add_argument('--profile-interval', type=float, default=DEFAULT_SAMPLE_INTERVAL_MS,
+                        metavar='MS', help='Интервал сэмплов профилировщика в миллисекундах')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP, metavar='N',
+                        help='Число строк таблицы профиля')
+    parser.add_argument('--log-level', type=str.upper, choices=LOG_LEVELS,
+                        help='Уровень журнала (по умолчанию $KVSTORE_LOG_LEVEL или INFO)')
+    parser.add_argument('--log-file', metavar='PATH',
+                        help='Писать журнал в файл вместо stderr (по умолчанию $KVSTORE_LOG_FILE)')
+    parser.add_argument('--log-format', choices=LOG_FORMATS,
+                        help='Формат журнала: text или json — объект на строку '
+                             '(по умолчанию $KVSTORE_LOG_FORMAT или text)')
+    args = parser.parse_args(argv)
+    if args.workers > 1 and (args.server or args.wal):
+        parser.error('--workers несовместим с --server и --wal')
+    if args.workers > 1 and any(limit is not None and limit < args.workers
+                                for limit in (args.max_keys, args.max_bytes)):
+        parser.error('--max-keys и --max-bytes не могут быть меньше --workers: лимит делится между шардами')
+    if (args.primary or args.follow) and not args.server:
+        parser.error('--primary и --follow работают только с --server')
+    if args.follow:
+        host, _, port = args.follow.rpartition(':')
+        if not host or not port.isdigit():
+            parser.error('--follow ожидает адрес в виде HOST:PORT')
+        if args.wal or args.isolation == 'snapshot':
+            parser.error('--follow несовместим с --wal и --isolation snapshot')
+        args.follow = (host, int(port))
+    return args
+
+
+def run_interactive(dispatcher: CommandDispatcher) -> None:
+    """
+    Интерактивный цикл: приглашение, чтение строки, выполнение команды.
+    :param dispatcher: Диспетчер команд
+    """
     first_run = True
     while True:
         try:
@@ -16,7 +120,7 @@ def main() -> None:
             logger.info('Получен EOF. Завершение работы приложения')
             break
         except ValueError as e:
-            logger.debug(str(e))
+            logger.debug('%s', e)
             continue
         try:
             dispatcher.dispatch(cmd, args)
@@ -24,7 +128,83 @@ def main() -> None:
             logger.info('Завершение работы приложения по команде END')
             break
         except ValueError as e:
-            logger.info(f'НЕВЕРНАЯ КОМАНДА: {e}')
+            logger.info('НЕВЕРНАЯ КОМАНДА: %s', e)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    try:
+        configure_logging(args.log_level, args.log_file, args.log_format)
+    except ValueError as e:
+        sys.exit(str(e))
+    batch = args.batch if args.batch is not None else not sys.stdin.isatty()
+    store_options = dict(compact=args.compact, max_keys=args.max_keys,
+                         max_bytes=args.max_bytes, eviction=args.eviction)
+    if args.workers > 1:
+        store = ShardedStore(workers=args.workers, **store_options)
+    else:
+        store = KeyValueStore(**store_options)
+    wal: Optional[WriteAheadLog] = None
+    if args.wal:
+        wal = WriteAheadLog(args.wal, snapshot_path=args.snapshot,
+                            sync_every_records=args.wal_sync_records,
+                            sync_interval_ms=args.wal_sync_ms,
+                            compact_bytes=args.wal_compact_bytes)
+        replayed = wal.attach(store)
+        logger.info('Восстановлено из журнала %s: записей %d', args.wal, replayed)
+    elif args.snapshot and os.path.exists(args.snapshot) and not args.follow:
+        loaded = load_snapshot(store, args.snapshot)
+        logger.info('Загружен снимок %s, ключей: %d', args.snapshot, loaded)
+    stats = CommandStats() if args.stats or args.stats_file else None
+    dumper: Optional[StatsDumper] = None
+    if args.stats_file:
+        # Шарды опрашиваются через общие каналы, поэтому из фонового потока — только задержки
+        dumper = StatsDumper(stats, args.stats_file, args.stats_interval,
+                             store=None if isinstance(store, ShardedStore) else store)
+        dumper.start()
+    # PROFILE ON работает и без --profile: отчёт тогда пишется в DEFAULT_PROFILE_PATH
+    profiler = SamplingProfiler(args.profile or DEFAULT_PROFILE_PATH, args.profile_interval,
+                                args.profile_top)
+    if args.profile:
+        profiler.start()
+    try:
+        if args.server:
+            # Реплика сама загружает свой снимок вместе со смещением потока
+            follower = Follower(store, *args.follow, snapshot_path=args.snapshot) if args.follow else None
+            feed = ChangeFeed(store, args.replication_backlog) if args.primary else None
+            server = KeyValueServer(store, host=args.host, port=args.port,
+                                    snapshot_path=args.snapshot, isolation=args.isolation,
+                                    stats=stats, profiler=profiler, feed=feed, follower=follower)
+            try:
+                asyncio.run(server.serve_forever())
+            except KeyboardInterrupt:
+                logger.info('Сервер остановлен')
+            return
+        if not batch:
+            console.enable()
+            run_interactive(CommandDispatcher(store, snapshot_path=args.snapshot, stats=stats,
+                                              profiler=profiler))
+            return
+        with open(sys.stdin.fileno(), 'r', encoding='utf-8', buffering=BATCH_BUFFER_SIZE,
+                  closefd=False) as input_stream, \
+                open(sys.stdout.fileno(), 'w', encoding='utf-8', buffering=BATCH_BUFFER_SIZE,
+                     closefd=False) as output_stream:
+            dispatcher = CommandDispatcher(store, out=output_stream, snapshot_path=args.snapshot,
+                                           stats=stats, profiler=profiler)
+            if isinstance(store, ShardedStore):
+                store.run_batch(dispatcher, input_stream)
+            else:
+                run_batch(dispatcher, input_stream)
+    finally:
+        console.disable()
+        profiler.stop()
+        profiler.write_report()
+        if dumper is not None:
+            dumper.close()
+        if wal is not None:
+            wal.close()
+        if isinstance(store, ShardedStore):
+            store.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,44 @@
+import io
+import pytest
+from utils.key_value_store import KeyValueStore
+from utils.command_dispatcher import CommandDispatcher
+from utils.batch_runner import run_batch
+
+
+@pytest.fixture
+def output():
+    return io.StringIO()
+
+
+@pytest.fixture
+def dispatcher(output):
+    return CommandDispatcher(KeyValueStore(), out=output)
+
+
+def test_batch_executes_commands_into_output(dispatcher, output):
+    """Тест: пакетный режим пишет результаты в переданный поток"""
+    script = io.StringIO('SET a 1\n\nget A\nBEGIN\nSET a 2\nROLLBACK\nGET a\nCOUNTS 1\nFIND 1\n')
+    executed = run_batch(dispatcher, script, read_hint=8)
+    assert executed == 8
+    assert output.getvalue().splitlines() == [
+        "Ключ 'a' изменён: было 'NULL', стало '1'",
+        '1',
+        'Транзакция начата',
+        "Ключ 'a' изменён: было '1', стало '2'",
+        'Откат транзакции выполнен',
+        '1',
+        '1',
+        'a',
+    ]
+
+
+def test_batch_stops_on_end(dispatcher, output):
+    """Тест: END прекращает обработку оставшихся строк"""
+    run_batch(dispatcher, io.StringIO('SET a 1\nEND\nGET a\n'))
+    assert output.getvalue().splitlines() == ["Ключ 'a' изменён: было 'NULL', стало '1'"]
+
+
+def test_batch_skips_invalid_commands(dispatcher, output):
+    """Тест: неверные команды и аргументы не прерывают пакет"""
+    run_batch(dispatcher, io.StringIO('NOPE\nGET\nGET a\n'))
+    assert output.getvalue().splitlines() == ['NULL']
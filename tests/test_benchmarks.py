@@ -0,0 +1,35 @@
+from benchmarks.dispatch_benchmark import run_benchmark as run_dispatch_benchmark
+from benchmarks.store_benchmark import build_workload, compare, run_benchmark, DEFAULT_MIX
+
+
+def test_workload_is_reproducible():
+    """Тест: нагрузка детерминирована seed"""
+    first = build_workload(100, 5, 500, DEFAULT_MIX, seed=1)
+    second = build_workload(100, 5, 500, DEFAULT_MIX, seed=1)
+    assert first == second
+    assert {operation[0] for operation in first[1]} == set(DEFAULT_MIX)
+
+
+def test_report_structure_and_regression_check():
+    """Тест: отчёт содержит метрики по целям, сравнение находит падение ops/sec"""
+    report = run_benchmark(keys=200, cardinality=10, depth=2, ops=2000)
+    for target in ('store', 'dispatcher'):
+        result = report['results'][target]
+        assert result['ops_per_sec'] > 0
+        assert result['peak_memory_bytes'] > 0
+        assert result['ops']['SET']['p50_us'] <= result['ops']['SET']['p99_us']
+    assert compare(report, report, threshold=0.1) == []
+    faster = {'results': {'store': dict(report['results']['store'],
+                                        ops_per_sec=report['results']['store']['ops_per_sec'] * 2,
+                                        ops={})}}
+    regressions = compare(report, faster, threshold=0.1)
+    assert len(regressions) == 1 and regressions[0].startswith('store.total')
+
+
+def test_dispatch_benchmark_report():
+    """Тест: бенчмарк разбора команд измеряет все пути и накладные расходы"""
+    report = run_dispatch_benchmark(keys=100, cardinality=5, ops=500, repeat=1)
+    assert set(report['results']) == {'store', 'dispatcher', 'dispatcher_stats', 'pipeline',
+                                      'pipeline_values', 'client'}
+    assert report['results']['store']['overhead_us'] == 0
+    assert all(result['ops_per_sec'] > 0 for result in report['results'].values())
@@ -0,0 +1,65 @@
+import pytest
+from utils.key_value_store import KeyValueStore
+from utils.command_dispatcher import CommandDispatcher
+
+
+@pytest.fixture
+def store():
+    return KeyValueStore()
+
+
+@pytest.fixture
+def dispatcher(store):
+    return CommandDispatcher(store)
+
+
+def test_mset_mget_munset(store):
+    """Тест: пакетные методы хранилища и индекс значений"""
+    assert store.mset([('a', '1'), ('B', '1'), ('c', '2')]) == [None, None, None]
+    assert store.mget(['A', 'b', 'x']) == ['1', '1', 'NULL']
+    assert store.find('1') == ['a', 'b']
+    assert store.mset([('a', '2'), ('a', '3')]) == ['1', '2']
+    assert store.counts('1') == 1
+    assert store.counts('2') == 1
+    assert store.find('3') == ['a']
+    assert store.munset(['a', 'x', 'c']) == ['3', None, '2']
+    assert {value: list(keys) for value, keys in store._value_to_keys.items()} == {'1': ['b']}
+
+
+def test_bulk_operations_roll_back(store):
+    """Тест: MSET/MUNSET внутри транзакции откатываются"""
+    store.mset([('a', '1'), ('b', '2')])
+    store.begin()
+    store.mset([('a', '5'), ('c', '5')])
+    store.munset(['b'])
+    assert store.counts('5') == 2
+    store.rollback()
+    assert store.mget(['a', 'b', 'c']) == ['1', '2', 'NULL']
+    assert store.counts('5') == 0
+
+
+def test_bulk_write_is_one_notification(store):
+    """Тест: MSET вне транзакции передаёт слушателям одно уведомление с итоговыми значениями"""
+    notifications = []
+    store.set('a', '1')
+    store.add_listener(notifications.append)
+    store.mset([('a', '1'), ('b', '2'), ('b', '3')])
+    assert notifications == [[('b', '3')]]
+
+
+def test_bulk_commands(dispatcher, capsys):
+    """Тест: команды MSET/MGET/MUNSET выводят одну строку на команду"""
+    dispatcher.dispatch('MSET', ['a', '1', 'b', '2'])
+    dispatcher.dispatch('MSET', ['a', '1', 'c', '3'])
+    dispatcher.dispatch('MGET', ['a', 'b', 'd'])
+    dispatcher.dispatch('MUNSET', ['a', 'd'])
+    assert capsys.readouterr().out.splitlines() == [
+        'Установлено ключей: 2, изменено: 2',
+        'Установлено ключей: 2, изменено: 1',
+        '1 2 NULL',
+        'Удалено ключей: 1 из 2',
+    ]
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('MSET', ['a', '1', 'b'])
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('MGET', [])
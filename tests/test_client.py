@@ -0,0 +1,79 @@
+import io
+import pytest
+from utils.client import (CountsResult, EndResult, ErrorResult, FindResult, GetResult, KeyValueClient,
+                          MgetResult, MsetResult, ScanResult, SetResult, SnapshotResult, TransactionResult,
+                          UnsetResult)
+from utils.command_dispatcher import CommandDispatcher
+from utils.key_value_store import KeyValueStore
+from utils.mvcc import SnapshotSession, VersionedStore
+
+
+@pytest.fixture
+def client():
+    return KeyValueClient()
+
+
+def test_results_are_typed(client, capsys):
+    """Тест: команды возвращают типизированные результаты и ничего не печатают"""
+    assert client.execute('SET a 10') == SetResult('a', None, '10')
+    result = client.execute(['SET', 'a', 'значение с пробелами'])
+    assert result.old_value == '10' and result.value == 'значение с пробелами'
+    assert client.execute(b'GET a') == GetResult('значение с пробелами')
+    assert client.execute('MSET b 1 c 1') == MsetResult(count=2, changed=2)
+    assert client.execute('MGET b x') == MgetResult(['1', 'NULL'])
+    assert client.execute('COUNTS 1').count == 2
+    assert client.execute('FIND 1').keys == ['b', 'c']
+    assert client.execute('FIND 1 LIMIT 1 AFTER b') == FindResult(['c'])
+    assert client.execute('SCAN PREFIX b TO c') == ScanResult(['b'])
+    assert client.execute('UNSET b') == UnsetResult('b', '1')
+    assert client.execute('') is None
+    assert capsys.readouterr().out == ''
+
+
+def test_execute_many_reports_transaction_status(client):
+    """Тест: execute_many возвращает статусы транзакций и ошибки, не прерываясь, до END"""
+    results = client.execute_many([
+        'BEGIN', 'SET a 1', 'GET', 'FLY', 'ROLLBACK', 'ROLLBACK', 'BEGIN', 'SET b 2', 'COMMIT',
+        'COMMIT', ['COUNTS', '2'], 'END', 'SET c 3',
+    ])
+    assert results == [
+        TransactionResult('BEGIN', True), SetResult('a', None, '1'),
+        ErrorResult('Команда GET требует 1 аргумент'),
+        ErrorResult('НЕВЕРНАЯ КОМАНДА: FLY', unknown=True),
+        TransactionResult('ROLLBACK', True), TransactionResult('ROLLBACK', False),
+        TransactionResult('BEGIN', True), SetResult('b', None, '2'),
+        TransactionResult('COMMIT', True), TransactionResult('COMMIT', False),
+        CountsResult(1), EndResult(),
+    ]
+    assert client.store.get('c') == 'NULL'
+
+
+def test_commit_conflict_is_a_result():
+    """Тест: конфликт COMMIT при изоляции снимков — результат с ok=False и ключами"""
+    versioned = VersionedStore(KeyValueStore())
+    first, second = KeyValueClient(SnapshotSession(versioned)), KeyValueClient(SnapshotSession(versioned))
+    first.execute_many(['BEGIN', 'SET a 1'])
+    second.execute('SET a 2')
+    result = first.execute('COMMIT')
+    assert result.command == 'COMMIT' and not result.ok and result.conflict.keys == ['a']
+
+
+def test_snapshot_results(client, tmp_path):
+    """Тест: SAVE/LOAD возвращают путь, число ключей или текст ошибки"""
+    path = str(tmp_path / 'store.snap')
+    client.execute('SET a 1')
+    assert client.execute(['SAVE', path]) == SnapshotResult('SAVE', path, 1, None)
+    failed = client.execute(['LOAD', str(tmp_path / 'missing.snap')])
+    assert failed.count is None and failed.error
+
+
+def test_cli_output_is_rendered_from_pipeline():
+    """Тест: CLI-диспетчер печатает результаты конвейера в прежнем текстовом виде"""
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(KeyValueStore(), out=out)
+    dispatcher.dispatch('SET', ['a', '1'])
+    with pytest.raises(ValueError, match='GET требует 1 аргумент'):
+        dispatcher.dispatch('GET', [])
+    with pytest.raises(KeyboardInterrupt):
+        dispatcher.dispatch('END', [])
+    assert out.getvalue() == "Ключ 'a' изменён: было 'NULL', стало '1'\n"
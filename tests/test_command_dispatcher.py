@@ -10,10 +10,10 @@ def dispatcher():
     return CommandDispatcher(store)
 
 def test_help_command(dispatcher):
-    """Тест: команда HELP выводит справку"""
-    with patch.object(logger_config.logger, 'info') as mock_info:
+    """Тест: команда HELP выводит справку в канал консоли"""
+    with patch.object(logger_config.console, 'write') as mock_write:
         dispatcher.dispatch('HELP', [])
-        help_msgs = [call.args[0] for call in mock_info.call_args_list]
+        help_msgs = [call.args[0] for call in mock_write.call_args_list]
         assert any('Доступные команды' in msg or 'Available commands' in msg for msg in help_msgs)
 
 def test_end_command(dispatcher):
@@ -0,0 +1,73 @@
+import io
+import pytest
+from utils.command_dispatcher import CommandDispatcher
+from utils.command_pipeline import END_REPLY, CommandPipeline, render_reply, write_reply
+from utils.key_value_store import KeyValueStore
+from utils.read_command import parse_command
+
+SCRIPT = [
+    'SET a 10', 'set b 10', 'GET a', 'GET x', 'COUNTS 10', 'FIND 10', 'FIND 10 LIMIT 1',
+    'FIND 10 LIMIT 1 AFTER a', 'MSET c 1 d 2', 'MGET a c x', 'MUNSET c x', 'UNSET a', 'UNSET a',
+    'BEGIN', 'SET e 5 EX 100', 'TTL e', 'PERSIST e', 'TTL e', 'ROLLBACK', 'ROLLBACK', 'COMMIT',
+    'BEGIN', 'SET f 1', 'COMMIT', 'FIND nothing',
+]
+
+
+def test_output_matches_dispatcher():
+    """Тест: форматированный вывод конвейера совпадает с выводом диспетчера"""
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(KeyValueStore(), out=out)
+    for line in SCRIPT:
+        dispatcher.dispatch(*parse_command(line))
+    pipeline = CommandPipeline(KeyValueStore())
+    rendered = io.StringIO()
+    for reply in pipeline.execute_lines(line.encode() for line in SCRIPT):
+        assert write_reply(rendered.write, reply)
+    assert rendered.getvalue() == out.getvalue()
+
+
+def test_replies_are_values():
+    """Тест: результаты возвращаются значениями, без печати"""
+    pipeline = CommandPipeline(KeyValueStore())
+    assert pipeline.execute(b'SET a 1\n') == ('SET', ('a', None, '1'))
+    assert pipeline.execute(b'GET a') == ('GET', '1')
+    assert pipeline.execute(b'MSET b 1 c 2') == ('MSET', (2, 2))
+    cmd, chunks = pipeline.execute(b'FIND 1')
+    assert cmd == 'FIND' and [key for chunk in chunks for key in chunk] == ['a', 'b']
+    assert render_reply(pipeline.execute(b'COUNTS 1')) == '2'
+    assert pipeline.execute(b'   \n') is None
+    assert pipeline.execute(b'fly away') == ('UNKNOWN', 'fly')
+    assert pipeline.execute_command('mget', ['a', 'key with spaces']) == ('MGET', ['1', 'NULL'])
+
+
+@pytest.mark.parametrize('line, code', [
+    (b'GET', 'ERROR'), (b'SET a', 'ERROR'), (b'SET a 1 EX 0', 'ERROR'), (b'MSET a', 'ERROR'),
+    (b'FIND 1 LIMIT', 'ERROR'), (b'FIND 1 SKIP 2', 'ERROR'), (b'BEGIN now', 'ERROR'),
+    (b'\xff\xfe', 'ERROR'), (b'SAVE', 'ERROR'), (b'FLY away', 'UNKNOWN'),
+    ('SET a 1 EX ²'.encode('utf-8'), 'ERROR'), ('FIND 1 LIMIT ²'.encode('utf-8'), 'ERROR'),
+    ('FIND RANGE 0 9 LIMIT ²'.encode('utf-8'), 'ERROR'), ('SCAN LIMIT ³'.encode('utf-8'), 'ERROR'),
+])
+def test_invalid_commands_return_replies(line, code):
+    """Тест: неверные команды возвращают результат ERROR/UNKNOWN без исключений"""
+    reply = CommandPipeline(KeyValueStore()).execute(line)
+    assert reply[0] == code
+    assert render_reply(reply) is None
+    assert write_reply(io.StringIO().write, reply) is False
+
+
+def test_execute_lines_stops_after_end():
+    """Тест: выполнение строк останавливается после END"""
+    store = KeyValueStore()
+    replies = list(CommandPipeline(store).execute_lines([b'SET a 1', b'', b'END', b'SET b 1']))
+    assert replies[-1] is END_REPLY and len(replies) == 2
+    assert store.get('b') == 'NULL'
+    assert [reply[0] for reply in replies] == ['SET', 'END']
+
+
+def test_find_streams_large_result():
+    """Тест: FIND без LIMIT выводится порциями в одну строку"""
+    store = KeyValueStore()
+    store.mset([(f'k{number:05d}', 'v') for number in range(2500)])
+    out = io.StringIO()
+    assert write_reply(out.write, CommandPipeline(store).execute(b'FIND v'))
+    assert out.getvalue() == ' '.join(sorted(f'k{number:05d}' for number in range(2500))) + '\n'
@@ -0,0 +1,77 @@
+import time
+import pytest
+from utils.key_value_store import KeyValueStore
+
+@pytest.fixture
+def store():
+    return KeyValueStore()
+
+def _fill_parent(store, size):
+    """Заполняет хранилище и родительскую транзакцию size ключами"""
+    for i in range(size):
+        store.set(f'base{i}', str(i % 7))
+    store.begin()
+    for i in range(size):
+        store.set(f'base{i}', 'parent')
+
+def _best_commit_time(size, touched=20, repeats=15):
+    """Минимальное время COMMIT небольшой транзакции при родителе из size ключей"""
+    store = KeyValueStore()
+    _fill_parent(store, size)
+    best = float('inf')
+    for attempt in range(repeats):
+        store.begin()
+        for i in range(touched):
+            store.unset(f'base{i}')
+            store.set(f'new{attempt}_{i}', 'x')
+        started = time.perf_counter()
+        store.commit()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def test_small_commit_merges_into_parent_log(store):
+    """Тест: журнал маленькой транзакции вливается в журнал родителя без копирования родителя"""
+    _fill_parent(store, 1000)
+    parent_log = store._undo_logs[-1]
+    store.begin()
+    store.unset('base1')
+    store.set('fresh', '1')
+    store.commit()
+    assert store._undo_logs[-1] is parent_log
+    assert parent_log['base1'] == '1'
+    assert parent_log['fresh'] is None
+
+def test_large_commit_splices_child_log(store):
+    """Тест: журнал большой транзакции занимает место меньшего журнала родителя"""
+    store.set('a', '1')
+    store.begin()
+    store.set('a', '2')
+    store.begin()
+    for i in range(100):
+        store.set(f'k{i}', 'v')
+    store.set('a', '3')
+    child_log = store._undo_logs[-1]
+    store.commit()
+    assert store._undo_logs[-1] is child_log
+    assert child_log['a'] == '1'
+    store.rollback()
+    assert store.get('a') == '1'
+    assert store.counts('v') == 0
+
+def test_commit_with_deletions_keeps_index_consistent(store):
+    """Тест: COMMIT транзакции с удалениями сохраняет индекс COUNTS/FIND"""
+    for i in range(50):
+        store.set(f'k{i}', str(i))
+    store.begin()
+    for i in range(0, 50, 2):
+        store.unset(f'k{i}')
+    store.commit()
+    assert store.counts('0') == 0
+    assert store.find('1') == ['k1']
+    assert len(store._value_to_keys) == 25
+
+def test_commit_cost_flat_as_parent_grows():
+    """Тест: стоимость COMMIT не растёт вместе с размером родительской транзакции"""
+    small = _best_commit_time(1_000)
+    large = _best_commit_time(100_000)
+    assert large < small * 10 + 1e-4
@@ -0,0 +1,163 @@
+import io
+import random
+import sys
+import threading
+from utils.command_dispatcher import CommandDispatcher
+from utils.concurrent_store import TOUCH_BATCH, ConcurrentKeyValueStore, StripedStore
+from utils.key_value_store import KeyValueStore
+
+
+def run_threads(target, count):
+    """Запускает count потоков с target(номер) и пробрасывает первое исключение"""
+    errors = []
+
+    def wrapper(number):
+        try:
+            target(number)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrapper, args=(number,)) for number in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def assert_index_consistent(store):
+    """Индекс значений каждой полосы совпадает с её состоянием"""
+    for stripe in store._striped._stripes:
+        rebuilt = {}
+        for key_name, value in stripe._state.items():
+            rebuilt.setdefault(value, []).append(key_name)
+        assert {value: sorted(keys) for value, keys in rebuilt.items()} == \
+            {value: list(keys) for value, keys in stripe._value_to_keys.items()}
+
+
+def test_single_thread_matches_key_value_store():
+    """Тест: в одном потоке поведение совпадает с KeyValueStore"""
+    rng = random.Random(3)
+    single, striped = KeyValueStore(), ConcurrentKeyValueStore(stripes=4)
+    for _ in range(2000):
+        key, value = f'K{rng.randrange(30)}', f'v{rng.randrange(3)}'
+        roll = rng.random()
+        for store in (single, striped):
+            if roll < 0.5:
+                store.set(key, value)
+            elif roll < 0.6:
+                store.unset(key)
+            elif roll < 0.7:
+                store.begin()
+            elif roll < 0.8:
+                store.rollback()
+            elif roll < 0.9:
+                store.commit()
+        assert striped.get(key) == single.get(key)
+        assert striped.find(value) == single.find(value)
+        assert striped.counts(value) == single.counts(value)
+        assert striped.transaction_depth == single.transaction_depth
+
+
+def test_transactions_belong_to_thread():
+    """Тест: транзакция одного потока не видна другому до COMMIT"""
+    store = ConcurrentKeyValueStore()
+    store.set('a', '1')
+    store.begin()
+    store.set('a', '2')
+    seen = []
+    run_threads(lambda _: seen.append((store.get('a'), store.counts('2'), store.rollback())), 1)
+    assert seen == [('1', 0, False)]
+    assert store.get('a') == '2'
+    assert store.commit() is True
+    run_threads(lambda _: seen.append(store.find('2')), 1)
+    assert seen[-1] == ['a']
+
+
+def test_dispatcher_over_concurrent_store():
+    """Тест: CommandDispatcher работает поверх ConcurrentKeyValueStore"""
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(ConcurrentKeyValueStore(), out=out)
+    for line in ('MSET a 1 b 1 c 2', 'BEGIN', 'MUNSET a c', 'FIND 1', 'COMMIT', 'MGET a b c'):
+        parts = line.split()
+        dispatcher.dispatch(parts[0], parts[1:])
+    assert out.getvalue().splitlines()[-3:] == ['b', 'Транзакция применена', 'NULL 1 NULL']
+
+
+def test_stress_invariants_under_many_threads():
+    """
+    Тест: много потоков пишут, читают и фиксируют транзакции одновременно.
+    Каждая транзакция записывает пару ключей одной меткой; COUNTS/FIND других
+    потоков видят пару целиком или не видят вовсе, а индекс остаётся согласованным.
+    """
+    store = ConcurrentKeyValueStore(stripes=8)
+    rounds = 300
+    torn = []
+
+    def writer(number):
+        rng = random.Random(number)
+        for round_number in range(rounds):
+            tag = f't{number}-{round_number}'
+            store.begin()
+            store.set(f'w{number}-a', tag)
+            store.set(f'w{number}-b', tag)
+            if rng.random() < 0.3:
+                store.rollback()
+            else:
+                store.commit()
+            store.mset([(f'shared{rng.randrange(50)}', f'v{rng.randrange(5)}') for _ in range(3)])
+            store.unset(f'shared{rng.randrange(50)}')
+
+    def reader(number):
+        rng = random.Random(100 + number)
+        for _ in range(rounds * 2):
+            writer_number = rng.randrange(6)
+            tag = store.get(f'w{writer_number}-a')
+            if tag != 'NULL' and store.counts(tag) not in (0, 2):
+                torn.append(tag)
+            value = f'v{rng.randrange(5)}'
+            found = store.find(value)
+            if found != sorted(set(found)):
+                torn.append(value)
+
+    def worker(number):
+        (writer if number < 6 else reader)(number)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        run_threads(worker, 10)
+    finally:
+        sys.setswitchinterval(interval)
+    assert torn == []
+    assert_index_consistent(store)
+    for number in range(6):
+        first, second = store.get(f'w{number}-a'), store.get(f'w{number}-b')
+        assert first == second and first != 'NULL'
+    total = sum(store.counts(f'v{index}') for index in range(5))
+    assert total == sum(1 for index in range(50) if store.get(f'shared{index}') != 'NULL')
+
+
+def test_limits_are_shared_by_stripes():
+    """Тест: max_keys ограничивает все полосы вместе, а не каждую"""
+    store = ConcurrentKeyValueStore(stripes=4, max_keys=5)
+    for number in range(40):
+        store.set(f'k{number}', 'x')
+    store.mset([(f'm{number}', 'x') for number in range(10)])
+    assert store.counts('x') == 5
+    assert store.stats()['evictions'] == 45
+
+
+def test_lock_free_reads_feed_lru():
+    """Тест: GET без блокировки учитывается политикой LRU полосы"""
+    store = StripedStore(stripes=1, max_keys=3)
+    for key in 'abc':
+        store.set(key, '1')
+    assert store.get('a') == '1'
+    store.set('d', '1')
+    assert store.get('a') == '1'
+    assert store.get('b') == 'NULL'
+    for _ in range(TOUCH_BATCH):
+        store.get('c')
+    assert len(store._touches[0]) < TOUCH_BATCH
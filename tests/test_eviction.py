@@ -0,0 +1,131 @@
+import random
+import pytest
+from utils.eviction import LFU_DECAY_PERIOD, LFU_INIT, LFUPolicy, LRUPolicy, RandomPolicy
+from utils.key_value_store import ENTRY_OVERHEAD, KeyValueStore
+
+
+def test_lru_evicts_least_recently_used():
+    """Тест: LRU вытесняет давно не использованный ключ и чистит индекс значений"""
+    store = KeyValueStore(max_keys=3)
+    store.set('a', '1')
+    store.set('b', '1')
+    store.set('c', '2')
+    store.get('a')
+    store.set('d', '2')
+    assert store.get('b') == 'NULL'
+    assert store.find('1') == ['a']
+    assert store.counts('2') == 2
+    assert store.evictions == 1
+
+
+def test_byte_budget():
+    """Тест: бюджет памяти ограничивает сумму оценок размеров ключей"""
+    entry = ENTRY_OVERHEAD + len('k00') + len('v')
+    store = KeyValueStore(max_bytes=entry * 10)
+    for i in range(100):
+        store.set(f'k{i:02d}', 'v')
+    assert len(store._state) == 10
+    assert store.used_bytes == entry * 10
+    assert store.find('v') == [f'k{i}' for i in range(90, 100)]
+
+
+def test_mset_and_rollback_respect_limit():
+    """Тест: пакетная запись и откат не оставляют хранилище выше лимита"""
+    store = KeyValueStore(max_keys=5)
+    store.mset([(f'k{i}', 'v') for i in range(8)])
+    assert len(store._state) == 5
+    assert store.find('v') == ['k3', 'k4', 'k5', 'k6', 'k7']
+
+
+def test_keys_in_open_transaction_are_not_evicted():
+    """Тест: ключи из журнала открытой транзакции не вытесняются, ROLLBACK корректен"""
+    store = KeyValueStore(max_keys=2)
+    store.set('a', '1')
+    store.set('b', '2')
+    store.begin()
+    store.set('a', '10')
+    store.set('c', '3')
+    assert store.get('b') == 'NULL'
+    store.set('d', '4')
+    assert len(store._state) == 3
+    store.rollback()
+    assert store.get('a') == '1'
+    assert store.get('c') == 'NULL'
+    assert store.get('d') == 'NULL'
+    assert store.find('2') == []
+
+
+def test_eviction_during_transaction_is_reported_as_committed():
+    """Тест: вытеснение незатронутого транзакцией ключа сразу уходит слушателям"""
+    store = KeyValueStore(max_keys=1)
+    changes = []
+    store.set('a', '1')
+    store.add_listener(changes.append)
+    store.begin()
+    store.set('b', '2')
+    assert changes == [[('a', None)]]
+    store.commit()
+    assert changes == [[('a', None)], [('b', '2')]]
+
+
+def test_commit_enforces_limit():
+    """Тест: после COMMIT верхнего уровня хранилище сразу возвращается к лимиту"""
+    store = KeyValueStore(max_keys=3)
+    store.begin()
+    store.mset([(f'k{i}', 'v') for i in range(6)])
+    store.begin()
+    store.set('k6', 'v')
+    store.commit()
+    assert len(store._state) == 7
+    store.commit()
+    assert len(store._state) == 3
+    assert store.evictions == 4
+
+
+def test_lfu_counters_decay():
+    """Тест: счётчик давно частого ключа стареет, и ключ вытесняется раньше нового"""
+    policy = LFUPolicy(random.Random(5))
+    policy.insert('old')
+    for _ in range(500):
+        policy.touch('old')
+    assert policy._counters['old'] > LFU_INIT
+    policy.insert('new')
+    for _ in range(LFU_DECAY_PERIOD * 2 * 3):
+        policy.touch('new')
+    assert policy._counters['old'] < LFU_INIT
+    assert policy.victim(lambda key: False) == 'old'
+
+
+@pytest.mark.parametrize('policy, min_hot', [(LFUPolicy(random.Random(1)), 5), (LRUPolicy(), 0)])
+def test_lfu_keeps_frequently_used_keys(policy, min_hot):
+    """Тест: после прохода по редким ключам LFU сохраняет часть частых, а LRU — нет"""
+    store = KeyValueStore(max_keys=10, eviction=policy)
+    for i in range(10):
+        store.set(f'hot{i}', 'v')
+    for _ in range(200):
+        for i in range(10):
+            store.get(f'hot{i}')
+    for i in range(50):
+        store.set(f'cold{i}', 'v')
+    hot = sum(1 for key in store._state if key.startswith('hot'))
+    assert hot >= min_hot
+    if isinstance(policy, LRUPolicy):
+        assert hot == 0
+
+
+@pytest.mark.parametrize('policy', [LRUPolicy(), RandomPolicy(random.Random(2)),
+                                    LFUPolicy(random.Random(3))])
+def test_policies_stay_consistent(policy):
+    """Тест: учёт политики совпадает с содержимым хранилища после смешанной нагрузки"""
+    store = KeyValueStore(max_keys=50, eviction=policy)
+    rng = random.Random(4)
+    for _ in range(2000):
+        key = f'k{rng.randrange(200)}'
+        if rng.random() < 0.2:
+            store.unset(key)
+        else:
+            store.set(key, str(rng.randrange(5)))
+    assert len(store._state) <= 50
+    tracked = policy._order if isinstance(policy, LRUPolicy) else policy._positions
+    assert set(tracked) == set(store._state)
+    assert sum(len(bucket) for bucket in store._value_to_keys.values()) == len(store._state)
@@ -0,0 +1,103 @@
+import pytest
+from utils.key_value_store import KeyValueStore
+from utils.command_dispatcher import CommandDispatcher
+from utils.session import Session
+from utils.sorted_list import SortedList
+
+
+@pytest.fixture
+def store():
+    store = KeyValueStore()
+    store.mset([(f'k{i:04d}', 'v' if i % 2 else 'w') for i in range(3000)])
+    return store
+
+
+def test_sorted_list_keeps_order_across_chunks(monkeypatch):
+    """Тест: SortedList сохраняет порядок при делении и слиянии блоков"""
+    monkeypatch.setattr(SortedList, 'LOAD', 4)
+    keys = SortedList()
+    for i in reversed(range(100)):
+        keys.add(f'{i:03d}')
+    keys.add('050')
+    assert len(keys) == 100
+    assert list(keys) == [f'{i:03d}' for i in range(100)]
+    for i in range(0, 100, 3):
+        keys.discard(f'{i:03d}')
+    assert list(keys) == [f'{i:03d}' for i in range(100) if i % 3]
+    assert '001' in keys and '003' not in keys
+    assert keys.page('049', 3) == ['050', '052', '053']
+
+
+def test_find_page_resumes_after_cursor(store):
+    """Тест: страницы FIND продолжаются с курсора без пропусков и повторов"""
+    pages = []
+    after = None
+    while True:
+        page = store.find_page('v', 700, after)
+        if not page:
+            break
+        pages.append(page)
+        after = page[-1]
+    assert [len(page) for page in pages] == [700, 700, 100]
+    assert sum(pages, []) == store.find('v')
+
+
+def test_iter_find_tolerates_changes_between_chunks(store):
+    """Тест: изменения между порциями не ломают перебор"""
+    seen = []
+    for chunk in store.iter_find('v', chunk_size=500):
+        seen.extend(chunk)
+        store.set('k0001', 'x')
+        store.set('k2999', 'x')
+        store.set('k9999', 'v')
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen))
+    assert seen[-1] == 'k9999'
+
+
+def test_find_command_limit_and_after(store, capsys):
+    """Тест: FIND с LIMIT/AFTER и потоковый FIND без LIMIT"""
+    dispatcher = CommandDispatcher(store)
+    dispatcher.dispatch('FIND', ['v', 'LIMIT', '3'])
+    dispatcher.dispatch('FIND', ['v', 'limit', '2', 'after', 'K0005'])
+    dispatcher.dispatch('FIND', ['v', 'AFTER', 'k2995'])
+    dispatcher.dispatch('FIND', ['missing'])
+    dispatcher.dispatch('FIND', ['w'])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:4] == ['k0001 k0003 k0005', 'k0007 k0009', 'k2997 k2999', 'NULL']
+    assert lines[4].split() == store.find('w')
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('FIND', ['v', 'LIMIT', '0'])
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('FIND', ['v', 'LIMIT'])
+
+
+def test_session_pages_include_overlay(store):
+    """Тест: страницы FIND в транзакции сессии учитывают её изменения"""
+    session = Session(store)
+    session.begin()
+    session.set('a', 'v')
+    session.unset('k0001')
+    assert session.find_page('v', 2) == ['a', 'k0003']
+    assert session.find_page('v', 2, after='k0003') == ['k0005', 'k0007']
+    assert sum(session.iter_find('v', 1000), []) == session.find('v')
+
+
+def test_session_pages_read_bounded_store_pages(store):
+    """Тест: страницы сессии с наложением запрашивают у хранилища не больше limit + размер наложения"""
+    session = Session(store)
+    session.begin()
+    session.mset([('a', 'v'), ('k0002', 'v'), ('zz', 'w')])
+    session.munset(['k0001', 'k2999'])
+    requested = []
+    find_page = store.find_page
+
+    def spy(value, limit=None, after=None):
+        requested.append(limit)
+        return find_page(value, limit, after)
+
+    store.find_page = spy
+    pages = list(session.iter_find('v', 100))
+    assert sum(pages, []) == session.find('v')
+    assert [len(page) for page in pages][:-1] == [100] * (len(pages) - 1)
+    assert requested and all(limit is not None and limit <= 105 for limit in requested)
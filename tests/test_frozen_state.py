@@ -0,0 +1,169 @@
+import io
+import os
+import random
+import threading
+from utils.client import BackgroundSaveResult, ErrorResult, KeyValueClient
+from utils.command_dispatcher import CommandDispatcher
+from utils.concurrent_store import ConcurrentKeyValueStore
+from utils.key_value_store import KeyValueStore
+from utils import snapshot
+from utils.session import Session
+from utils.snapshot import BackgroundSave, iter_snapshot
+
+
+def committed_state(store):
+    """Эталон зафиксированного состояния: ключ -> значение"""
+    return {key_name: value for value, keys in store.committed_buckets() for key_name in keys}
+
+
+def test_frozen_state_ignores_later_writes():
+    """Тест: срез хранит зафиксированное состояние на момент заморозки при любых записях"""
+    now = [100.0]
+    store = KeyValueStore(clock=lambda: now[0], max_keys=8)
+    store.mset([('a', '1'), ('b', '2'), ('c', '3'), ('t', 'temp')])
+    store.set('t', 'temp', ttl=5)
+    store.begin()
+    store.set('a', 'uncommitted')
+    store.unset('b')
+    store.set('new', 'x')
+    expected = committed_state(store)
+    frozen = store.freeze()
+    store.set('c', '30')
+    store.commit()
+    store.begin()
+    store.mset([('c', '300'), ('d', '4')])
+    store.rollback()
+    store.munset(['a', 'c'])
+    now[0] += 10
+    store.get('t')
+    store.mset([(f'k{number}', 'v') for number in range(10)])
+    assert store.evictions > 0
+    assert dict(frozen.items()) == expected == {'a': '1', 'b': '2', 'c': '3', 't': 'temp'}
+    assert frozen.changed < len(store._state) + 10
+    frozen.close()
+    store.set('z', '1')
+    assert store.stats()['frozen_changes'] == 0
+
+
+def test_random_writes_keep_point_in_time():
+    """Тест: случайные записи и транзакции после заморозки не меняют срез"""
+    rng = random.Random(7)
+    store = KeyValueStore()
+    store.mset([(f'k{number}', str(number % 5)) for number in range(200)])
+    store.begin()
+    store.set('k1', 'x')
+    expected = committed_state(store)
+    with store.freeze() as frozen:
+        for _ in range(2000):
+            key_name = f'k{rng.randrange(300)}'
+            action = rng.random()
+            if action < 0.5:
+                store.set(key_name, str(rng.randrange(5)))
+            elif action < 0.7:
+                store.unset(key_name)
+            elif action < 0.8:
+                store.mset([(f'k{rng.randrange(300)}', 'm') for _ in range(3)])
+            elif action < 0.9:
+                store.begin()
+            elif not store.commit():
+                store.begin()
+        state = dict(frozen.items())
+        assert state == expected
+        assert sum(len(keys) for _, keys in frozen.buckets(chunk_size=7)) == len(expected)
+
+
+def test_freezes_are_independent_and_survive_load():
+    """Тест: открытые срезы видят каждый свой момент; LOAD не меняет открытый срез"""
+    store = KeyValueStore()
+    store.set('a', '1')
+    frozen = store.freeze()
+    store.set('a', '2')
+    store.set('b', '1')
+    middle = store.freeze()
+    store.set('a', '3')
+    store.unset('b')
+    assert dict(frozen.items()) == {'a': '1'}
+    assert dict(middle.items()) == {'a': '2', 'b': '1'}
+    middle.close()
+    store.set('a', '4')
+    assert dict(frozen.items()) == {'a': '1'}
+    assert store.stats()['frozen_changes'] == 2
+    store.load_buckets([('2', ['b'])])
+    store.set('b', '3')
+    assert dict(frozen.items()) == {'a': '1'}
+    second = store.freeze()
+    frozen.close()
+    store.set('c', '4')
+    assert dict(second.items()) == {'b': '3'}
+    second.close()
+
+    striped = ConcurrentKeyValueStore(stripes=4)
+    striped.mset([(f'k{number}', '1') for number in range(20)])
+    with striped.freeze() as frozen:
+        striped.mset([(f'k{number}', '2') for number in range(30)])
+        assert dict(frozen.items()) == {f'k{number}': '1' for number in range(20)}
+
+
+def test_background_save_during_concurrent_sets(tmp_path):
+    """Тест: фоновый снимок совпадает с моментом запуска, пока идут SET в другом потоке"""
+    store = KeyValueStore()
+    store.mset([(f'key{number}', str(number % 100)) for number in range(200000)])
+    expected = committed_state(store)
+    path = str(tmp_path / 'bg.snap')
+    save = BackgroundSave(store, path)
+    rng = random.Random(3)
+    writes = 0
+    while save.running:
+        store.set(f'key{rng.randrange(250000)}', 'changed')
+        writes += 1
+    assert save.wait() == len(expected) and save.error is None
+    assert writes > 0
+    saved = {key_name: value for value, keys in iter_snapshot(path) for key_name in keys}
+    assert saved == expected
+    assert store.stats()['frozen_changes'] == 0
+
+
+def test_bgsave_command(tmp_path):
+    """Тест: BGSAVE запускает фоновую запись снимка, без пути — ошибка"""
+    store = KeyValueStore()
+    store.set('a', '1')
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(store, out=out, snapshot_path=str(tmp_path / 'default.snap'))
+    dispatcher.dispatch('BGSAVE', [])
+    dispatcher.pipeline.background_save.wait()
+    assert out.getvalue() == f"Фоновое сохранение снимка '{tmp_path / 'default.snap'}' запущено\n"
+    assert list(iter_snapshot(str(tmp_path / 'default.snap'))) == [('1', ['a'])]
+
+    client = KeyValueClient(store)
+    path = str(tmp_path / 'client.snap')
+    assert client.execute(['BGSAVE', path]) == BackgroundSaveResult(path)
+    assert client._pipeline.background_save.wait() == 1
+    assert client.execute('BGSAVE') == ErrorResult('Команда BGSAVE требует путь к снимку')
+
+
+def test_bgsave_same_path_is_rejected_across_sessions(tmp_path, monkeypatch):
+    """Тест: пока идёт BGSAVE в путь, BGSAVE в тот же путь из другой сессии отклоняется"""
+    store = KeyValueStore()
+    store.set('a', '1')
+    started, release = threading.Event(), threading.Event()
+    original = snapshot.write_snapshot
+
+    def slow_write(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(snapshot, 'write_snapshot', slow_write)
+    path = str(tmp_path / 'shared.snap')
+    first, second = KeyValueClient(Session(store)), KeyValueClient(Session(store))
+    assert first.execute(['BGSAVE', path]) == BackgroundSaveResult(path)
+    started.wait(5)
+    assert second.execute(['BGSAVE', path]) == \
+        ErrorResult(f'Фоновое сохранение снимка {path} уже выполняется')
+    other = str(tmp_path / 'other.snap')
+    assert second.execute(['BGSAVE', other]) == BackgroundSaveResult(other)
+    release.set()
+    assert first._pipeline.background_save.wait() == 1
+    assert second._pipeline.background_save.wait() == 1
+    assert second.execute(['BGSAVE', path]) == BackgroundSaveResult(path)
+    assert second._pipeline.background_save.wait() == 1
+    assert sorted(os.listdir(tmp_path)) == ['other.snap', 'shared.snap']
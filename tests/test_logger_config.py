@@ -0,0 +1,93 @@
+import io
+import json
+import logging
+import sys
+import pytest
+from main import main
+from utils.logger_config import configure_logging, console, logger
+from utils.read_command import read_command
+
+
+@pytest.fixture(autouse=True)
+def restore_logger():
+    """Возвращает логгер к состоянию до теста"""
+    handlers, level, propagate = logger.handlers[:], logger.level, logger.propagate
+    yield
+    for handler in logger.handlers[:]:
+        if handler not in handlers:
+            handler.close()
+    logger.handlers[:] = handlers
+    logger.setLevel(level)
+    logger.propagate = propagate
+    console.disable()
+
+
+class CountingArg:
+    """Аргумент сообщения, считающий свои преобразования в строку"""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'arg'
+
+
+def test_json_log_file_with_level(tmp_path):
+    """Тест: журнал в JSON-файл, записи ниже уровня отбрасываются без форматирования"""
+    path = tmp_path / 'kv.log'
+    configure_logging('info', str(path), 'json')
+    arg = CountingArg()
+    logger.debug('Отладка %s', arg)
+    logger.info('Событие %s', arg)
+    for handler in logger.handlers:
+        handler.flush()
+    entries = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [(entry['level'], entry['message']) for entry in entries] == [('INFO', 'Событие arg')]
+    assert entries[0]['logger'] == 'kvstore'
+    assert arg.formatted == 1
+
+
+def test_environment_settings(tmp_path, monkeypatch):
+    """Тест: незаданные параметры берутся из переменных окружения, ошибки — ValueError"""
+    monkeypatch.setenv('KVSTORE_LOG_LEVEL', 'warning')
+    monkeypatch.setenv('KVSTORE_LOG_FILE', str(tmp_path / 'env.log'))
+    configure_logging()
+    assert logger.level == logging.WARNING
+    assert isinstance(logger.handlers[0], logging.FileHandler)
+    configure_logging(level='DEBUG')
+    assert logger.level == logging.DEBUG and len(logger.handlers) == 1
+    with pytest.raises(ValueError):
+        configure_logging(fmt='xml')
+
+
+def test_console_prompt_only_when_enabled(monkeypatch):
+    """Тест: приглашение и справка выводятся только во включённый канал консоли"""
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('get a\nset b 1\n'))
+    assert read_command(show_help_flag=True) == ('GET', ['a'])
+    stream = io.StringIO()
+    console.enable(stream)
+    assert read_command(show_help_flag=True) == ('SET', ['b', '1'])
+    assert stream.getvalue().startswith('Ожидание ввода...\n')
+    assert 'Доступные команды' in stream.getvalue()
+
+
+def test_main_interactive_and_batch_channels(tmp_path, monkeypatch, capsys):
+    """Тест: интерактивный режим выводит приглашения в stderr, пакетный — нет; журнал в файл"""
+    log_path = tmp_path / 'main.log'
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('SET a 1\nGET a\nOOPS\n'))
+    main(['--interactive', '--log-file', str(log_path), '--log-format', 'json'])
+    captured = capsys.readouterr()
+    assert captured.out.endswith('\n1\n')
+    assert captured.err.count('Ожидание ввода...') == 4 and 'Доступные команды' in captured.err
+    messages = [json.loads(line)['message'] for line in log_path.read_text(encoding='utf-8').splitlines()]
+    assert messages == ['НЕВЕРНАЯ КОМАНДА', 'Получен EOF. Завершение работы приложения']
+    assert not console.enabled
+
+    commands = tmp_path / 'commands.txt'
+    commands.write_text('SET a 1\nHELP\nOOPS\n', encoding='utf-8')
+    with open(commands, encoding='utf-8') as stdin, open(tmp_path / 'out.txt', 'w') as stdout:
+        monkeypatch.setattr(sys, 'stdin', stdin)
+        monkeypatch.setattr(sys, 'stdout', stdout)
+        main(['--batch', '--log-level', 'warning'])
+    assert capsys.readouterr().err == ''
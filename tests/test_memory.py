@@ -0,0 +1,55 @@
+import tracemalloc
+import pytest
+from utils.key_value_store import KeyValueStore
+
+# Документированный расход памяти компактного режима (см. README): ключи вида
+# 'key123456', 100 различных значений, значения приходят новыми строками, как из ввода.
+COMPACT_BYTES_PER_KEY = 120
+
+
+def bytes_per_key(store, keys=20000, cardinality=100):
+    """Средний прирост памяти на ключ при заполнении хранилища, как из строк ввода"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(keys):
+        key, value = f'Key{i:06d} value{i % cardinality}'.split()
+        store.set(key, value)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / keys
+
+
+def test_compact_mode_bytes_per_key():
+    """Тест: компактный режим укладывается в документированный расход на ключ"""
+    compact = bytes_per_key(KeyValueStore(compact=True))
+    regular = bytes_per_key(KeyValueStore())
+    assert compact <= COMPACT_BYTES_PER_KEY
+    assert regular - compact >= 30
+
+
+@pytest.mark.parametrize('compact', [True, False])
+def test_values_share_one_object(compact):
+    """Тест: в компактном режиме одинаковые значения хранятся одним объектом"""
+    store = KeyValueStore(compact=compact)
+    store.set('a', ''.join(['v', '1']))
+    store.mset([('b', ''.join(['v', '1'])), ('c', ''.join(['v', '2'])), ('d', ''.join(['v', '2']))])
+    store.begin()
+    store.set('e', ''.join(['v', '2']))
+    store.rollback()
+    same = store._state['a'] is store._state['b'] and store._state['c'] is store._state['d']
+    assert same == compact
+
+
+def test_intern_table_is_pruned_with_buckets():
+    """Тест: таблица интернирования и корзины индекса очищаются, когда значение исчезает"""
+    store = KeyValueStore(compact=True)
+    store.mset([('a', '1'), ('b', '2')])
+    store.begin()
+    store.set('a', '3')
+    store.munset(['b'])
+    assert set(store._interned) == {'3'}
+    store.rollback()
+    assert set(store._interned) == {'1', '2'} == set(store._value_to_keys)
+    store.load_buckets([('x', ['k1']), ('x', ['k2'])])
+    assert store._state['k1'] is store._state['k2']
+    assert set(store._interned) == {'x'}
@@ -0,0 +1,116 @@
+import io
+import pytest
+from utils.command_dispatcher import CommandDispatcher
+from utils.key_value_store import KeyValueStore
+from utils.mvcc import CommitConflict, SnapshotSession, VersionedStore
+
+
+@pytest.fixture
+def versioned():
+    store = KeyValueStore()
+    store.mset([('a', '1'), ('b', '1'), ('c', '2')])
+    return VersionedStore(store)
+
+
+def test_transaction_reads_snapshot_from_begin(versioned):
+    """Тест: транзакция не видит чужие COMMIT, сделанные после её BEGIN"""
+    reader, writer = SnapshotSession(versioned), SnapshotSession(versioned)
+    reader.begin()
+    writer.set('a', '2')
+    writer.unset('b')
+    writer.set('d', '1')
+    assert [reader.get(key) for key in 'abcd'] == ['1', '1', '2', 'NULL']
+    assert reader.counts('1') == 2 and reader.find('1') == ['a', 'b']
+    assert reader.counts('2') == 1 and reader.find_page('2', 5) == ['c']
+    assert reader.mget(['a', 'd']) == ['1', 'NULL']
+    reader.set('c', '1')
+    assert reader.find('1') == ['a', 'b', 'c']
+    assert reader.commit() is True
+    assert reader.find('1') == ['c', 'd']
+    assert versioned.history_size == 0
+
+
+def test_snapshot_find_pages_merge_changed_keys():
+    """Тест: страницы FIND в снимке сливают изменённые ключи с корзиной без полного списка"""
+    store = KeyValueStore()
+    store.mset([(f'k{number:03d}', '1') for number in range(300)])
+    versioned = VersionedStore(store)
+    reader, writer = SnapshotSession(versioned), SnapshotSession(versioned)
+    reader.begin()
+    writer.munset([f'k{number:03d}' for number in range(0, 300, 7)])
+    writer.mset([('a', '1'), ('k001', '2')])
+    reader.set('b', '1')
+    expected = [f'k{number:03d}' for number in range(300)] + ['b']
+    requested = []
+    find_page = store.find_page
+
+    def spy(value, limit=None, after=None):
+        requested.append(limit)
+        return find_page(value, limit, after)
+
+    store.find_page = spy
+    assert sum(reader.iter_find('1', 50), []) == sorted(expected)
+    assert reader.find_page('1', 3, after='k005') == ['k006', 'k007', 'k008']
+    assert all(limit is not None for limit in requested)
+
+
+def test_first_committer_wins(versioned):
+    """Тест: второй COMMIT по тем же ключам отменяется, непересекающиеся проходят"""
+    first, second, third = (SnapshotSession(versioned) for _ in range(3))
+    for session in (first, second, third):
+        session.begin()
+    first.set('a', 'x')
+    second.set('a', 'y')
+    second.set('b', 'y')
+    third.set('c', 'z')
+    assert first.commit() is True
+    with pytest.raises(CommitConflict) as conflict:
+        second.commit()
+    assert conflict.value.keys == ['a']
+    assert second.transaction_depth == 0
+    assert third.commit() is True
+    assert [versioned.store.get(key) for key in 'abc'] == ['x', '1', 'z']
+
+
+def test_nested_transactions_share_snapshot(versioned):
+    """Тест: вложенные BEGIN читают тот же снимок, ROLLBACK вложенной не закрывает его"""
+    session, other = SnapshotSession(versioned), SnapshotSession(versioned)
+    session.begin()
+    session.begin()
+    other.set('a', '9')
+    assert session.rollback() is True
+    assert session.get('a') == '1'
+    assert session.rollback() is True
+    assert session.get('a') == '9'
+    assert versioned.history_size == 0
+
+
+def test_history_is_collected_after_oldest_snapshot(versioned):
+    """Тест: версии хранятся, пока нужны открытым снимкам, и удаляются после"""
+    old, young, writer = (SnapshotSession(versioned) for _ in range(3))
+    old.begin()
+    writer.set('a', '2')
+    young.begin()
+    writer.set('a', '3')
+    assert versioned.history_size == 2
+    assert (old.get('a'), young.get('a')) == ('1', '2')
+    old.close()
+    assert versioned.history_size == 1
+    assert young.get('a') == '2'
+    young.rollback()
+    assert versioned.history_size == 0
+    writer.set('a', '4')
+    assert versioned.history_size == 0
+
+
+def test_dispatcher_reports_conflict(versioned):
+    """Тест: COMMIT с конфликтом печатает отмену транзакции"""
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(SnapshotSession(versioned), out=out)
+    dispatcher.dispatch('BEGIN', [])
+    dispatcher.dispatch('SET', ['a', '5'])
+    SnapshotSession(versioned).set('A', '6')
+    dispatcher.dispatch('COMMIT', [])
+    dispatcher.dispatch('GET', ['a'])
+    assert out.getvalue().splitlines()[-2:] == [
+        'Транзакция отменена: ключи изменены другой сессией: a', '6']
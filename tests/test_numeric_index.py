@@ -0,0 +1,186 @@
+import io
+import random
+import pytest
+from utils.client import CountsResult, ErrorResult, FindResult, KeyValueClient
+from utils.command_dispatcher import CommandDispatcher
+from utils.concurrent_store import ConcurrentKeyValueStore
+from utils.key_value_store import KeyValueStore
+from utils.mvcc import SnapshotSession, VersionedStore
+from utils.numeric_index import NumericIndex, parse_number
+from utils.session import Session
+from utils.sorted_list import RankedSortedList
+
+
+class SmallRankedList(RankedSortedList):
+    LOAD = 4
+
+
+def expected_range(state, lo, hi):
+    """Эталон выборки диапазона полным перебором: пары (число, ключ) по возрастанию"""
+    return sorted((float(value), key) for key, value in state.items()
+                  if parse_number(value) is not None and lo <= float(value) <= hi)
+
+
+@pytest.fixture
+def store():
+    store = KeyValueStore()
+    store.mset([('a', '10'), ('b', '2.5'), ('c', '-3'), ('d', 'десять'), ('e', '10'), ('f', 'nan')])
+    return store
+
+
+def test_rank_matches_brute_force():
+    """Тест: ранг RankedSortedList верен после вставок и удалений с делением блоков"""
+    rng = random.Random(5)
+    ordered = SmallRankedList(rng.sample(range(1000), 40))
+    present = set(ordered)
+    for _ in range(600):
+        value = rng.randrange(1000)
+        if rng.random() < 0.6:
+            ordered.add(value)
+            present.add(value)
+        else:
+            ordered.discard(value)
+            present.discard(value)
+        probe = rng.randrange(1001)
+        assert ordered.rank(probe) == sum(1 for item in present if item < probe)
+    assert list(ordered) == sorted(present)
+
+
+def test_numeric_index_count_and_page():
+    """Тест: NumericIndex считает и выбирает только числовые значения из диапазона"""
+    index = NumericIndex([('10', ['a', 'e']), ('2.5', ['b']), ('x', ['d']), ('inf', ['g'])])
+    assert index.count(0, 10) == 3
+    assert index.count(10, 10) == 2
+    assert index.count(5, 1) == 0
+    assert index.page(0, 100) == [(2.5, 'b'), (10.0, 'a'), (10.0, 'e')]
+    assert index.page(0, 100, 1, (2.5, 'b')) == [(10.0, 'a')]
+    index.discard('10', ['a'])
+    index.add('1e1', ['z'])
+    assert index.page(10, 10) == [(10.0, 'e'), (10.0, 'z')]
+
+
+def test_store_range_queries(store):
+    """Тест: COUNTS/FIND RANGE хранилища по числовому значению, нечисловые пропускаются"""
+    assert store.counts_range(-5, 10) == 4
+    assert store.counts_range(float('-inf'), float('inf')) == 4
+    assert store.find_range_page(0, 10) == [(2.5, 'b'), (10.0, 'a'), (10.0, 'e')]
+    assert store.find_range_page(0, 10, 2, (2.5, 'b')) == [(10.0, 'a'), (10.0, 'e')]
+    assert [chunk for chunk in store.iter_find_range(-10, 10, chunk_size=2)] == [['c', 'b'], ['a', 'e']]
+
+
+def test_index_follows_writes_and_rollback(store):
+    """Тест: числовой индекс поддерживается записями, транзакциями, TTL и загрузкой"""
+    store.counts_range(0, 1)
+    store.begin()
+    store.set('d', '7')
+    store.unset('a')
+    store.mset([('b', '100'), ('g', '3')])
+    store.munset(['c'])
+    assert store.find_range_page(-100, 100) == expected_range(store._state, -100, 100)
+    store.begin()
+    store.set('e', 'x')
+    store.rollback()
+    store.commit()
+    assert store.find_range_page(-100, 100) == [(3.0, 'g'), (7.0, 'd'), (10.0, 'e'), (100.0, 'b')]
+    store.begin()
+    store.mset([('g', '-1'), ('h', '5')])
+    store.rollback()
+    assert store.counts_range(-100, 100) == 4
+    store.load_buckets([('1', ['x']), ('y', ['z'])])
+    assert store.find_range_page(0, 10) == [(1.0, 'x')]
+
+    now = [100.0]
+    ttl_store = KeyValueStore(clock=lambda: now[0])
+    ttl_store.set('temp', '1', ttl=5)
+    ttl_store.set('stay', '2')
+    assert ttl_store.counts_range(0, 5) == 2
+    now[0] += 10
+    assert ttl_store.counts_range(0, 5) == 1
+    assert ttl_store.find_range_page(0, 5) == [(2.0, 'stay')]
+
+
+def test_random_writes_match_brute_force():
+    """Тест: случайные SET/UNSET/MSET с откатами дают тот же результат, что перебор"""
+    rng = random.Random(11)
+    store = KeyValueStore()
+    store.counts_range(0, 0)
+    for _ in range(400):
+        key = f'k{rng.randrange(40)}'
+        action = rng.random()
+        if action < 0.5:
+            store.set(key, rng.choice([str(rng.randrange(-20, 20)), 'abc', f'{rng.random():.3f}']))
+        elif action < 0.7:
+            store.unset(key)
+        elif action < 0.8:
+            store.mset([(f'k{rng.randrange(40)}', str(rng.randrange(10))) for _ in range(3)])
+        elif action < 0.9:
+            store.begin()
+        elif not store.rollback():
+            store.begin()
+        lo = rng.randrange(-25, 25)
+        hi = lo + rng.randrange(15)
+        expected = expected_range(store._state, lo, hi)
+        assert store.counts_range(lo, hi) == len(expected)
+        assert store.find_range_page(lo, hi) == expected
+
+
+def test_session_range_sees_own_changes(store):
+    """Тест: RANGE в транзакции сессии учитывает её незафиксированные изменения"""
+    session = Session(store)
+    session.begin()
+    session.set('a', '1')
+    session.set('d', '4')
+    session.unset('b')
+    assert session.counts_range(0, 10) == 3
+    assert session.find_range_page(0, 10) == [(1.0, 'a'), (4.0, 'd'), (10.0, 'e')]
+    assert session.find_range_page(0, 10, 1, (1.0, 'a')) == [(4.0, 'd')]
+    assert store.counts_range(0, 10) == 3
+    assert store.find_range_page(0, 10) == [(2.5, 'b'), (10.0, 'a'), (10.0, 'e')]
+    session.commit()
+    assert store.find_range_page(0, 10) == [(1.0, 'a'), (4.0, 'd'), (10.0, 'e')]
+
+
+def test_snapshot_range_ignores_later_commits(store):
+    """Тест: RANGE в снимке не видит значения, зафиксированные после его начала"""
+    versioned = VersionedStore(store)
+    reader, writer = SnapshotSession(versioned), SnapshotSession(versioned)
+    reader.begin()
+    writer.set('a', '0')
+    writer.set('g', '5')
+    assert reader.counts_range(1, 10) == 3
+    assert reader.find_range_page(1, 10) == [(2.5, 'b'), (10.0, 'a'), (10.0, 'e')]
+    reader.rollback()
+    assert reader.find_range_page(1, 10) == [(2.5, 'b'), (5.0, 'g'), (10.0, 'e')]
+
+
+def test_concurrent_store_range():
+    """Тест: RANGE потокобезопасного хранилища сливает полосы по значению"""
+    store = ConcurrentKeyValueStore(stripes=4)
+    store.mset([(f'k{number:02d}', str(number % 7)) for number in range(20)])
+    assert store.counts_range(2, 3) == 6
+    assert store.find_range_page(6, 6) == [(6.0, 'k06'), (6.0, 'k13')]
+    assert [len(chunk) for chunk in store.iter_find_range(0, 6, chunk_size=8)] == [8, 8, 4]
+
+
+def test_range_commands(store):
+    """Тест: команды COUNTS RANGE и FIND RANGE, ошибки границ и значение 'RANGE'"""
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(store, out=out)
+    dispatcher.dispatch('SET', ['r', 'RANGE'])
+    dispatcher.dispatch('COUNTS', ['RANGE', '0', '10'])
+    dispatcher.dispatch('FIND', ['range', '-inf', '5'])
+    dispatcher.dispatch('FIND', ['RANGE', '0', '100', 'LIMIT', '2'])
+    dispatcher.dispatch('FIND', ['RANGE', '50', '100'])
+    dispatcher.dispatch('COUNTS', ['RANGE'])
+    dispatcher.dispatch('FIND', ['RANGE'])
+    assert out.getvalue().splitlines()[1:] == ['3', 'c b', 'b a', 'NULL', '1', 'r']
+    with pytest.raises(ValueError, match='числами'):
+        dispatcher.dispatch('COUNTS', ['RANGE', 'a', '1'])
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('COUNTS', ['RANGE', '1'])
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('FIND', ['RANGE', '1', '2', 'AFTER', 'a'])
+    client = KeyValueClient(store)
+    assert client.execute('COUNTS RANGE 10 10') == CountsResult(2)
+    assert client.execute('FIND RANGE 2 10') == FindResult(['b', 'a', 'e'])
+    assert client.execute('FIND RANGE nan 1') == ErrorResult('Границы RANGE должны быть числами')
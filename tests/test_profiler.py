@@ -0,0 +1,80 @@
+import io
+import sys
+import time
+import pytest
+from main import main
+from utils.client import ErrorResult, KeyValueClient, ProfileResult
+from utils.command_dispatcher import CommandDispatcher
+from utils.key_value_store import KeyValueStore
+from utils.profiler import SamplingProfiler
+
+
+def busy_store_work(seconds):
+    """Нагрузка на хранилище в текущем потоке в течение заданного времени"""
+    store = KeyValueStore()
+    deadline = time.perf_counter() + seconds
+    index = 0
+    while time.perf_counter() < deadline:
+        store.set(f'k{index % 500}', str(index % 7))
+        index += 1
+
+
+def test_profiler_collects_store_stacks(tmp_path):
+    """Тест: сэмплы содержат стеки хранилища, отчёт — свёрнутые стеки и таблица"""
+    profiler = SamplingProfiler(str(tmp_path / 'profile.folded'), interval_ms=1)
+    switch_interval = sys.getswitchinterval()
+    assert profiler.start() is True and profiler.start() is False
+    busy_store_work(0.3)
+    assert profiler.stop() is True and profiler.stop() is False
+    assert sys.getswitchinterval() == switch_interval
+    assert profiler.samples > 10
+    assert profiler.write_report() == str(tmp_path / 'profile.folded.top.txt')
+    lines = (tmp_path / 'profile.folded').read_text(encoding='utf-8').splitlines()
+    assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any('busy_store_work (' in line and ';KeyValueStore.set (' in line for line in lines)
+    table = (tmp_path / 'profile.folded.top.txt').read_text(encoding='utf-8')
+    assert table.startswith(f'Сэмплов: {profiler.samples}')
+    assert 'KeyValueStore.set' in table
+
+
+def test_empty_profile_writes_nothing(tmp_path):
+    """Тест: без сэмплов отчёт не создаётся"""
+    profiler = SamplingProfiler(str(tmp_path / 'empty.folded'))
+    assert profiler.write_report() is None
+    assert not (tmp_path / 'empty.folded').exists()
+
+
+def test_profile_command_toggles_sampling():
+    """Тест: PROFILE ON/OFF запускает и приостанавливает сэмплирование, сэмплы накапливаются"""
+    out = io.StringIO()
+    profiler = SamplingProfiler(interval_ms=1)
+    dispatcher = CommandDispatcher(KeyValueStore(), out=out, profiler=profiler)
+    dispatcher.dispatch('PROFILE', ['on'])
+    assert profiler.running
+    busy_store_work(0.05)
+    dispatcher.dispatch('PROFILE', ['OFF'])
+    assert not profiler.running
+    dispatcher.dispatch('PROFILE', [])
+    lines = out.getvalue().splitlines()
+    assert lines[0] == 'Профилирование включено, сэмплов: 0'
+    assert lines[1].startswith('Профилирование выключено') and lines[1] == lines[2]
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('PROFILE', ['MAYBE'])
+
+    assert KeyValueClient().execute('PROFILE ON') == ErrorResult('Профилирование недоступно')
+    result = KeyValueClient(profiler=profiler).execute('PROFILE')
+    assert result == ProfileResult(False, profiler.samples)
+
+
+def test_batch_run_with_profile_option(tmp_path, monkeypatch):
+    """Тест: --profile профилирует пакетный режим и пишет отчёт при выходе"""
+    commands = tmp_path / 'commands.txt'
+    commands.write_text(''.join(f'SET k{i % 300} {i % 5}\nGET k{i % 300}\n' for i in range(20000)),
+                        encoding='utf-8')
+    path = tmp_path / 'batch.folded'
+    with open(commands, encoding='utf-8') as stdin, open(tmp_path / 'out.txt', 'w') as stdout:
+        monkeypatch.setattr(sys, 'stdin', stdin)
+        monkeypatch.setattr(sys, 'stdout', stdout)
+        main(['--batch', '--profile', str(path), '--profile-interval', '0.5'])
+    assert 'run_batch (' in path.read_text(encoding='utf-8')
+    assert (tmp_path / 'batch.folded.top.txt').exists()
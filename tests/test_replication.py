@@ -0,0 +1,168 @@
+import asyncio
+import pytest
+from utils.key_value_store import KeyValueStore
+from utils.replication import ChangeFeed, Follower
+from utils.server import KeyValueServer
+from utils.wal import FRAME_HEADER_SIZE, check_frame, unpack_frame_header
+
+
+def committed_state(store):
+    """Зафиксированное состояние: ключ -> значение"""
+    return {key_name: value for value, keys in store.committed_buckets() for key_name in keys}
+
+
+def decode_stream(data):
+    """Разбирает байты потока на списки изменений кадров"""
+    frames = []
+    offset = 0
+    while offset < len(data):
+        length, checksum = unpack_frame_header(data[offset:offset + FRAME_HEADER_SIZE])
+        start = offset + FRAME_HEADER_SIZE
+        frames.append(check_frame(data[start:start + length], checksum))
+        offset = start + length
+    return frames
+
+
+async def _request(host, port, *lines):
+    """Отправляет команды и читает по строке ответа на каждую"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(''.join(f'{line}\n' for line in lines).encode('utf-8'))
+    await writer.drain()
+    replies = [(await reader.readline()).decode('utf-8').rstrip('\n') for _ in lines]
+    writer.close()
+    return replies
+
+
+async def _wait_for(condition, timeout=5.0):
+    """Ждёт выполнения условия, уступая цикл событий"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, 'условие не выполнилось'
+        await asyncio.sleep(0.01)
+
+
+def test_feed_emits_only_committed_changes():
+    """Тест: поток содержит изменения вне транзакций и COMMIT верхнего уровня, смещения — кадры"""
+    store = KeyValueStore()
+    feed = ChangeFeed(store)
+    store.set('a', '1')
+    store.begin()
+    store.set('b', '2')
+    store.begin()
+    store.unset('a')
+    store.commit()
+    assert len(decode_stream(feed.read_from(0))) == 1
+    store.commit()
+    store.mset([('c', '3'), ('d', '4')])
+    store.load_buckets([('9', ['z'])])
+    assert decode_stream(feed.read_from(0)) == [
+        [('a', '1')], [('b', '2'), ('a', None)], [('c', '3'), ('d', '4')], [None, ('z', '9')]]
+    assert feed.read_from(feed.offset) == b''
+    assert feed.read_from(1) is None
+    feed.close()
+    store.set('e', '5')
+    assert feed.read_from(feed.offset) == b''
+
+
+def test_feed_backlog_drops_old_frames():
+    """Тест: буфер потока ограничен; вытесненные смещения требуют полной синхронизации"""
+    store = KeyValueStore()
+    feed = ChangeFeed(store, backlog_bytes=200)
+    offsets = []
+    for number in range(50):
+        offsets.append(feed.offset)
+        store.set(f'key{number}', 'value')
+    assert feed.read_from(0) is None
+    assert decode_stream(feed.read_from(offsets[-1])) == [[('key49', 'value')]]
+    assert len(decode_stream(feed.read_from(offsets[-3], limit=1))) == 1
+
+
+def test_follower_replicates_and_resumes(tmp_path):
+    """Тест: реплика получает снимок и изменения, отклоняет запись и продолжает с сохранённого смещения"""
+    snapshot = str(tmp_path / 'follower.snap')
+
+    async def scenario():
+        primary_store = KeyValueStore()
+        feed = ChangeFeed(primary_store, backlog_bytes=4096)
+        primary = KeyValueServer(primary_store, port=0, feed=feed)
+        host, port = await primary.start()
+        await _request(host, port, 'SET a 1', 'BEGIN', 'SET b 2', 'COMMIT', 'SET t x EX 100',
+                       'BEGIN', 'SET open 1')
+
+        async def start_follower():
+            store = KeyValueStore()
+            follower = Follower(store, host, port, snapshot_path=snapshot, retry_interval=0.01)
+            server = KeyValueServer(store, port=0, follower=follower)
+            address = await server.start()
+            await _wait_for(lambda: follower.offset == feed.offset)
+            return store, follower, server, address
+
+        store, follower, server, address = await start_follower()
+        assert follower.full_syncs == 1
+        assert committed_state(store) == {'a': '1', 'b': '2', 't': 'x'}
+        replies = await _request(*address, 'GET a', 'SET a 2', 'MGET b t', 'FIND 1')
+        assert replies[0] == '1' and replies[2] == '2 x' and replies[3] == 'a'
+        assert replies[1].startswith('НЕВЕРНАЯ КОМАНДА: Реплика только для чтения')
+
+        await _request(host, port, 'MSET c 3 d 4', 'UNSET a', 'SET b 20')
+        await _wait_for(lambda: follower.offset == feed.offset)
+        assert committed_state(store) == committed_state(primary_store)
+        await server.close()
+
+        await _request(host, port, 'SET e 5', 'UNSET c')
+        store, follower, server, address = await start_follower()
+        assert (follower.full_syncs, follower.partial_syncs) == (0, 1)
+        assert committed_state(store) == committed_state(primary_store)
+        await server.close()
+
+        await _request(host, port, *[f'SET k{number} {number}' for number in range(200)])
+        store, follower, server, address = await start_follower()
+        assert follower.full_syncs == 1
+        assert committed_state(store) == committed_state(primary_store)
+        await server.close()
+        await primary.close()
+
+    asyncio.run(scenario())
+
+
+def test_full_syncs_share_store_with_open_freeze():
+    """Тест: две реплики синхронизируются одновременно, пока открыт срез фонового сохранения"""
+    async def scenario():
+        primary_store = KeyValueStore()
+        feed = ChangeFeed(primary_store)
+        primary = KeyValueServer(primary_store, port=0, feed=feed)
+        host, port = await primary.start()
+        await _request(host, port, *[f'SET k{number} {number % 3}' for number in range(100)])
+        frozen = primary_store.freeze()
+        await _request(host, port, 'SET k0 changed')
+        followers = []
+        for _ in range(2):
+            store = KeyValueStore()
+            follower = Follower(store, host, port, retry_interval=0.01)
+            server = KeyValueServer(store, port=0, follower=follower)
+            await server.start()
+            followers.append((store, follower, server))
+        for store, follower, server in followers:
+            await _wait_for(lambda: follower.offset == feed.offset)
+            assert follower.full_syncs == 1
+            assert committed_state(store) == committed_state(primary_store)
+            await server.close()
+        assert dict(frozen.items())['k0'] == '0'
+        frozen.close()
+        await primary.close()
+
+    asyncio.run(scenario())
+
+
+def test_sync_requires_primary():
+    """Тест: сервер без потока изменений отвечает на SYNC ошибкой; реплика несовместима со snapshot"""
+    async def scenario():
+        server = KeyValueServer(KeyValueStore(), port=0)
+        host, port = await server.start()
+        reply = await _request(host, port, 'SYNC')
+        await server.close()
+        return reply
+    assert asyncio.run(scenario())[0].startswith('НЕВЕРНАЯ КОМАНДА: Сервер не принимает реплики')
+    with pytest.raises(ValueError):
+        KeyValueServer(KeyValueStore(), follower=Follower(KeyValueStore(), '127.0.0.1', 1),
+                       isolation='snapshot')
@@ -0,0 +1,147 @@
+import io
+import random
+import pytest
+from utils.command_dispatcher import CommandDispatcher
+from utils.concurrent_store import ConcurrentKeyValueStore
+from utils.key_value_store import KeyValueStore
+from utils.mvcc import SnapshotSession, VersionedStore
+from utils.session import Session
+from utils.sorted_list import SortedList, prefix_end, scan_bounds
+
+
+class SmallSortedList(SortedList):
+    LOAD = 4
+
+
+def expected_scan(keys, prefix=None, start=None, end=None, limit=None, after=None):
+    """Эталон сканирования полным перебором"""
+    result = sorted(key for key in keys
+                    if (prefix is None or key.startswith(prefix)) and (start is None or key >= start)
+                    and (end is None or key < end) and (after is None or key > after))
+    return result if limit is None else result[:limit]
+
+
+@pytest.fixture
+def store():
+    store = KeyValueStore()
+    store.mset([(key, '1') for key in ('user:1', 'user:2', 'user:10', 'users', 'admin', 'zed')])
+    return store
+
+
+def test_range_page_matches_brute_force():
+    """Тест: страница диапазона SortedList совпадает с перебором при мелких блоках"""
+    rng = random.Random(3)
+    values = {f'{rng.choice("abc")}{rng.randrange(60)}' for _ in range(150)}
+    ordered = SmallSortedList(values)
+    for _ in range(300):
+        start, stop, after = (rng.choice([None, f'{rng.choice("abc")}{rng.randrange(60)}'])
+                              for _ in range(3))
+        limit = rng.choice([None, 1, 3, 10])
+        assert ordered.range_page(start, stop, after, limit) == \
+            expected_scan(values, None, start, stop, limit, after)
+
+
+def test_prefix_bounds():
+    """Тест: префикс сводится к полуинтервалу [префикс, следующая строка)"""
+    assert prefix_end('user:') == 'user;'
+    assert prefix_end('a\U0010ffff') == 'b'
+    assert prefix_end('') is None
+    assert scan_bounds('user:', 'user:2', None) == ('user:2', 'user;')
+    assert scan_bounds('b', 'a', 'bb') == ('b', 'bb')
+
+
+def test_prefix_and_range_scans(store):
+    """Тест: KEYS/SCAN по префиксу и диапазону, постранично через AFTER"""
+    assert store.scan_page('USER:') == ['user:1', 'user:10', 'user:2']
+    assert store.scan_page('user', limit=2) == ['user:1', 'user:10']
+    assert store.scan_page('user', limit=2, after='user:10') == ['user:2', 'users']
+    assert store.scan_page(start='b', end='users') == ['user:1', 'user:10', 'user:2']
+    assert store.scan_page('user:', start='user:2') == ['user:2']
+    assert [len(chunk) for chunk in store.iter_scan(chunk_size=4)] == [4, 2]
+    assert store.scan_page('nobody') == []
+
+
+def test_index_follows_writes_and_rollback(store):
+    """Тест: индекс ключей поддерживается записями, транзакциями, TTL и загрузкой"""
+    now = [100.0]
+    ttl_store = KeyValueStore(clock=lambda: now[0])
+    ttl_store.set('temp', '1', ttl=5)
+    ttl_store.set('stay', '1')
+    assert ttl_store.scan_page() == ['stay', 'temp']
+    now[0] += 10
+    assert ttl_store.scan_page() == ['stay']
+
+    store.scan_page()
+    store.begin()
+    store.set('user:3', '1')
+    store.munset(['user:1', 'admin'])
+    store.mset([('user:4', '2'), ('zed', '2')])
+    assert store.scan_page('user:') == ['user:10', 'user:2', 'user:3', 'user:4']
+    store.rollback()
+    assert store.scan_page() == ['admin', 'user:1', 'user:10', 'user:2', 'users', 'zed']
+    store.load_buckets([('x', ['b', 'a'])])
+    assert store.scan_page() == ['a', 'b']
+    limited = KeyValueStore(max_keys=2)
+    limited.mset([('a', '1'), ('b', '1')])
+    limited.scan_page()
+    limited.set('c', '1')
+    assert limited.scan_page() == sorted(limited._state)
+
+
+def test_session_scan_merges_overlay(store):
+    """Тест: сканирование в транзакции сессии учитывает свои ключи и метки удаления"""
+    session = Session(store)
+    session.begin()
+    session.munset(['user:1', 'user:10'])
+    session.set('user:0', '1')
+    assert session.scan_page('user', limit=2) == ['user:0', 'user:2']
+    assert session.scan_page('user', limit=2, after='user:0') == ['user:2', 'users']
+    assert [key for chunk in session.iter_scan(chunk_size=1) for key in chunk] == \
+        ['admin', 'user:0', 'user:2', 'users', 'zed']
+    assert store.scan_page('user:') == ['user:1', 'user:10', 'user:2']
+    session.commit()
+    assert store.scan_page('user:') == ['user:0', 'user:2']
+
+
+def test_snapshot_scan_ignores_later_commits(store):
+    """Тест: SCAN в снимке не видит ключи, зафиксированные после его начала"""
+    versioned = VersionedStore(store)
+    reader, writer = SnapshotSession(versioned), SnapshotSession(versioned)
+    reader.begin()
+    writer.set('user:5', '1')
+    writer.unset('user:2')
+    assert reader.scan_page('user:') == ['user:1', 'user:10', 'user:2']
+    reader.set('user:9', '1')
+    assert reader.scan_page('user:', limit=3, after='user:1') == ['user:10', 'user:2', 'user:9']
+    reader.rollback()
+    assert reader.scan_page('user:') == ['user:1', 'user:10', 'user:5']
+
+
+def test_concurrent_store_scan():
+    """Тест: сканирование потокобезопасного хранилища сливает полосы по порядку"""
+    store = ConcurrentKeyValueStore(stripes=4)
+    store.mset([(f'k{number:02d}', '1') for number in range(20)])
+    assert store.scan_page('k1', limit=5) == [f'k{number}' for number in range(10, 15)]
+    store.begin()
+    store.unset('k10')
+    assert store.scan_page('k1', limit=2) == ['k11', 'k12']
+    store.rollback()
+    assert [len(chunk) for chunk in store.iter_scan('k', chunk_size=8)] == [8, 8, 4]
+
+
+def test_commands_output(store):
+    """Тест: KEYS и SCAN печатаются как FIND, неверные параметры — ошибка"""
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(store, out=out)
+    dispatcher.dispatch('KEYS', ['user:'])
+    dispatcher.dispatch('SCAN', ['PREFIX', 'user', 'LIMIT', '2', 'AFTER', 'user:1'])
+    dispatcher.dispatch('SCAN', ['from', 'u', 'to', 'user:10'])
+    dispatcher.dispatch('KEYS', ['nobody'])
+    dispatcher.dispatch('KEYS', [])
+    assert out.getvalue().splitlines() == [
+        'user:1 user:10 user:2', 'user:10 user:2', 'user:1', 'NULL',
+        'admin user:1 user:10 user:2 users zed']
+    for cmd, args in (('SCAN', ['LIMIT']), ('SCAN', ['LIMIT', '0']), ('SCAN', ['WHERE', 'x']),
+                      ('KEYS', ['a', 'b'])):
+        with pytest.raises(ValueError):
+            dispatcher.dispatch(cmd, args)
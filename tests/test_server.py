@@ -0,0 +1,110 @@
+import asyncio
+from utils.key_value_store import KeyValueStore
+from utils.server import KeyValueServer
+
+
+async def _request(reader, writer, *lines):
+    """Отправляет строки одной записью и читает по строке ответа на каждую"""
+    writer.write(''.join(f'{line}\n' for line in lines).encode('utf-8'))
+    await writer.drain()
+    return [(await reader.readline()).decode('utf-8').rstrip('\n') for _ in lines]
+
+
+def run_with_server(scenario, **options):
+    """Запускает сервер на loopback со свободным портом и выполняет сценарий клиента"""
+    async def runner():
+        store = KeyValueStore()
+        server = KeyValueServer(store, port=0, **options)
+        host, port = await server.start()
+        try:
+            return await scenario(store, host, port)
+        finally:
+            await server.close()
+    return asyncio.run(runner())
+
+
+def test_pipelined_commands_get_ordered_replies():
+    """Тест: конвейер команд получает ответы по порядку"""
+    async def scenario(store, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        replies = await _request(reader, writer, 'SET a 1', 'SET b 1', 'GET a', 'COUNTS 1',
+                                 'FIND 1', 'UNSET a', 'NOPE', 'GET')
+        writer.close()
+        return replies
+    assert run_with_server(scenario) == [
+        "Ключ 'a' изменён: было 'NULL', стало '1'",
+        "Ключ 'b' изменён: было 'NULL', стало '1'",
+        '1',
+        '2',
+        'a b',
+        "Ключ 'a' удалён: было '1'",
+        'НЕВЕРНАЯ КОМАНДА',
+        'НЕВЕРНАЯ КОМАНДА: Команда GET требует 1 аргумент',
+    ]
+
+
+def test_transactions_are_isolated_per_connection():
+    """Тест: BEGIN одного клиента не виден другому до COMMIT"""
+    async def scenario(store, host, port):
+        first = await asyncio.open_connection(host, port)
+        second = await asyncio.open_connection(host, port)
+        await _request(*first, 'SET a 1', 'BEGIN', 'SET a 2', 'SET b 2', 'UNSET c')
+        before = await _request(*second, 'GET a', 'GET b', 'COUNTS 2', 'ROLLBACK')
+        inside = await _request(*first, 'GET a', 'COUNTS 2', 'FIND 2', 'COMMIT')
+        after = await _request(*second, 'GET a', 'FIND 2')
+        for _, writer in (first, second):
+            writer.close()
+        return before, inside, after
+    before, inside, after = run_with_server(scenario)
+    assert before == ['1', 'NULL', '0', 'Не запущено ни одной транзакции!']
+    assert inside == ['2', '2', 'a b', 'Транзакция применена']
+    assert after == ['2', 'a b']
+
+
+def test_disconnect_discards_open_transaction():
+    """Тест: обрыв соединения отбрасывает незафиксированную транзакцию"""
+    async def scenario(store, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        await _request(reader, writer, 'BEGIN', 'SET a 1')
+        writer.close()
+        await writer.wait_closed()
+        reader, writer = await asyncio.open_connection(host, port)
+        replies = await _request(reader, writer, 'GET a')
+        writer.write(b'END\n')
+        closed = await reader.read()
+        writer.close()
+        return replies, closed
+    replies, closed = run_with_server(scenario)
+    assert replies == ['NULL']
+    assert closed == b''
+
+
+def test_snapshot_isolation_between_connections():
+    """Тест: при изоляции снимков транзакция читает данные на момент BEGIN"""
+    async def scenario(store, host, port):
+        first = await asyncio.open_connection(host, port)
+        second = await asyncio.open_connection(host, port)
+        await _request(*first, 'SET a 1', 'BEGIN', 'SET b 1')
+        await _request(*second, 'SET a 2', 'BEGIN', 'SET b 2', 'COMMIT')
+        inside = await _request(*first, 'GET a', 'COUNTS 2', 'COMMIT', 'GET b')
+        for _, writer in (first, second):
+            writer.close()
+        return inside
+    assert run_with_server(scenario, isolation='snapshot') == [
+        '1', '0', 'Транзакция отменена: ключи изменены другой сессией: b', '2']
+
+
+def test_long_line_closes_connection():
+    """Тест: незавершённая строка длиннее лимита получает ошибку, соединение закрывается"""
+    async def scenario(store, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        assert await _request(reader, writer, 'SET a 1') == ["Ключ 'a' изменён: было 'NULL', стало '1'"]
+        writer.write(b'SET b ' + b'x' * 200)
+        await writer.drain()
+        reply = (await reader.readline()).decode('utf-8')
+        closed = await reader.read()
+        writer.close()
+        return reply, closed
+    reply, closed = run_with_server(scenario, max_line_bytes=100)
+    assert reply == 'НЕВЕРНАЯ КОМАНДА: Строка команды длиннее 100 байт\n'
+    assert closed == b''
@@ -0,0 +1,61 @@
+import pytest
+from utils.key_value_store import KeyValueStore
+from utils.session import Session
+
+
+@pytest.fixture
+def store():
+    return KeyValueStore()
+
+
+def test_nested_session_transactions(store):
+    """Тест: вложенные COMMIT/ROLLBACK сессии не трогают общее хранилище до верхнего COMMIT"""
+    session = Session(store)
+    store.set('a', '1')
+    session.begin()
+    session.set('a', '2')
+    session.begin()
+    session.unset('a')
+    session.set('b', '3')
+    assert session.get('a') == 'NULL'
+    session.commit()
+    assert session.get('a') == 'NULL'
+    session.begin()
+    session.set('a', '4')
+    session.rollback()
+    assert session.get('a') == 'NULL'
+    assert store.get('a') == '1'
+    assert store.get('b') == 'NULL'
+    session.commit()
+    assert store.get('a') == 'NULL'
+    assert store.get('b') == '3'
+
+
+def test_session_counts_and_find_merge_overlay(store):
+    """Тест: COUNTS/FIND сессии учитывают её незафиксированные изменения"""
+    session = Session(store)
+    store.set('a', '1')
+    store.set('b', '1')
+    session.begin()
+    session.set('a', '2')
+    session.set('c', '1')
+    session.unset('b')
+    assert session.counts('1') == 1
+    assert session.find('1') == ['c']
+    assert session.counts('2') == 1
+    assert store.counts('1') == 2
+    session.rollback()
+    assert session.find('1') == ['a', 'b']
+
+
+def test_session_commit_is_one_notification(store):
+    """Тест: COMMIT сессии применяется к хранилищу одним уведомлением слушателей"""
+    notifications = []
+    store.add_listener(notifications.append)
+    session = Session(store)
+    session.begin()
+    session.set('a', '1')
+    session.set('b', '2')
+    assert notifications == []
+    session.commit()
+    assert notifications == [[('a', '1'), ('b', '2')]]
@@ -0,0 +1,159 @@
+import io
+import random
+import pytest
+from utils.batch_runner import run_batch
+from utils.command_dispatcher import CommandDispatcher
+from utils.key_value_store import KeyValueStore
+from utils.sharded_store import ShardedStore
+from utils.snapshot import load_snapshot, save_snapshot
+from utils.stats import CommandStats
+from main import parse_args
+
+
+@pytest.fixture
+def sharded():
+    store = ShardedStore(workers=3)
+    yield store
+    store.close()
+
+
+def make_commands(seed: int, count: int) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        key = f'Key{rng.randrange(40)}'
+        roll = rng.random()
+        if roll < 0.35:
+            lines.append(f'SET {key} v{rng.randrange(4)}')
+        elif roll < 0.55:
+            lines.append(f'GET {key}')
+        elif roll < 0.62:
+            lines.append(f'UNSET {key}')
+        elif roll < 0.70:
+            lines.append(f'COUNTS v{rng.randrange(4)}')
+        elif roll < 0.76:
+            lines.append(f'FIND v{rng.randrange(4)}')
+        elif roll < 0.80:
+            lines.append(f'FIND v{rng.randrange(4)} LIMIT 3 AFTER key1')
+        elif roll < 0.84:
+            lines.append(f'MSET {key} v1 key{rng.randrange(40)} v2')
+        elif roll < 0.88:
+            lines.append(f'MGET {key} key{rng.randrange(40)}')
+        elif roll < 0.92:
+            lines.append('BEGIN')
+        elif roll < 0.96:
+            lines.append('ROLLBACK')
+        else:
+            lines.append('COMMIT')
+    return '\n'.join(lines) + '\n'
+
+
+def test_batch_output_matches_single_store(sharded):
+    """Тест: пакетный вывод шардированного хранилища совпадает с одним хранилищем"""
+    commands = make_commands(seed=7, count=3000)
+    expected = io.StringIO()
+    run_batch(CommandDispatcher(KeyValueStore(), out=expected), io.StringIO(commands))
+    actual = io.StringIO()
+    executed = sharded.run_batch(CommandDispatcher(sharded, out=actual), io.StringIO(commands),
+                                 read_hint=4096)
+    assert executed == 3000
+    assert actual.getvalue() == expected.getvalue()
+
+
+def test_fanout_queries_merge_sorted(sharded):
+    """Тест: COUNTS и FIND собирают ключи со всех шардов, FIND — по порядку"""
+    sharded.mset([(f'k{i:02d}', 'x') for i in range(30)])
+    assert sharded.counts('x') == 30
+    assert sharded.find('x') == [f'k{i:02d}' for i in range(30)]
+    assert sharded.find_page('x', 5, 'k10') == ['k11', 'k12', 'k13', 'k14', 'k15']
+    assert [len(chunk) for chunk in sharded.iter_find('x', 12)] == [12, 12, 6]
+    assert sharded.mget(['K01', 'nope']) == ['x', 'NULL']
+
+
+def test_range_queries_merge_by_value(sharded):
+    """Тест: COUNTS/FIND RANGE собирают числовые значения со всех шардов по порядку"""
+    sharded.mset([(f'k{i:02d}', str(30 - i)) for i in range(30)])
+    assert sharded.counts_range(10, 19.5) == 10
+    assert sharded.find_range_page(1, 3) == [(1.0, 'k29'), (2.0, 'k28'), (3.0, 'k27')]
+    assert [len(chunk) for chunk in sharded.iter_find_range(1, 30, 12)] == [12, 12, 6]
+
+
+def test_stats_sum_shards(sharded):
+    """Тест: показатели STATS суммируются по шардам"""
+    sharded.mset([(f'k{i}', str(i % 4)) for i in range(10)])
+    stats = sharded.stats()
+    assert stats['keys'] == 10 and stats['shards'] == 3
+    assert 4 <= stats['value_buckets'] <= 12
+
+
+def test_transaction_spans_all_shards(sharded):
+    """Тест: BEGIN/ROLLBACK/COMMIT действуют на все шарды как одна транзакция"""
+    sharded.mset([(f'k{i}', '1') for i in range(10)])
+    sharded.begin()
+    sharded.munset([f'k{i}' for i in range(10)])
+    sharded.begin()
+    sharded.set('k0', '2')
+    assert sharded.rollback() is True
+    assert sharded.counts('1') == 0
+    assert sharded.rollback() is True
+    assert sharded.counts('1') == 10
+    assert sharded.rollback() is False
+
+
+def test_snapshot_roundtrip(sharded, tmp_path):
+    """Тест: SAVE/LOAD через шардированное хранилище"""
+    path = str(tmp_path / 'data.snap')
+    sharded.mset([(f'k{i}', f'v{i % 3}') for i in range(50)])
+    assert save_snapshot(sharded, path) == 50
+    single = KeyValueStore()
+    load_snapshot(single, path)
+    assert single.counts('v0') == 17
+    sharded.munset([f'k{i}' for i in range(50)])
+    assert load_snapshot(sharded, path) == 50
+    assert sharded.find('v1') == single.find('v1')
+
+
+def test_scan_merges_shards(sharded):
+    """Тест: SCAN по префиксу сливает отсортированные страницы шардов"""
+    sharded.mset([(f'k{i:02d}', 'x') for i in range(30)] + [('other', 'x')])
+    assert sharded.scan_page('k1', limit=4, after='k11') == ['k12', 'k13', 'k14', 'k15']
+    assert [len(chunk) for chunk in sharded.iter_scan('k', chunk_size=12)] == [12, 12, 6]
+
+
+def test_limits_split_across_shards():
+    """Тест: --max-keys ограничивает всё хранилище, а не каждый шард"""
+    store = ShardedStore(workers=3, max_keys=7)
+    try:
+        store.mset([(f'k{i}', 'x') for i in range(30)])
+        assert store.counts('x') <= 7
+    finally:
+        store.close()
+    with pytest.raises(ValueError):
+        ShardedStore(workers=3, max_keys=2)
+    with pytest.raises(SystemExit):
+        parse_args(['--batch', '--workers', '3', '--max-keys', '2'])
+
+
+def test_shard_failure_is_reported(sharded):
+    """Тест: сбой шарда возвращается ошибкой, а завершённый шард не блокирует маршрутизатор"""
+    connection = sharded._connections[0]
+    connection.send(('call', 'no_such_method', ()))
+    with pytest.raises(RuntimeError):
+        sharded._receive(connection)
+    sharded.set('a', '1')
+    assert sharded.counts('1') == 1
+    sharded._processes[1].kill()
+    sharded._processes[1].join()
+    with pytest.raises(RuntimeError):
+        sharded.counts('1')
+
+
+def test_batch_stats_count_shard_commands(sharded):
+    """Тест: STATS учитывает команды, выполненные шардами в пакетном режиме"""
+    dispatcher = CommandDispatcher(sharded, out=io.StringIO())
+    stats = CommandStats()
+    dispatcher.enable_stats(stats)
+    sharded.run_batch(dispatcher, io.StringIO('SET a 1\nSET b 1\nGET a\nCOUNTS 1\n'))
+    assert stats.histogram('SET').count == 2
+    assert stats.histogram('GET').count == 1
+    assert stats.histogram('COUNTS').count == 1
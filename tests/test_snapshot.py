@@ -0,0 +1,117 @@
+import pytest
+from utils.key_value_store import KeyValueStore
+from utils.command_dispatcher import CommandDispatcher
+from utils.snapshot import LEGACY_MAGIC, MAGIC, BackgroundSave, iter_snapshot, load_snapshot, save_snapshot
+
+
+@pytest.fixture
+def store():
+    return KeyValueStore()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'store.snap')
+
+
+def test_save_and_load_roundtrip(store, path):
+    """Тест: снимок восстанавливает ключи, значения и индекс COUNTS/FIND"""
+    for i in range(1000):
+        store.set(f'Key{i}', f'значение{i % 3}')
+    assert save_snapshot(store, path) == 1000
+    restored = KeyValueStore()
+    assert load_snapshot(restored, path) == 1000
+    assert restored.get('key5') == 'значение2'
+    assert restored.counts('значение0') == 334
+    assert restored.find('значение1')[:2] == ['key1', 'key10']
+    restored.set('key5', 'x')
+    assert restored.counts('значение2') == 332
+
+
+def test_save_writes_only_committed_state(store, path):
+    """Тест: незафиксированные изменения открытых транзакций не попадают в снимок"""
+    store.set('a', '1')
+    store.set('b', '2')
+    store.begin()
+    store.set('a', '10')
+    store.unset('b')
+    store.set('c', '3')
+    save_snapshot(store, path)
+    restored = KeyValueStore()
+    load_snapshot(restored, path)
+    assert restored.get('a') == '1'
+    assert restored.get('b') == '2'
+    assert restored.get('c') == 'NULL'
+    assert store.get('a') == '10'
+
+
+def test_large_buckets_are_split_into_records(store, path, monkeypatch):
+    """Тест: крупная корзина пишется несколькими записями и читается обратно целиком"""
+    monkeypatch.setattr('utils.snapshot.KEYS_PER_RECORD', 10)
+    for i in range(25):
+        store.set(f'k{i}', 'v')
+    save_snapshot(store, path)
+    assert [len(keys) for _, keys in iter_snapshot(path)] == [10, 10, 5]
+    restored = KeyValueStore()
+    load_snapshot(restored, path)
+    assert restored.counts('v') == 25
+
+
+def test_snapshot_keeps_deadlines(path, tmp_path):
+    """Тест: снимок сохраняет зафиксированные сроки жизни; снимок первой версии читается без них"""
+    now = [100.0]
+    store = KeyValueStore(clock=lambda: now[0])
+    store.set('a', '1', ttl=10)
+    store.set('b', '1', ttl=10)
+    store.set('c', '1')
+    store.begin()
+    store.persist('a')
+    store.set('c', '1', ttl=5)
+    save_snapshot(store, path)
+    background = BackgroundSave(store, str(tmp_path / 'bg.snap'))
+    assert background.wait() == 3
+    for snapshot_path in (path, str(tmp_path / 'bg.snap')):
+        restored = KeyValueStore(clock=lambda: now[0])
+        load_snapshot(restored, snapshot_path)
+        assert [restored.ttl(key) for key in 'abc'] == [10, 10, -1]
+    now[0] = 110.0
+    assert restored.find('1') == ['c']
+
+    legacy = tmp_path / 'legacy.snap'
+    legacy.write_bytes(LEGACY_MAGIC + open(path, 'rb').read()[len(MAGIC) + 4 + 2 * (4 + 1 + 8):])
+    restored = KeyValueStore()
+    assert load_snapshot(restored, str(legacy)) == 3
+    assert restored.ttl('a') == -1
+
+
+def test_load_rejects_invalid_file_and_keeps_data(store, tmp_path):
+    """Тест: повреждённый снимок не портит текущие данные"""
+    bad = tmp_path / 'bad.snap'
+    bad.write_bytes(MAGIC + b'\x05\x00\x00\x00ab')
+    store.set('a', '1')
+    with pytest.raises(ValueError):
+        load_snapshot(store, str(bad))
+    assert store.get('a') == '1'
+
+
+def test_load_inside_transaction_is_rejected(store, path):
+    """Тест: LOAD внутри транзакции запрещён"""
+    save_snapshot(store, path)
+    store.begin()
+    with pytest.raises(ValueError):
+        load_snapshot(store, path)
+
+
+def test_save_load_commands(store, path, capsys):
+    """Тест: команды SAVE/LOAD используют путь по умолчанию"""
+    dispatcher = CommandDispatcher(store, snapshot_path=path)
+    dispatcher.dispatch('SET', ['a', '1'])
+    dispatcher.dispatch('SAVE', [])
+    assert 'сохранён, ключей: 1' in capsys.readouterr().out
+    dispatcher.dispatch('UNSET', ['a'])
+    dispatcher.dispatch('LOAD', [])
+    assert 'загружен, ключей: 1' in capsys.readouterr().out
+    dispatcher.dispatch('GET', ['a'])
+    assert capsys.readouterr().out.strip() == '1'
+    with pytest.raises(ValueError):
+        CommandDispatcher(store).dispatch('SAVE', [])
@@ -0,0 +1,137 @@
+import io
+import json
+import random
+import pytest
+from utils.client import KeyValueClient, StatsResult
+from utils.command_dispatcher import CommandDispatcher
+from utils.command_pipeline import CommandPipeline
+from utils.concurrent_store import ConcurrentKeyValueStore
+from utils.key_value_store import KeyValueStore
+from utils.mvcc import SnapshotSession, VersionedStore
+from utils.session import Session
+from utils.stats import (BUCKET_COUNT, CommandStats, LatencyHistogram, StatsDumper, bucket_index,
+                         bucket_upper)
+
+
+def test_bucket_bounds_cover_every_latency():
+    """Тест: каждая задержка попадает в корзину, границы которой её содержат, с погрешностью 1/16"""
+    rng = random.Random(1)
+    for ns in list(range(2000)) + [rng.randrange(1, 1 << 62) for _ in range(2000)]:
+        index = bucket_index(ns)
+        assert index < BUCKET_COUNT
+        assert ns <= bucket_upper(index) <= ns + ns // 16
+        assert index == 0 or bucket_upper(index - 1) < ns
+
+
+def test_histogram_percentiles():
+    """Тест: перцентили гистограммы — верхние границы корзин, не больше максимума"""
+    histogram = LatencyHistogram()
+    for value in range(1, 1001):
+        histogram.record(value * 1000)
+    summary = histogram.summary()
+    assert summary['calls'] == 1000
+    assert summary['mean_us'] == pytest.approx(500.5)
+    assert 500 <= summary['p50_us'] <= 500 * 17 / 16
+    assert 990 <= summary['p99_us'] <= summary['max_us'] == 1000
+    assert LatencyHistogram().percentile(50) == 0
+
+
+def test_dispatcher_swaps_handlers_only_when_enabled():
+    """Тест: статистика подменяет обработчики таблицы команд, выключение возвращает исходные"""
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(KeyValueStore(), out=out)
+    plain = dict(dispatcher.commands)
+    stats = CommandStats()
+    dispatcher.enable_stats(stats)
+    assert all(dispatcher.commands[name].__wrapped__ is handler for name, handler in plain.items())
+    dispatcher.dispatch('SET', ['a', '1'])
+    dispatcher.dispatch('GET', ['a'])
+    dispatcher.dispatch('GET', ['b'])
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('GET', [])
+    report = stats.report()
+    assert report['GET']['calls'] == 3 and report['SET']['calls'] == 1
+    dispatcher.disable_stats()
+    assert dispatcher.commands == plain
+    dispatcher.dispatch('GET', ['a'])
+    assert stats.report()['GET']['calls'] == 3
+
+
+def test_stats_command_reports_store_and_latencies():
+    """Тест: STATS выводит размеры хранилища, транзакции, индексы и сводки команд"""
+    out = io.StringIO()
+    store = KeyValueStore()
+    dispatcher = CommandDispatcher(store, out=out, stats=CommandStats())
+    for line in ('SET a 1', 'SET b 1', 'SET c 2', 'KEYS', 'COUNTS RANGE 0 5', 'BEGIN', 'UNSET a'):
+        name, *args = line.split()
+        dispatcher.dispatch(name, args)
+    out.truncate(0)
+    out.seek(0)
+    dispatcher.dispatch('STATS', [])
+    lines = out.getvalue().splitlines()
+    fields = dict(line.split(' ', 1) for line in lines)
+    assert fields['keys'] == '2' and fields['value_buckets'] == '2'
+    assert fields['transaction_depth'] == '1' and fields['undo_entries'] == '1'
+    assert fields['key_index_size'] == '2' and fields['numeric_index_size'] == '2'
+    assert fields['SET'].startswith('calls=3 mean_us=')
+    assert 'p99_us=' in fields['UNSET']
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('STATS', ['x'])
+
+
+def test_pipeline_and_client_stats():
+    """Тест: конвейер и клиент собирают статистику, без неё STATS даёт только размеры"""
+    pipeline = CommandPipeline(KeyValueStore(), stats=CommandStats())
+    pipeline.execute(b'SET a 1')
+    code, report = pipeline.execute(b'STATS')
+    assert code == 'STATS' and report['commands']['SET']['calls'] == 1
+    pipeline.disable_stats()
+    assert pipeline.execute(b'STATS')[1]['commands'] == {}
+
+    client = KeyValueClient()
+    client.execute('SET a 1')
+    result = client.execute('STATS')
+    assert isinstance(result, StatsResult)
+    assert result.store['keys'] == 1 and result.commands == {} and result.uptime is None
+
+
+def test_layered_store_stats():
+    """Тест: сессии, снимки и полосы сообщают свои слои и суммарные размеры"""
+    store = KeyValueStore()
+    store.mset([('a', '1'), ('b', '2')])
+    session = Session(store)
+    session.begin()
+    session.set('c', '3', ttl=10)
+    stats = session.stats()
+    assert (stats['keys'], stats['transaction_depth'], stats['pending_keys'], stats['pending_expiry']) \
+        == (2, 1, 1, 1)
+
+    versioned = VersionedStore(store)
+    reader, writer = SnapshotSession(versioned), SnapshotSession(versioned)
+    reader.begin()
+    writer.set('a', '9')
+    stats = reader.stats()
+    assert stats['history_versions'] == 1 and stats['open_snapshots'] == 1
+
+    concurrent = ConcurrentKeyValueStore(stripes=4)
+    concurrent.mset([(f'k{number}', str(number % 3)) for number in range(20)])
+    concurrent.begin()
+    concurrent.unset('k1')
+    stats = concurrent.stats()
+    assert stats['keys'] == 20 and stats['value_buckets'] >= 3 and stats['pending_keys'] == 1
+    concurrent.rollback()
+
+
+def test_dumper_writes_json_report(tmp_path):
+    """Тест: периодический отчёт пишется в JSON-файл целиком"""
+    stats = CommandStats()
+    pipeline = CommandPipeline(KeyValueStore(), stats=stats)
+    pipeline.execute(b'SET a 1')
+    path = tmp_path / 'stats.json'
+    dumper = StatsDumper(stats, str(path), interval=0.01, store=pipeline.store)
+    dumper.start()
+    dumper.close()
+    report = json.loads(path.read_text(encoding='utf-8'))
+    assert report['store']['keys'] == 1
+    assert report['commands']['SET']['calls'] == 1
+    assert not (tmp_path / 'stats.json.tmp').exists()
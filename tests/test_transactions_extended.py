@@ -61,4 +61,56 @@ def test_rollback_without_active_transaction_is_safe(store):
     """Тест: ROLLBACK без активной транзакции не меняет состояние и не бросает исключений"""
     store.set('y', 'Y')
     store.rollback()
-    assert store.get('y') == 'Y' 
\ No newline at end of file
+    assert store.get('y') == 'Y' 
+
+
+def test_index_follows_commit_and_rollback(store):
+    """Тест: индекс значений COUNTS/FIND согласован после COMMIT и ROLLBACK"""
+    store.set('a', '1')
+    store.set('b', '1')
+    store.begin()
+    store.unset('a')
+    store.set('b', '2')
+    store.begin()
+    store.set('c', '1')
+    store.commit()
+    assert store.counts('1') == 1
+    assert store.find('1') == ['c']
+    assert store.find('2') == ['b']
+    store.rollback()
+    assert store.counts('1') == 2
+    assert store.find('1') == ['a', 'b']
+    assert store.counts('2') == 0
+    assert store.find('2') == []
+
+def test_index_drops_empty_buckets(store):
+    """Тест: опустевшие корзины индекса удаляются"""
+    store.set('a', '1')
+    store.set('a', '2')
+    store.unset('a')
+    assert store._value_to_keys == {}
+
+def test_deep_nesting_rollback_restores_each_level(store):
+    """Тест: при глубокой вложенности каждый ROLLBACK восстанавливает свой уровень"""
+    depth = 300
+    for level in range(depth):
+        store.begin()
+        store.set('a', str(level))
+        if level % 2:
+            store.unset('b')
+        else:
+            store.set('b', str(level))
+    assert store.transaction_depth == depth
+    for level in reversed(range(depth)):
+        assert store.get('a') == str(level)
+        store.rollback()
+    assert store.get('a') == 'NULL'
+    assert store.get('b') == 'NULL'
+    assert store.transaction_depth == 0
+
+def test_set_and_unset_return_previous_value(store):
+    """Тест: set и unset возвращают прежнее значение (None, если ключа не было)"""
+    assert store.set('a', '1') is None
+    assert store.set('A', '2') == '1'
+    assert store.unset('a') == '2'
+    assert store.unset('a') is None
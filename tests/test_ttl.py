@@ -0,0 +1,183 @@
+import io
+import pytest
+from utils.key_value_store import EVICTION_BATCH, KeyValueStore
+from utils.command_dispatcher import CommandDispatcher
+from utils.session import Session
+
+
+class FakeClock:
+    """Управляемые часы для тестов сроков жизни"""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def store(clock):
+    return KeyValueStore(clock=clock)
+
+
+def test_key_expires_lazily(store, clock):
+    """Тест: ключ с TTL исчезает после истечения срока"""
+    store.set('a', '1', ttl=10)
+    store.set('b', '1')
+    assert store.ttl('a') == 10
+    assert store.ttl('b') == -1
+    assert store.ttl('x') == -2
+    clock.now += 10
+    assert store.get('a') == 'NULL'
+    assert store.ttl('a') == -2
+    assert store.find('1') == ['b']
+
+
+def test_counts_and_find_skip_expired(store, clock):
+    """Тест: COUNTS/FIND не учитывают истёкшие ключи, даже не прочитанные ранее"""
+    for i in range(5):
+        store.set(f'k{i}', 'v', ttl=i + 1)
+    clock.now += 3
+    assert store.counts('v') == 2
+    assert store.find('v') == ['k3', 'k4']
+    assert store._value_to_keys['v'] and len(store._state) == 2
+
+
+def test_plain_set_and_persist_clear_ttl(store, clock):
+    """Тест: SET без EX и PERSIST снимают срок жизни"""
+    store.set('a', '1', ttl=5)
+    store.set('a', '1')
+    store.set('b', '2', ttl=5)
+    assert store.persist('b') is True
+    assert store.persist('b') is False
+    assert store.persist('x') is False
+    clock.now += 10
+    assert store.get('a') == '1'
+    assert store.get('b') == '2'
+
+
+def test_eviction_is_bounded_per_write(store, clock):
+    """Тест: запись удаляет не больше EVICTION_BATCH истёкших ключей за раз"""
+    for i in range(EVICTION_BATCH * 3):
+        store.set(f'k{i}', 'v', ttl=1)
+    clock.now += 2
+    store.set('other', 'x')
+    assert len(store._state) == EVICTION_BATCH * 2 + 1
+    assert store.evict_expired(None) == EVICTION_BATCH * 2
+    assert store._state == {'other': 'x'}
+
+
+def test_rollback_restores_value_and_ttl(store, clock):
+    """Тест: ROLLBACK восстанавливает и значение, и срок жизни"""
+    store.set('a', '1', ttl=10)
+    store.begin()
+    store.set('a', '2')
+    store.persist('a')
+    store.set('b', '3', ttl=1)
+    store.rollback()
+    assert store.get('a') == '1'
+    assert store.ttl('a') == 10
+    assert store.ttl('b') == -2
+    clock.now += 10
+    assert store.get('a') == 'NULL'
+
+
+def test_expiry_inside_transaction_is_rolled_back(store, clock):
+    """Тест: удаление истёкшего ключа внутри транзакции попадает в журнал отката"""
+    store.set('a', '1', ttl=5)
+    store.begin()
+    store.begin()
+    store.set('b', '2', ttl=20)
+    store.commit()
+    clock.now += 5
+    assert store.get('a') == 'NULL'
+    store.rollback()
+    assert store._state == {'a': '1'}
+    assert store.get('a') == 'NULL'
+
+
+def test_expiry_is_reported_to_listeners(store, clock):
+    """Тест: удаление истёкшего ключа уведомляет слушателей (журнал, репликация)"""
+    changes = []
+    store.set('a', '1', ttl=1)
+    store.add_listener(changes.append)
+    clock.now += 1
+    assert store.get('a') == 'NULL'
+    assert changes == [[('a', None)]]
+
+
+def test_dispatcher_set_ex_ttl_persist(store, clock):
+    """Тест: команды SET ... EX, TTL и PERSIST"""
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(store, out=out)
+    dispatcher.dispatch('SET', ['a', '1', 'ex', '10'])
+    clock.now += 2.5
+    dispatcher.dispatch('TTL', ['a'])
+    dispatcher.dispatch('PERSIST', ['a'])
+    dispatcher.dispatch('TTL', ['a'])
+    dispatcher.dispatch('TTL', ['x'])
+    lines = out.getvalue().splitlines()
+    assert lines[1:] == ['8', "Срок жизни ключа 'a' снят", '-1', '-2']
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('SET', ['a', '1', 'EX', '0'])
+    with pytest.raises(ValueError):
+        dispatcher.dispatch('SET', ['a', '1', 'PX', '10'])
+
+
+def test_session_ttl_applies_on_commit(store, clock):
+    """Тест: срок жизни, заданный в транзакции сессии, применяется при COMMIT"""
+    session = Session(store)
+    store.set('b', '1', ttl=10)
+    session.begin()
+    session.set('a', '1', ttl=5)
+    session.persist('b')
+    assert session.ttl('a') == 5
+    assert session.ttl('b') == -1
+    assert store.ttl('a') == -2
+    assert store.ttl('b') == 10
+    session.commit()
+    assert store.ttl('a') == 5
+    assert store.ttl('b') == -1
+    clock.now += 5
+    assert store.get('a') == 'NULL'
+    assert session.counts('1') == 1
+
+
+def test_session_commit_persists_only_unwritten_keys(store, clock):
+    """Тест: COMMIT вызывает persist только для ключей, у которых снят срок без записи значения"""
+    for key in 'acd':
+        store.set(key, '1', ttl=10)
+    persisted = []
+    original = store.persist
+
+    def persist(key):
+        persisted.append(key)
+        return original(key)
+    store.persist = persist
+    session = Session(store)
+    session.begin()
+    session.unset('a')
+    session.set('c', '2')
+    session.persist('d')
+    session.commit()
+    assert persisted == ['d']
+    assert (store.ttl('a'), store.ttl('c'), store.ttl('d')) == (-2, -1, -1)
+
+
+def test_session_queries_see_local_expiry(store, clock):
+    """Тест: ключ, которому в транзакции задан только срок, пропадает из COUNTS/FIND после истечения"""
+    store.mset([('a', '1'), ('b', '1')])
+    session = Session(store)
+    session.begin()
+    session.set('a', '1', ttl=5)
+    assert session.counts('1') == 2
+    clock.now += 5
+    assert session.counts('1') == 1
+    assert session.find('1') == ['b']
+    assert session.find_page('1', limit=5) == ['b']
+    assert store.counts('1') == 2
@@ -0,0 +1,163 @@
+import time
+import pytest
+from utils.key_value_store import KeyValueStore
+from utils.session import Session
+from utils.wal import WriteAheadLog
+
+
+@pytest.fixture
+def wal_path(tmp_path):
+    return str(tmp_path / 'store.wal')
+
+
+def reopen(wal_path, clock=time.time, **kwargs):
+    """Открывает журнал заново над пустым хранилищем (имитация перезапуска)"""
+    store = KeyValueStore(clock=clock)
+    wal = WriteAheadLog(wal_path, sync_interval_ms=None, **kwargs)
+    wal.attach(store)
+    return store, wal
+
+
+def test_replay_restores_committed_changes(wal_path):
+    """Тест: после перезапуска восстанавливаются SET/UNSET и COMMIT верхнего уровня"""
+    store, wal = reopen(wal_path)
+    store.set('a', '1')
+    store.set('b', '2')
+    store.unset('b')
+    store.begin()
+    store.set('c', '3')
+    store.begin()
+    store.set('a', '10')
+    store.commit()
+    store.commit()
+    wal.close()
+    restored, wal = reopen(wal_path)
+    assert restored.get('a') == '10'
+    assert restored.get('b') == 'NULL'
+    assert restored.get('c') == '3'
+    assert restored.counts('10') == 1
+    wal.close()
+
+
+def test_uncommitted_transactions_never_reach_disk(wal_path):
+    """Тест: изменения открытых и откатанных транзакций не журналируются"""
+    store, wal = reopen(wal_path)
+    store.set('a', '1')
+    store.begin()
+    store.set('a', '2')
+    store.set('b', '2')
+    wal.sync()
+    with open(wal_path, 'rb') as wal_file:
+        assert b'b' not in wal_file.read()[-20:]
+    store.rollback()
+    store.begin()
+    store.set('c', '3')
+    wal.close()
+    restored, wal = reopen(wal_path)
+    assert restored.get('a') == '1'
+    assert restored.get('b') == 'NULL'
+    assert restored.get('c') == 'NULL'
+    wal.close()
+
+
+def test_group_commit_syncs_every_n_records(wal_path, monkeypatch):
+    """Тест: fsync выполняется группами по sync_every_records записей"""
+    syncs = []
+    monkeypatch.setattr('utils.wal.os.fsync', lambda fd: syncs.append(fd))
+    store, wal = reopen(wal_path, sync_every_records=10)
+    for i in range(25):
+        store.set(f'k{i}', 'v')
+    assert len(syncs) == 2
+    wal.close()
+    assert len(syncs) == 3
+
+
+def test_torn_tail_is_discarded(wal_path):
+    """Тест: недописанный последний кадр отбрасывается при восстановлении"""
+    store, wal = reopen(wal_path)
+    store.set('a', '1')
+    store.set('b', '2')
+    wal.close()
+    with open(wal_path, 'r+b') as wal_file:
+        wal_file.truncate(wal_file.seek(0, 2) - 3)
+    restored, wal = reopen(wal_path)
+    assert restored.get('a') == '1'
+    assert restored.get('b') == 'NULL'
+    restored.set('c', '3')
+    wal.close()
+    restored, wal = reopen(wal_path)
+    assert restored.get('c') == '3'
+    wal.close()
+
+
+def test_compaction_folds_log_into_snapshot(wal_path, tmp_path):
+    """Тест: журнал сворачивается в снимок при превышении порога размера"""
+    snapshot_path = str(tmp_path / 'store.snap')
+    store, wal = reopen(wal_path, snapshot_path=snapshot_path, compact_bytes=200)
+    for i in range(50):
+        store.set(f'key{i}', str(i))
+    store.unset('key0')
+    wal.close()
+    with open(wal_path, 'rb') as wal_file:
+        assert len(wal_file.read()) < 200
+    restored, wal = reopen(wal_path, snapshot_path=snapshot_path, compact_bytes=200)
+    assert restored.get('key0') == 'NULL'
+    assert restored.get('key49') == '49'
+    assert restored.counts('7') == 1
+    wal.close()
+
+
+def test_load_is_logged_as_reset(wal_path):
+    """Тест: полная замена данных без снимка журналируется кадром очистки"""
+    store, wal = reopen(wal_path)
+    store.set('old', '1')
+    store.load_buckets([('v', ['x', 'y'])])
+    wal.close()
+    restored, wal = reopen(wal_path)
+    assert restored.get('old') == 'NULL'
+    assert restored.find('v') == ['x', 'y']
+    wal.close()
+
+
+def test_ttl_survives_restart(wal_path, tmp_path):
+    """Тест: сроки жизни журналируются и снимаются так же, как в работающем хранилище"""
+    now = [100.0]
+    clock = lambda: now[0]
+    store, wal = reopen(wal_path, clock)
+    store.set('a', '1', ttl=10)
+    store.set('b', '2', ttl=10)
+    store.persist('b')
+    store.set('c', '3', ttl=10)
+    store.set('c', '4')
+    store.set('d', '4', ttl=50)
+    store.set('d', '4', ttl=20)
+    store.begin()
+    store.set('e', '5', ttl=5)
+    store.commit()
+    session = Session(store)
+    session.begin()
+    session.set('f', '6', ttl=30)
+    session.commit()
+    store.begin()
+    store.set('g', '7', ttl=5)
+    store.rollback()
+    wal.close()
+    restored, wal = reopen(wal_path, clock)
+    assert [restored.ttl(key) for key in 'abcdefg'] == [10, -1, -1, 20, 5, 30, -2]
+    wal.close()
+    now[0] = 111.0
+    restored, wal = reopen(wal_path, clock)
+    assert restored.get('a') == 'NULL' and restored.ttl('a') == -2
+    assert [restored.get(key) for key in 'bcdef'] == ['2', '4', '4', 'NULL', '6']
+    wal.close()
+
+    snapshot_path = str(tmp_path / 'ttl.snap')
+    store, wal = reopen(str(tmp_path / 'compact.wal'), clock, snapshot_path=snapshot_path, compact_bytes=None)
+    store.set('x', '1', ttl=10)
+    store.begin()
+    store.set('y', '1', ttl=10)
+    wal.compact()
+    wal.close()
+    restored, wal = reopen(str(tmp_path / 'compact.wal'), clock, snapshot_path=snapshot_path)
+    assert restored.ttl('x') == 10 and restored.ttl('y') == -2
+    wal.close()
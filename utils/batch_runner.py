@@ -0,0 +1,42 @@
+from typing import TextIO
+from utils.command_dispatcher import CommandDispatcher
+from utils.logger_config import logger
+
+# Размер порции чтения входного потока (в байтах) в пакетном режиме
+BATCH_READ_HINT = 1 << 20
+
+
+def run_batch(dispatcher: CommandDispatcher, input_stream: TextIO,
+              read_hint: int = BATCH_READ_HINT) -> int:
+    """
+    Выполняет команды из потока без приглашений и справки.
+    Строки читаются крупными порциями, результаты пишутся в dispatcher.out.
+    :param dispatcher: Диспетчер команд (его поток вывода должен быть буферизован)
+    :param input_stream: Входной поток команд
+    :param read_hint: Примерный объём одной порции чтения в байтах
+    :return: Количество выполненных команд
+    """
+    commands = dispatcher.commands
+    executed = 0
+    while True:
+        lines = input_stream.readlines(read_hint)
+        if not lines:
+            logger.debug('Получен EOF. Завершение пакетного выполнения')
+            return executed
+        for line in lines:
+            parts = line.split()
+            if not parts:
+                continue
+            cmd = parts[0].upper()
+            handler = commands.get(cmd)
+            if handler is None:
+                logger.info('НЕВЕРНАЯ КОМАНДА')
+                continue
+            try:
+                handler(parts[1:])
+            except KeyboardInterrupt:
+                logger.debug('Завершение пакетного выполнения по команде END')
+                return executed
+            except ValueError as e:
+                logger.info('НЕВЕРНАЯ КОМАНДА: %s', e)
+            executed += 1
@@ -0,0 +1,216 @@
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Union
+from utils.command_pipeline import CommandPipeline, Reply
+from utils.key_value_store import KeyValueStore
+from utils.mvcc import CommitConflict
+from utils.profiler import SamplingProfiler
+from utils.stats import CommandStats
+
+# Команда для execute: строка ('SET a 1') или последовательность ('SET', 'a', 'значение с пробелами')
+Command = Union[str, bytes, Sequence[str]]
+
+
+class SetResult(NamedTuple):
+    key: str
+    old_value: Optional[str]
+    value: str
+
+
+class GetResult(NamedTuple):
+    value: str
+
+
+class UnsetResult(NamedTuple):
+    key: str
+    old_value: Optional[str]
+
+
+class TtlResult(NamedTuple):
+    # Оставшиеся секунды; -1 — ключ бессрочный, -2 — ключа нет
+    seconds: float
+
+
+class PersistResult(NamedTuple):
+    key: str
+    persisted: bool
+
+
+class MsetResult(NamedTuple):
+    count: int
+    changed: int
+
+
+class MgetResult(NamedTuple):
+    values: List[str]
+
+
+class MunsetResult(NamedTuple):
+    removed: int
+    count: int
+
+
+class CountsResult(NamedTuple):
+    count: int
+
+
+class FindResult(NamedTuple):
+    keys: List[str]
+
+
+class ScanResult(NamedTuple):
+    # Ключи KEYS/SCAN по возрастанию
+    keys: List[str]
+
+
+class TransactionResult(NamedTuple):
+    # BEGIN, ROLLBACK или COMMIT; ok=False — нет открытой транзакции или конфликт COMMIT
+    command: str
+    ok: bool
+    conflict: Optional[CommitConflict] = None
+
+
+class SnapshotResult(NamedTuple):
+    # SAVE или LOAD; при ошибке count=None, error — её текст
+    command: str
+    path: str
+    count: Optional[int]
+    error: Optional[str]
+
+
+class BackgroundSaveResult(NamedTuple):
+    # BGSAVE: запись снимка запущена в фоновом потоке
+    path: str
+
+
+class StatsResult(NamedTuple):
+    # Показатели хранилища; сводки задержек по командам и время работы (если статистика включена)
+    store: Dict[str, int]
+    commands: Dict[str, Dict[str, float]]
+    uptime: Optional[float]
+
+
+class ProfileResult(NamedTuple):
+    running: bool
+    samples: int
+
+
+class HelpResult(NamedTuple):
+    text: str
+
+
+class ErrorResult(NamedTuple):
+    # Неверные аргументы или неизвестная команда (unknown=True)
+    message: str
+    unknown: bool = False
+
+
+class EndResult(NamedTuple):
+    pass
+
+
+Result = Union[SetResult, GetResult, UnsetResult, TtlResult, PersistResult, MsetResult,
+               MgetResult, MunsetResult, CountsResult, FindResult, ScanResult, TransactionResult,
+               SnapshotResult, BackgroundSaveResult, StatsResult, ProfileResult, HelpResult,
+               ErrorResult, EndResult]
+
+
+def _commit_result(data: Any) -> TransactionResult:
+    if isinstance(data, CommitConflict):
+        return TransactionResult('COMMIT', False, data)
+    return TransactionResult('COMMIT', data)
+
+
+# Построение типизированного результата из данных результата конвейера
+_RESULTS: Dict[str, Callable[[Any], Result]] = {
+    'SET': lambda data: SetResult(*data),
+    'GET': GetResult,
+    'UNSET': lambda data: UnsetResult(*data),
+    'TTL': TtlResult,
+    'PERSIST': lambda data: PersistResult(*data),
+    'MSET': lambda data: MsetResult(*data),
+    'MGET': MgetResult,
+    'MUNSET': lambda data: MunsetResult(*data),
+    'COUNTS': CountsResult,
+    'FIND': lambda chunks: FindResult([key for chunk in chunks for key in chunk]),
+    'KEYS': lambda chunks: ScanResult([key for chunk in chunks for key in chunk]),
+    'SCAN': lambda chunks: ScanResult([key for chunk in chunks for key in chunk]),
+    'BEGIN': lambda data: TransactionResult('BEGIN', True),
+    'ROLLBACK': lambda data: TransactionResult('ROLLBACK', data),
+    'COMMIT': _commit_result,
+    'SAVE': lambda data: SnapshotResult('SAVE', *data),
+    'LOAD': lambda data: SnapshotResult('LOAD', *data),
+    'BGSAVE': BackgroundSaveResult,
+    'STATS': lambda data: StatsResult(data['store'], data['commands'], data.get('uptime_s')),
+    'PROFILE': lambda data: ProfileResult(*data),
+    'HELP': HelpResult,
+    'END': lambda data: EndResult(),
+}
+
+
+class KeyValueClient:
+    """
+    API для встраивания: команды выполняются через CommandPipeline, результаты
+    возвращаются типизированными объектами вместо печати. Ничего не пишет в stdout,
+    поэтому несколько клиентов (например, над своими Session) работают независимо.
+    """
+
+    def __init__(self, store: Optional[KeyValueStore] = None,
+                 snapshot_path: Optional[str] = None,
+                 stats: Optional[CommandStats] = None,
+                 profiler: Optional[SamplingProfiler] = None) -> None:
+        """
+        Инициализация клиента.
+        :param store: Хранилище (KeyValueStore, Session или совместимое); по умолчанию новое
+        :param snapshot_path: Путь к снимку по умолчанию для SAVE/LOAD
+        :param stats: Статистика команд (None — выключена)
+        :param profiler: Профилировщик для команды PROFILE
+        """
+        self.store = store if store is not None else KeyValueStore()
+        self._pipeline = CommandPipeline(self.store, snapshot_path, stream_keys=False, stats=stats,
+                                         profiler=profiler)
+
+    def execute(self, command: Command) -> Optional[Result]:
+        """
+        Выполняет одну команду.
+        :param command: Строка команды или последовательность (имя, аргументы...)
+        :return: Типизированный результат или None для пустой команды
+        """
+        if isinstance(command, bytes):
+            reply = self._pipeline.execute(command)
+        elif isinstance(command, str):
+            reply = self._pipeline.execute_text(command)
+        elif command:
+            reply = self._pipeline.execute_command(command[0], list(command[1:]))
+        else:
+            return None
+        return None if reply is None else _to_result(reply)
+
+    def execute_many(self, commands: Iterable[Command]) -> List[Result]:
+        """
+        Выполняет команды по порядку; пустые пропускаются, выполнение останавливается после END.
+        Ошибка одной команды не прерывает остальные: её результат — ErrorResult.
+        :param commands: Команды
+        :return: Результаты в порядке команд
+        """
+        results: List[Result] = []
+        for command in commands:
+            result = self.execute(command)
+            if result is None:
+                continue
+            results.append(result)
+            if type(result) is EndResult:
+                break
+        return results
+
+
+def _to_result(reply: Reply) -> Result:
+    """
+    Переводит результат конвейера (код, данные) в типизированный объект.
+    :param reply: Результат CommandPipeline
+    :return: Типизированный результат
+    """
+    code, data = reply
+    if code == 'ERROR':
+        return ErrorResult(data)
+    if code == 'UNKNOWN':
+        return ErrorResult(f'НЕВЕРНАЯ КОМАНДА: {data}', unknown=True)
+    return _RESULTS[code](data)
@@ -1,140 +1,129 @@
-from typing import Callable, Dict, List, Optional
+import sys
+from typing import Callable, Dict, List, Optional, TextIO
+from utils.command_pipeline import LINE_RENDERERS, CommandPipeline, CommandSpec, render_line, write_reply
 from utils.logger_config import logger
+from utils.profiler import SamplingProfiler
+from utils.stats import CommandStats
 from utils.read_command import show_help
 from utils.key_value_store import KeyValueStore
 
 
+def _write_stdout(text: str) -> None:
+    """
+    Пишет фрагмент вывода в текущий sys.stdout без перевода строки.
+    :param text: Фрагмент
+    """
+    sys.stdout.write(text)
+
+
 class CommandDispatcher:
     """
-    Класс для обработки команд key-value хранилища и транзакций.
+    Текстовый фронтенд CLI: выполняет команды через CommandPipeline и печатает
+    отформатированные результаты. Неверные аргументы сообщаются исключением ValueError,
+    команда END — KeyboardInterrupt (так их обрабатывают интерактивный и пакетный режимы).
     """
 
-    def __init__(self, store: KeyValueStore) -> None:
+    def __init__(self, store: KeyValueStore, out: Optional[TextIO] = None,
+                 snapshot_path: Optional[str] = None,
+                 stats: Optional[CommandStats] = None,
+                 profiler: Optional[SamplingProfiler] = None) -> None:
         """
         Инициализация диспетчера команд.
         :param store: Экземпляр KeyValueStore
+        :param out: Поток для вывода результатов (по умолчанию sys.stdout)
+        :param snapshot_path: Путь к снимку по умолчанию для SAVE/LOAD
+        :param stats: Статистика команд (None — выключена)
+        :param profiler: Профилировщик для команды PROFILE
         """
         self.store = store
+        self.out = out
+        self.pipeline = CommandPipeline(store, snapshot_path, profiler=profiler)
+        self._write: Callable[[str], object] = out.write if out is not None else _write_stdout
         self.commands: Dict[str, Callable[[List[str]], Optional[bool]]] = {
-            'SET': self.cmd_set,
-            'GET': self.cmd_get,
-            'UNSET': self.cmd_unset,
-            'COUNTS': self.cmd_counts,
-            'FIND': self.cmd_find,
-            'BEGIN': self.cmd_begin,
-            'ROLLBACK': self.cmd_rollback,
-            'COMMIT': self.cmd_commit,
-            'END': self.cmd_end,
-            'HELP': self.cmd_help,
-        }
+            name: self._command(name, self.pipeline.spec(name)) for name in self.pipeline.names}
+        self._plain_commands = self.commands
+        if stats is not None:
+            self.enable_stats(stats)
 
-    def cmd_set(self, args: List[str]) -> None:
+    def enable_stats(self, stats: CommandStats) -> None:
         """
-        Сохраняет значение по ключу и печатает, что изменилось.
-        :param args: [ключ, значение]
+        Включает статистику: обработчики self.commands заменяются обёртками, измеряющими
+        полное время команды (проверка аргументов, хранилище, вывод). Выключенная статистика
+        ничего не стоит. Циклы, уже взявшие таблицу commands, работают со старой таблицей.
+        :param stats: Статистика команд
         """
-        if len(args) != 2:
-            raise ValueError('Команда SET требует 2 аргумента')
-        key, value = args[0], args[1]
-        old_value = self.store.get(key)
-        self.store.set(key, value)
-        print(f"Ключ '{key}' изменён: было '{old_value}', стало '{value}'")
+        self.pipeline.stats = stats
+        self.commands = {name: stats.instrument(name, handler)
+                         for name, handler in self._plain_commands.items()}
 
-    def cmd_get(self, args: List[str]) -> None:
+    def disable_stats(self) -> None:
         """
-        Получает значение по ключу.
-        :param args: [ключ]
+        Возвращает исходные обработчики команд.
         """
-        if len(args) != 1:
-            raise ValueError('Команда GET требует 1 аргумент')
-        print(self.store.get(args[0]))
+        self.pipeline.stats = None
+        self.commands = self._plain_commands
 
-    def cmd_unset(self, args: List[str]) -> None:
-        """
-        Удаляет ключ и печатает, что изменилось.
-        :param args: [ключ]
-        """
-        if len(args) != 1:
-            raise ValueError('Команда UNSET требует 1 аргумент')
-        key = args[0]
-        old_value = self.store.get(key)
-        self.store.unset(key)
-        if old_value == 'NULL':
-            print(f"Ключ '{key}' не существовал")
-        else:
-            print(f"Ключ '{key}' удалён: было '{old_value}'")
-
-    def cmd_counts(self, args: List[str]) -> None:
+    @property
+    def snapshot_path(self) -> Optional[str]:
         """
-        Возвращает количество ключей с данным значением.
-        :param args: [значение]
+        Путь к снимку по умолчанию для SAVE/LOAD.
         """
-        if len(args) != 1:
-            raise ValueError('Команда COUNTS требует 1 аргумент')
-        print(self.store.counts(args[0]))
+        return self.pipeline.snapshot_path
 
-    def cmd_find(self, args: List[str]) -> None:
-        """
-        Находит все ключи по значению.
-        :param args: [значение]
-        """
-        if len(args) != 1:
-            raise ValueError('Команда FIND требует 1 аргумент')
-        keys = self.store.find(args[0])
-        print(' '.join(keys) if keys else 'NULL')
+    def _command(self, name: str, spec: CommandSpec) -> Callable[[List[str]], None]:
+        """
+        Строит обработчик команды: обработчик конвейера + форматирование результата.
+        :param name: Имя команды
+        :param spec: Запись таблицы конвейера
+        :return: Функция от списка аргументов
+        """
+        handler, min_args, max_args, arity_error = spec
+        renderer = LINE_RENDERERS.get(name)
+        write = self._write
+        if name == 'HELP' and self.out is None:
+            return self._help_to_console
+        if renderer is render_line:
+            # Самые частые команды (GET, COUNTS): форматирование без отдельного вызова
+            def run_line(args: List[str]) -> None:
+                if not min_args <= len(args) <= max_args:
+                    raise ValueError(arity_error)
+                code, data = handler(args)
+                if code != name:
+                    raise ValueError(data)
+                write(f'{data}\n')
+            return run_line
 
-    def cmd_begin(self, args: List[str]) -> None:
-        """
-        Начинает транзакцию.
-        :param args: []
-        """
-        if len(args) != 0:
-            raise ValueError('Команда BEGIN не принимает аргументов')
-        self.store.begin()
-        print('Транзакция начата')
-
-    def cmd_rollback(self, args: List[str]) -> None:
-        """
-        Откатывает текущую транзакцию.
-        :param args: []
-        """
-        if len(args) != 0:
-            raise ValueError('Команда ROLLBACK не принимает аргументов')
-        if self.store.rollback():
-            print('Откат транзакции выполнен')
-        else:
-            print('Не запущено ни одной транзакции!')
+        def run(args: List[str]) -> None:
+            if not min_args <= len(args) <= max_args:
+                raise ValueError(arity_error)
+            reply = handler(args)
+            code, data = reply
+            if code == name and renderer is not None:
+                write(renderer(data))
+            elif not write_reply(write, reply):
+                self._fail(reply)
+        return run
 
-    def cmd_commit(self, args: List[str]) -> None:
+    @staticmethod
+    def _help_to_console(args: List[str]) -> None:
         """
-        Применяет изменения текущей транзакции.
+        HELP без потока вывода: справка уходит в канал консоли, как в интерактивном режиме.
         :param args: []
         """
         if len(args) != 0:
-            raise ValueError('Команда COMMIT не принимает аргументов')
-        if self.store.commit():
-            print('Транзакция применена')
-        else:
-            print('Не запущено ни одной транзакции!')
+            raise ValueError('Команда HELP не принимает аргументов')
+        show_help()
 
-    def cmd_end(self, args: List[str]) -> None:
+    def _fail(self, reply) -> None:
         """
-        Завершает выполнение программы.
-        :param args: []
+        Переводит результат без текста в исключение, как его ждут фронтенды CLI.
+        :param reply: Результат ERROR или END
         """
-        if len(args) != 0:
-            raise ValueError('Команда END не принимает аргументов')
+        cmd, data = reply
+        if cmd == 'ERROR':
+            raise ValueError(data)
         raise KeyboardInterrupt('Завершение работы приложения по команде END')
 
-    def cmd_help(self, args: List[str]) -> None:
-        """
-        Показывает справку по командам.
-        :param args: []
-        """
-        if len(args) != 0:
-            raise ValueError('Команда HELP не принимает аргументов')
-        show_help()
-
     def dispatch(self, cmd: str, args: List[str]) -> Optional[bool]:
         """
         Выполняет команду по её имени.
@@ -0,0 +1,521 @@
+import math
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.key_value_store import KeyValueStore
+from utils.mvcc import CommitConflict
+from utils.profiler import SamplingProfiler
+from utils.read_command import COMMANDS_HELP
+from utils.snapshot import BackgroundSave, load_snapshot, save_snapshot
+from utils.stats import CommandStats, collect_stats, render_stats
+
+# Размер порции ключей при потоковом выводе FIND/KEYS/SCAN
+FIND_CHUNK_SIZE = 1000
+
+# Неограниченное число аргументов в таблице арности
+UNLIMITED = 1 << 30
+
+# Результат команды: (код, данные). Код — имя команды для успешного выполнения,
+# ERROR (данные — текст ошибки), UNKNOWN (данные — имя неизвестной команды) или END.
+Reply = Tuple[str, Any]
+
+Handler = Callable[[List[str]], Reply]
+
+# Запись таблицы команд: (обработчик, min и max число аргументов, текст ошибки арности)
+CommandSpec = Tuple[Handler, int, int, str]
+
+END_REPLY: Reply = ('END', None)
+
+# Команды, меняющие данные: на реплике только для чтения они отклоняются
+WRITE_COMMANDS = ('SET', 'UNSET', 'PERSIST', 'MSET', 'MUNSET', 'LOAD')
+
+
+class CommandPipeline:
+    """
+    Быстрый путь разбора и выполнения команд: байтовая строка -> результат-значение.
+    Ничего не печатает: форматирование вынесено в render_reply/write_reply, поэтому
+    встраивающий код, сервер и пакетный режим могут не трогать stdout вовсе.
+
+    Строка декодируется и разбивается один раз; таблица обработчиков строится один раз
+    и индексируется именем команды (в верхнем регистре; другой регистр — одним
+    дополнительным поиском). Арность
+    проверяется сравнением с границами из таблицы, неверная команда возвращает
+    результат ERROR без выброса исключения. Исключения остаются только на редких путях
+    (ошибки снимков и хранилища, конфликт COMMIT).
+    """
+
+    def __init__(self, store: KeyValueStore, snapshot_path: Optional[str] = None,
+                 stream_keys: bool = True, stats: Optional[CommandStats] = None,
+                 profiler: Optional[SamplingProfiler] = None, read_only: bool = False) -> None:
+        """
+        Инициализация таблицы обработчиков.
+        :param store: Хранилище (KeyValueStore, Session или совместимое)
+        :param snapshot_path: Путь к снимку по умолчанию для SAVE/LOAD
+        :param stream_keys: FIND/KEYS/SCAN без LIMIT возвращают ленивый итератор порций;
+            False — сразу весь список ключей одной порцией
+        :param stats: Статистика команд (None — выключена)
+        :param profiler: Профилировщик для команды PROFILE (None — команда недоступна)
+        :param read_only: Отклонять команды записи (реплика)
+        """
+        self.store = store
+        self.profiler = profiler
+        self.snapshot_path = snapshot_path
+        self.stream_keys = stream_keys
+        self.background_save: Optional[BackgroundSave] = None
+        specs: Dict[str, CommandSpec] = {
+            'SET': (self._set, 2, 4, 'Команда SET требует 2 аргумента и необязательный EX <секунды>'),
+            'GET': (self._get, 1, 1, 'Команда GET требует 1 аргумент'),
+            'UNSET': (self._unset, 1, 1, 'Команда UNSET требует 1 аргумент'),
+            'TTL': (self._ttl, 1, 1, 'Команда TTL требует 1 аргумент'),
+            'PERSIST': (self._persist, 1, 1, 'Команда PERSIST требует 1 аргумент'),
+            'MSET': (self._mset, 2, UNLIMITED, 'Команда MSET требует пары ключ значение'),
+            'MGET': (self._mget, 1, UNLIMITED, 'Команда MGET требует хотя бы 1 аргумент'),
+            'MUNSET': (self._munset, 1, UNLIMITED, 'Команда MUNSET требует хотя бы 1 аргумент'),
+            'COUNTS': (self._counts, 1, 3, 'Команда COUNTS требует значение или RANGE <от> <до>'),
+            'FIND': (self._find, 1, 5,
+                     'Команда FIND требует значение и необязательные LIMIT <n>, AFTER <ключ>'),
+            'KEYS': (self._keys, 0, 1, 'Команда KEYS принимает не более 1 аргумента (префикс)'),
+            'SCAN': (self._scan, 0, 10,
+                     'Команда SCAN принимает параметры PREFIX, FROM, TO, LIMIT и AFTER со значениями'),
+            'BEGIN': (self._begin, 0, 0, 'Команда BEGIN не принимает аргументов'),
+            'ROLLBACK': (self._rollback, 0, 0, 'Команда ROLLBACK не принимает аргументов'),
+            'COMMIT': (self._commit, 0, 0, 'Команда COMMIT не принимает аргументов'),
+            'SAVE': (self._save, 0, 1, 'Команда SAVE принимает не более 1 аргумента'),
+            'LOAD': (self._load, 0, 1, 'Команда LOAD принимает не более 1 аргумента'),
+            'BGSAVE': (self._bgsave, 0, 1, 'Команда BGSAVE принимает не более 1 аргумента'),
+            'END': (self._end, 0, 0, 'Команда END не принимает аргументов'),
+            'HELP': (self._help, 0, 0, 'Команда HELP не принимает аргументов'),
+            'STATS': (self._stats, 0, 0, 'Команда STATS не принимает аргументов'),
+            'PROFILE': (self._profile, 0, 1, 'Команда PROFILE принимает ON или OFF'),
+        }
+        if read_only:
+            for name in WRITE_COMMANDS:
+                _, min_args, max_args, arity_error = specs[name]
+                specs[name] = (self._read_only, min_args, max_args, arity_error)
+        self._table = specs
+        self._plain_table = specs
+        self.stats: Optional[CommandStats] = None
+        if stats is not None:
+            self.enable_stats(stats)
+
+    def enable_stats(self, stats: CommandStats) -> None:
+        """
+        Включает статистику: обработчики таблицы заменяются обёртками с замером времени.
+        Выключенная статистика ничего не стоит — в таблице исходные обработчики.
+        :param stats: Статистика команд
+        """
+        self.stats = stats
+        self._table = {name: (stats.instrument(name, handler), min_args, max_args, arity_error)
+                       for name, (handler, min_args, max_args, arity_error) in self._plain_table.items()}
+
+    def disable_stats(self) -> None:
+        """
+        Возвращает исходные обработчики; STATS показывает только показатели хранилища.
+        """
+        self.stats = None
+        self._table = self._plain_table
+
+    def execute(self, line: bytes) -> Optional[Reply]:
+        """
+        Разбирает и выполняет одну строку команды.
+        :param line: Строка (байты, UTF-8); перевод строки допускается
+        :return: Результат или None для пустой строки
+        """
+        try:
+            text = line.decode('utf-8')
+        except UnicodeDecodeError:
+            return 'ERROR', 'Команда должна быть в кодировке UTF-8'
+        return self.execute_text(text)
+
+    def execute_text(self, line: str) -> Optional[Reply]:
+        """
+        То же для уже декодированной строки (текстовые потоки декодируют ввод порциями).
+        :param line: Строка команды
+        :return: Результат или None для пустой строки
+        """
+        parts = line.split()
+        if not parts:
+            return None
+        spec = self._table.get(parts[0])
+        if spec is None:
+            spec = self._table.get(parts[0].upper())
+            if spec is None:
+                return 'UNKNOWN', parts[0]
+        handler, min_args, max_args, arity_error = spec
+        args = parts[1:]
+        if not min_args <= len(args) <= max_args:
+            return 'ERROR', arity_error
+        return handler(args)
+
+    def execute_command(self, name: str, args: List[str]) -> Reply:
+        """
+        Выполняет уже разобранную команду (аргументы могут содержать пробелы).
+        :param name: Имя команды (регистр не важен)
+        :param args: Аргументы
+        :return: Результат
+        """
+        spec = self._table.get(name) or self._table.get(name.upper())
+        if spec is None:
+            return 'UNKNOWN', name
+        handler, min_args, max_args, arity_error = spec
+        if not min_args <= len(args) <= max_args:
+            return 'ERROR', arity_error
+        return handler(args)
+
+    def spec(self, name: str) -> Optional[CommandSpec]:
+        """
+        Запись таблицы команд (для фронтендов, строящих свои обёртки обработчиков).
+        :param name: Имя команды в верхнем регистре
+        :return: (обработчик, min и max число аргументов, текст ошибки) или None
+        """
+        return self._table.get(name)
+
+    @property
+    def names(self) -> List[str]:
+        """
+        Имена поддерживаемых команд.
+        """
+        return list(self._table)
+
+    def execute_lines(self, lines: Iterable[bytes]) -> Iterator[Reply]:
+        """
+        Выполняет строки по порядку, пропуская пустые; останавливается после END.
+        :param lines: Строки команд (байты)
+        """
+        execute = self.execute
+        for line in lines:
+            reply = execute(line)
+            if reply is None:
+                continue
+            yield reply
+            if reply is END_REPLY:
+                return
+
+    def _set(self, args: List[str]) -> Reply:
+        if len(args) == 4 and args[2].upper() == 'EX':
+            ttl: Optional[int] = _positive_int(args[3])
+            if ttl is None:
+                return 'ERROR', 'EX должен быть положительным целым числом'
+        elif len(args) == 2:
+            ttl = None
+        else:
+            return 'ERROR', 'Команда SET требует 2 аргумента и необязательный EX <секунды>'
+        key, value = args[0], args[1]
+        return 'SET', (key, self.store.set(key, value, ttl), value)
+
+    def _get(self, args: List[str]) -> Reply:
+        return 'GET', self.store.get(args[0])
+
+    def _unset(self, args: List[str]) -> Reply:
+        return 'UNSET', (args[0], self.store.unset(args[0]))
+
+    def _ttl(self, args: List[str]) -> Reply:
+        return 'TTL', self.store.ttl(args[0])
+
+    def _persist(self, args: List[str]) -> Reply:
+        return 'PERSIST', (args[0], self.store.persist(args[0]))
+
+    def _mset(self, args: List[str]) -> Reply:
+        if len(args) % 2:
+            return 'ERROR', 'Команда MSET требует пары ключ значение'
+        values = args[1::2]
+        old_values = self.store.mset(list(zip(args[::2], values)))
+        changed = sum(1 for old_value, value in zip(old_values, values) if old_value != value)
+        return 'MSET', (len(old_values), changed)
+
+    def _mget(self, args: List[str]) -> Reply:
+        return 'MGET', self.store.mget(args)
+
+    def _munset(self, args: List[str]) -> Reply:
+        old_values = self.store.munset(args)
+        return 'MUNSET', (sum(1 for old_value in old_values if old_value is not None),
+                          len(old_values))
+
+    def _counts(self, args: List[str]) -> Reply:
+        if len(args) == 1:
+            return 'COUNTS', self.store.counts(args[0])
+        if len(args) != 3 or args[0].upper() != 'RANGE':
+            return 'ERROR', 'Команда COUNTS требует значение или RANGE <от> <до>'
+        bounds = _range_bounds(args[1], args[2])
+        if bounds is None:
+            return 'ERROR', 'Границы RANGE должны быть числами'
+        return 'COUNTS', self.store.counts_range(*bounds)
+
+    def _find(self, args: List[str]) -> Reply:
+        """
+        Данные FIND — порции ключей: с LIMIT одна порция (страница), без LIMIT —
+        ленивый итератор iter_find, чтобы фронтенд мог выводить огромный результат
+        потоково; его нужно прочитать до выполнения следующей команды.
+        FIND RANGE <от> <до> [LIMIT <n>] — ключи с числовым значением в диапазоне.
+        """
+        if len(args) >= 3 and args[0].upper() == 'RANGE' and args[1].upper() not in ('LIMIT', 'AFTER'):
+            return self._find_range(args)
+        if len(args) % 2 == 0:
+            return 'ERROR', 'Команда FIND требует значение и необязательные LIMIT <n>, AFTER <ключ>'
+        options = {name.upper(): option for name, option in zip(args[1::2], args[2::2])}
+        if not options.keys() <= {'LIMIT', 'AFTER'}:
+            return 'ERROR', 'Команда FIND поддерживает только параметры LIMIT и AFTER'
+        after = options.get('AFTER')
+        limit = options.get('LIMIT')
+        if limit is None:
+            return 'FIND', self._chunks(self.store.iter_find(args[0], FIND_CHUNK_SIZE, after))
+        count = _positive_int(limit)
+        if count is None:
+            return 'ERROR', 'LIMIT должен быть положительным целым числом'
+        return 'FIND', [self.store.find_page(args[0], count, after)]
+
+    def _find_range(self, args: List[str]) -> Reply:
+        """
+        FIND RANGE <от> <до> [LIMIT <n>]: ключи по возрастанию значения, затем ключа.
+        """
+        if len(args) == 4 or (len(args) == 5 and args[3].upper() != 'LIMIT'):
+            return 'ERROR', 'Команда FIND RANGE требует границы и необязательный LIMIT <n>'
+        bounds = _range_bounds(args[1], args[2])
+        if bounds is None:
+            return 'ERROR', 'Границы RANGE должны быть числами'
+        if len(args) == 3:
+            return 'FIND', self._chunks(self.store.iter_find_range(*bounds, FIND_CHUNK_SIZE))
+        count = _positive_int(args[4])
+        if count is None:
+            return 'ERROR', 'LIMIT должен быть положительным целым числом'
+        return 'FIND', [[key_name for _, key_name in self.store.find_range_page(*bounds, count)]]
+
+    def _keys(self, args: List[str]) -> Reply:
+        prefix = args[0] if args else None
+        return 'KEYS', self._chunks(self.store.iter_scan(prefix, None, None, FIND_CHUNK_SIZE))
+
+    def _scan(self, args: List[str]) -> Reply:
+        """
+        SCAN [PREFIX <p>] [FROM <ключ>] [TO <ключ>] [LIMIT <n>] [AFTER <ключ>]:
+        ключи с префиксом из диапазона FROM <= ключ < TO; данные — как у FIND.
+        """
+        if len(args) % 2:
+            return 'ERROR', 'Команда SCAN принимает параметры PREFIX, FROM, TO, LIMIT и AFTER со значениями'
+        options = {name.upper(): option for name, option in zip(args[::2], args[1::2])}
+        if not options.keys() <= {'PREFIX', 'FROM', 'TO', 'LIMIT', 'AFTER'}:
+            return 'ERROR', 'Команда SCAN поддерживает только параметры PREFIX, FROM, TO, LIMIT и AFTER'
+        bounds = options.get('PREFIX'), options.get('FROM'), options.get('TO')
+        after = options.get('AFTER')
+        limit = options.get('LIMIT')
+        if limit is None:
+            return 'SCAN', self._chunks(self.store.iter_scan(*bounds, FIND_CHUNK_SIZE, after))
+        count = _positive_int(limit)
+        if count is None:
+            return 'ERROR', 'LIMIT должен быть положительным целым числом'
+        return 'SCAN', [self.store.scan_page(*bounds, count, after)]
+
+    def _chunks(self, chunks: Iterator[List[str]]) -> Iterable[List[str]]:
+        """
+        Порции ключей результата: ленивые или, если потоковый вывод выключен, одной порцией.
+        """
+        if self.stream_keys:
+            return chunks
+        return [[key for chunk in chunks for key in chunk]]
+
+    def _begin(self, args: List[str]) -> Reply:
+        return 'BEGIN', self.store.begin()
+
+    def _rollback(self, args: List[str]) -> Reply:
+        return 'ROLLBACK', self.store.rollback()
+
+    def _commit(self, args: List[str]) -> Reply:
+        try:
+            return 'COMMIT', self.store.commit()
+        except CommitConflict as e:
+            return 'COMMIT', e
+
+    def _save(self, args: List[str]) -> Reply:
+        return self._snapshot('SAVE', args, save_snapshot)
+
+    def _load(self, args: List[str]) -> Reply:
+        return self._snapshot('LOAD', args, load_snapshot)
+
+    def _snapshot(self, cmd: str, args: List[str], operation: Callable[[Any, str], int]) -> Reply:
+        """
+        Выполняет SAVE/LOAD.
+        :return: (cmd, (путь, количество ключей или None, текст ошибки или None))
+        """
+        path = args[0] if args else self.snapshot_path
+        if path is None:
+            return 'ERROR', f'Команда {cmd} требует путь к снимку'
+        try:
+            return cmd, (path, operation(self.store, path), None)
+        except (OSError, ValueError) as e:
+            return cmd, (path, None, str(e))
+
+    def _bgsave(self, args: List[str]) -> Reply:
+        """
+        BGSAVE [path]: замораживает хранилище и сохраняет снимок в фоновом потоке.
+        Данные — путь к снимку; итог записи — в background_save и в журнале.
+        """
+        path = args[0] if args else self.snapshot_path
+        if path is None:
+            return 'ERROR', 'Команда BGSAVE требует путь к снимку'
+        try:
+            self.background_save = BackgroundSave(self.store, path)
+        except ValueError as e:
+            return 'ERROR', str(e)
+        return 'BGSAVE', path
+
+    @staticmethod
+    def _read_only(args: List[str]) -> Reply:
+        return 'ERROR', 'Реплика только для чтения: команды записи выполняются на основном сервере'
+
+    def _end(self, args: List[str]) -> Reply:
+        return END_REPLY
+
+    def _help(self, args: List[str]) -> Reply:
+        return 'HELP', COMMANDS_HELP
+
+    def _stats(self, args: List[str]) -> Reply:
+        return 'STATS', collect_stats(self.store, self.stats)
+
+    def _profile(self, args: List[str]) -> Reply:
+        """
+        PROFILE [ON|OFF]: запускает или приостанавливает сэмплирование; без аргумента — состояние.
+        Данные — (идёт ли сэмплирование, число собранных сэмплов).
+        """
+        if self.profiler is None:
+            return 'ERROR', 'Профилирование недоступно'
+        if args:
+            mode = args[0].upper()
+            if mode == 'ON':
+                self.profiler.start()
+            elif mode == 'OFF':
+                self.profiler.stop()
+            else:
+                return 'ERROR', 'Команда PROFILE принимает ON или OFF'
+        return 'PROFILE', (self.profiler.running, self.profiler.samples)
+
+
+def _positive_int(text: str) -> Optional[int]:
+    """
+    Положительное целое из десятичных цифр ASCII или None. str.isdigit() пропускает
+    символы вроде '²', на которых int() бросает ValueError.
+    :param text: Аргумент команды
+    """
+    if not (text.isascii() and text.isdecimal()):
+        return None
+    number = int(text)
+    return number if number > 0 else None
+
+
+def _range_bounds(lo: str, hi: str) -> Optional[Tuple[float, float]]:
+    """
+    Границы RANGE как числа (допускаются -inf и inf) или None, если это не числа.
+    :param lo: Нижняя граница
+    :param hi: Верхняя граница
+    """
+    try:
+        bounds = float(lo), float(hi)
+    except ValueError:
+        return None
+    return None if math.isnan(bounds[0]) or math.isnan(bounds[1]) else bounds
+
+
+def _render_set(data: Tuple[str, Optional[str], str]) -> str:
+    key, old_value, value = data
+    return f"Ключ '{key}' изменён: было '{'NULL' if old_value is None else old_value}', стало '{value}'\n"
+
+
+def _render_unset(data: Tuple[str, Optional[str]]) -> str:
+    key, old_value = data
+    if old_value is None:
+        return f"Ключ '{key}' не существовал\n"
+    return f"Ключ '{key}' удалён: было '{old_value}'\n"
+
+
+def _render_persist(data: Tuple[str, bool]) -> str:
+    key, persisted = data
+    if persisted:
+        return f"Срок жизни ключа '{key}' снят\n"
+    return f"Ключ '{key}' не существует или бессрочный\n"
+
+
+def _render_commit(data: Any) -> str:
+    if isinstance(data, CommitConflict):
+        return f'Транзакция отменена: {data}\n'
+    return 'Транзакция применена\n' if data else 'Не запущено ни одной транзакции!\n'
+
+
+def _render_snapshot(action: str, failure: str) -> Callable[[Tuple[str, Optional[int], Optional[str]]], str]:
+    def render(data: Tuple[str, Optional[int], Optional[str]]) -> str:
+        path, count, error = data
+        if error is not None:
+            return f'{failure}: {error}\n'
+        return f"Снимок '{path}' {action}, ключей: {count}\n"
+    return render
+
+
+def _render_chunks(chunks: Iterable[List[str]]) -> str:
+    return (' '.join(key for chunk in chunks for key in chunk) or 'NULL') + '\n'
+
+
+def render_line(text: object) -> str:
+    """
+    Результат, который печатается как есть (GET, COUNTS, HELP), — строка с переводом строки.
+    """
+    return f'{text}\n'
+
+
+# Форматирование успешных результатов в строки вывода CLI (с переводом строки:
+# так write_reply пишет строку одной операцией без лишней конкатенации)
+RENDERERS: Dict[str, Callable[[Any], str]] = {
+    'SET': _render_set,
+    'GET': render_line,
+    'UNSET': _render_unset,
+    'TTL': lambda remaining: render_line(remaining if remaining < 0 else math.ceil(remaining)),
+    'PERSIST': _render_persist,
+    'MSET': lambda data: f'Установлено ключей: {data[0]}, изменено: {data[1]}\n',
+    'MGET': lambda values: render_line(' '.join(values)),
+    'MUNSET': lambda data: f'Удалено ключей: {data[0]} из {data[1]}\n',
+    'COUNTS': render_line,
+    'FIND': _render_chunks,
+    'KEYS': _render_chunks,
+    'SCAN': _render_chunks,
+    'BEGIN': lambda _: 'Транзакция начата\n',
+    'ROLLBACK': lambda data: 'Откат транзакции выполнен\n' if data else 'Не запущено ни одной транзакции!\n',
+    'COMMIT': _render_commit,
+    'SAVE': _render_snapshot('сохранён', 'Ошибка сохранения снимка'),
+    'LOAD': _render_snapshot('загружен', 'Ошибка загрузки снимка'),
+    'BGSAVE': lambda path: f"Фоновое сохранение снимка '{path}' запущено\n",
+    'HELP': render_line,
+    'STATS': render_stats,
+    'PROFILE': lambda data: f"Профилирование {'включено' if data[0] else 'выключено'}, сэмплов: {data[1]}\n",
+}
+
+
+# Форматирование в одну строку без потоковой записи (все, кроме FIND)
+LINE_RENDERERS: Dict[str, Callable[[Any], str]] = {
+    cmd: renderer for cmd, renderer in RENDERERS.items() if renderer is not _render_chunks}
+
+
+def render_reply(reply: Reply) -> Optional[str]:
+    """
+    Текст успешного результата, как его печатает CLI (без перевода строки).
+    :param reply: Результат CommandPipeline
+    :return: Текст или None для ERROR/UNKNOWN/END (их оформляет фронтенд)
+    """
+    renderer = RENDERERS.get(reply[0])
+    return renderer(reply[1])[:-1] if renderer is not None else None
+
+
+def write_reply(write: Callable[[str], Any], reply: Reply) -> bool:
+    """
+    Пишет строку успешного результата; FIND без LIMIT — потоково, порциями.
+    :param write: Функция записи текста
+    :param reply: Результат CommandPipeline
+    :return: False, если результат не имеет текста (ERROR/UNKNOWN/END)
+    """
+    cmd, data = reply
+    renderer = RENDERERS.get(cmd)
+    if renderer is None:
+        return False
+    if renderer is not _render_chunks:
+        write(renderer(data))
+        return True
+    separator = ''
+    for chunk in data:
+        if chunk:
+            write(separator + ' '.join(chunk))
+            separator = ' '
+    write('\n' if separator else 'NULL\n')
+    return True
@@ -0,0 +1,567 @@
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from utils.frozen_state import FrozenGroup
+from utils.key_value_store import KeyValueStore
+from utils.numeric_index import NumericEntry
+from utils.session import Session
+from utils.stats import merge_store_stats
+
+# Количество полос блокировок по умолчанию
+DEFAULT_STRIPES = 16
+
+# После стольких накопленных обращений полосы чтение пробует передать их политике вытеснения
+TOUCH_BATCH = 256
+
+
+class StripedStore:
+    """
+    Зафиксированное состояние, разбитое по хешу ключа на полосы: у каждой полосы
+    своё KeyValueStore (со своим индексом значений) и своя блокировка. Запись
+    блокирует только полосу ключа, пакетная запись — затронутые полосы по
+    возрастанию номера (без взаимоблокировок).
+
+    Чтение ключа не берёт блокировок: чтение из словаря полосы атомарно под GIL,
+    а запись заменяет значение одним присваиванием, поэтому читатель видит старое
+    или новое значение целиком. Ключи с TTL читаются под блокировкой, так как
+    чтение может их удалить. COUNTS/FIND берут блокировки всех полос и видят
+    согласованный срез. Транзакций нет: их ведут сессии (Session) поверх этого слоя.
+
+    Лимиты max_keys/max_bytes общие для всех полос: после записи, если сумма по полосам
+    превышает лимит, ключи вытесняются политикой сначала в полосах под блокировкой записи,
+    затем в свободных полосах (чужие блокировки берутся без ожидания). Порядок вытеснения
+    внутри полосы точный, между полосами — приближённый. Чтения без блокировки копятся
+    в буфере обращений полосы (_touches) и передаются её политике при записи в полосу
+    или когда буфер набирает TOUCH_BATCH ключей; под конкуренцией часть обращений теряется.
+    """
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES, clock: Callable[[], float] = time.time,
+                 **store_options: Any) -> None:
+        """
+        Инициализация полос.
+        :param stripes: Количество полос
+        :param clock: Источник текущего времени (общий для полос)
+        :param store_options: Параметры KeyValueStore каждой полосы; лимиты общие для полос
+        """
+        if stripes < 1:
+            raise ValueError('Количество полос должно быть положительным')
+        self._stripes = [KeyValueStore(clock=clock, **store_options) for _ in range(stripes)]
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._touches: List[List[str]] = [[] for _ in range(stripes)]
+        self._clock = clock
+        self._all = range(stripes)
+        self._max_keys: Optional[int] = store_options.get('max_keys')
+        self._max_bytes: Optional[int] = store_options.get('max_bytes')
+        self._limited = self._max_keys is not None or self._max_bytes is not None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[str]:
+        normalized_key = key.lower()
+        index = self._stripe_of(normalized_key)
+        with self._locks[index]:
+            if not self._limited:
+                return self._stripes[index].set(key, value, ttl)
+            self._apply_touches(index)
+            old_value = self._stripes[index].set(key, value, ttl)
+            self._enforce_limits((index,), normalized_key)
+            return old_value
+
+    def get(self, key: str) -> str:
+        value = self._lookup(key.lower())
+        return value if value is not None else 'NULL'
+
+    def unset(self, key: str) -> Optional[str]:
+        index = self._stripe_of(key.lower())
+        with self._locks[index]:
+            return self._stripes[index].unset(key)
+
+    def ttl(self, key: str) -> float:
+        index = self._stripe_of(key.lower())
+        with self._locks[index]:
+            return self._stripes[index].ttl(key)
+
+    def persist(self, key: str) -> bool:
+        index = self._stripe_of(key.lower())
+        with self._locks[index]:
+            return self._stripes[index].persist(key)
+
+    def expire_at(self, key: str, deadline: float) -> bool:
+        index = self._stripe_of(key.lower())
+        with self._locks[index]:
+            return self._stripes[index].expire_at(key, deadline)
+
+    def mset(self, pairs: Iterable[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Сохраняет несколько пар атомарно относительно других потоков.
+        :param pairs: Пары (ключ, значение)
+        :return: Прежние значения
+        """
+        pairs = list(pairs)
+        return self._scatter('mset', pairs, [key for key, _ in pairs])
+
+    def mget(self, keys: Iterable[str]) -> List[str]:
+        return [self.get(key) for key in keys]
+
+    def munset(self, keys: Iterable[str]) -> List[Optional[str]]:
+        keys = list(keys)
+        return self._scatter('munset', keys, keys)
+
+    def apply_changes(self, changes: Iterable[Tuple[str, Optional[str]]]
+                      ) -> List[Tuple[str, Optional[str]]]:
+        """
+        Применяет изменения одной операцией под блокировками затронутых полос.
+        :param changes: Пары (нормализованный ключ, значение или None)
+        :return: Фактически применённые изменения
+        """
+        changes = list(changes)
+        per_stripe = self._group(key for key, _ in changes)
+        applied: List[Tuple[str, Optional[str]]] = []
+        with self._locked(per_stripe):
+            for index, positions in per_stripe.items():
+                self._apply_touches(index)
+                applied.extend(self._stripes[index].apply_changes([changes[p] for p in positions]))
+            if self._limited:
+                self._enforce_limits(per_stripe)
+        return applied
+
+    def counts(self, value: str) -> int:
+        with self._locked(self._all):
+            return sum(stripe.counts(value) for stripe in self._stripes)
+
+    def find(self, value: str) -> List[str]:
+        with self._locked(self._all):
+            found = [stripe.find(value) for stripe in self._stripes]
+        return sorted(chain.from_iterable(found))
+
+    def find_page(self, value: str, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        with self._locked(self._all):
+            pages = [stripe.find_page(value, limit, after) for stripe in self._stripes]
+        merged = sorted(chain.from_iterable(pages))
+        return merged if limit is None else merged[:limit]
+
+    def iter_find(self, value: str, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Порции отсортированных ключей; каждая порция читается отдельным срезом.
+        """
+        while True:
+            chunk = self.find_page(value, chunk_size, after)
+            if not chunk:
+                return
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1]
+
+    def counts_range(self, lo: float, hi: float) -> int:
+        with self._locked(self._all):
+            return sum(stripe.counts_range(lo, hi) for stripe in self._stripes)
+
+    def find_range_page(self, lo: float, hi: float, limit: Optional[int] = None,
+                        after: Optional[NumericEntry] = None) -> List[NumericEntry]:
+        """
+        Страница пар (число, ключ): каждая полоса отдаёт до limit пар, страницы сливаются.
+        """
+        with self._locked(self._all):
+            pages = [stripe.find_range_page(lo, hi, limit, after) for stripe in self._stripes]
+        merged = heapq.merge(*pages)
+        return list(merged) if limit is None else list(islice(merged, limit))
+
+    def iter_find_range(self, lo: float, hi: float, chunk_size: int = 1000) -> Iterator[List[str]]:
+        """
+        Порции ключей со значением в [lo, hi]; каждая порция читается отдельным срезом.
+        """
+        after = None
+        while True:
+            page = self.find_range_page(lo, hi, chunk_size, after)
+            if not page:
+                return
+            yield [key_name for _, key_name in page]
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def scan_page(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Страница ключей из диапазона: каждая полоса отдаёт до limit ключей, страницы сливаются.
+        """
+        with self._locked(self._all):
+            pages = [stripe.scan_page(prefix, start, end, limit, after) for stripe in self._stripes]
+        merged = heapq.merge(*pages)
+        return list(merged) if limit is None else list(islice(merged, limit))
+
+    def iter_scan(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Порции ключей из диапазона; каждая порция читается отдельным срезом.
+        """
+        while True:
+            chunk = self.scan_page(prefix, start, end, chunk_size, after)
+            if not chunk:
+                return
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1]
+
+    def evict_expired(self) -> int:
+        """
+        Порция фоновой очистки истёкших ключей в каждой полосе.
+        :return: Количество удалённых ключей
+        """
+        evicted = 0
+        for lock, stripe in zip(self._locks, self._stripes):
+            with lock:
+                evicted += stripe.evict_expired()
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Сумма показателей полос.
+        """
+        with self._locked(self._all):
+            return merge_store_stats(stripe.stats() for stripe in self._stripes)
+
+    def committed_buckets(self) -> Iterator[Tuple[str, Iterable[str]]]:
+        """
+        Согласованный срез всех полос, сгруппированный по значениям.
+        """
+        with self._locked(self._all):
+            buckets = [(value, list(keys)) for stripe in self._stripes
+                       for value, keys in stripe.committed_buckets()]
+        return iter(buckets)
+
+    def committed_deadlines(self) -> List[Tuple[str, float]]:
+        """
+        Зафиксированные сроки жизни всех полос.
+        """
+        with self._locked(self._all):
+            return [deadline for stripe in self._stripes for deadline in stripe.committed_deadlines()]
+
+    def freeze(self) -> FrozenGroup:
+        """
+        Замораживает все полосы одновременно (под блокировками всех полос).
+        """
+        with self._locked(self._all):
+            return FrozenGroup([stripe.freeze() for stripe in self._stripes])
+
+    def load_buckets(self, buckets: Iterable[Tuple[str, List[str]]],
+                     deadlines: Iterable[Tuple[str, float]] = ()) -> int:
+        """
+        Заменяет содержимое всех полос.
+        """
+        per_stripe: List[List[Tuple[str, List[str]]]] = [[] for _ in self._stripes]
+        for value, keys in buckets:
+            for index, positions in self._group(keys).items():
+                per_stripe[index].append((value, [keys[p] for p in positions]))
+        stripe_deadlines: List[List[Tuple[str, float]]] = [[] for _ in self._stripes]
+        for key_name, deadline in deadlines:
+            stripe_deadlines[self._stripe_of(key_name)].append((key_name, deadline))
+        with self._locked(self._all):
+            loaded = sum(stripe.load_buckets(stripe_buckets, part)
+                         for stripe, stripe_buckets, part in zip(self._stripes, per_stripe, stripe_deadlines))
+            if self._limited:
+                for touches in self._touches:
+                    touches.clear()
+                self._enforce_limits(self._all)
+            return loaded
+
+    def _lookup(self, normalized_key: str) -> Optional[str]:
+        """
+        Зафиксированное значение ключа; без блокировки, если у ключа нет TTL.
+        При лимитах обращение записывается в буфер полосы.
+        :param normalized_key: Нормализованный ключ
+        """
+        index = self._stripe_of(normalized_key)
+        stripe = self._stripes[index]
+        if normalized_key not in stripe._expiry:
+            value = stripe._state.get(normalized_key)
+            if value is not None and self._limited:
+                self._record_touch(index, normalized_key)
+            return value
+        with self._locks[index]:
+            value = stripe._lookup(normalized_key)
+            if value is not None and self._limited:
+                stripe.touch_keys((normalized_key,))
+            return value
+
+    def _record_touch(self, index: int, normalized_key: str) -> None:
+        """
+        Запоминает обращение без блокировки; полный буфер передаётся политике,
+        если блокировка полосы свободна (иначе это сделает пишущий поток).
+        :param index: Номер полосы
+        :param normalized_key: Нормализованный ключ
+        """
+        touches = self._touches[index]
+        touches.append(normalized_key)
+        if len(touches) >= TOUCH_BATCH and self._locks[index].acquire(blocking=False):
+            try:
+                self._apply_touches(index)
+            finally:
+                self._locks[index].release()
+
+    def _apply_touches(self, index: int) -> None:
+        """
+        Передаёт накопленные обращения политике полосы (под блокировкой полосы).
+        :param index: Номер полосы
+        """
+        touches = self._touches[index]
+        if touches:
+            self._touches[index] = []
+            self._stripes[index].touch_keys(touches)
+
+    def _over_limit(self) -> bool:
+        """
+        Превышен ли общий лимит ключей или памяти (сумма по полосам).
+        """
+        return (self._max_keys is not None
+                and sum(len(stripe._state) for stripe in self._stripes) > self._max_keys
+                or self._max_bytes is not None
+                and sum(stripe.used_bytes for stripe in self._stripes) > self._max_bytes)
+
+    def _enforce_limits(self, held: Iterable[int], keep: Optional[str] = None) -> None:
+        """
+        Вытесняет ключи, пока превышен общий лимит: сначала из полос, чьи блокировки
+        уже взяты, затем из остальных, если их блокировку удаётся взять без ожидания.
+        :param held: Номера полос, блокировки которых держит вызывающий
+        :param keep: Только что записанный нормализованный ключ, который не вытесняется
+        """
+        if not self._over_limit():
+            return
+        held = sorted(held)
+        for index in held:
+            if self._evict_from(index, keep):
+                return
+        for index in self._all:
+            if index in held or not self._locks[index].acquire(blocking=False):
+                continue
+            try:
+                if self._evict_from(index, keep):
+                    return
+            finally:
+                self._locks[index].release()
+
+    def _evict_from(self, index: int, keep: Optional[str]) -> bool:
+        """
+        Вытесняет ключи полосы (под её блокировкой), пока превышен общий лимит.
+        :return: True, если лимит больше не превышен
+        """
+        self._apply_touches(index)
+        stripe = self._stripes[index]
+        while self._over_limit():
+            if not stripe.evict_one(keep):
+                return False
+        return True
+
+    def _expiry_of(self, normalized_key: str) -> Optional[float]:
+        return self._stripes[self._stripe_of(normalized_key)]._expiry_of(normalized_key)
+
+    @staticmethod
+    def _normalize_key(key: str) -> str:
+        return key.lower()
+
+    def _stripe_of(self, normalized_key: str) -> int:
+        """
+        Номер полосы ключа. Полосы живут в одном процессе, поэтому достаточно
+        встроенного hash (в отличие от crc32 у ShardedStore, общего для процессов).
+        :param normalized_key: Нормализованный ключ
+        """
+        return hash(normalized_key) % len(self._stripes)
+
+    def _group(self, keys: Iterable[str]) -> Dict[int, List[int]]:
+        """
+        Раскладывает позиции ключей по полосам.
+        :param keys: Ключи (регистр не важен)
+        :return: Номер полосы -> позиции её ключей
+        """
+        per_stripe: Dict[int, List[int]] = {}
+        for position, key in enumerate(keys):
+            per_stripe.setdefault(self._stripe_of(key.lower()), []).append(position)
+        return per_stripe
+
+    @contextmanager
+    def _locked(self, indexes: Iterable[int]) -> Iterator[None]:
+        """
+        Берёт блокировки полос по возрастанию номера и освобождает их на выходе.
+        :param indexes: Номера полос
+        """
+        locks = [self._locks[index] for index in sorted(indexes)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _scatter(self, method: str, items: Sequence[Any], keys: List[str]) -> List[Any]:
+        """
+        Выполняет пакетную операцию по полосам под их блокировками.
+        :param method: Пакетный метод KeyValueStore (mset, munset)
+        :param items: Элементы (пары или ключи)
+        :param keys: Ключ каждого элемента
+        :return: Результаты в исходном порядке
+        """
+        per_stripe = self._group(keys)
+        results: List[Any] = [None] * len(items)
+        with self._locked(per_stripe):
+            for index, positions in per_stripe.items():
+                self._apply_touches(index)
+                stripe_results = getattr(self._stripes[index], method)([items[p] for p in positions])
+                for position, result in zip(positions, stripe_results):
+                    results[position] = result
+            if self._limited:
+                self._enforce_limits(per_stripe)
+        return results
+
+
+class ConcurrentKeyValueStore:
+    """
+    Потокобезопасное хранилище с интерфейсом KeyValueStore (подходит для CommandDispatcher,
+    SAVE/LOAD). Зафиксированное состояние хранится в StripedStore: запись блокирует
+    только полосу ключа, GET не блокируется вовсе, COUNTS/FIND видят согласованный срез.
+
+    Транзакции принадлежат потоку: BEGIN создаёт сессию потока (Session) поверх
+    StripedStore, изменения копятся в её наложении и при COMMIT верхнего уровня
+    применяются одной операцией под блокировками затронутых полос. Другие потоки
+    видят транзакцию целиком или не видят вовсе.
+    """
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES, clock: Callable[[], float] = time.time,
+                 **store_options: Any) -> None:
+        """
+        Инициализация хранилища.
+        :param stripes: Количество полос блокировок
+        :param clock: Источник текущего времени
+        :param store_options: Параметры KeyValueStore каждой полосы
+        """
+        self._striped = StripedStore(stripes, clock, **store_options)
+        self._local = threading.local()
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[str]:
+        return self._target().set(key, value, ttl)
+
+    def get(self, key: str) -> str:
+        return self._target().get(key)
+
+    def unset(self, key: str) -> Optional[str]:
+        return self._target().unset(key)
+
+    def ttl(self, key: str) -> float:
+        return self._target().ttl(key)
+
+    def persist(self, key: str) -> bool:
+        return self._target().persist(key)
+
+    def mset(self, pairs: Iterable[Tuple[str, str]]) -> List[Optional[str]]:
+        return self._target().mset(pairs)
+
+    def mget(self, keys: Iterable[str]) -> List[str]:
+        return self._target().mget(keys)
+
+    def munset(self, keys: Iterable[str]) -> List[Optional[str]]:
+        return self._target().munset(keys)
+
+    def counts(self, value: str) -> int:
+        return self._target().counts(value)
+
+    def find(self, value: str) -> List[str]:
+        return self._target().find(value)
+
+    def find_page(self, value: str, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        return self._target().find_page(value, limit, after)
+
+    def iter_find(self, value: str, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        return self._target().iter_find(value, chunk_size, after)
+
+    def counts_range(self, lo: float, hi: float) -> int:
+        return self._target().counts_range(lo, hi)
+
+    def find_range_page(self, lo: float, hi: float, limit: Optional[int] = None,
+                        after: Optional[NumericEntry] = None) -> List[NumericEntry]:
+        return self._target().find_range_page(lo, hi, limit, after)
+
+    def iter_find_range(self, lo: float, hi: float, chunk_size: int = 1000) -> Iterator[List[str]]:
+        return self._target().iter_find_range(lo, hi, chunk_size)
+
+    def scan_page(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        return self._target().scan_page(prefix, start, end, limit, after)
+
+    def iter_scan(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        return self._target().iter_scan(prefix, start, end, chunk_size, after)
+
+    def begin(self) -> bool:
+        """
+        Начинает транзакцию текущего потока.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = Session(self._striped)
+        return session.begin()
+
+    def rollback(self) -> bool:
+        session = self._session()
+        return session.rollback() if session is not None else False
+
+    def commit(self) -> bool:
+        session = self._session()
+        return session.commit() if session is not None else False
+
+    @property
+    def transaction_depth(self) -> int:
+        """
+        Количество открытых транзакций текущего потока.
+        """
+        session = self._session()
+        return session.transaction_depth if session is not None else 0
+
+    def evict_expired(self) -> int:
+        return self._striped.evict_expired()
+
+    def stats(self) -> Dict[str, int]:
+        return self._target().stats()
+
+    def committed_buckets(self) -> Iterator[Tuple[str, Iterable[str]]]:
+        return self._striped.committed_buckets()
+
+    def committed_deadlines(self) -> List[Tuple[str, float]]:
+        return self._striped.committed_deadlines()
+
+    def freeze(self) -> FrozenGroup:
+        return self._striped.freeze()
+
+    def load_buckets(self, buckets: Iterable[Tuple[str, List[str]]],
+                     deadlines: Iterable[Tuple[str, float]] = ()) -> int:
+        """
+        Заменяет содержимое хранилища.
+        :raises ValueError: если в текущем потоке открыта транзакция
+        """
+        if self.transaction_depth:
+            raise ValueError('Нельзя загрузить данные внутри транзакции')
+        return self._striped.load_buckets(buckets, deadlines)
+
+    def _session(self) -> Optional[Session]:
+        """
+        Сессия текущего потока, если в нём открыта транзакция.
+        """
+        session = getattr(self._local, 'session', None)
+        return session if session is not None and session.transaction_depth else None
+
+    def _target(self) -> Union[Session, StripedStore]:
+        """
+        Исполнитель команды: сессия потока внутри транзакции, иначе общее хранилище.
+        """
+        session = self._session()
+        return session if session is not None else self._striped
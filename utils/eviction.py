@@ -0,0 +1,218 @@
+import random
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+# Предикат «ключ нельзя вытеснять» (ключ упомянут в журнале открытой транзакции)
+PinnedCheck = Callable[[str], bool]
+
+# Сколько случайных ключей рассматривается при выборе жертвы (random, lfu)
+EVICTION_SAMPLES = 5
+
+# Начальный счётчик LFU: новый ключ не должен вытесняться сразу после вставки
+LFU_INIT = 5
+# Чем больше множитель, тем медленнее растёт логарифмический счётчик LFU
+LFU_LOG_FACTOR = 10
+LFU_MAX = 255
+# Счётчики LFU делятся пополам после стольких обращений на каждый ключ политики
+LFU_DECAY_PERIOD = 1024
+
+
+class EvictionPolicy:
+    """
+    Политика вытеснения: учитывает вставки, обращения и удаления ключей
+    за O(1) и выбирает ключ для вытеснения при превышении лимита памяти.
+    """
+
+    def insert(self, key: str) -> None:
+        """
+        Регистрирует новый ключ.
+        :param key: Нормализованный ключ
+        """
+        raise NotImplementedError
+
+    def touch(self, key: str) -> None:
+        """
+        Отмечает обращение к существующему ключу (чтение или перезапись).
+        :param key: Нормализованный ключ
+        """
+        raise NotImplementedError
+
+    def remove(self, key: str) -> None:
+        """
+        Забывает удалённый ключ.
+        :param key: Нормализованный ключ
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """
+        Забывает все ключи (при замене содержимого хранилища).
+        """
+        raise NotImplementedError
+
+    def victim(self, pinned: PinnedCheck) -> Optional[str]:
+        """
+        Выбирает ключ для вытеснения.
+        :param pinned: Ключи, для которых он возвращает True, выбирать нельзя
+        :return: Ключ или None, если вытеснять нечего
+        """
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """
+    Вытесняет давно не использованный ключ. Порядок обращений хранится
+    в OrderedDict: перенос в конец и удаление стоят O(1).
+    """
+
+    def __init__(self) -> None:
+        self._order: 'OrderedDict[str, None]' = OrderedDict()
+
+    def insert(self, key: str) -> None:
+        self._order[key] = None
+
+    def touch(self, key: str) -> None:
+        self._order.move_to_end(key)
+
+    def remove(self, key: str) -> None:
+        self._order.pop(key, None)
+
+    def clear(self) -> None:
+        self._order.clear()
+
+    def victim(self, pinned: PinnedCheck) -> Optional[str]:
+        for key in self._order:
+            if not pinned(key):
+                return key
+        return None
+
+
+class RandomPolicy(EvictionPolicy):
+    """
+    Вытесняет случайный ключ. Ключи хранятся в списке с индексом позиций:
+    удаление — перестановкой с последним элементом за O(1).
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None) -> None:
+        """
+        :param rng: Генератор случайных чисел (для воспроизводимости в тестах)
+        """
+        self._rng = rng or random.Random()
+        self._keys: List[str] = []
+        self._positions: Dict[str, int] = {}
+
+    def insert(self, key: str) -> None:
+        self._positions[key] = len(self._keys)
+        self._keys.append(key)
+
+    def touch(self, key: str) -> None:
+        pass
+
+    def remove(self, key: str) -> None:
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        last = self._keys.pop()
+        if position < len(self._keys):
+            self._keys[position] = last
+            self._positions[last] = position
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._positions.clear()
+
+    def victim(self, pinned: PinnedCheck) -> Optional[str]:
+        candidates = [key for key in self._sample() if not pinned(key)]
+        if candidates:
+            return self._best(candidates)
+        for key in self._keys:
+            if not pinned(key):
+                return key
+        return None
+
+    def _sample(self) -> List[str]:
+        """
+        Несколько случайных ключей-кандидатов.
+        """
+        keys = self._keys
+        if not keys:
+            return []
+        return [keys[self._rng.randrange(len(keys))] for _ in range(EVICTION_SAMPLES)]
+
+    def _best(self, candidates: List[str]) -> str:
+        """
+        Лучший кандидат на вытеснение из выборки.
+        :param candidates: Невытесняемые ключи уже отброшены
+        """
+        return candidates[0]
+
+
+class LFUPolicy(RandomPolicy):
+    """
+    Приближённый LFU: у ключа логарифмический счётчик обращений (растёт с
+    вероятностью, обратной его величине, до LFU_MAX), а жертва выбирается
+    как ключ с наименьшим счётчиком среди EVICTION_SAMPLES случайных.
+
+    Счётчики стареют: после LFU_DECAY_PERIOD обращений на ключ все они делятся пополам,
+    иначе ключ, бывший частым давно, не вытеснялся бы никогда. Проход по всем ключам
+    случается раз в LFU_DECAY_PERIOD * число ключей обращений, то есть в среднем O(1).
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None) -> None:
+        super().__init__(rng)
+        self._counters: Dict[str, int] = {}
+        self._accesses = 0
+
+    def insert(self, key: str) -> None:
+        super().insert(key)
+        self._counters[key] = LFU_INIT
+        self._access()
+
+    def touch(self, key: str) -> None:
+        counter = self._counters[key]
+        if counter < LFU_MAX and \
+                self._rng.random() * ((counter - LFU_INIT) * LFU_LOG_FACTOR + 1) < 1:
+            self._counters[key] = counter + 1
+        self._access()
+
+    def remove(self, key: str) -> None:
+        super().remove(key)
+        self._counters.pop(key, None)
+
+    def clear(self) -> None:
+        super().clear()
+        self._counters.clear()
+        self._accesses = 0
+
+    def _access(self) -> None:
+        """
+        Учитывает обращение и делит счётчики пополам, когда набран период старения.
+        """
+        self._accesses += 1
+        if self._accesses >= LFU_DECAY_PERIOD * len(self._counters):
+            self._accesses = 0
+            counters = self._counters
+            for key, counter in counters.items():
+                counters[key] = counter >> 1
+
+    def _best(self, candidates: List[str]) -> str:
+        return min(candidates, key=self._counters.__getitem__)
+
+
+EVICTION_POLICIES: Dict[str, Callable[[], EvictionPolicy]] = {
+    'lru': LRUPolicy,
+    'lfu': LFUPolicy,
+    'random': RandomPolicy,
+}
+
+
+def make_policy(name: str) -> EvictionPolicy:
+    """
+    Создаёт политику вытеснения по имени.
+    :param name: 'lru', 'lfu' или 'random'
+    :raises ValueError: если политика неизвестна
+    """
+    try:
+        return EVICTION_POLICIES[name]()
+    except KeyError:
+        raise ValueError(f'Неизвестная политика вытеснения: {name}') from None
@@ -0,0 +1,134 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Размер порции ключей, группируемых по значениям при переборе среза
+FROZEN_CHUNK_SIZE = 65536
+
+# Отметка «ключ не менялся после заморозки» (None — значение «ключа не было»)
+_UNCHANGED = object()
+
+
+class FrozenState:
+    """
+    Замороженный срез зафиксированного состояния KeyValueStore (copy-on-write).
+
+    Данные хранилища не копируются: пока срез открыт, хранилище перед первым изменением
+    каждого ключа (зафиксированным или внутри транзакции) сохраняет его зафиксированное
+    значение в словаре прежних значений. Ключ, которого там нет, не менялся с момента
+    заморозки, и его значение в живом словаре — значение среза. Дополнительная память —
+    массив ссылок на ключи и прежние значения изменённых за время жизни среза ключей.
+
+    Сроки жизни ключей среза копируются при заморозке (deadlines): их обычно немного
+    по сравнению с числом ключей.
+
+    Срез можно читать из другого потока без блокировок: хранилище записывает прежнее
+    значение до изменения словаря, а читатель берёт значение из словаря до проверки
+    прежних значений, и оба обращения атомарны под GIL. Поэтому читатель видит либо
+    неизменённое значение, либо уже сохранённое прежнее.
+    """
+
+    def __init__(self, state: Dict[str, str], preimages: Dict[str, Optional[str]],
+                 release: Callable[[], None], deadlines: Sequence[Tuple[str, float]] = ()) -> None:
+        """
+        Вызывается хранилищем в момент заморозки (в потоке-владельце хранилища).
+        :param state: Живой словарь состояния хранилища
+        :param preimages: Прежние зафиксированные значения; при заморозке — ключи из журналов
+            отката открытых транзакций, затем пополняется хранилищем
+        :param release: Снимает заморозку в хранилище
+        :param deadlines: Зафиксированные сроки жизни на момент заморозки
+        """
+        self.deadlines: List[Tuple[str, float]] = list(deadlines)
+        self._state = state
+        self._preimages = preimages
+        self._release: Optional[Callable[[], None]] = release
+        self._keys: List[str] = list(state)
+        # Зафиксированные ключи, удалённые открытыми транзакциями: в state их нет
+        self._removed: List[str] = [key_name for key_name, value in preimages.items()
+                                    if value is not None and key_name not in state]
+
+    @property
+    def changed(self) -> int:
+        """
+        Число ключей, прежние значения которых сохранены для среза.
+        """
+        return len(self._preimages)
+
+    def buckets(self, chunk_size: int = FROZEN_CHUNK_SIZE) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Перебирает срез, сгруппированный по значениям внутри порций ключей:
+        пары (значение, ключи), одно значение может встретиться в нескольких порциях.
+        :param chunk_size: Размер порции ключей
+        """
+        for start in range(0, len(self._keys), chunk_size):
+            yield from self._group(self._keys[start:start + chunk_size])
+        yield from self._group(self._removed)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """
+        Пары (ключ, значение) среза.
+        """
+        for value, keys in self.buckets():
+            for key_name in keys:
+                yield key_name, value
+
+    def close(self) -> None:
+        """
+        Освобождает срез: хранилище перестаёт сохранять прежние значения.
+        """
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+    def __enter__(self) -> 'FrozenState':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _group(self, keys: Sequence[str]) -> Iterable[Tuple[str, List[str]]]:
+        """
+        Значения ключей на момент заморозки, сгруппированные по значениям.
+        :param keys: Ключи порции
+        """
+        state_get = self._state.get
+        preimages_get = self._preimages.get
+        grouped: Dict[str, List[str]] = {}
+        for key_name in keys:
+            value = state_get(key_name)
+            previous = preimages_get(key_name, _UNCHANGED)
+            if previous is not _UNCHANGED:
+                value = previous
+            if value is not None:
+                grouped.setdefault(value, []).append(key_name)
+        return grouped.items()
+
+
+class FrozenGroup:
+    """
+    Срез из нескольких частей (полос хранилища), замороженных одновременно.
+    """
+
+    def __init__(self, parts: List[FrozenState]) -> None:
+        self._parts = parts
+        self.deadlines = [deadline for part in parts for deadline in part.deadlines]
+
+    @property
+    def changed(self) -> int:
+        return sum(part.changed for part in self._parts)
+
+    def buckets(self, chunk_size: int = FROZEN_CHUNK_SIZE) -> Iterator[Tuple[str, List[str]]]:
+        for part in self._parts:
+            yield from part.buckets(chunk_size)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        for part in self._parts:
+            yield from part.items()
+
+    def close(self) -> None:
+        for part in self._parts:
+            part.close()
+
+    def __enter__(self) -> 'FrozenGroup':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
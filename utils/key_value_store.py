@@ -1,34 +1,159 @@
-from collections import defaultdict
-from typing import Any, Dict, List, Set, Optional
+import heapq
+import threading
+import time
+from itertools import repeat
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from utils.eviction import EvictionPolicy, PinnedCheck, make_policy
+from utils.frozen_state import FrozenState
 from utils.logger_config import logger
+from utils.numeric_index import NumericEntry, NumericIndex
+from utils.sorted_list import SortedList, scan_bounds
+
+# Слушатель зафиксированных изменений: получает список пар (ключ, новое значение
+# или None при удалении) либо None, если содержимое хранилища заменено целиком.
+ChangeListener = Callable[[Optional[List[Tuple[str, Optional[str]]]]], None]
+
+# Слушатель зафиксированных сроков жизни: пары (ключ, момент истечения или None, если срок снят)
+ExpiryListener = Callable[[List[Tuple[str, Optional[float]]]], None]
+
+# Сколько записей очереди истечения разбирается за одну фоновую порцию
+EVICTION_BATCH = 64
+
+# Приблизительные накладные расходы на ключ (словарь состояния, индекс значений,
+# учёт политики вытеснения) сверх длины ключа и значения, байты
+ENTRY_OVERHEAD = 160
 
 
 class KeyValueStore:
     """
     Класс для хранения in-memory key-value данных с поддержкой транзакций.
     Ключи регистронезависимые (нормализуются к нижнему регистру).
+
+    Текущее видимое состояние хранится в одном плоском словаре, поэтому поиск
+    ключа не зависит от глубины вложенности транзакций. Каждая транзакция ведёт
+    журнал отката: прежнее значение каждого ключа, изменённого в ней впервые.
+
+    Ключи могут иметь срок жизни (TTL). Истёкший ключ удаляется лениво при обращении
+    к нему, а также порциями из кучи сроков: при записи и периодически (evict_expired),
+    поэтому ни один проход не разбирает сразу все истёкшие ключи. Перед COUNTS/FIND
+    удаляются все уже истёкшие ключи, чтобы ответ был точным. Сроки тоже журналируются
+    в транзакциях: ROLLBACK восстанавливает и значение, и TTL.
+
+    При заданном лимите (max_keys или max_bytes) после записи ключи вытесняются
+    выбранной политикой (LRU, приближённый LFU, случайная). Ключи, упомянутые
+    в журнале открытой транзакции, не вытесняются: ROLLBACK должен их восстановить.
+    Остальные ключи совпадают с зафиксированным состоянием, поэтому их вытеснение
+    сразу считается зафиксированным изменением и в журналы отката не попадает.
+
+    Для сканирования по префиксу и диапазону ключей (scan_page/iter_scan) ведётся
+    упорядоченный индекс ключей. Он строится при первом сканировании и затем
+    поддерживается при появлении и удалении ключей; хранилище, которое не сканируют,
+    за него не платит. Так же лениво строится индекс числовых значений для
+    COUNTS/FIND RANGE: он обновляется вместе с индексом значений.
+
+    freeze() замораживает зафиксированное состояние для фонового сохранения без копирования
+    данных: пока срез открыт, перед первым изменением ключа его зафиксированное значение
+    сохраняется в словарь прежних значений среза (см. FrozenState). Срезов может быть
+    открыто несколько (BGSAVE и полные синхронизации реплик): у каждого свой словарь.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, compact: bool = False, clock: Callable[[], float] = time.time,
+                 max_keys: Optional[int] = None, max_bytes: Optional[int] = None,
+                 eviction: Union[str, EvictionPolicy] = 'lru') -> None:
         """
         Инициализация хранилища и структуры для отслеживания значений.
+        :param compact: Компактный режим: одинаковые значения хранятся одним объектом
+        (интернирование через таблицу _interned, очищаемую вместе с корзинами индекса).
+        Экономит ~50 байт на ключ при малом числе различных значений.
+        :param clock: Источник текущего времени в секундах (для сроков жизни ключей)
+        :param max_keys: Максимальное количество ключей (None — без ограничения)
+        :param max_bytes: Приблизительный бюджет памяти в байтах (None — без ограничения)
+        :param eviction: Политика вытеснения при превышении лимита: 'lru', 'lfu', 'random'
+        или экземпляр EvictionPolicy
+        _state — итоговое видимое состояние (с учётом всех открытых транзакций);
+        _undo_logs — журналы отката транзакций: ключ -> значение до транзакции
+        (None, если ключа не было);
+        _value_to_keys — индекс значение -> отсортированные ключи для _state;
+        пустые корзины удаляются;
+        _listeners — слушатели изменений, дошедших до зафиксированного состояния;
+        _expiry_listeners — слушатели зафиксированных сроков жизни;
+        _interned — значение -> канонический объект строки (только в компактном режиме);
+        _expiry — ключ -> момент истечения; _expiry_heap — куча (момент, ключ) с ленивым
+        удалением устаревших записей; _expiry_undo — журналы отката сроков по транзакциям;
+        _policy — политика вытеснения (None, если лимитов нет); _used_bytes — оценка памяти;
+        _key_index — отсортированные ключи _state (None, пока не было сканирования);
+        _numeric_index — ключи по числовым значениям (None, пока не было запросов RANGE);
+        _preimages — словари открытых замороженных срезов: зафиксированные значения
+        ключей до их изменения после freeze() (пустой список, пока срезов нет). Срез
+        закрывают и из фонового потока, поэтому список не меняется на месте, а заменяется
+        под _freeze_lock; запись перебирает его без блокировки.
         """
-        self._data: List[Dict[str, Optional[str]]] = [{}]
-        self._value_to_keys: List[Dict[str, Set[str]]] = [defaultdict(set)]
+        self._state: Dict[str, str] = {}
+        self._undo_logs: List[Dict[str, Optional[str]]] = []
+        self._value_to_keys: Dict[str, SortedList] = {}
+        self._listeners: List[ChangeListener] = []
+        self._expiry_listeners: List[ExpiryListener] = []
+        self._interned: Optional[Dict[str, str]] = {} if compact else None
+        self._clock = clock
+        self._expiry: Dict[str, float] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._expiry_undo: List[Dict[str, Optional[float]]] = []
+        if max_keys is not None and max_keys < 1 or max_bytes is not None and max_bytes < 1:
+            raise ValueError('Лимит хранилища должен быть положительным')
+        self.max_keys = max_keys
+        self.max_bytes = max_bytes
+        self._policy: Optional[EvictionPolicy] = None
+        if max_keys is not None or max_bytes is not None:
+            self._policy = make_policy(eviction) if isinstance(eviction, str) else eviction
+        self._used_bytes = 0
+        self.evictions = 0
+        self._key_index: Optional[SortedList] = None
+        self._numeric_index: Optional[NumericIndex] = None
+        self._preimages: List[Dict[str, Optional[str]]] = []
+        self._freeze_lock = threading.Lock()
 
-    def set(self, key: str, value: str) -> None:
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[str]:
         """
-        Сохраняет значение по ключу (регистронезависимо).
+        Сохраняет значение по ключу (регистронезависимо). Прежний TTL ключа снимается.
         :param key: Ключ
         :param value: Значение
+        :param ttl: Срок жизни в секундах (None — бессрочно)
+        :return: Прежнее значение или None, если ключа не было
         """
         normalized_key = self._normalize_key(key)
-        current, value_to_keys = self._current()
-        old_value = self._get_from_layers(normalized_key)
+        if self._expiry_heap:
+            self._expire_if_due(normalized_key)
+            self.evict_expired()
+        old_value = self._state.get(normalized_key)
+        if ttl is None and self._expiry:
+            self._set_expiry(normalized_key, None)
+        if old_value == value:
+            if ttl is not None:
+                self._set_expiry(normalized_key, self._clock() + ttl)
+            if self._policy is not None and old_value is not None:
+                self._policy.touch(normalized_key)
+            return old_value
         if old_value is not None:
-            value_to_keys[old_value].discard(normalized_key)
-        current[normalized_key] = value
-        value_to_keys[value].add(normalized_key)
+            self._index_discard(old_value, normalized_key)
+        elif self._key_index is not None:
+            self._key_index.add(normalized_key)
+        if self._interned is not None:
+            value = self._interned.get(value, value)
+        if self._preimages:
+            self._keep_preimage(normalized_key, old_value)
+        self._state[normalized_key] = value
+        self._index_add(value, normalized_key)
+        if self._undo_logs:
+            self._undo_logs[-1].setdefault(normalized_key, old_value)
+        elif self._listeners:
+            self._notify([(normalized_key, value)])
+        # Срок — после значения: слушатели получают SET, который снимает срок, раньше срока
+        if ttl is not None:
+            self._set_expiry(normalized_key, self._clock() + ttl)
+        if self._policy is not None:
+            self._track(normalized_key, old_value, value)
+            self._enforce_limits(normalized_key)
+        return old_value
 
     def get(self, key: str) -> str:
         """
@@ -37,20 +162,68 @@ class KeyValueStore:
         :return: Значение или 'NULL'
         """
         normalized_key = self._normalize_key(key)
-        value = self._get_from_layers(normalized_key)
-        return value if value is not None else 'NULL'
+        if self._expiry:
+            self._expire_if_due(normalized_key)
+        value = self._state.get(normalized_key)
+        if value is None:
+            return 'NULL'
+        if self._policy is not None:
+            self._policy.touch(normalized_key)
+        return value
 
-    def unset(self, key: str) -> None:
+    def unset(self, key: str) -> Optional[str]:
         """
         Удаляет ключ (регистронезависимо) из хранилища.
         :param key: Ключ
+        :return: Удалённое значение или None, если ключа не было
         """
         normalized_key = self._normalize_key(key)
-        current, value_to_keys = self._current()
-        old_value = self._get_from_layers(normalized_key)
-        if old_value is not None:
-            value_to_keys[old_value].discard(normalized_key)
-        current[normalized_key] = None
+        if self._expiry_heap:
+            self._expire_if_due(normalized_key)
+            self.evict_expired()
+        return self._remove(normalized_key)
+
+    def mset(self, pairs: Iterable[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Сохраняет несколько пар ключ-значение одной операцией.
+        Индекс значений обновляется целыми группами ключей.
+        :param pairs: Пары (ключ, значение)
+        :return: Прежние значения в порядке пар (None, если ключа не было)
+        """
+        old_values, _ = self._write_many(
+            [(self._normalize_key(key), value) for key, value in pairs])
+        return old_values
+
+    def mget(self, keys: Iterable[str]) -> List[str]:
+        """
+        Возвращает значения нескольких ключей ('NULL' для отсутствующих).
+        :param keys: Ключи
+        """
+        if self._expiry or self._policy is not None:
+            return [self.get(key) for key in keys]
+        state = self._state
+        normalize = self._normalize_key
+        return [state.get(normalize(key), 'NULL') for key in keys]
+
+    def munset(self, keys: Iterable[str]) -> List[Optional[str]]:
+        """
+        Удаляет несколько ключей одной операцией.
+        :param keys: Ключи
+        :return: Удалённые значения в порядке ключей (None, если ключа не было)
+        """
+        old_values, _ = self._write_many([(self._normalize_key(key), None) for key in keys])
+        return old_values
+
+    def apply_changes(self, changes: Iterable[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[str]]]:
+        """
+        Применяет набор изменений как одну операцию: вне транзакции слушатели
+        получают их одним уведомлением, внутри транзакции они попадают в её журнал отката.
+        :param changes: Пары (ключ, значение или None для удаления)
+        :return: Фактически применённые изменения (с нормализованными ключами)
+        """
+        _, applied = self._write_many(
+            [(self._normalize_key(key), value) for key, value in changes])
+        return applied
 
     def counts(self, value: str) -> int:
         """
@@ -58,12 +231,10 @@ class KeyValueStore:
         :param value: Значение
         :return: Количество ключей
         """
-        resolved = self._resolved_state()
-        count = 0
-        for _, resolved_value in resolved.items():
-            if resolved_value == value:
-                count += 1
-        return count
+        if self._expiry_heap:
+            self._evict_all_due()
+        keys = self._value_to_keys.get(value)
+        return len(keys) if keys else 0
 
     def find(self, value: str) -> List[str]:
         """
@@ -71,87 +242,845 @@ class KeyValueStore:
         :param value: Значение
         :return: Список ключей (в нормализованном виде)
         """
-        resolved = self._resolved_state()
-        result_keys: List[str] = []
-        for key_name, resolved_value in resolved.items():
-            if resolved_value == value:
-                result_keys.append(key_name)
-        return sorted(result_keys)
+        if self._expiry_heap:
+            self._evict_all_due()
+        keys = self._value_to_keys.get(value)
+        return list(keys) if keys else []
+
+    def find_page(self, value: str, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Возвращает страницу отсортированных ключей с данным значением.
+        Стоимость — O(log n + limit): корзина индекса уже отсортирована.
+        :param value: Значение
+        :param limit: Максимальный размер страницы (None — все оставшиеся)
+        :param after: Курсор — последний ключ предыдущей страницы (None — с начала)
+        :return: Ключи, строго большие after
+        """
+        if self._expiry_heap:
+            self._evict_all_due()
+        keys = self._value_to_keys.get(value)
+        if not keys:
+            return []
+        return keys.page(None if after is None else self._normalize_key(after), limit)
+
+    def iter_find(self, value: str, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Отдаёт отсортированные ключи с данным значением порциями по chunk_size.
+        Каждая порция продолжает с последнего выданного ключа, поэтому изменения
+        хранилища между порциями не ломают перебор, а память ограничена размером порции.
+        :param value: Значение
+        :param chunk_size: Размер порции
+        :param after: Начать после этого ключа (None — с начала)
+        """
+        while True:
+            page = self.find_page(value, chunk_size, after)
+            if not page:
+                return
+            yield page
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def counts_range(self, lo: float, hi: float) -> int:
+        """
+        Количество ключей с числовым значением в [lo, hi] с учётом вложенных транзакций.
+        Стоимость — O(log n) по индексу числовых значений.
+        :param lo: Нижняя граница включительно
+        :param hi: Верхняя граница включительно
+        """
+        if self._expiry_heap:
+            self._evict_all_due()
+        return self._numbers().count(lo, hi)
+
+    def find_range_page(self, lo: float, hi: float, limit: Optional[int] = None,
+                        after: Optional[NumericEntry] = None) -> List[NumericEntry]:
+        """
+        Страница ключей с числовым значением в [lo, hi], упорядоченных по значению, затем по ключу.
+        Стоимость — O(log n + limit).
+        :param lo: Нижняя граница включительно
+        :param hi: Верхняя граница включительно
+        :param limit: Размер страницы (None — все)
+        :param after: Курсор — последняя пара предыдущей страницы
+        :return: Пары (число, нормализованный ключ)
+        """
+        if self._expiry_heap:
+            self._evict_all_due()
+        return self._numbers().page(lo, hi, limit, after)
+
+    def iter_find_range(self, lo: float, hi: float, chunk_size: int = 1000) -> Iterator[List[str]]:
+        """
+        Отдаёт ключи с числовым значением в [lo, hi] порциями по chunk_size
+        (порядок — по значению, затем по ключу).
+        :param lo: Нижняя граница включительно
+        :param hi: Верхняя граница включительно
+        :param chunk_size: Размер порции
+        """
+        after = None
+        while True:
+            page = self.find_range_page(lo, hi, chunk_size, after)
+            if not page:
+                return
+            yield [key_name for _, key_name in page]
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def scan_page(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Возвращает страницу отсортированных ключей с префиксом prefix из диапазона
+        start <= ключ < end (любой фильтр можно опустить) с учётом вложенных транзакций.
+        Стоимость — O(log n + limit) по упорядоченному индексу ключей.
+        :param prefix: Префикс ключа (None — любой)
+        :param start: Нижняя граница включительно (None — без неё)
+        :param end: Верхняя граница не включительно (None — без неё)
+        :param limit: Максимальный размер страницы (None — все оставшиеся)
+        :param after: Курсор — последний ключ предыдущей страницы (None — с начала)
+        :return: Ключи (в нормализованном виде), строго большие after
+        """
+        if self._expiry_heap:
+            self._evict_all_due()
+        if self._key_index is None:
+            self._key_index = SortedList(self._state)
+        normalize = self._normalize_key
+        low, high = scan_bounds(*(None if bound is None else normalize(bound)
+                                  for bound in (prefix, start, end)))
+        return self._key_index.range_page(low, high, None if after is None else normalize(after), limit)
+
+    def iter_scan(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Отдаёт отсортированные ключи из диапазона порциями по chunk_size; как и iter_find,
+        каждая порция продолжает с последнего выданного ключа.
+        :param prefix: Префикс ключа (None — любой)
+        :param start: Нижняя граница включительно (None — без неё)
+        :param end: Верхняя граница не включительно (None — без неё)
+        :param chunk_size: Размер порции
+        :param after: Начать после этого ключа (None — с начала)
+        """
+        while True:
+            page = self.scan_page(prefix, start, end, chunk_size, after)
+            if not page:
+                return
+            yield page
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
 
     def begin(self) -> bool:
         """
         Начинает новую транзакцию.
         :return: True (всегда успешный старт транзакции)
         """
-        self._data.append({})
-        self._value_to_keys.append(defaultdict(set))
+        self._undo_logs.append({})
+        self._expiry_undo.append({})
         return True
 
     def rollback(self) -> bool:
         """
         Откатывает изменения текущей транзакции.
+        Восстанавливаются только ключи из журнала отката транзакции.
         :return: True если транзакция была откатена, False если активной транзакции нет
         """
-        if len(self._data) == 1:
+        if not self._undo_logs:
             return False
-        self._data.pop()
-        self._value_to_keys.pop()
+        undo_log = self._undo_logs.pop()
+        expiry_log = self._expiry_undo.pop()
+        key_index = self._key_index
+        preimages = self._preimages
+        for key_name, previous_value in undo_log.items():
+            current_value = self._state.get(key_name)
+            if preimages:
+                self._keep_preimage(key_name, current_value)
+            if current_value is not None:
+                self._index_discard(current_value, key_name)
+            if previous_value is None:
+                self._state.pop(key_name, None)
+                if key_index is not None and current_value is not None:
+                    key_index.discard(key_name)
+            else:
+                self._state[key_name] = previous_value
+                self._index_add(previous_value, key_name)
+                if key_index is not None and current_value is None:
+                    key_index.add(key_name)
+            if self._policy is not None:
+                self._track(key_name, current_value, previous_value)
+        for key_name, previous_deadline in expiry_log.items():
+            if previous_deadline is None:
+                self._expiry.pop(key_name, None)
+            else:
+                self._expiry[key_name] = previous_deadline
+                heapq.heappush(self._expiry_heap, (previous_deadline, key_name))
+        if self._policy is not None:
+            self._enforce_limits()
         return True
 
     def commit(self) -> bool:
         """
         Применяет изменения текущей транзакции к родительской.
+        Видимое состояние и индекс значений не меняются; журнал отката сливается
+        с журналом родителя, в котором сохраняется более раннее значение ключа.
+        Меньший из двух журналов вливается в больший, поэтому стоимость
+        пропорциональна min(изменено в транзакции, изменено в родителе).
         :return: True если изменения применены, False если активной транзакции нет
         """
-        if len(self._data) == 1:
+        if not self._undo_logs:
             return False
-        top_layer_changes = self._data.pop()
-        self._value_to_keys.pop()
-        for key_name, value_in_layer in top_layer_changes.items():
-            if value_in_layer is None:
-                self._data[-1][key_name] = None
-                for mapped_value in self._value_to_keys[-1]:
-                    self._value_to_keys[-1][mapped_value].discard(key_name)
-            else:
-                self._data[-1][key_name] = value_in_layer
-                self._value_to_keys[-1][value_in_layer].add(key_name)
+        undo_log = self._undo_logs.pop()
+        expiry_log = self._expiry_undo.pop()
+        if not self._undo_logs:
+            changes = [(key_name, self._state.get(key_name))
+                       for key_name, previous_value in undo_log.items()
+                       if self._state.get(key_name) != previous_value]
+            if self._listeners:
+                self._notify(changes)
+            if self._expiry_listeners:
+                self._notify_expiry(self._committed_expiry(changes, expiry_log))
+            # Ключи транзакции больше не закреплены: лимит проверяется сразу, как в rollback
+            if self._policy is not None:
+                self._enforce_limits()
+            return True
+        self._undo_logs[-1] = self._merge_logs(undo_log, self._undo_logs[-1])
+        if expiry_log:
+            self._expiry_undo[-1] = self._merge_logs(expiry_log, self._expiry_undo[-1])
+        return True
+
+    def ttl(self, key: str) -> float:
+        """
+        Возвращает оставшийся срок жизни ключа в секундах.
+        :param key: Ключ
+        :return: Секунды до истечения; -1, если срок не задан; -2, если ключа нет
+        """
+        normalized_key = self._normalize_key(key)
+        if self._expiry:
+            self._expire_if_due(normalized_key)
+        if normalized_key not in self._state:
+            return -2
+        deadline = self._expiry.get(normalized_key)
+        return -1 if deadline is None else deadline - self._clock()
+
+    def persist(self, key: str) -> bool:
+        """
+        Снимает срок жизни ключа.
+        :param key: Ключ
+        :return: True если срок был снят, False если ключа нет или срок не задан
+        """
+        normalized_key = self._normalize_key(key)
+        if not self._expiry or self._expire_if_due(normalized_key):
+            return False
+        if normalized_key not in self._expiry:
+            return False
+        self._set_expiry(normalized_key, None)
+        return True
+
+    def expire_at(self, key: str, deadline: float) -> bool:
+        """
+        Назначает существующему ключу момент истечения (по часам хранилища).
+        :param key: Ключ
+        :param deadline: Момент истечения
+        :return: True если срок назначен, False если ключа нет
+        """
+        normalized_key = self._normalize_key(key)
+        if normalized_key not in self._state:
+            return False
+        self._set_expiry(normalized_key, deadline)
         return True
 
+    def evict_expired(self, limit: Optional[int] = EVICTION_BATCH) -> int:
+        """
+        Удаляет истёкшие ключи, разбирая не более limit записей кучи сроков.
+        Вызывается при записи и периодически сервером, чтобы память освобождалась
+        без длинных пауз.
+        :param limit: Максимум записей кучи за вызов (None — все истёкшие)
+        :return: Количество удалённых ключей
+        """
+        heap = self._expiry_heap
+        if not heap:
+            return 0
+        now = self._clock()
+        evicted = 0
+        popped = 0
+        while heap and heap[0][0] <= now and (limit is None or popped < limit):
+            deadline, key_name = heapq.heappop(heap)
+            popped += 1
+            if self._expiry.get(key_name) == deadline:
+                self._evict(key_name)
+                evicted += 1
+        return evicted
+
     def end(self) -> None:
         """
         Завершает выполнение программы (выход).
         """
         raise KeyboardInterrupt('Завершение работы приложения по команде END')
 
-    def _current(self) -> Any:
+    def committed_buckets(self) -> Iterator[Tuple[str, Iterable[str]]]:
+        """
+        Перебирает зафиксированное состояние (без открытых транзакций),
+        сгруппированное по значениям: пары (значение, ключи).
+        Стоимость пропорциональна размеру хранилища плюс числу ключей в журналах отката.
+        """
+        overrides: Dict[str, Optional[str]] = {}
+        for undo_log in self._undo_logs:
+            for key_name, previous_value in undo_log.items():
+                overrides.setdefault(key_name, previous_value)
+        for value, keys in self._value_to_keys.items():
+            if not overrides:
+                yield value, keys
+            else:
+                yield value, [key_name for key_name in keys if key_name not in overrides]
+        restored: Dict[str, List[str]] = {}
+        for key_name, previous_value in overrides.items():
+            if previous_value is not None:
+                restored.setdefault(previous_value, []).append(key_name)
+        yield from restored.items()
+
+    def committed_deadlines(self) -> List[Tuple[str, float]]:
+        """
+        Сроки жизни зафиксированного состояния (без открытых транзакций).
+        Стоимость пропорциональна числу ключей со сроком плюс записям журналов отката сроков.
+        :return: Пары (нормализованный ключ, момент истечения)
+        """
+        overrides: Dict[str, Optional[float]] = {}
+        for expiry_log in self._expiry_undo:
+            for key_name, previous_deadline in expiry_log.items():
+                overrides.setdefault(key_name, previous_deadline)
+        deadlines = [(key_name, deadline) for key_name, deadline in self._expiry.items()
+                     if key_name not in overrides]
+        deadlines.extend((key_name, deadline) for key_name, deadline in overrides.items()
+                         if deadline is not None)
+        return deadlines
+
+    def load_buckets(self, buckets: Iterable[Tuple[str, List[str]]],
+                     deadlines: Iterable[Tuple[str, float]] = ()) -> int:
+        """
+        Заменяет содержимое хранилища ключами, сгруппированными по значениям.
+        Индекс значений строится целыми корзинами, а не отдельными вызовами set().
+        :param buckets: Пары (значение, нормализованные ключи); значение может повторяться
+        :param deadlines: Сроки жизни загруженных ключей: пары (нормализованный ключ,
+            момент истечения); перебираются после корзин, сроки ключей вне корзин пропускаются
+        :return: Количество загруженных ключей
+        :raises ValueError: если открыта транзакция
+        """
+        if self._undo_logs:
+            raise ValueError('Нельзя загрузить данные внутри транзакции')
+        state: Dict[str, str] = {}
+        canonical: Dict[str, str] = {}
+        grouped: Dict[str, List[str]] = {}
+        for value, keys in buckets:
+            if not keys:
+                continue
+            value = canonical.setdefault(value, value)
+            state.update(zip(keys, repeat(value)))
+            grouped.setdefault(value, []).extend(keys)
+        # Замороженные срезы остаются со старым словарём, который больше не меняется
+        with self._freeze_lock:
+            self._preimages = []
+        self._state = state
+        self._value_to_keys = {value: SortedList(keys) for value, keys in grouped.items()}
+        self._key_index = None
+        self._numeric_index = None
+        self._expiry = {key_name: deadline for key_name, deadline in deadlines if key_name in state}
+        self._expiry_heap = [(deadline, key_name) for key_name, deadline in self._expiry.items()]
+        heapq.heapify(self._expiry_heap)
+        if self._interned is not None:
+            self._interned = canonical
+        if self._listeners:
+            self._notify(None)
+        if self._policy is not None:
+            self._policy.clear()
+            self._used_bytes = 0
+            for normalized_key, value in state.items():
+                self._track(normalized_key, None, value)
+            self._enforce_limits()
+        return len(state)
+
+    def freeze(self) -> FrozenState:
+        """
+        Замораживает зафиксированное состояние (без открытых транзакций) для фонового
+        сохранения или выгрузки. Стоимость — массив ссылок на ключи плюс число ключей
+        в журналах отката; запись продолжается, и каждый изменённый ключ один раз
+        сохраняет прежнее значение, пока срез не закрыт.
+        Срезы независимы: каждый открытый срез запоминает прежние значения отдельно,
+        поэтому запись стоит на одно сохранение больше за каждый открытый срез.
+        :return: Срез; его нужно закрыть (close), иначе прежние значения копятся
+        """
+        preimages: Dict[str, Optional[str]] = {}
+        for undo_log in self._undo_logs:
+            for key_name, previous_value in undo_log.items():
+                preimages.setdefault(key_name, previous_value)
+        with self._freeze_lock:
+            self._preimages = self._preimages + [preimages]
+
+        def release() -> None:
+            # После load_buckets словаря среза в списке уже нет
+            with self._freeze_lock:
+                self._preimages = [open_preimages for open_preimages in self._preimages
+                                   if open_preimages is not preimages]
+        return FrozenState(self._state, preimages, release, self.committed_deadlines())
+
+    def add_listener(self, listener: ChangeListener) -> None:
+        """
+        Подписывает слушателя на изменения зафиксированного состояния:
+        SET/UNSET вне транзакций, COMMIT транзакции верхнего уровня и загрузку данных.
+        Изменения внутри незафиксированных транзакций слушателям не передаются.
+        :param listener: Слушатель изменений
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: ChangeListener) -> None:
+        """
+        Отписывает слушателя изменений.
+        :param listener: Слушатель изменений
+        """
+        self._listeners.remove(listener)
+
+    def add_expiry_listener(self, listener: ExpiryListener) -> None:
+        """
+        Подписывает слушателя на зафиксированные сроки жизни: назначение и снятие срока
+        вне транзакций и при COMMIT верхнего уровня. Изменение значения, о котором слушатели
+        изменений узнают раньше, снимает срок; новый срок ключа приходит после его значения.
+        Замена содержимого (load_buckets) передаётся только слушателям изменений.
+        :param listener: Слушатель сроков
+        """
+        self._expiry_listeners.append(listener)
+
+    def remove_expiry_listener(self, listener: ExpiryListener) -> None:
+        """
+        Отписывает слушателя сроков жизни.
+        :param listener: Слушатель сроков
+        """
+        self._expiry_listeners.remove(listener)
+
+    def _notify_expiry(self, deadlines: List[Tuple[str, Optional[float]]]) -> None:
+        """
+        Передаёт зафиксированные сроки жизни слушателям сроков.
+        :param deadlines: Пары (ключ, момент истечения или None)
+        """
+        if not deadlines:
+            return
+        for listener in self._expiry_listeners:
+            listener(deadlines)
+
+    def _committed_expiry(self, changes: List[Tuple[str, Optional[str]]],
+                          expiry_log: Dict[str, Optional[float]]) -> List[Tuple[str, Optional[float]]]:
         """
-        Возвращает текущий слой данных и отображение значений.
+        Сроки, зафиксированные COMMIT верхнего уровня: изменённые в транзакции и сроки ключей
+        с новым значением (изменение значения снимает срок у слушателя).
+        :param changes: Зафиксированные изменения значений
+        :param expiry_log: Журнал отката сроков транзакции
         """
-        return self._data[-1], self._value_to_keys[-1]
+        expiry = self._expiry
+        deadlines = [(key_name, expiry.get(key_name)) for key_name, previous_deadline in expiry_log.items()
+                     if expiry.get(key_name) != previous_deadline]
+        reported = {key_name for key_name, _ in deadlines}
+        deadlines.extend((key_name, expiry[key_name]) for key_name, value in changes
+                         if value is not None and key_name in expiry and key_name not in reported)
+        return deadlines
 
-    def _get_from_layers(self, normalized_key: str) -> Optional[str]:
+    def _notify(self, changes: Optional[List[Tuple[str, Optional[str]]]]) -> None:
+        """
+        Передаёт зафиксированные изменения всем слушателям.
+        :param changes: Пары (ключ, значение или None) либо None при полной замене данных
         """
-        Ищет значение ключа во всех слоях транзакций (ключ должен быть уже нормализован).
-        :param normalized_key: Нормализованный ключ (нижний регистр)
-        :return: Значение или None
+        if changes is not None and not changes:
+            return
+        for listener in self._listeners:
+            listener(changes)
+
+    @property
+    def transaction_depth(self) -> int:
+        """
+        Количество открытых (вложенных) транзакций.
+        """
+        return len(self._undo_logs)
+
+    def _write_many(self, items: List[Tuple[str, Optional[str]]]
+                    ) -> Tuple[List[Optional[str]], List[Tuple[str, Optional[str]]]]:
+        """
+        Применяет изменения по порядку (повторы ключа допускаются), затем обновляет
+        индекс значений, журнал отката и слушателей по итоговому изменению каждого ключа.
+        Как и SET/UNSET, снимает TTL с записанных ключей.
+        :param items: Пары (нормализованный ключ, значение или None для удаления)
+        :return: (прежние значения для каждой пары, фактически применённые изменения)
+        """
+        if self._expiry_heap:
+            for normalized_key, _ in items:
+                self._expire_if_due(normalized_key)
+            self.evict_expired()
+        if self._expiry:
+            for normalized_key, _ in items:
+                if normalized_key in self._expiry:
+                    self._set_expiry(normalized_key, None)
+        state = self._state
+        interned = self._interned
+        preimages = self._preimages
+        batch_values: Dict[str, str] = {}
+        old_values: List[Optional[str]] = []
+        originals: Dict[str, Optional[str]] = {}
+        for normalized_key, value in items:
+            if interned is not None and value is not None:
+                canonical = interned.get(value)
+                value = batch_values.setdefault(value, value) if canonical is None else canonical
+            old_value = state.get(normalized_key)
+            old_values.append(old_value)
+            originals.setdefault(normalized_key, old_value)
+            if preimages:
+                self._keep_preimage(normalized_key, old_value)
+            if value is None:
+                state.pop(normalized_key, None)
+            else:
+                state[normalized_key] = value
+        removed: Dict[str, List[str]] = {}
+        added: Dict[str, List[str]] = {}
+        applied: List[Tuple[str, Optional[str]]] = []
+        new_keys: List[str] = []
+        gone_keys: List[str] = []
+        for normalized_key, original_value in originals.items():
+            final_value = state.get(normalized_key)
+            if final_value == original_value:
+                continue
+            if original_value is not None:
+                removed.setdefault(original_value, []).append(normalized_key)
+            else:
+                new_keys.append(normalized_key)
+            if final_value is not None:
+                added.setdefault(final_value, []).append(normalized_key)
+            else:
+                gone_keys.append(normalized_key)
+            applied.append((normalized_key, final_value))
+        if self._key_index is not None:
+            self._key_index.difference_update(gone_keys)
+            self._key_index.update(new_keys)
+        value_to_keys = self._value_to_keys
+        numeric_index = self._numeric_index
+        if numeric_index is not None:
+            for value, keys in removed.items():
+                numeric_index.discard(value, keys)
+            for value, keys in added.items():
+                numeric_index.add(value, keys)
+        for value, keys in removed.items():
+            bucket = value_to_keys[value]
+            bucket.difference_update(keys)
+            if not bucket:
+                del value_to_keys[value]
+                if interned is not None:
+                    del interned[value]
+        for value, keys in added.items():
+            bucket = value_to_keys.get(value)
+            if bucket is None:
+                value_to_keys[value] = SortedList(keys)
+                if interned is not None:
+                    interned[value] = value
+            else:
+                bucket.update(keys)
+        if self._undo_logs:
+            undo_log = self._undo_logs[-1]
+            for normalized_key, _ in applied:
+                undo_log.setdefault(normalized_key, originals[normalized_key])
+        elif self._listeners:
+            self._notify(applied)
+        if self._policy is not None:
+            for normalized_key, final_value in applied:
+                self._track(normalized_key, originals[normalized_key], final_value)
+            self._enforce_limits()
+        return old_values, applied
+
+    def _remove(self, normalized_key: str) -> Optional[str]:
+        """
+        Удаляет ключ со снятием TTL, журналом отката и уведомлением слушателей.
+        :param normalized_key: Нормализованный ключ
+        :return: Удалённое значение или None
+        """
+        if self._expiry and normalized_key in self._expiry:
+            self._set_expiry(normalized_key, None)
+        old_value = self._state.get(normalized_key)
+        if old_value is None:
+            return None
+        if self._preimages:
+            self._keep_preimage(normalized_key, old_value)
+        del self._state[normalized_key]
+        self._index_discard(old_value, normalized_key)
+        if self._key_index is not None:
+            self._key_index.discard(normalized_key)
+        if self._undo_logs:
+            self._undo_logs[-1].setdefault(normalized_key, old_value)
+        elif self._listeners:
+            self._notify([(normalized_key, None)])
+        if self._policy is not None:
+            self._track(normalized_key, old_value, None)
+        return old_value
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Показатели для STATS: число ключей и корзин индекса значений, ключей со сроком жизни,
+        глубина транзакций и записи журналов отката, размеры ленивых индексов, вытеснения.
+        """
+        return {
+            'keys': len(self._state),
+            'value_buckets': len(self._value_to_keys),
+            'expiring_keys': len(self._expiry),
+            'transaction_depth': len(self._undo_logs),
+            'undo_entries': sum(len(undo_log) for undo_log in self._undo_logs),
+            'key_index_size': 0 if self._key_index is None else len(self._key_index),
+            'numeric_index_size': 0 if self._numeric_index is None else len(self._numeric_index),
+            'evictions': self.evictions,
+            'frozen_changes': sum(len(preimages) for preimages in self._preimages),
+        }
+
+    @property
+    def used_bytes(self) -> int:
+        """
+        Приблизительный объём памяти под ключи (учитывается только при заданном лимите).
+        """
+        return self._used_bytes
+
+    def _track(self, normalized_key: str, old_value: Optional[str],
+               new_value: Optional[str]) -> None:
+        """
+        Обновляет учёт политики вытеснения и оценку памяти после изменения ключа.
+        :param normalized_key: Нормализованный ключ
+        :param old_value: Значение до изменения (None — ключа не было)
+        :param new_value: Значение после изменения (None — ключ удалён)
+        """
+        policy = self._policy
+        if old_value is None:
+            if new_value is None:
+                return
+            policy.insert(normalized_key)
+            self._used_bytes += len(normalized_key) + ENTRY_OVERHEAD
+        elif new_value is None:
+            policy.remove(normalized_key)
+            self._used_bytes -= len(normalized_key) + ENTRY_OVERHEAD + len(old_value)
+            return
+        else:
+            policy.touch(normalized_key)
+            self._used_bytes -= len(old_value)
+        self._used_bytes += len(new_value)
+
+    def _over_limit(self) -> bool:
+        """
+        Превышен ли лимит количества ключей или памяти.
+        """
+        return (self.max_keys is not None and len(self._state) > self.max_keys
+                or self.max_bytes is not None and self._used_bytes > self.max_bytes)
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> None:
+        """
+        Вытесняет ключи, пока хранилище превышает лимит. Ключи из журналов открытых
+        транзакций не трогаются; если вытеснить больше нечего, лимит временно превышен.
+        :param keep: Только что записанный ключ, который не вытесняется
+        """
+        if not self._over_limit():
+            return
+        pinned = self._pinned(keep)
+        while self._over_limit():
+            victim = self._policy.victim(pinned)
+            if victim is None:
+                logger.debug('Лимит хранилища превышен: все ключи заняты открытыми транзакциями')
+                return
+            self._evict_for_memory(victim)
+
+    def evict_one(self, keep: Optional[str] = None) -> bool:
+        """
+        Вытесняет один ключ политикой вытеснения независимо от собственного лимита:
+        для лимита, общего для нескольких хранилищ (полосы StripedStore).
+        :param keep: Нормализованный ключ, который не вытесняется
+        :return: False, если лимитов нет или вытеснить нечего
+        """
+        if self._policy is None:
+            return False
+        victim = self._policy.victim(self._pinned(keep))
+        if victim is None:
+            return False
+        self._evict_for_memory(victim)
+        return True
+
+    def touch_keys(self, normalized_keys: Iterable[str]) -> None:
+        """
+        Отмечает для политики вытеснения обращения, прочитанные в обход get
+        (StripedStore читает без блокировки и передаёт обращения порциями).
+        Удалённые с тех пор ключи пропускаются.
+        :param normalized_keys: Нормализованные ключи
+        """
+        if self._policy is None:
+            return
+        state = self._state
+        touch = self._policy.touch
+        for normalized_key in normalized_keys:
+            if normalized_key in state:
+                touch(normalized_key)
+
+    def _pinned(self, keep: Optional[str]) -> PinnedCheck:
+        """
+        Предикат невытесняемых ключей: keep и ключи из журналов открытых транзакций.
+        :param keep: Нормализованный ключ, который не вытесняется
+        """
+        undo_logs = self._undo_logs
+        expiry_undo = self._expiry_undo
+
+        def pinned(key_name: str) -> bool:
+            return key_name == keep or any(key_name in log for log in undo_logs) \
+                or any(key_name in log for log in expiry_undo)
+        return pinned
+
+    def _evict_for_memory(self, normalized_key: str) -> None:
+        """
+        Вытесняет ключ, не упомянутый в журналах открытых транзакций. Его значение
+        совпадает с зафиксированным, поэтому удаление сразу уходит слушателям.
+        :param normalized_key: Нормализованный ключ
+        """
+        if self._preimages:
+            self._keep_preimage(normalized_key, self._state[normalized_key])
+        old_value = self._state.pop(normalized_key)
+        self._index_discard(old_value, normalized_key)
+        if self._key_index is not None:
+            self._key_index.discard(normalized_key)
+        if self._expiry.pop(normalized_key, None) is not None and not self._expiry:
+            self._expiry_heap.clear()
+        self._track(normalized_key, old_value, None)
+        self.evictions += 1
+        if self._listeners:
+            self._notify([(normalized_key, None)])
+
+    def _keep_preimage(self, normalized_key: str, value: Optional[str]) -> None:
+        """
+        Запоминает зафиксированное значение ключа перед первым изменением
+        в каждом открытом замороженном срезе.
+        :param normalized_key: Нормализованный ключ
+        :param value: Значение до изменения (None — ключа не было)
+        """
+        for preimages in self._preimages:
+            preimages.setdefault(normalized_key, value)
+
+    def _lookup(self, normalized_key: str) -> Optional[str]:
+        """
+        Значение нормализованного ключа с ленивой проверкой срока жизни.
+        :param normalized_key: Нормализованный ключ
+        """
+        if self._expiry:
+            self._expire_if_due(normalized_key)
+        return self._state.get(normalized_key)
+
+    def _expiry_of(self, normalized_key: str) -> Optional[float]:
+        """
+        Момент истечения ключа или None, если срок не задан.
+        :param normalized_key: Нормализованный ключ
+        """
+        return self._expiry.get(normalized_key)
+
+    def _expire_if_due(self, normalized_key: str) -> bool:
+        """
+        Удаляет ключ, если его срок жизни истёк.
+        :param normalized_key: Нормализованный ключ
+        :return: True если ключ был удалён
+        """
+        deadline = self._expiry.get(normalized_key)
+        if deadline is None or deadline > self._clock():
+            return False
+        self._evict(normalized_key)
+        return True
+
+    def _evict(self, normalized_key: str) -> None:
+        """
+        Удаляет истёкший ключ как UNSET: внутри транзакции удаление попадает в журнал
+        отката, вне транзакции — к слушателям.
+        :param normalized_key: Нормализованный ключ
+        """
+        self._remove(normalized_key)
+
+    def _evict_all_due(self) -> None:
+        """
+        Удаляет все уже истёкшие ключи (перед COUNTS/FIND). Работа пропорциональна
+        числу ключей, истёкших с прошлой очистки, и выполняется для каждого ключа один раз.
+        """
+        if self._expiry_heap[0][0] <= self._clock():
+            self.evict_expired(None)
+
+    def _set_expiry(self, normalized_key: str, deadline: Optional[float]) -> None:
+        """
+        Устанавливает или снимает срок жизни ключа с записью в журнал отката транзакции,
+        а вне транзакции — с уведомлением слушателей сроков.
+        :param normalized_key: Нормализованный ключ
+        :param deadline: Момент истечения или None
+        """
+        previous_deadline = self._expiry.get(normalized_key)
+        if previous_deadline == deadline:
+            return
+        if self._expiry_undo:
+            self._expiry_undo[-1].setdefault(normalized_key, previous_deadline)
+        elif self._expiry_listeners:
+            self._notify_expiry([(normalized_key, deadline)])
+        if deadline is None:
+            del self._expiry[normalized_key]
+            if not self._expiry:
+                self._expiry_heap.clear()
+            return
+        self._expiry[normalized_key] = deadline
+        heap = self._expiry_heap
+        heapq.heappush(heap, (deadline, normalized_key))
+        if len(heap) > 2 * len(self._expiry) + EVICTION_BATCH:
+            self._expiry_heap = [(when, name) for name, when in self._expiry.items()]
+            heapq.heapify(self._expiry_heap)
+
+    @staticmethod
+    def _merge_logs(child_log: Dict, parent_log: Dict) -> Dict:
+        """
+        Сливает журнал отката вложенной транзакции с журналом родителя: сохраняется
+        более раннее (родительское) значение. Меньший журнал вливается в больший,
+        поэтому стоимость пропорциональна размеру меньшего.
+        :return: Объединённый журнал для родителя
+        """
+        if len(child_log) > len(parent_log):
+            child_log.update(parent_log)
+            return child_log
+        for key_name, previous_value in child_log.items():
+            parent_log.setdefault(key_name, previous_value)
+        return parent_log
+
+    def _index_add(self, value: str, normalized_key: str) -> None:
+        """
+        Добавляет ключ в корзину индекса для значения.
+        :param value: Значение
+        :param normalized_key: Нормализованный ключ
+        """
+        keys = self._value_to_keys.get(value)
+        if keys is None:
+            keys = self._value_to_keys[value] = SortedList()
+            if self._interned is not None:
+                self._interned[value] = value
+        keys.add(normalized_key)
+        if self._numeric_index is not None:
+            self._numeric_index.add(value, (normalized_key,))
+
+    def _index_discard(self, value: str, normalized_key: str) -> None:
+        """
+        Удаляет ключ из корзины индекса; пустая корзина удаляется целиком.
+        :param value: Значение
+        :param normalized_key: Нормализованный ключ
         """
-        for layer in reversed(self._data):
-            if normalized_key in layer:
-                return layer[normalized_key]
-        return None
+        keys = self._value_to_keys.get(value)
+        if keys is None:
+            return
+        keys.discard(normalized_key)
+        if self._numeric_index is not None:
+            self._numeric_index.discard(value, (normalized_key,))
+        if not keys:
+            del self._value_to_keys[value]
+            if self._interned is not None:
+                del self._interned[value]
 
-    def _resolved_state(self) -> Dict[str, Optional[str]]:
+    def _numbers(self) -> NumericIndex:
         """
-        Строит итоговое видимое состояние: для каждого ключа берётся первое встреченное
-        сверху вниз значение (включая метку удаления None). Ключи нормализованы.
-        :return: Отображение ключ -> итоговое значение (или None)
+        Индекс числовых значений; при первом обращении строится по корзинам индекса значений.
         """
-        resolved: Dict[str, Optional[str]] = {}
-        for layer in reversed(self._data):
-            for key_name, value_in_layer in layer.items():
-                if key_name not in resolved:
-                    resolved[key_name] = value_in_layer
-        return resolved
+        if self._numeric_index is None:
+            self._numeric_index = NumericIndex(self._value_to_keys.items())
+        return self._numeric_index
 
     def _normalize_key(self, key: str) -> str:
         """
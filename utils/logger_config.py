@@ -1,4 +1,111 @@
+import json
 import logging
+import os
+import sys
+from typing import Optional, TextIO
 
-logging.basicConfig(level=logging.INFO, format='%(message)s')
-logger = logging.getLogger(__name__)
+# Переменные окружения с настройками журнала (аргументы командной строки важнее)
+LOG_LEVEL_ENV = 'KVSTORE_LOG_LEVEL'
+LOG_FILE_ENV = 'KVSTORE_LOG_FILE'
+LOG_FORMAT_ENV = 'KVSTORE_LOG_FORMAT'
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+LOG_FORMATS = ('text', 'json')
+DEFAULT_LOG_LEVEL = 'INFO'
+DEFAULT_LOG_FORMAT = 'text'
+
+# Журнал приложения. Пока configure_logging не вызван, записи передаются обработчикам
+# корневого логгера встраивающего приложения (своего обработчика у библиотеки нет).
+# Сообщения передаются шаблоном с аргументами: форматирование выполняется только
+# для записей, прошедших фильтр уровня.
+logger = logging.getLogger('kvstore')
+logger.addHandler(logging.NullHandler())
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Структурированный формат: одна запись — один JSON-объект в строке.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'time': round(record.created, 6), 'level': record.levelname,
+                 'logger': record.name, 'message': record.getMessage()}
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(level: Optional[str] = None, destination: Optional[str] = None,
+                      fmt: Optional[str] = None) -> None:
+    """
+    Настраивает журнал приложения; незаданные параметры берутся из переменных окружения
+    KVSTORE_LOG_LEVEL, KVSTORE_LOG_FILE и KVSTORE_LOG_FORMAT, затем — значения по умолчанию.
+    Повторный вызов заменяет обработчик.
+    :param level: Уровень (DEBUG, INFO, WARNING, ERROR)
+    :param destination: Файл журнала; по умолчанию stderr
+    :param fmt: Формат записей: text (только сообщение) или json
+    """
+    level = (level or os.environ.get(LOG_LEVEL_ENV) or DEFAULT_LOG_LEVEL).upper()
+    destination = destination or os.environ.get(LOG_FILE_ENV)
+    fmt = (fmt or os.environ.get(LOG_FORMAT_ENV) or DEFAULT_LOG_FORMAT).lower()
+    if level not in LOG_LEVELS:
+        raise ValueError(f'Неизвестный уровень журнала: {level}')
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f'Неизвестный формат журнала: {fmt}')
+    handler: logging.Handler
+    if destination:
+        handler = logging.FileHandler(destination, encoding='utf-8')
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter('%(message)s'))
+    for old_handler in logger.handlers[:]:
+        logger.removeHandler(old_handler)
+        old_handler.close()
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+class Console:
+    """
+    Канал для человека за терминалом: приглашение ввода и справка. Отделён от журнала,
+    чтобы не смешиваться с записями (и JSON-форматом) и не зависеть от уровня журнала.
+    По умолчанию выключен; main включает его только в интерактивном режиме, поэтому
+    в пакетном режиме и на сервере приглашения и справка не выводятся.
+    """
+
+    def __init__(self) -> None:
+        self.stream: Optional[TextIO] = None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Выводится ли что-нибудь.
+        """
+        return self.stream is not None
+
+    def enable(self, stream: Optional[TextIO] = None) -> None:
+        """
+        Включает вывод.
+        :param stream: Поток вывода (по умолчанию stderr, чтобы не смешиваться с ответами в stdout)
+        """
+        self.stream = stream if stream is not None else sys.stderr
+
+    def disable(self) -> None:
+        """
+        Выключает вывод.
+        """
+        self.stream = None
+
+    def write(self, text: str) -> None:
+        """
+        Выводит строку текста, если канал включён.
+        :param text: Текст без завершающего перевода строки
+        """
+        stream = self.stream
+        if stream is not None:
+            stream.write(f'{text}\n')
+            stream.flush()
+
+
+console = Console()
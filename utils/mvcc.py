@@ -0,0 +1,458 @@
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.frozen_state import FrozenState
+from utils.key_value_store import KeyValueStore
+from utils.numeric_index import NumericEntry, merge_overlay_range, number_in_range
+from utils.session import Session, merge_overlay_find, merge_overlay_page
+
+# Прежняя версия ключа: (номер фиксации, перезаписавшей значение; значение до неё или None)
+VersionEntry = Tuple[int, Optional[str]]
+
+
+class CommitConflict(ValueError):
+    """
+    COMMIT отклонён: ключи транзакции изменены другой сессией после начала её снимка.
+    """
+
+    def __init__(self, keys: List[str]) -> None:
+        self.keys = keys
+        super().__init__(f"ключи изменены другой сессией: {', '.join(keys)}")
+
+
+class VersionedStore:
+    """
+    Многоверсионная надстройка над KeyValueStore для изоляции снимков (snapshot isolation).
+
+    Текущие значения хранятся в KeyValueStore как обычно; каждая фиксация (SET/UNSET вне
+    транзакции или COMMIT сессии) увеличивает глобальный счётчик version. Пока открыт хотя
+    бы один снимок, для изменённых ключей сохраняется история прежних значений
+    (ключ -> [(номер фиксации, значение до неё)]) и номер последней фиксации ключа.
+    Чтение в снимке — O(1) для ключей без истории и O(длина истории) для изменённых после
+    начала самого старого снимка; хранилище не копируется.
+
+    Конфликты разрешаются по правилу «первый зафиксировавший побеждает»: COMMIT отклоняется,
+    если какой-либо его ключ зафиксирован другой сессией после начала снимка.
+    История, не нужная ни одному открытому снимку, удаляется в порядке фиксаций
+    при закрытии самого старого снимка.
+
+    Сроки жизни и вытеснение по лимиту не версионируются: истёкший или вытесненный ключ
+    пропадает из всех снимков сразу.
+    """
+
+    def __init__(self, store: KeyValueStore) -> None:
+        """
+        Инициализация.
+        :param store: Хранилище текущих значений (без собственных открытых транзакций)
+        _history — прежние значения ключей в порядке фиксаций; _last_write — номер последней
+        фиксации ключа; _log — (номер фиксации, ключ) в порядке записи в историю, для сборки
+        мусора; _snapshots — номер версии -> количество открытых снимков на ней;
+        _reset_version — номер фиксации последней полной замены данных (LOAD).
+        """
+        self.store = store
+        self.version = 0
+        self._history: Dict[str, List[VersionEntry]] = {}
+        self._last_write: Dict[str, int] = {}
+        self._log: Deque[Tuple[int, str]] = deque()
+        self._snapshots: Counter = Counter()
+        self._reset_version = 0
+
+    def open_snapshot(self) -> int:
+        """
+        Открывает снимок на текущей версии.
+        :return: Номер версии снимка
+        """
+        self._snapshots[self.version] += 1
+        return self.version
+
+    def close_snapshot(self, version: int) -> None:
+        """
+        Закрывает снимок и удаляет историю, которая больше никому не нужна.
+        :param version: Номер версии снимка
+        """
+        self._snapshots[version] -= 1
+        if self._snapshots[version]:
+            return
+        del self._snapshots[version]
+        self._collect_garbage()
+
+    @property
+    def history_size(self) -> int:
+        """
+        Количество хранимых прежних версий ключей.
+        """
+        return len(self._log)
+
+    def read(self, normalized_key: str, version: int) -> Optional[str]:
+        """
+        Значение ключа на момент версии.
+        :param normalized_key: Нормализованный ключ
+        :param version: Номер версии снимка
+        """
+        entries = self._history.get(normalized_key)
+        if entries is not None:
+            for write_version, previous_value in entries:
+                if write_version > version:
+                    return previous_value
+        return self.store._lookup(normalized_key)
+
+    def changed_since(self, version: int) -> Iterator[str]:
+        """
+        Ключи, зафиксированные после версии (по сохранённой истории).
+        :param version: Номер версии снимка
+        """
+        for normalized_key, entries in self._history.items():
+            if entries[-1][0] > version:
+                yield normalized_key
+
+    def write(self, changes: List[Tuple[str, Optional[str]]],
+              since: Optional[int] = None) -> List[Tuple[str, Optional[str]]]:
+        """
+        Фиксирует изменения одной версией.
+        :param changes: Пары (нормализованный ключ, значение или None)
+        :param since: Версия снимка транзакции для проверки конфликтов (None — без проверки)
+        :return: Фактически применённые изменения
+        :raises CommitConflict: если ключ зафиксирован другой сессией после since
+        """
+        if since is not None:
+            if since < self._reset_version:
+                raise CommitConflict(['*'])
+            conflicts = sorted(normalized_key for normalized_key, _ in changes
+                               if self._last_write.get(normalized_key, 0) > since)
+            if conflicts:
+                raise CommitConflict(conflicts)
+        previous = [(normalized_key, self.store._lookup(normalized_key))
+                    for normalized_key, _ in changes]
+        applied = self.store.apply_changes(changes)
+        if applied:
+            self._record(dict(reversed(previous)), [normalized_key for normalized_key, _ in applied])
+        return applied
+
+    def reset(self, buckets: Iterable[Tuple[str, List[str]]],
+              deadlines: Iterable[Tuple[str, float]] = ()) -> int:
+        """
+        Заменяет содержимое хранилища. Снимки после этого видят новые данные,
+        а транзакции, начатые до замены, не смогут зафиксироваться.
+        :param buckets: Пары (значение, ключи)
+        :param deadlines: Сроки жизни: пары (ключ, момент истечения)
+        :return: Количество загруженных ключей
+        """
+        loaded = self.store.load_buckets(buckets, deadlines)
+        self.version += 1
+        self._reset_version = self.version
+        self._history.clear()
+        self._last_write.clear()
+        self._log.clear()
+        return loaded
+
+    def _record(self, previous: Dict[str, Optional[str]], keys: List[str]) -> None:
+        """
+        Назначает изменениям новую версию и, если открыты снимки, сохраняет прежние значения.
+        :param previous: Ключ -> значение до фиксации
+        :param keys: Изменённые ключи
+        """
+        self.version += 1
+        if not self._snapshots:
+            return
+        version = self.version
+        for normalized_key in keys:
+            self._history.setdefault(normalized_key, []).append(
+                (version, previous[normalized_key]))
+            self._last_write[normalized_key] = version
+            self._log.append((version, normalized_key))
+
+    def _collect_garbage(self) -> None:
+        """
+        Удаляет версии, зафиксированные не позже самого старого открытого снимка:
+        этот и более новые снимки их уже видят как текущие.
+        """
+        if not self._snapshots:
+            self._history.clear()
+            self._last_write.clear()
+            self._log.clear()
+            return
+        oldest = min(self._snapshots)
+        log = self._log
+        while log and log[0][0] <= oldest:
+            version, normalized_key = log.popleft()
+            entries = self._history[normalized_key]
+            entries.pop(0)
+            if not entries:
+                del self._history[normalized_key]
+            if self._last_write.get(normalized_key) == version:
+                del self._last_write[normalized_key]
+
+
+class SnapshotView:
+    """
+    Зафиксированное состояние VersionedStore глазами одной сессии: внутри транзакции —
+    на момент её начала, вне транзакции — текущее. Поддерживает интерфейс хранилища,
+    который использует Session, поэтому сессия работает поверх него без изменений.
+    """
+
+    def __init__(self, versioned: VersionedStore) -> None:
+        """
+        :param versioned: Многоверсионное хранилище
+        """
+        self.versioned = versioned
+        self.version: Optional[int] = None
+        self._clock = versioned.store._clock
+        self._normalize_key = versioned.store._normalize_key
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[str]:
+        normalized_key = self._normalize_key(key)
+        old_value = self._lookup(normalized_key)
+        self.versioned.write([(normalized_key, value)])
+        if ttl is not None:
+            self.versioned.store.expire_at(normalized_key, self._clock() + ttl)
+        return old_value
+
+    def get(self, key: str) -> str:
+        value = self._lookup(self._normalize_key(key))
+        return value if value is not None else 'NULL'
+
+    def unset(self, key: str) -> Optional[str]:
+        normalized_key = self._normalize_key(key)
+        old_value = self._lookup(normalized_key)
+        self.versioned.write([(normalized_key, None)])
+        return old_value
+
+    def ttl(self, key: str) -> float:
+        normalized_key = self._normalize_key(key)
+        if self.version is None:
+            return self.versioned.store.ttl(key)
+        if self._lookup(normalized_key) is None:
+            return -2
+        deadline = self._expiry_of(normalized_key)
+        return -1 if deadline is None else deadline - self._clock()
+
+    def persist(self, key: str) -> bool:
+        return self.versioned.store.persist(key)
+
+    def expire_at(self, key: str, deadline: float) -> bool:
+        return self.versioned.store.expire_at(key, deadline)
+
+    def mset(self, pairs: Iterable[Tuple[str, str]]) -> List[Optional[str]]:
+        changes = [(self._normalize_key(key), value) for key, value in pairs]
+        return self._write_many(changes)
+
+    def mget(self, keys: Iterable[str]) -> List[str]:
+        return [self.get(key) for key in keys]
+
+    def munset(self, keys: Iterable[str]) -> List[Optional[str]]:
+        return self._write_many([(self._normalize_key(key), None) for key in keys])
+
+    def apply_changes(self, changes: Iterable[Tuple[str, Optional[str]]]
+                      ) -> List[Tuple[str, Optional[str]]]:
+        """
+        Фиксирует изменения сессии с проверкой конфликтов относительно её снимка.
+        :raises CommitConflict: если ключи изменены другой сессией после начала снимка
+        """
+        return self.versioned.write(list(changes), self.version)
+
+    def counts(self, value: str) -> int:
+        """
+        Количество ключей с данным значением в снимке.
+        Стоимость — O(1) плюс число ключей, изменённых после начала снимка.
+        """
+        count = self.versioned.store.counts(value)
+        if self.version is None:
+            return count
+        for normalized_key in self.versioned.changed_since(self.version):
+            if self.versioned.store._lookup(normalized_key) == value:
+                count -= 1
+            if self._lookup(normalized_key) == value:
+                count += 1
+        return count
+
+    def find(self, value: str) -> List[str]:
+        """
+        Ключи с данным значением в снимке, отсортированные.
+        """
+        if self.version is None:
+            return self.versioned.store.find(value)
+        keys = set(self.versioned.store.find(value))
+        for normalized_key in self.versioned.changed_since(self.version):
+            if self._lookup(normalized_key) == value:
+                keys.add(normalized_key)
+            else:
+                keys.discard(normalized_key)
+        return sorted(keys)
+
+    def find_page(self, value: str, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Страница ключей с данным значением в снимке: ключи, изменённые после начала снимка,
+        сливаются с корзиной текущего индекса по их значению в снимке.
+        """
+        store = self.versioned.store
+        if self.version is None:
+            return store.find_page(value, limit, after)
+        return merge_overlay_find(store.find_page, list(self.versioned.changed_since(self.version)),
+                                  self._lookup, self._normalize_key, value, limit, after)
+
+    def iter_find(self, value: str, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        while True:
+            page = self.find_page(value, chunk_size, after)
+            if not page:
+                return
+            yield page
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def counts_range(self, lo: float, hi: float) -> int:
+        """
+        Количество ключей с числовым значением в [lo, hi] в снимке.
+        Стоимость — O(log n) плюс число ключей, изменённых после начала снимка.
+        """
+        store = self.versioned.store
+        count = store.counts_range(lo, hi)
+        if self.version is None:
+            return count
+        for normalized_key in self.versioned.changed_since(self.version):
+            if number_in_range(store._lookup(normalized_key), lo, hi) is not None:
+                count -= 1
+            if number_in_range(self._lookup(normalized_key), lo, hi) is not None:
+                count += 1
+        return count
+
+    def find_range_page(self, lo: float, hi: float, limit: Optional[int] = None,
+                        after: Optional[NumericEntry] = None) -> List[NumericEntry]:
+        store = self.versioned.store
+        if self.version is None:
+            return store.find_range_page(lo, hi, limit, after)
+        return merge_overlay_range(store.find_range_page, self.versioned.changed_since(self.version),
+                                   store._lookup, self._lookup, lo, hi, limit, after)
+
+    def iter_find_range(self, lo: float, hi: float, chunk_size: int = 1000) -> Iterator[List[str]]:
+        after = None
+        while True:
+            page = self.find_range_page(lo, hi, chunk_size, after)
+            if not page:
+                return
+            yield [key_name for _, key_name in page]
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def scan_page(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Страница ключей из диапазона в снимке: ключи, изменённые после начала снимка,
+        сливаются с текущим упорядоченным индексом по их значению в снимке.
+        """
+        store = self.versioned.store
+        if self.version is None:
+            return store.scan_page(prefix, start, end, limit, after)
+        return merge_overlay_page(store.scan_page, list(self.versioned.changed_since(self.version)),
+                                  lambda key_name: self._lookup(key_name) is not None,
+                                  self._normalize_key, prefix, start, end, limit, after)
+
+    def iter_scan(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        while True:
+            page = self.scan_page(prefix, start, end, chunk_size, after)
+            if not page:
+                return
+            yield page
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def committed_buckets(self) -> Iterator[Tuple[str, Iterable[str]]]:
+        return self.versioned.store.committed_buckets()
+
+    def committed_deadlines(self) -> List[Tuple[str, float]]:
+        return self.versioned.store.committed_deadlines()
+
+    def freeze(self) -> FrozenState:
+        return self.versioned.store.freeze()
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.versioned.store.stats()
+        stats['history_versions'] = self.versioned.history_size
+        stats['open_snapshots'] = sum(self.versioned._snapshots.values())
+        return stats
+
+    def load_buckets(self, buckets: Iterable[Tuple[str, List[str]]],
+                     deadlines: Iterable[Tuple[str, float]] = ()) -> int:
+        return self.versioned.reset(buckets, deadlines)
+
+    def evict_expired(self) -> int:
+        return self.versioned.store.evict_expired()
+
+    def _lookup(self, normalized_key: str) -> Optional[str]:
+        """
+        Значение ключа в снимке (или текущее вне транзакции).
+        :param normalized_key: Нормализованный ключ
+        """
+        if self.version is None:
+            return self.versioned.store._lookup(normalized_key)
+        return self.versioned.read(normalized_key, self.version)
+
+    def _expiry_of(self, normalized_key: str) -> Optional[float]:
+        return self.versioned.store._expiry_of(normalized_key)
+
+    def _write_many(self, changes: List[Tuple[str, Optional[str]]]) -> List[Optional[str]]:
+        """
+        Фиксирует пакет изменений одной версией.
+        :return: Прежние значения в порядке пар
+        """
+        old_values = []
+        seen: Dict[str, Optional[str]] = {}
+        for normalized_key, value in changes:
+            old_values.append(seen[normalized_key] if normalized_key in seen
+                              else self._lookup(normalized_key))
+            seen[normalized_key] = value
+        self.versioned.write(changes)
+        return old_values
+
+
+class SnapshotSession(Session):
+    """
+    Сессия с изоляцией снимков: BEGIN верхнего уровня открывает снимок VersionedStore,
+    и вся транзакция читает данные на момент её начала, не видя чужих COMMIT.
+    COMMIT верхнего уровня проверяет конфликты («первый зафиксировавший побеждает»):
+    при конфликте транзакция отменяется и выбрасывается CommitConflict.
+    Снимок закрывается при COMMIT, ROLLBACK верхнего уровня и закрытии сессии.
+    """
+
+    def __init__(self, versioned: VersionedStore) -> None:
+        """
+        :param versioned: Общее многоверсионное хранилище
+        """
+        super().__init__(SnapshotView(versioned))
+
+    def begin(self) -> bool:
+        if not self._undo_logs:
+            self.store.version = self.store.versioned.open_snapshot()
+        return super().begin()
+
+    def rollback(self) -> bool:
+        rolled_back = super().rollback()
+        if rolled_back and not self._undo_logs:
+            self._release_snapshot()
+        return rolled_back
+
+    def commit(self) -> bool:
+        if len(self._undo_logs) != 1:
+            return super().commit()
+        try:
+            return super().commit()
+        finally:
+            self._release_snapshot()
+
+    def close(self) -> None:
+        super().close()
+        self._release_snapshot()
+
+    def _release_snapshot(self) -> None:
+        """
+        Закрывает снимок сессии, если он открыт.
+        """
+        if self.store.version is not None:
+            self.store.versioned.close_snapshot(self.store.version)
+            self.store.version = None
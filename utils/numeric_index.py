@@ -0,0 +1,152 @@
+import heapq
+import math
+from typing import Callable, Iterable, List, Optional, Tuple
+from utils.sorted_list import RankedSortedList
+
+# Запись индекса: (числовое значение, нормализованный ключ)
+NumericEntry = Tuple[float, str]
+
+# Страница нижнего слоя: (lo, hi, limit, after) -> записи
+RangePage = Callable[[float, float, Optional[int], Optional[NumericEntry]], List[NumericEntry]]
+
+
+class _Top:
+    """
+    Граница, большая любого ключа: (hi, TOP) следует за всеми записями со значением hi.
+    """
+
+    def __lt__(self, other: object) -> bool:
+        return False
+
+    def __le__(self, other: object) -> bool:
+        return other is self
+
+    def __gt__(self, other: object) -> bool:
+        return other is not self
+
+    def __ge__(self, other: object) -> bool:
+        return True
+
+
+TOP = _Top()
+
+
+def parse_number(value: str) -> Optional[float]:
+    """
+    Числовое значение строки или None, если это не конечное число.
+    :param value: Значение ключа
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+class NumericIndex:
+    """
+    Вторичный индекс числовых значений: записи (число, ключ) в RankedSortedList.
+    Подсчёт ключей со значением в [lo, hi] — разность двух рангов, O(log n);
+    выборка — O(log n + размер страницы). Нечисловые значения в индекс не попадают.
+    Числа сравниваются как float (целые больше 2**53 теряют точность).
+    """
+
+    __slots__ = ('_entries',)
+
+    def __init__(self, buckets: Iterable[Tuple[str, Iterable[str]]] = ()) -> None:
+        """
+        Строит индекс по корзинам индекса значений: каждое значение разбирается один раз.
+        :param buckets: Пары (значение, ключи)
+        """
+        entries = []
+        for value, keys in buckets:
+            number = parse_number(value)
+            if number is not None:
+                entries.extend((number, key_name) for key_name in keys)
+        self._entries = RankedSortedList(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, value: str, keys: Iterable[str]) -> None:
+        """
+        Добавляет ключи с данным значением (нечисловое значение пропускается).
+        :param value: Значение
+        :param keys: Нормализованные ключи
+        """
+        number = parse_number(value)
+        if number is not None:
+            for key_name in keys:
+                self._entries.add((number, key_name))
+
+    def discard(self, value: str, keys: Iterable[str]) -> None:
+        """
+        Удаляет ключи с данным значением.
+        :param value: Значение
+        :param keys: Нормализованные ключи
+        """
+        number = parse_number(value)
+        if number is not None:
+            for key_name in keys:
+                self._entries.discard((number, key_name))
+
+    def count(self, lo: float, hi: float) -> int:
+        """
+        Количество ключей со значением в [lo, hi].
+        """
+        if lo > hi:
+            return 0
+        return self._entries.rank((hi, TOP)) - self._entries.rank((lo,))
+
+    def page(self, lo: float, hi: float, limit: Optional[int] = None,
+             after: Optional[NumericEntry] = None) -> List[NumericEntry]:
+        """
+        Записи со значением в [lo, hi] по возрастанию (значение, затем ключ).
+        :param limit: Размер страницы (None — все)
+        :param after: Курсор — последняя запись предыдущей страницы
+        """
+        if lo > hi:
+            return []
+        return self._entries.range_page((lo,), (hi, TOP), after, limit)
+
+
+def number_in_range(value: Optional[str], lo: float, hi: float) -> Optional[float]:
+    """
+    Числовое значение, если оно попадает в [lo, hi], иначе None.
+    :param value: Значение ключа или None, если ключа нет
+    """
+    if value is None:
+        return None
+    number = parse_number(value)
+    return number if number is not None and lo <= number <= hi else None
+
+
+def merge_overlay_range(range_page: RangePage, overlay_keys: Iterable[str],
+                        committed: Callable[[str], Optional[str]],
+                        visible: Callable[[str], Optional[str]],
+                        lo: float, hi: float, limit: Optional[int],
+                        after: Optional[NumericEntry]) -> List[NumericEntry]:
+    """
+    Страница записей нижнего слоя с учётом наложения: ключи наложения исключаются
+    из записей нижнего слоя и добавляются по своему видимому значению. Нижний слой
+    запрашивается с запасом на число ключей наложения, чьи прежние значения в диапазоне,
+    поэтому стоимость — размер наложения плюс размер страницы.
+    :param range_page: Выборка нижнего слоя
+    :param overlay_keys: Нормализованные ключи наложения
+    :param committed: Значение ключа в нижнем слое
+    :param visible: Видимое значение ключа с учётом наложения
+    :return: Записи, строго большие after, не более limit
+    """
+    overlay = set(overlay_keys)
+    hidden = 0
+    added = []
+    for key_name in overlay:
+        if number_in_range(committed(key_name), lo, hi) is not None:
+            hidden += 1
+        number = number_in_range(visible(key_name), lo, hi)
+        if number is not None and (after is None or (number, key_name) > after):
+            added.append((number, key_name))
+    added.sort()
+    below = range_page(lo, hi, None if limit is None else limit + hidden, after)
+    merged = heapq.merge([entry for entry in below if entry[1] not in overlay], added)
+    return list(merged) if limit is None else [entry for entry, _ in zip(merged, range(limit))]
@@ -0,0 +1,173 @@
+import os
+import sys
+import threading
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+from utils.logger_config import logger
+
+# Интервал между сэмплами по умолчанию (миллисекунды)
+DEFAULT_SAMPLE_INTERVAL_MS = 1.0
+
+# Число строк таблицы самых затратных функций по умолчанию
+DEFAULT_TOP = 30
+
+# Файл отчёта, если профилирование включено командой PROFILE без --profile
+DEFAULT_PROFILE_PATH = 'profile.folded'
+
+# Кадр стека сэмпла: (код функции, номер строки)
+StackFrame = Tuple[CodeType, int]
+
+
+def _function_label(code: CodeType, line: Optional[int] = None) -> str:
+    """
+    Имя функции с классом и путём к файлу (относительно текущего каталога, если внутри него).
+    :param code: Код функции
+    :param line: Номер строки (None — без него)
+    """
+    path = code.co_filename
+    relative = os.path.relpath(path) if os.path.isabs(path) else path
+    if relative.startswith('..'):
+        relative = os.path.basename(path)
+    location = relative if line is None else f'{relative}:{line}'
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({location})"
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик: фоновый поток с заданным интервалом снимает стек Python
+    профилируемого потока (sys._current_frames) и считает одинаковые стеки. Код хранилища
+    и диспетчера не меняется и не замедляется трассировкой; цена — захват GIL на время
+    обхода стека. Время в функциях на C (например, запись в stdout) приписывается строке
+    вызывающей функции Python, поэтому кадр отчёта содержит номер строки.
+
+    Отчёт — свёрнутые стеки в формате flamegraph.pl/speedscope («f1;f2;f3 число»)
+    и таблица функций с наибольшим собственным временем.
+    Чтобы поток сэмплов получал GIL вовремя, на время профилирования интервал переключения
+    GIL (sys.setswitchinterval) уменьшается до интервала сэмплов.
+    """
+
+    def __init__(self, path: str = DEFAULT_PROFILE_PATH,
+                 interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS, top: int = DEFAULT_TOP) -> None:
+        """
+        :param path: Файл свёрнутых стеков; таблица пишется рядом с суффиксом .top.txt
+        :param interval_ms: Интервал между сэмплами в миллисекундах
+        :param top: Число строк таблицы
+        _stacks — стек (от внешнего кадра к внутреннему) -> число сэмплов.
+        """
+        self.path = path
+        self.interval = interval_ms / 1000
+        self.top = top
+        self._stacks: Counter = Counter()
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._switch_interval: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        """
+        Идёт ли сэмплирование.
+        """
+        return self._thread is not None
+
+    @property
+    def samples(self) -> int:
+        """
+        Число собранных сэмплов.
+        """
+        return sum(self._stacks.values())
+
+    def start(self, thread_id: Optional[int] = None) -> bool:
+        """
+        Начинает (или продолжает) сэмплирование; собранные ранее сэмплы сохраняются.
+        :param thread_id: Профилируемый поток (по умолчанию вызывающий)
+        :return: False, если сэмплирование уже идёт
+        """
+        if self._thread is not None:
+            return False
+        self._target = thread_id if thread_id is not None else threading.get_ident()
+        self._stop.clear()
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> bool:
+        """
+        Приостанавливает сэмплирование.
+        :return: False, если оно не шло
+        """
+        if self._thread is None:
+            return False
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        sys.setswitchinterval(self._switch_interval)
+        return True
+
+    def collapsed(self) -> List[str]:
+        """
+        Свёрнутые стеки: «функция (файл:строка);...;функция (файл:строка) число сэмплов».
+        """
+        labels: Dict[StackFrame, str] = {}
+        folded: Counter = Counter()
+        for stack, count in self._stacks.items():
+            parts = []
+            for code, line in stack:
+                label = labels.get((code, line))
+                if label is None:
+                    label = labels[(code, line)] = _function_label(code, line)
+                parts.append(label)
+            folded[';'.join(parts)] += count
+        return [f'{stack} {count}' for stack, count in sorted(folded.items())]
+
+    def top_table(self) -> List[str]:
+        """
+        Таблица функций по собственному времени (доля сэмплов, где функция — верхний кадр)
+        с полным временем (доля сэмплов, где функция есть в стеке).
+        """
+        total = self.samples
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self._stacks.items():
+            own[stack[-1][0]] += count
+            for code in {code for code, _ in stack}:
+                inclusive[code] += count
+        lines = [f'Сэмплов: {total}, интервал {self.interval * 1000:g} мс',
+                 f"{'self%':>7} {'total%':>7}  функция"]
+        for code, count in own.most_common(self.top):
+            lines.append(f'{count / total:7.1%} {inclusive[code] / total:7.1%}  {_function_label(code)}')
+        return lines
+
+    def write_report(self) -> Optional[str]:
+        """
+        Записывает свёрнутые стеки в path и таблицу в path.top.txt.
+        :return: Путь к таблице или None, если сэмплов нет
+        """
+        if not self._stacks:
+            return None
+        with open(self.path, 'w', encoding='utf-8') as folded_file:
+            folded_file.write('\n'.join(self.collapsed()) + '\n')
+        top_path = f'{self.path}.top.txt'
+        with open(top_path, 'w', encoding='utf-8') as top_file:
+            top_file.write('\n'.join(self.top_table()) + '\n')
+        logger.info('Профиль записан в %s и %s', self.path, top_path)
+        return top_path
+
+    def _sample_loop(self) -> None:
+        """
+        Фоновый поток: снимает стек профилируемого потока каждые interval секунд.
+        """
+        stacks = self._stacks
+        target = self._target
+        while not self._stop.wait(self.interval):
+            frame: Optional[FrameType] = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                stacks[tuple(stack)] += 1
@@ -1,33 +1,68 @@
 from typing import Tuple, List
-from utils.logger_config import logger
+from utils.logger_config import console, logger
 
 COMMANDS_HELP = (
     '\nДоступные команды:\n'
-    '  SET <key> <value>   - Сохранить значение по ключу\n'
+    '  SET <key> <value> [EX <sec>]\n'
+    '                      - Сохранить значение по ключу (EX — срок жизни в секундах)\n'
     '  GET <key>           - Получить значение по ключу, или NULL если не найдено\n'
     '  UNSET <key>         - Удалить ключ\n'
+    '  TTL <key>           - Оставшийся срок жизни (-1 бессрочно, -2 нет ключа)\n'
+    '  PERSIST <key>       - Снять срок жизни ключа\n'
+    '  MSET <k> <v> ...    - Сохранить несколько пар ключ-значение\n'
+    '  MGET <key> ...      - Получить значения нескольких ключей\n'
+    '  MUNSET <key> ...    - Удалить несколько ключей\n'
     '  COUNTS <value>      - Сколько ключей имеет это значение\n'
-    '  FIND <value>        - Все ключи, связанные с этим значением\n'
+    '  FIND <value> [LIMIT <n>] [AFTER <key>]\n'
+    '                      - Ключи с этим значением (по порядку, постранично)\n'
+    '  COUNTS RANGE <lo> <hi>\n'
+    '                      - Сколько ключей имеют числовое значение в [lo, hi]\n'
+    '  FIND RANGE <lo> <hi> [LIMIT <n>]\n'
+    '                      - Ключи с числовым значением в [lo, hi] (по значению)\n'
+    '  KEYS [prefix]       - Ключи с префиксом по порядку\n'
+    '  SCAN [PREFIX <p>] [FROM <key>] [TO <key>] [LIMIT <n>] [AFTER <key>]\n'
+    '                      - Ключи из диапазона FROM <= ключ < TO (постранично)\n'
     '  BEGIN               - Начать транзакцию\n'
     '  ROLLBACK            - Откатить текущую транзакцию\n'
     '  COMMIT              - Применить изменения текущей транзакции\n'
+    '  SAVE [path]         - Сохранить зафиксированные данные в снимок\n'
+    '  LOAD [path]         - Загрузить данные из снимка\n'
+    '  BGSAVE [path]       - Сохранить снимок в фоне, не блокируя команды\n'
     '  END                 - Завершить приложение\n'
+    '  STATS               - Размеры хранилища и задержки команд\n'
+    '  PROFILE [ON|OFF]    - Включить/приостановить профилирование (отчёт при выходе)\n'
     '  HELP                - Показать эту справку\n'
 )
 
 
 def show_help() -> None:
-    logger.info(COMMANDS_HELP)
+    """
+    Выводит справку в канал консоли (только в интерактивном режиме).
+    """
+    console.write(COMMANDS_HELP)
 
 
-def read_command(show_help_flag: bool = False) -> Tuple[str, List[str]]:
-    logger.info('Ожидание ввода...')
-    if show_help_flag:
-        show_help()
-    parts = input().strip().split()
+def parse_command(line: str) -> Tuple[str, List[str]]:
+    """
+    Разбирает строку команды на имя (в верхнем регистре) и аргументы.
+    :param line: Строка ввода
+    :return: (имя команды, аргументы)
+    """
+    parts = line.split()
     if not parts:
-        logger.debug('Нет ввода или команды.')
         raise ValueError('Нет ввода или команды.')
     cmd, *args = parts
-    logger.debug(f'Разобрана команда: {cmd.upper()}, аргументы: {args}')
     return cmd.upper(), args
+
+
+def read_command(show_help_flag: bool = False) -> Tuple[str, List[str]]:
+    console.write('Ожидание ввода...')
+    if show_help_flag:
+        show_help()
+    try:
+        cmd, args = parse_command(input())
+    except ValueError:
+        logger.debug('Нет ввода или команды.')
+        raise
+    logger.debug('Разобрана команда: %s, аргументы: %s', cmd, args)
+    return cmd, args
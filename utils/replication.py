@@ -0,0 +1,355 @@
+import asyncio
+import os
+import struct
+import tempfile
+import uuid
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+from utils.key_value_store import KeyValueStore
+from utils.logger_config import logger
+from utils.snapshot import MAGIC, encode_deadlines, encode_records, load_snapshot
+from utils.wal import (FRAME_HEADER_SIZE, OP_RESET, Change, check_frame, encode_changes, encode_frame,
+                       unpack_frame_header)
+
+# Протокол репликации поверх TCP-порта сервера. Реплика отправляет первой строкой
+#   SYNC                      — полная синхронизация;
+#   SYNC <id> <смещение>      — продолжение с позиции потока основного сервера <id>.
+# Основной сервер отвечает строкой
+#   CONTINUE <id> <смещение>  — дальше идут кадры потока с этого смещения;
+#   FULLSYNC <id> <смещение>  — дальше снимок порциями (uint32 длина, байты файла снимка),
+#                               порция нулевой длины, затем кадры потока с этого смещения.
+# Кадры — в формате журнала упреждающей записи (utils/wal.py); смещение — число байт
+# кадров, выпущенных потоком с его создания.
+SYNC_COMMAND = b'SYNC'
+_CHUNK_HEADER = struct.Struct('<I')
+
+# Объём последних кадров, которые основной сервер хранит для продолжения синхронизации
+DEFAULT_BACKLOG_BYTES = 64 << 20
+
+# Наибольшая порция данных (кадры потока, части снимка), отправляемая за одну запись
+STREAM_CHUNK_BYTES = 1 << 20
+
+# Пауза перед повторным подключением реплики, секунды
+DEFAULT_RETRY_INTERVAL = 1.0
+
+
+class ChangeFeed:
+    """
+    Поток зафиксированных изменений хранилища для реплик: слушатель хранилища кодирует
+    каждое изменение, дошедшее до базового состояния (SET/UNSET вне транзакции, COMMIT
+    транзакции верхнего уровня, истечение и вытеснение ключей), в кадр журнала
+    и дописывает его в буфер последних кадров ограниченного объёма.
+
+    Сроки жизни не передаются: истечение ключа на основном сервере приходит реплике
+    как удаление. Полная замена данных (LOAD) передаётся кадром очистки со всем
+    новым содержимым, как в журнале без снимка.
+    Поток используется из потока цикла событий сервера, который выполняет команды.
+    """
+
+    def __init__(self, store: KeyValueStore, backlog_bytes: int = DEFAULT_BACKLOG_BYTES) -> None:
+        """
+        :param store: Хранилище основного сервера
+        :param backlog_bytes: Объём хранимых последних кадров
+        _frames/_offsets — кадры и их смещения; кадры до _head уже вытеснены из буфера.
+        """
+        self.store = store
+        self.backlog_bytes = backlog_bytes
+        self.replication_id = uuid.uuid4().hex
+        self.offset = 0
+        self._frames: List[bytes] = []
+        self._offsets: List[int] = []
+        self._head = 0
+        self._size = 0
+        self._changed = asyncio.Event()
+        self._watched = False
+        store.add_listener(self.on_changes)
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """
+        Событие, которое устанавливается при следующем новом кадре.
+        """
+        self._watched = True
+        return self._changed
+
+    def on_changes(self, changes: Optional[List[Change]]) -> None:
+        """
+        Слушатель хранилища: кодирует изменения в кадр и дописывает его в буфер.
+        :param changes: Изменения или None при полной замене данных
+        """
+        if changes is None:
+            contents: List[Change] = [(key_name, value) for value, keys in self.store.committed_buckets()
+                                      for key_name in keys]
+            frame = encode_frame(OP_RESET + encode_changes(contents))
+        else:
+            frame = encode_frame(encode_changes(changes))
+        self._frames.append(frame)
+        self._offsets.append(self.offset)
+        self.offset += len(frame)
+        self._size += len(frame)
+        self._trim()
+        if self._watched:
+            # Новое событие — только если текущее кто-то получил: запись без реплик дешевле
+            self._watched = False
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+    def read_from(self, offset: int, limit: int = STREAM_CHUNK_BYTES) -> Optional[bytes]:
+        """
+        Кадры, начиная со смещения, не больше limit байт (но не меньше одного кадра).
+        :param offset: Смещение начала кадра
+        :param limit: Наибольший объём ответа
+        :return: Байты кадров (b'' — новых кадров нет) или None, если смещения нет в буфере
+        """
+        if offset == self.offset:
+            return b''
+        index = bisect_left(self._offsets, offset, self._head)
+        if index == len(self._offsets) or self._offsets[index] != offset:
+            return None
+        parts = []
+        size = 0
+        while index < len(self._frames) and (not parts or size + len(self._frames[index]) <= limit):
+            parts.append(self._frames[index])
+            size += len(self._frames[index])
+            index += 1
+        return b''.join(parts)
+
+    def close(self) -> None:
+        """
+        Отписывается от хранилища.
+        """
+        self.store.remove_listener(self.on_changes)
+
+    def _trim(self) -> None:
+        """
+        Вытесняет старые кадры сверх backlog_bytes (последний кадр остаётся всегда).
+        """
+        frames = self._frames
+        while self._size > self.backlog_bytes and len(frames) - self._head > 1:
+            self._size -= len(frames[self._head])
+            frames[self._head] = b''
+            self._head += 1
+        if self._head > 1024 and self._head * 2 > len(frames):
+            del frames[:self._head]
+            del self._offsets[:self._head]
+            self._head = 0
+
+
+async def serve_follower(feed: ChangeFeed, store: KeyValueStore, request: bytes,
+                         writer: asyncio.StreamWriter) -> None:
+    """
+    Обслуживает реплику на основном сервере: продолжение с её смещения, если оно есть
+    в буфере, иначе полная синхронизация замороженным срезом (без блокировки команд
+    на время передачи), затем кадры потока по мере появления.
+    Возвращается, когда реплика отстала больше, чем на объём буфера.
+    :param feed: Поток изменений
+    :param store: Хранилище основного сервера
+    :param request: Строка SYNC от реплики
+    :param writer: Поток записи соединения
+    """
+    args = request.decode('utf-8', 'replace').split()[1:]
+    offset = int(args[1]) if len(args) == 2 and args[1].isdigit() else None
+    if offset is not None and args[0] == feed.replication_id and feed.read_from(offset, 0) is not None:
+        writer.write(f'CONTINUE {feed.replication_id} {offset}\n'.encode('utf-8'))
+    else:
+        offset = await _send_snapshot(feed, store, writer)
+    while True:
+        changed = feed.changed
+        data = feed.read_from(offset)
+        if data is None:
+            logger.warning('Реплика отстала больше, чем на буфер потока изменений')
+            return
+        if data:
+            writer.write(data)
+            offset += len(data)
+            await writer.drain()
+        else:
+            await changed.wait()
+
+
+async def _send_snapshot(feed: ChangeFeed, store: KeyValueStore, writer: asyncio.StreamWriter) -> int:
+    """
+    Полная синхронизация: замораживает хранилище и передаёт срез порциями,
+    уступая цикл событий между порциями.
+    :return: Смещение потока на момент заморозки
+    """
+    with store.freeze() as frozen:
+        offset = feed.offset
+        writer.write(f'FULLSYNC {feed.replication_id} {offset}\n'.encode('utf-8'))
+        # Сроки жизни не реплицируются: раздел сроков снимка пуст
+        parts = [MAGIC + encode_deadlines(())]
+        size = len(parts[0])
+        for record, _ in encode_records(frozen.buckets()):
+            parts.append(record)
+            size += len(record)
+            if size >= STREAM_CHUNK_BYTES:
+                await _send_chunk(writer, b''.join(parts))
+                parts, size = [], 0
+        if parts:
+            await _send_chunk(writer, b''.join(parts))
+        writer.write(_CHUNK_HEADER.pack(0))
+    logger.info('Реплике передан снимок, смещение потока %d', offset)
+    return offset
+
+
+async def _send_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+    writer.write(_CHUNK_HEADER.pack(len(data)) + data)
+    await writer.drain()
+    await asyncio.sleep(0)
+
+
+class Follower:
+    """
+    Реплика только для чтения: подключается к основному серверу, получает снимок
+    (или продолжает с сохранённого смещения) и применяет кадры потока изменений
+    к своему хранилищу. При обрыве соединения переподключается.
+
+    Снимок полной синхронизации сохраняется в snapshot_path, а рядом, в файле
+    snapshot_path.offset, — идентификатор потока и смещение на момент снимка. После
+    перезапуска реплика загружает снимок и продолжает с этого смещения, если основной
+    сервер ещё хранит его в буфере; иначе выполняется полная синхронизация.
+    """
+
+    def __init__(self, store: KeyValueStore, host: str, port: int,
+                 snapshot_path: Optional[str] = None,
+                 retry_interval: float = DEFAULT_RETRY_INTERVAL) -> None:
+        """
+        :param store: Хранилище реплики (команды записи к нему не допускаются)
+        :param host: Адрес основного сервера
+        :param port: Порт основного сервера
+        :param snapshot_path: Файл снимка реплики (None — временный файл на время загрузки)
+        :param retry_interval: Пауза перед повторным подключением, секунды
+        """
+        self.store = store
+        self.host = host
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self.retry_interval = retry_interval
+        self.replication_id: Optional[str] = None
+        self.offset: Optional[int] = None
+        self.full_syncs = 0
+        self.partial_syncs = 0
+        if snapshot_path is not None:
+            self._restore()
+
+    async def run(self) -> None:
+        """
+        Синхронизируется с основным сервером до отмены задачи, переподключаясь при обрывах.
+        """
+        while True:
+            try:
+                await self.sync()
+            except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                logger.warning('Репликация с %s:%s прервана: %s', self.host, self.port, e)
+            await asyncio.sleep(self.retry_interval)
+
+    async def sync(self) -> None:
+        """
+        Одна сессия репликации: подключение, синхронизация и применение кадров до закрытия
+        соединения основным сервером.
+        """
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            if self.offset is None:
+                writer.write(SYNC_COMMAND + b'\n')
+            else:
+                writer.write(f'SYNC {self.replication_id} {self.offset}\n'.encode('utf-8'))
+            await writer.drain()
+            reply = (await reader.readline()).decode('utf-8', 'replace').split()
+            if len(reply) != 3 or reply[0] not in ('FULLSYNC', 'CONTINUE') or not reply[2].isdigit():
+                raise ValueError(f"Неожиданный ответ основного сервера: {' '.join(reply)}")
+            mode, replication_id, offset = reply[0], reply[1], int(reply[2])
+            if mode == 'FULLSYNC':
+                await self._receive_snapshot(reader, replication_id, offset)
+                self.full_syncs += 1
+            else:
+                self.partial_syncs += 1
+            self.replication_id, self.offset = replication_id, offset
+            logger.info('Реплика синхронизирована с %s:%s (%s), смещение %d',
+                        self.host, self.port, mode, offset)
+            await self._apply_stream(reader)
+        finally:
+            writer.close()
+
+    async def _apply_stream(self, reader: asyncio.StreamReader) -> None:
+        """
+        Применяет кадры потока, пока соединение открыто.
+        """
+        while True:
+            try:
+                header = await reader.readexactly(FRAME_HEADER_SIZE)
+            except asyncio.IncompleteReadError as e:
+                if e.partial:
+                    raise
+                return
+            length, checksum = unpack_frame_header(header)
+            self._apply(check_frame(await reader.readexactly(length), checksum))
+            self.offset += FRAME_HEADER_SIZE + length
+
+    def _apply(self, changes: List[Optional[Change]]) -> None:
+        """
+        Применяет изменения кадра; None — очистка хранилища перед новым содержимым.
+        """
+        batch: List[Change] = []
+        for change in changes:
+            if change is None:
+                if batch:
+                    self.store.apply_changes(batch)
+                    batch = []
+                self.store.load_buckets([])
+            else:
+                batch.append(change)
+        if batch:
+            self.store.apply_changes(batch)
+
+    async def _receive_snapshot(self, reader: asyncio.StreamReader, replication_id: str,
+                                offset: int) -> None:
+        """
+        Принимает снимок в файл и загружает его в хранилище; запоминает смещение снимка.
+        """
+        if self.snapshot_path is not None:
+            path = self.snapshot_path
+            tmp_path = f'{path}.sync.tmp'
+        else:
+            descriptor, tmp_path = tempfile.mkstemp(suffix='.snap')
+            os.close(descriptor)
+            path = tmp_path
+        try:
+            with open(tmp_path, 'wb') as snapshot_file:
+                while True:
+                    (length,) = _CHUNK_HEADER.unpack(await reader.readexactly(_CHUNK_HEADER.size))
+                    if not length:
+                        break
+                    snapshot_file.write(await reader.readexactly(length))
+            if tmp_path != path:
+                os.replace(tmp_path, path)
+            load_snapshot(self.store, path)
+        finally:
+            if self.snapshot_path is None:
+                os.remove(tmp_path)
+        if self.snapshot_path is not None:
+            with open(f'{self.snapshot_path}.offset', 'w', encoding='utf-8') as offset_file:
+                offset_file.write(f'{replication_id} {offset}\n')
+
+    def _restore(self) -> None:
+        """
+        Загружает сохранённый снимок реплики и смещение, с которого продолжить.
+        """
+        position = self._saved_position()
+        if position is None or not os.path.exists(self.snapshot_path):
+            return
+        loaded = load_snapshot(self.store, self.snapshot_path)
+        self.replication_id, self.offset = position
+        logger.info('Реплика загрузила снимок %s (ключей: %d), смещение %d',
+                    self.snapshot_path, loaded, self.offset)
+
+    def _saved_position(self) -> Optional[Tuple[str, int]]:
+        """
+        Идентификатор потока и смещение из файла snapshot_path.offset (None — файла нет).
+        """
+        try:
+            with open(f'{self.snapshot_path}.offset', encoding='utf-8') as offset_file:
+                replication_id, offset = offset_file.read().split()
+            return replication_id, int(offset)
+        except (OSError, ValueError):
+            return None
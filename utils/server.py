@@ -0,0 +1,236 @@
+import asyncio
+import io
+from typing import Optional, Set, Tuple
+from utils.command_pipeline import END_REPLY, CommandPipeline, write_reply
+from utils.key_value_store import EVICTION_BATCH, KeyValueStore
+from utils.logger_config import logger
+from utils.mvcc import SnapshotSession, VersionedStore
+from utils.profiler import SamplingProfiler
+from utils.replication import SYNC_COMMAND, ChangeFeed, Follower, serve_follower
+from utils.session import Session
+from utils.stats import CommandStats
+
+# Размер порции чтения из сокета
+READ_CHUNK_SIZE = 1 << 16
+
+# Наибольшая длина строки команды; клиент с более длинной строкой отключается
+MAX_LINE_BYTES = 1 << 20
+
+# Период фоновой очистки истёкших ключей, секунды
+EXPIRY_SWEEP_INTERVAL = 0.1
+
+# Уровни изоляции транзакций соединений
+ISOLATION_LEVELS = ('read-committed', 'snapshot')
+
+
+class KeyValueServer:
+    """
+    Асинхронный TCP-сервер: строковый протокол команд, как в интерактивном режиме,
+    поверх общего KeyValueStore. Каждое соединение получает свою сессию
+    со своим стеком транзакций. Поддерживается конвейерная обработка: все полные
+    строки, пришедшие одной порцией, выполняются подряд, а ответы отправляются одной записью.
+    Фоновая задача периодически удаляет истёкшие ключи небольшими порциями,
+    не блокируя обработку команд надолго.
+
+    Уровень изоляции 'read-committed' (по умолчанию): транзакция видит последние чужие
+    COMMIT. Уровень 'snapshot': транзакция читает снимок на момент BEGIN (VersionedStore),
+    а конфликтующий COMMIT отменяется по правилу «первый зафиксировавший побеждает».
+
+    С потоком изменений (feed) сервер — основной для реплик: соединение, начатое строкой
+    SYNC, получает снимок и зафиксированные изменения (utils/replication.py). С follower
+    сервер — реплика: применяет поток основного сервера и отклоняет команды записи.
+
+    Незавершённая строка копится не длиннее max_line_bytes: иначе клиент, не присылающий
+    перевод строки, занимал бы память без ограничения. При превышении сервер отвечает
+    ошибкой и закрывает соединение.
+    """
+
+    def __init__(self, store: KeyValueStore, host: str = '127.0.0.1', port: int = 7070,
+                 snapshot_path: Optional[str] = None,
+                 sweep_interval: float = EXPIRY_SWEEP_INTERVAL,
+                 isolation: str = 'read-committed',
+                 stats: Optional[CommandStats] = None,
+                 profiler: Optional[SamplingProfiler] = None,
+                 feed: Optional[ChangeFeed] = None,
+                 follower: Optional[Follower] = None,
+                 max_line_bytes: int = MAX_LINE_BYTES) -> None:
+        """
+        Инициализация сервера.
+        :param store: Общее хранилище
+        :param host: Адрес для прослушивания
+        :param port: Порт (0 — выбрать свободный)
+        :param snapshot_path: Путь к снимку по умолчанию для SAVE/LOAD
+        :param sweep_interval: Период очистки истёкших ключей в секундах
+        :param isolation: Уровень изоляции транзакций: 'read-committed' или 'snapshot'
+        :param stats: Статистика команд, общая для всех соединений (None — выключена)
+        :param profiler: Профилировщик для команды PROFILE (профилируется поток цикла событий)
+        :param feed: Поток изменений для реплик (None — реплики не принимаются)
+        :param follower: Репликация с основного сервера (None — сервер не реплика)
+        :param max_line_bytes: Наибольшая длина строки команды в байтах
+        """
+        if isolation not in ISOLATION_LEVELS:
+            raise ValueError(f'Неизвестный уровень изоляции: {isolation}')
+        if follower is not None and isolation == 'snapshot':
+            raise ValueError('Реплика поддерживает только изоляцию read-committed')
+        self.store = store
+        self.host = host
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+        self._versioned = VersionedStore(store) if isolation == 'snapshot' else None
+        self.stats = stats
+        self.profiler = profiler
+        self.feed = feed
+        self.follower = follower
+        self._replication: Optional[asyncio.Task] = None
+        self.max_line_bytes = max_line_bytes
+
+    async def start(self) -> Tuple[str, int]:
+        """
+        Начинает принимать соединения.
+        :return: Фактические (адрес, порт)
+        """
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self._sweeper = asyncio.create_task(self._sweep_expired())
+        if self.follower is not None:
+            self._replication = asyncio.create_task(self.follower.run())
+        host, port = self._server.sockets[0].getsockname()[:2]
+        logger.info('Сервер слушает %s:%s', host, port)
+        return host, port
+
+    async def serve_forever(self) -> None:
+        """
+        Запускает сервер и обслуживает соединения до отмены.
+        """
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Останавливает приём соединений и закрывает открытые соединения.
+        """
+        for background in (self._sweeper, self._replication):
+            if background is not None:
+                background.cancel()
+                await asyncio.gather(background, return_exceptions=True)
+        self._sweeper = self._replication = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in list(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+
+    async def _sweep_expired(self) -> None:
+        """
+        Периодически удаляет истёкшие ключи порциями, уступая цикл событий между порциями.
+        """
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            while self.store.evict_expired() == EVICTION_BATCH:
+                await asyncio.sleep(0)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        """
+        Обслуживает одно соединение.
+        :param reader: Поток чтения
+        :param writer: Поток записи
+        """
+        task = asyncio.current_task()
+        self._connections.add(task)
+        if self._versioned is not None:
+            session: Session = SnapshotSession(self._versioned)
+        else:
+            session = Session(self.store)
+        out = io.StringIO()
+        pipeline = CommandPipeline(session, snapshot_path=self.snapshot_path, stats=self.stats,
+                                   profiler=self.profiler, read_only=self.follower is not None)
+        buffer = b''
+        first_line = True
+        try:
+            while True:
+                chunk = await reader.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if b'\n' not in chunk:
+                    # Строка не завершена: без разбиения всего буфера заново
+                    buffer += chunk
+                    if len(buffer) > self.max_line_bytes:
+                        await self._reject_long_line(writer)
+                        break
+                    continue
+                *lines, buffer = (buffer + chunk).split(b'\n')
+                if len(buffer) > self.max_line_bytes:
+                    await self._reject_long_line(writer)
+                    break
+                if first_line and lines:
+                    first_line = False
+                    if lines[0].split()[:1] == [SYNC_COMMAND]:
+                        await self._serve_follower(lines[0], writer)
+                        break
+                finished = self._execute_lines(pipeline, lines, out.write)
+                response = out.getvalue()
+                if response:
+                    out.seek(0)
+                    out.truncate()
+                    writer.write(response.encode('utf-8'))
+                    await writer.drain()
+                if finished:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            session.close()
+            writer.close()
+            self._connections.discard(task)
+
+    async def _reject_long_line(self, writer: asyncio.StreamWriter) -> None:
+        """
+        Сообщает клиенту о слишком длинной строке команды; соединение затем закрывается.
+        :param writer: Поток записи
+        """
+        logger.warning('Строка команды длиннее %d байт: соединение закрывается', self.max_line_bytes)
+        writer.write(f'НЕВЕРНАЯ КОМАНДА: Строка команды длиннее {self.max_line_bytes} байт\n'
+                     .encode('utf-8'))
+        await writer.drain()
+
+    async def _serve_follower(self, request: bytes, writer: asyncio.StreamWriter) -> None:
+        """
+        Соединение реплики: передаёт поток изменений, если сервер основной.
+        :param request: Строка SYNC
+        :param writer: Поток записи
+        """
+        if self.feed is None:
+            writer.write('НЕВЕРНАЯ КОМАНДА: Сервер не принимает реплики (запуск с --primary)\n'
+                         .encode('utf-8'))
+            return
+        try:
+            await serve_follower(self.feed, self.store, request, writer)
+        except ValueError as e:
+            writer.write(f'НЕВЕРНАЯ КОМАНДА: {e}\n'.encode('utf-8'))
+
+    def _execute_lines(self, pipeline: CommandPipeline, lines, write) -> bool:
+        """
+        Выполняет полученные строки команд по порядку; на каждую непустую строку — ответ.
+        :param pipeline: Конвейер команд сессии
+        :param lines: Строки (байты)
+        :param write: Запись текста ответа
+        :return: True если клиент завершил сеанс командой END
+        """
+        for reply in pipeline.execute_lines(lines):
+            if write_reply(write, reply):
+                continue
+            if reply is END_REPLY:
+                return True
+            if reply[0] == 'ERROR':
+                write(f'НЕВЕРНАЯ КОМАНДА: {reply[1]}\n')
+            else:
+                write('НЕВЕРНАЯ КОМАНДА\n')
+        return False
@@ -0,0 +1,515 @@
+import heapq
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from utils.frozen_state import FrozenState
+from utils.key_value_store import KeyValueStore
+from utils.numeric_index import NumericEntry, merge_overlay_range, number_in_range
+from utils.sorted_list import scan_bounds
+
+# Метка «ключа не было в наложении сессии» в журналах отката сессии
+_MISSING = object()
+
+OverlayEntry = Union[Optional[str], object]
+
+# Страница сканирования нижнего слоя: (prefix, start, end, limit, after) -> ключи
+ScanPage = Callable[[Optional[str], Optional[str], Optional[str], Optional[int], Optional[str]], List[str]]
+
+# Страница ключей значения нижнего слоя: (value, limit, after) -> ключи
+FindPage = Callable[[str, Optional[int], Optional[str]], List[str]]
+
+
+def merge_overlay_page(scan_page: ScanPage, overlay_keys: Iterable[str],
+                       visible: Callable[[str], bool], normalize: Callable[[str], str],
+                       prefix: Optional[str], start: Optional[str], end: Optional[str],
+                       limit: Optional[int], after: Optional[str]) -> List[str]:
+    """
+    Страница сканирования нижнего слоя с учётом верхнего слоя (наложения): ключи наложения
+    из диапазона добавляются, если видны, и исключаются, если удалены (метка удаления).
+    Нижний слой запрашивается с запасом на число ключей наложения в диапазоне, поэтому
+    стоимость — размер наложения плюс размер страницы, а не размер хранилища.
+    :param scan_page: Сканирование нижнего слоя
+    :param overlay_keys: Нормализованные ключи наложения
+    :param visible: Виден ли ключ наложения (False — удалён)
+    :param normalize: Нормализация ключей и границ
+    :return: Ключи, строго большие after, не более limit
+    """
+    low, high = scan_bounds(*(None if bound is None else normalize(bound)
+                              for bound in (prefix, start, end)))
+    cursor = None if after is None else normalize(after)
+    in_range = {key_name for key_name in overlay_keys
+                if (low is None or key_name >= low) and (high is None or key_name < high)
+                and (cursor is None or key_name > cursor)}
+    added = sorted(key_name for key_name in in_range if visible(key_name))
+    below = scan_page(None, low, high, None if limit is None else limit + len(in_range), cursor)
+    merged = heapq.merge([key_name for key_name in below if key_name not in in_range], added)
+    return list(merged) if limit is None else [key_name for key_name, _ in zip(merged, range(limit))]
+
+
+def merge_overlay_find(find_page: FindPage, overlay_keys: Iterable[str],
+                       visible: Callable[[str], Optional[str]], normalize: Callable[[str], str],
+                       value: str, limit: Optional[int], after: Optional[str]) -> List[str]:
+    """
+    Страница ключей с данным значением из нижнего слоя с учётом наложения: ключи наложения
+    исключаются из корзины нижнего слоя и добавляются, если их видимое значение равно value.
+    Как и в merge_overlay_page, нижний слой запрашивается с запасом на число ключей наложения,
+    поэтому стоимость — размер наложения плюс размер страницы.
+    :param find_page: Страница ключей значения нижнего слоя
+    :param overlay_keys: Нормализованные ключи наложения
+    :param visible: Видимое значение ключа наложения (None — удалён)
+    :param normalize: Нормализация ключей
+    :return: Ключи, строго большие after, не более limit
+    """
+    cursor = None if after is None else normalize(after)
+    overlay = {key_name for key_name in overlay_keys if cursor is None or key_name > cursor}
+    added = sorted(key_name for key_name in overlay if visible(key_name) == value)
+    below = find_page(value, None if limit is None else limit + len(overlay), cursor)
+    merged = heapq.merge([key_name for key_name in below if key_name not in overlay], added)
+    return list(merged) if limit is None else [key_name for key_name, _ in zip(merged, range(limit))]
+
+
+class Session:
+    """
+    Клиентская сессия поверх общего KeyValueStore со своим стеком транзакций.
+    Вне транзакции команды сразу применяются к общему хранилищу. Внутри транзакции
+    изменения копятся в наложении сессии (ключ -> значение или None при удалении)
+    и не видны другим сессиям до COMMIT верхнего уровня, который применяет их
+    к общему хранилищу одной операцией. Чтение видит последнее зафиксированное
+    состояние плюс собственные незафиксированные изменения.
+    Сроки жизни ключей, заданные внутри транзакции, хранятся в отдельном наложении
+    (ключ -> момент истечения или None, если срок снят) и применяются при COMMIT.
+    Сессия поддерживает тот же интерфейс, что и KeyValueStore, и подходит для CommandDispatcher.
+    """
+
+    def __init__(self, store: KeyValueStore) -> None:
+        """
+        Инициализация сессии.
+        :param store: Общее хранилище
+        """
+        self.store = store
+        self._pending: Dict[str, Optional[str]] = {}
+        self._undo_logs: List[Dict[str, OverlayEntry]] = []
+        self._pending_expiry: Dict[str, Optional[float]] = {}
+        self._expiry_undo: List[Dict[str, OverlayEntry]] = []
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[str]:
+        """
+        Сохраняет значение по ключу.
+        :param key: Ключ
+        :param value: Значение
+        :param ttl: Срок жизни в секундах (None — бессрочно)
+        :return: Прежнее видимое значение или None
+        """
+        if not self._undo_logs:
+            return self.store.set(key, value, ttl)
+        normalized_key = self.store._normalize_key(key)
+        old_value = self._write(normalized_key, value)
+        self._write_expiry(normalized_key, None if ttl is None else self.store._clock() + ttl)
+        return old_value
+
+    def get(self, key: str) -> str:
+        """
+        Возвращает видимое в сессии значение по ключу или 'NULL'.
+        :param key: Ключ
+        """
+        value = self._read(self.store._normalize_key(key))
+        return value if value is not None else 'NULL'
+
+    def unset(self, key: str) -> Optional[str]:
+        """
+        Удаляет ключ.
+        :param key: Ключ
+        :return: Удалённое значение или None, если ключа не было
+        """
+        if not self._undo_logs:
+            return self.store.unset(key)
+        normalized_key = self.store._normalize_key(key)
+        self._write_expiry(normalized_key, None)
+        return self._write(normalized_key, None)
+
+    def ttl(self, key: str) -> float:
+        """
+        Оставшийся срок жизни видимого в сессии ключа.
+        :param key: Ключ
+        :return: Секунды до истечения; -1, если срок не задан; -2, если ключа нет
+        """
+        if not self._pending and not self._pending_expiry:
+            return self.store.ttl(key)
+        normalized_key = self.store._normalize_key(key)
+        if self._read(normalized_key) is None:
+            return -2
+        deadline = self._deadline(normalized_key)
+        return -1 if deadline is None else deadline - self.store._clock()
+
+    def persist(self, key: str) -> bool:
+        """
+        Снимает срок жизни ключа.
+        :param key: Ключ
+        :return: True если срок был снят
+        """
+        if not self._undo_logs:
+            return self.store.persist(key)
+        normalized_key = self.store._normalize_key(key)
+        if self._read(normalized_key) is None or self._deadline(normalized_key) is None:
+            return False
+        self._write_expiry(normalized_key, None)
+        return True
+
+    def mset(self, pairs: Iterable[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Сохраняет несколько пар ключ-значение.
+        :param pairs: Пары (ключ, значение)
+        :return: Прежние видимые значения
+        """
+        if not self._undo_logs:
+            return self.store.mset(pairs)
+        normalize = self.store._normalize_key
+        old_values = []
+        for key, value in pairs:
+            normalized_key = normalize(key)
+            self._write_expiry(normalized_key, None)
+            old_values.append(self._write(normalized_key, value))
+        return old_values
+
+    def mget(self, keys: Iterable[str]) -> List[str]:
+        """
+        Возвращает видимые в сессии значения нескольких ключей.
+        :param keys: Ключи
+        """
+        if not self._pending:
+            return self.store.mget(keys)
+        return [self.get(key) for key in keys]
+
+    def munset(self, keys: Iterable[str]) -> List[Optional[str]]:
+        """
+        Удаляет несколько ключей.
+        :param keys: Ключи
+        :return: Удалённые значения
+        """
+        if not self._undo_logs:
+            return self.store.munset(keys)
+        normalize = self.store._normalize_key
+        old_values = []
+        for key in keys:
+            normalized_key = normalize(key)
+            self._write_expiry(normalized_key, None)
+            old_values.append(self._write(normalized_key, None))
+        return old_values
+
+    def counts(self, value: str) -> int:
+        """
+        Количество ключей с данным значением с учётом незафиксированных изменений сессии.
+        Стоимость — O(1) плюс размер наложения сессии.
+        :param value: Значение
+        """
+        count = self.store.counts(value)
+        for key_name in self._pending.keys() | self._pending_expiry.keys():
+            committed_value = self.store._lookup(key_name)
+            if committed_value == value:
+                count -= 1
+            if self._read(key_name) == value:
+                count += 1
+        return count
+
+    def find(self, value: str) -> List[str]:
+        """
+        Ключи с данным значением с учётом незафиксированных изменений сессии.
+        :param value: Значение
+        :return: Отсортированный список ключей
+        """
+        if not self._pending and not self._pending_expiry:
+            return self.store.find(value)
+        keys = set(self.store.find(value))
+        for key_name in self._pending.keys() | self._pending_expiry.keys():
+            if self._read(key_name) == value:
+                keys.add(key_name)
+            else:
+                keys.discard(key_name)
+        return sorted(keys)
+
+    def find_page(self, value: str, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Страница ключей с данным значением с учётом изменений сессии.
+        :param value: Значение
+        :param limit: Размер страницы (None — все оставшиеся)
+        :param after: Курсор — последний ключ предыдущей страницы
+        """
+        if not self._pending and not self._pending_expiry:
+            return self.store.find_page(value, limit, after)
+        return merge_overlay_find(self.store.find_page,
+                                  self._pending.keys() | self._pending_expiry.keys(), self._read,
+                                  self.store._normalize_key, value, limit, after)
+
+    def iter_find(self, value: str, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Порции отсортированных ключей с данным значением с учётом изменений сессии.
+        :param value: Значение
+        :param chunk_size: Размер порции
+        :param after: Начать после этого ключа
+        """
+        while True:
+            page = self.find_page(value, chunk_size, after)
+            if not page:
+                return
+            yield page
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def counts_range(self, lo: float, hi: float) -> int:
+        """
+        Количество ключей с числовым значением в [lo, hi] с учётом изменений сессии.
+        Стоимость — O(log n) плюс размер наложения сессии.
+        :param lo: Нижняя граница включительно
+        :param hi: Верхняя граница включительно
+        """
+        count = self.store.counts_range(lo, hi)
+        for key_name in self._pending.keys() | self._pending_expiry.keys():
+            if number_in_range(self.store._lookup(key_name), lo, hi) is not None:
+                count -= 1
+            if number_in_range(self._read(key_name), lo, hi) is not None:
+                count += 1
+        return count
+
+    def find_range_page(self, lo: float, hi: float, limit: Optional[int] = None,
+                        after: Optional[NumericEntry] = None) -> List[NumericEntry]:
+        """
+        Страница пар (число, ключ) со значением в [lo, hi] с учётом изменений сессии.
+        :param lo: Нижняя граница включительно
+        :param hi: Верхняя граница включительно
+        :param limit: Размер страницы (None — все оставшиеся)
+        :param after: Курсор — последняя пара предыдущей страницы
+        """
+        if not self._pending and not self._pending_expiry:
+            return self.store.find_range_page(lo, hi, limit, after)
+        return merge_overlay_range(self.store.find_range_page,
+                                   self._pending.keys() | self._pending_expiry.keys(),
+                                   self.store._lookup, self._read, lo, hi, limit, after)
+
+    def iter_find_range(self, lo: float, hi: float, chunk_size: int = 1000) -> Iterator[List[str]]:
+        """
+        Порции ключей с числовым значением в [lo, hi] с учётом изменений сессии.
+        :param lo: Нижняя граница включительно
+        :param hi: Верхняя граница включительно
+        :param chunk_size: Размер порции
+        """
+        after = None
+        while True:
+            page = self.find_range_page(lo, hi, chunk_size, after)
+            if not page:
+                return
+            yield [key_name for _, key_name in page]
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def scan_page(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Страница ключей из диапазона с учётом незафиксированных изменений сессии:
+        свои новые ключи добавляются, удалённые в транзакции — исключаются.
+        :param prefix: Префикс ключа
+        :param start: Нижняя граница включительно
+        :param end: Верхняя граница не включительно
+        :param limit: Размер страницы (None — все оставшиеся)
+        :param after: Курсор — последний ключ предыдущей страницы
+        """
+        if not self._pending and not self._pending_expiry:
+            return self.store.scan_page(prefix, start, end, limit, after)
+        overlay = self._pending.keys() | self._pending_expiry.keys()
+        return merge_overlay_page(self.store.scan_page, overlay,
+                                  lambda key_name: self._read(key_name) is not None,
+                                  self.store._normalize_key, prefix, start, end, limit, after)
+
+    def iter_scan(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Порции ключей из диапазона с учётом изменений сессии.
+        :param prefix: Префикс ключа
+        :param start: Нижняя граница включительно
+        :param end: Верхняя граница не включительно
+        :param chunk_size: Размер порции
+        :param after: Начать после этого ключа
+        """
+        while True:
+            page = self.scan_page(prefix, start, end, chunk_size, after)
+            if not page:
+                return
+            yield page
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def begin(self) -> bool:
+        """
+        Начинает транзакцию сессии.
+        :return: True
+        """
+        self._undo_logs.append({})
+        self._expiry_undo.append({})
+        return True
+
+    def rollback(self) -> bool:
+        """
+        Откатывает текущую транзакцию сессии.
+        :return: True если транзакция была откатена, False если активной транзакции нет
+        """
+        if not self._undo_logs:
+            return False
+        self._restore(self._pending, self._undo_logs.pop())
+        self._restore(self._pending_expiry, self._expiry_undo.pop())
+        return True
+
+    def commit(self) -> bool:
+        """
+        Применяет текущую транзакцию сессии: вложенную — к родительской транзакции,
+        транзакцию верхнего уровня — к общему хранилищу одной операцией.
+        :return: True если изменения применены, False если активной транзакции нет
+        """
+        if not self._undo_logs:
+            return False
+        undo_log = self._undo_logs.pop()
+        expiry_log = self._expiry_undo.pop()
+        if not self._undo_logs:
+            changes = list(self._pending.items())
+            expiries = list(self._pending_expiry.items())
+            self._pending.clear()
+            self._pending_expiry.clear()
+            self.store.apply_changes(changes)
+            # Записанные и удалённые ключи уже без срока: persist нужен только для PERSIST
+            written = dict(changes)
+            for key_name, deadline in expiries:
+                if deadline is not None:
+                    self.store.expire_at(key_name, deadline)
+                elif key_name not in written:
+                    self.store.persist(key_name)
+            return True
+        merge = KeyValueStore._merge_logs
+        self._undo_logs[-1] = merge(undo_log, self._undo_logs[-1])
+        self._expiry_undo[-1] = merge(expiry_log, self._expiry_undo[-1])
+        return True
+
+    def close(self) -> None:
+        """
+        Завершает сессию: незафиксированные транзакции отбрасываются.
+        """
+        self._undo_logs.clear()
+        self._pending.clear()
+        self._expiry_undo.clear()
+        self._pending_expiry.clear()
+
+    @property
+    def transaction_depth(self) -> int:
+        """
+        Количество открытых транзакций сессии.
+        """
+        return len(self._undo_logs)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Показатели общего хранилища, глубина транзакций сессии и размеры её наложений.
+        """
+        stats = self.store.stats()
+        stats['transaction_depth'] = len(self._undo_logs)
+        stats['pending_keys'] = len(self._pending)
+        stats['pending_expiry'] = len(self._pending_expiry)
+        return stats
+
+    def committed_buckets(self) -> Iterator[Tuple[str, Iterable[str]]]:
+        """
+        Зафиксированное состояние общего хранилища, сгруппированное по значениям.
+        """
+        return self.store.committed_buckets()
+
+    def committed_deadlines(self) -> List[Tuple[str, float]]:
+        """
+        Зафиксированные сроки жизни общего хранилища.
+        """
+        return self.store.committed_deadlines()
+
+    def freeze(self) -> FrozenState:
+        """
+        Замороженный срез зафиксированного состояния общего хранилища.
+        """
+        return self.store.freeze()
+
+    def load_buckets(self, buckets: Iterable[Tuple[str, List[str]]],
+                     deadlines: Iterable[Tuple[str, float]] = ()) -> int:
+        """
+        Заменяет содержимое общего хранилища.
+        :param buckets: Пары (значение, ключи)
+        :param deadlines: Сроки жизни: пары (ключ, момент истечения)
+        :raises ValueError: если в сессии открыта транзакция
+        """
+        if self._undo_logs:
+            raise ValueError('Нельзя загрузить данные внутри транзакции')
+        return self.store.load_buckets(buckets, deadlines)
+
+    def _read(self, normalized_key: str) -> Optional[str]:
+        """
+        Видимое в сессии значение ключа.
+        :param normalized_key: Нормализованный ключ
+        """
+        if normalized_key in self._pending:
+            value = self._pending[normalized_key]
+            deadline = self._pending_expiry.get(normalized_key)
+            if value is not None and deadline is not None and deadline <= self.store._clock():
+                return None
+            return value
+        if normalized_key in self._pending_expiry:
+            deadline = self._pending_expiry[normalized_key]
+            if deadline is not None and deadline <= self.store._clock():
+                return None
+        return self.store._lookup(normalized_key)
+
+    def _deadline(self, normalized_key: str) -> Optional[float]:
+        """
+        Видимый в сессии момент истечения ключа.
+        :param normalized_key: Нормализованный ключ
+        """
+        if normalized_key in self._pending_expiry:
+            return self._pending_expiry[normalized_key]
+        if normalized_key in self._pending:
+            return None
+        return self.store._expiry_of(normalized_key)
+
+    def _write_expiry(self, normalized_key: str, deadline: Optional[float]) -> None:
+        """
+        Записывает срок жизни ключа в наложение текущей транзакции сессии.
+        :param normalized_key: Нормализованный ключ
+        :param deadline: Момент истечения или None, если срок снят
+        """
+        if self._deadline(normalized_key) == deadline:
+            return
+        self._expiry_undo[-1].setdefault(normalized_key,
+                                         self._pending_expiry.get(normalized_key, _MISSING))
+        self._pending_expiry[normalized_key] = deadline
+
+    @staticmethod
+    def _restore(overlay: Dict[str, OverlayEntry], undo_log: Dict[str, OverlayEntry]) -> None:
+        """
+        Возвращает наложение к состоянию до транзакции по её журналу отката.
+        :param overlay: Наложение сессии
+        :param undo_log: Журнал отката
+        """
+        for key_name, previous_entry in undo_log.items():
+            if previous_entry is _MISSING:
+                overlay.pop(key_name, None)
+            else:
+                overlay[key_name] = previous_entry
+
+    def _write(self, normalized_key: str, value: Optional[str]) -> Optional[str]:
+        """
+        Записывает изменение в наложение текущей транзакции сессии.
+        :param normalized_key: Нормализованный ключ
+        :param value: Новое значение или None для удаления
+        :return: Прежнее видимое значение
+        """
+        old_value = self._read(normalized_key)
+        if old_value == value:
+            return old_value
+        self._undo_logs[-1].setdefault(normalized_key, self._pending.get(normalized_key, _MISSING))
+        self._pending[normalized_key] = value
+        return old_value
@@ -0,0 +1,574 @@
+import heapq
+import io
+import multiprocessing
+from itertools import chain, islice
+from time import perf_counter_ns
+from zlib import crc32
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from utils.batch_runner import BATCH_READ_HINT
+from utils.command_dispatcher import CommandDispatcher
+from utils.key_value_store import KeyValueStore
+from utils.logger_config import logger
+from utils.numeric_index import NumericEntry
+from utils.stats import CommandStats, merge_store_stats
+
+# Команды с ключом первым аргументом: выполняются целиком в шарде этого ключа
+KEY_COMMANDS = frozenset({'SET', 'GET', 'UNSET', 'TTL', 'PERSIST'})
+
+# Команды, рассылаемые всем шардам в общем потоке (ожидаемое число аргументов);
+# ответы шардов объединяются, поэтому они не прерывают конвейер
+FANOUT_COMMANDS = {'COUNTS': 1, 'FIND': 1, 'BEGIN': 0, 'COMMIT': 0, 'ROLLBACK': 0}
+
+# Лимиты хранилища, которые делятся между шардами
+SHARED_LIMITS = ('max_keys', 'max_bytes')
+
+# Отправленная шардам порция: (шарды, получившие строки; план вывода)
+SentBatch = Tuple[List[int], List[Tuple[str, int]]]
+# Полученный вывод порции: (план вывода, текст вывода шардов, смещения концов строк,
+# время выполнения строк в нс или None, если статистика выключена)
+ReceivedBatch = Tuple[List[Tuple[str, int]], List[str], List[List[int]], List[Optional[List[int]]]]
+
+
+def shard_limits(store_options: Dict[str, Any], workers: int) -> Dict[str, Any]:
+    """
+    Параметры хранилища шарда: лимиты max_keys/max_bytes делятся поровну с округлением вниз,
+    поэтому сумма лимитов шардов не превышает общий лимит. Ключи распределяются по шардам
+    не идеально ровно, и шард, получивший больше своей доли, начинает вытеснять раньше.
+    :param store_options: Параметры KeyValueStore всего хранилища
+    :param workers: Количество шардов
+    :raises ValueError: если лимит меньше числа шардов
+    """
+    options = dict(store_options)
+    for name in SHARED_LIMITS:
+        limit = options.get(name)
+        if limit is None:
+            continue
+        if limit < workers:
+            raise ValueError('Лимит хранилища меньше числа шардов')
+        options[name] = limit // workers
+    return options
+
+
+def _shard_worker(connection, store_options: Dict[str, Any]) -> None:
+    """
+    Цикл процесса-шарда: своё KeyValueStore и диспетчер, команды приходят по каналу.
+    Сообщения: ('lines', строки, замерять ли время) — выполнить строки команд и вернуть
+    вывод каждой (и время её выполнения); ('call', метод, аргументы) — вызвать метод
+    хранилища; ('close',) — завершиться. Неожиданное исключение не завершает процесс:
+    строка пропускается с записью в журнал, вызов метода возвращает ошибку.
+    :param connection: Конец канала multiprocessing.Pipe
+    :param store_options: Параметры KeyValueStore
+    """
+    store = KeyValueStore(**store_options)
+    out = io.StringIO()
+    dispatcher = CommandDispatcher(store, out=out)
+    commands = dispatcher.commands
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message[0] == 'close':
+            connection.close()
+            return
+        if message[0] == 'lines':
+            offsets = []
+            timings: Optional[List[int]] = [] if message[2] else None
+            for line in message[1]:
+                parts = line.split()
+                started = perf_counter_ns() if timings is not None else 0
+                try:
+                    commands[parts[0].upper()](parts[1:])
+                except ValueError as e:
+                    logger.info('НЕВЕРНАЯ КОМАНДА: %s', e)
+                except Exception:
+                    logger.exception('Ошибка шарда при выполнении команды %s', parts[0])
+                if timings is not None:
+                    timings.append(perf_counter_ns() - started)
+                offsets.append(out.tell())
+            text = out.getvalue()
+            out.seek(0)
+            out.truncate()
+            connection.send((text, offsets, timings))
+            continue
+        _, method, args = message
+        try:
+            result = getattr(store, method)(*args)
+            if method == 'committed_buckets':
+                result = [(value, list(keys)) for value, keys in result]
+        except ValueError as e:
+            connection.send(('error', e))
+        except Exception as e:
+            logger.exception('Ошибка шарда при вызове %s', method)
+            connection.send(('error', RuntimeError(f'Ошибка шарда: {type(e).__name__}: {e}')))
+        else:
+            connection.send(('ok', result))
+
+
+class ShardedStore:
+    """
+    Хранилище, разбитое на N процессов-шардов по crc32 нормализованного ключа.
+    Снаружи поддерживает интерфейс KeyValueStore и подходит для CommandDispatcher.
+    COUNTS и FIND рассылаются всем шардам, результаты объединяются (FIND — слиянием
+    отсортированных ответов шардов). BEGIN/COMMIT/ROLLBACK рассылаются всем шардам в одной
+    и той же точке потока команд, поэтому для клиента это одна логическая транзакция.
+
+    Параллельность даёт пакетный режим (run_batch): строки порции раскладываются по
+    шардам без ожидания ответов, шарды выполняют свои части одновременно, а вывод
+    собирается в исходном порядке. Команды одного ключа выполняются в порядке ввода,
+    рассылаемые команды попадают в поток каждого шарда в той же позиции.
+    """
+
+    def __init__(self, workers: int = 2, **store_options: Any) -> None:
+        """
+        Запускает процессы-шарды.
+        :param workers: Количество шардов
+        :param store_options: Параметры KeyValueStore; лимиты делятся между шардами (shard_limits)
+        :raises ValueError: если шардов нет или лимит меньше числа шардов
+        """
+        if workers < 1:
+            raise ValueError('Количество шардов должно быть положительным')
+        store_options = shard_limits(store_options, workers)
+        self.workers = workers
+        self._connections = []
+        self._processes = []
+        for _ in range(workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_shard_worker, args=(child, store_options),
+                                              daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        self._depth = 0
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[str]:
+        return self._call_key(key, 'set', key, value, ttl)
+
+    def get(self, key: str) -> str:
+        return self._call_key(key, 'get', key)
+
+    def unset(self, key: str) -> Optional[str]:
+        return self._call_key(key, 'unset', key)
+
+    def ttl(self, key: str) -> float:
+        return self._call_key(key, 'ttl', key)
+
+    def persist(self, key: str) -> bool:
+        return self._call_key(key, 'persist', key)
+
+    def mset(self, pairs: Iterable[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Сохраняет несколько пар: каждый шард получает свою часть одним сообщением.
+        :param pairs: Пары (ключ, значение)
+        :return: Прежние значения в порядке пар
+        """
+        pairs = list(pairs)
+        return self._scatter('mset', pairs, [key for key, _ in pairs])
+
+    def mget(self, keys: Iterable[str]) -> List[str]:
+        keys = list(keys)
+        return self._scatter('mget', keys, keys)
+
+    def munset(self, keys: Iterable[str]) -> List[Optional[str]]:
+        keys = list(keys)
+        return self._scatter('munset', keys, keys)
+
+    def counts(self, value: str) -> int:
+        return sum(self._broadcast('counts', value))
+
+    def find(self, value: str) -> List[str]:
+        return sorted(chain.from_iterable(self._broadcast('find', value)))
+
+    def find_page(self, value: str, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Страница ключей: каждый шард отдаёт до limit ключей, страницы сливаются.
+        :param value: Значение
+        :param limit: Размер страницы (None — все оставшиеся)
+        :param after: Курсор — последний ключ предыдущей страницы
+        """
+        merged = sorted(chain.from_iterable(self._broadcast('find_page', value, limit, after)))
+        return merged if limit is None else merged[:limit]
+
+    def iter_find(self, value: str, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Порции отсортированных ключей; каждая порция — отдельный запрос к шардам.
+        """
+        while True:
+            chunk = self.find_page(value, chunk_size, after)
+            if not chunk:
+                return
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1]
+
+    def counts_range(self, lo: float, hi: float) -> int:
+        return sum(self._broadcast('counts_range', lo, hi))
+
+    def find_range_page(self, lo: float, hi: float, limit: Optional[int] = None,
+                        after: Optional[NumericEntry] = None) -> List[NumericEntry]:
+        """
+        Страница пар (число, ключ): каждый шард отдаёт до limit пар, страницы сливаются.
+        """
+        merged = heapq.merge(*self._broadcast('find_range_page', lo, hi, limit, after))
+        return list(merged) if limit is None else list(islice(merged, limit))
+
+    def iter_find_range(self, lo: float, hi: float, chunk_size: int = 1000) -> Iterator[List[str]]:
+        """
+        Порции ключей со значением в [lo, hi]; каждая порция — отдельный запрос к шардам.
+        """
+        after = None
+        while True:
+            page = self.find_range_page(lo, hi, chunk_size, after)
+            if not page:
+                return
+            yield [key_name for _, key_name in page]
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    def scan_page(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[str] = None) -> List[str]:
+        """
+        Страница ключей из диапазона: каждый шард отдаёт до limit ключей, страницы сливаются.
+        """
+        merged = heapq.merge(*self._broadcast('scan_page', prefix, start, end, limit, after))
+        return list(merged) if limit is None else list(islice(merged, limit))
+
+    def iter_scan(self, prefix: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, chunk_size: int = 1000,
+                  after: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Порции ключей из диапазона; каждая порция — отдельный запрос к шардам.
+        """
+        while True:
+            chunk = self.scan_page(prefix, start, end, chunk_size, after)
+            if not chunk:
+                return
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1]
+
+    def begin(self) -> bool:
+        self._broadcast('begin')
+        self._depth += 1
+        return True
+
+    def rollback(self) -> bool:
+        if not self._depth:
+            return False
+        self._broadcast('rollback')
+        self._depth -= 1
+        return True
+
+    def commit(self) -> bool:
+        if not self._depth:
+            return False
+        self._broadcast('commit')
+        self._depth -= 1
+        return True
+
+    @property
+    def transaction_depth(self) -> int:
+        return self._depth
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Сумма показателей шардов и их число.
+        """
+        stats = merge_store_stats(self._broadcast('stats'))
+        stats['shards'] = self.workers
+        return stats
+
+    def committed_buckets(self) -> Iterator[Tuple[str, Iterable[str]]]:
+        """
+        Зафиксированное состояние всех шардов; одно значение может встретиться
+        несколько раз (по корзине от каждого шарда).
+        """
+        for buckets in self._broadcast('committed_buckets'):
+            yield from buckets
+
+    def committed_deadlines(self) -> List[Tuple[str, float]]:
+        """
+        Зафиксированные сроки жизни всех шардов.
+        """
+        return [deadline for deadlines in self._broadcast('committed_deadlines') for deadline in deadlines]
+
+    def freeze(self) -> None:
+        """
+        Срез шардов живёт в других процессах, поэтому фоновое сохранение не поддерживается.
+        :raises ValueError: всегда
+        """
+        raise ValueError('Фоновое сохранение не поддерживается для шардированного хранилища')
+
+    def load_buckets(self, buckets: Iterable[Tuple[str, List[str]]],
+                     deadlines: Iterable[Tuple[str, float]] = ()) -> int:
+        """
+        Заменяет содержимое всех шардов, раскладывая ключи каждой корзины и сроки по шардам.
+        :raises ValueError: если открыта транзакция
+        """
+        if self._depth:
+            raise ValueError('Нельзя загрузить данные внутри транзакции')
+        per_shard: List[List[Tuple[str, List[str]]]] = [[] for _ in self._connections]
+        for value, keys in buckets:
+            parts: Dict[int, List[str]] = {}
+            for key in keys:
+                parts.setdefault(self._shard_of(key), []).append(key)
+            for shard, shard_keys in parts.items():
+                per_shard[shard].append((value, shard_keys))
+        shard_deadlines: List[List[Tuple[str, float]]] = [[] for _ in self._connections]
+        for key_name, deadline in deadlines:
+            shard_deadlines[self._shard_of(key_name)].append((key_name, deadline))
+        for connection, shard_buckets, part in zip(self._connections, per_shard, shard_deadlines):
+            self._send(connection, ('call', 'load_buckets', (shard_buckets, part)))
+        return sum(self._receive(connection) for connection in self._connections)
+
+    def run_batch(self, dispatcher: CommandDispatcher, input_stream: TextIO,
+                  read_hint: int = BATCH_READ_HINT) -> int:
+        """
+        Пакетное выполнение с параллельной работой шардов (аналог batch_runner.run_batch).
+        Команды ключа и рассылаемые команды копятся по шардам; остальные (MSET, SAVE, ...)
+        выполняются через dispatcher после того, как всё накопленное выполнено.
+        Пока шарды выполняют одну порцию, маршрутизатор раскладывает следующую
+        и записывает вывод предыдущей.
+        :param dispatcher: Диспетчер над этим хранилищем; в его поток пишется вывод
+        :param input_stream: Входной поток команд
+        :param read_hint: Примерный объём одной порции чтения в байтах
+        :return: Количество выполненных команд
+        """
+        commands = dispatcher.commands
+        # Строки шардов не проходят через обёртки статистики диспетчера: время замеряют шарды
+        timed = dispatcher.pipeline.stats is not None
+        workers = self.workers
+        executed = 0
+        in_flight: Optional[SentBatch] = None
+        while True:
+            lines = input_stream.readlines(read_hint)
+            if not lines:
+                self._write_output(dispatcher, self._receive_lines(in_flight))
+                logger.debug('Получен EOF. Завершение пакетного выполнения')
+                return executed
+            per_shard: List[List[str]] = [[] for _ in self._connections]
+            plan: List[Tuple[str, int]] = []
+            for line in lines:
+                parts = line.split(None, 2)
+                if not parts:
+                    continue
+                cmd = parts[0].upper()
+                if cmd in KEY_COMMANDS and len(parts) > 1:
+                    shard = crc32(parts[1].lower().encode('utf-8')) % workers
+                    per_shard[shard].append(line)
+                    plan.append((cmd, shard))
+                    executed += 1
+                    continue
+                if FANOUT_COMMANDS.get(cmd, -1) == len(parts) - 1:
+                    for shard_lines in per_shard:
+                        shard_lines.append(line)
+                    if cmd == 'BEGIN':
+                        self._depth += 1
+                    elif cmd != 'COUNTS' and cmd != 'FIND' and self._depth:
+                        self._depth -= 1
+                    plan.append((cmd, -1))
+                    executed += 1
+                    continue
+                self._write_output(dispatcher, self._receive_lines(in_flight))
+                in_flight = None
+                self._write_output(dispatcher, self._receive_lines(self._send_lines(per_shard, plan, timed)))
+                per_shard = [[] for _ in self._connections]
+                plan = []
+                handler = commands.get(cmd)
+                if handler is None:
+                    logger.info('НЕВЕРНАЯ КОМАНДА')
+                    continue
+                try:
+                    handler(line.split()[1:])
+                except KeyboardInterrupt:
+                    logger.debug('Завершение пакетного выполнения по команде END')
+                    return executed
+                except ValueError as e:
+                    logger.info('НЕВЕРНАЯ КОМАНДА: %s', e)
+                executed += 1
+            received = self._receive_lines(in_flight)
+            in_flight = self._send_lines(per_shard, plan, timed)
+            self._write_output(dispatcher, received)
+
+    def close(self) -> None:
+        """
+        Останавливает процессы-шарды.
+        """
+        for connection in self._connections:
+            try:
+                connection.send(('close',))
+            except OSError:
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections.clear()
+        self._processes.clear()
+
+    def _send_lines(self, per_shard: List[List[str]], plan: List[Tuple[str, int]],
+                    timed: bool = False) -> Optional[SentBatch]:
+        """
+        Отправляет накопленные строки всем шардам, не дожидаясь ответов.
+        :param per_shard: Строки каждого шарда
+        :param plan: Для каждой строки ввода: (команда, номер шарда или -1 для рассылаемой)
+        :param timed: Замерять время выполнения каждой строки
+        :return: Описание отправленной порции или None, если отправлять нечего
+        """
+        if not plan:
+            return None
+        active = [shard for shard, shard_lines in enumerate(per_shard) if shard_lines]
+        for shard in active:
+            self._send(self._connections[shard], ('lines', per_shard[shard], timed))
+        return active, plan
+
+    def _receive_lines(self, sent: Optional[SentBatch]) -> Optional[ReceivedBatch]:
+        """
+        Дожидается вывода шардов по отправленной порции.
+        :param sent: Результат _send_lines
+        :return: (plan, вывод каждого шарда, смещения концов строк вывода, время строк) или None
+        """
+        if sent is None:
+            return None
+        active, plan = sent
+        texts: List[str] = [''] * len(self._connections)
+        offsets: List[List[int]] = [[] for _ in self._connections]
+        timings: List[Optional[List[int]]] = [None] * len(self._connections)
+        for shard in active:
+            texts[shard], offsets[shard], timings[shard] = self._recv(self._connections[shard])
+        return plan, texts, offsets, timings
+
+    def _write_output(self, dispatcher: CommandDispatcher,
+                      received: Optional[ReceivedBatch]) -> None:
+        """
+        Пишет вывод порции в исходном порядке строк, объединяя ответы рассылаемых команд.
+        Если статистика включена, записывает время строк: рассылаемая команда выполняется
+        шардами параллельно, поэтому её время — наибольшее из времён шардов.
+        :param dispatcher: Диспетчер, в поток которого пишется вывод
+        :param received: Результат _receive_lines
+        """
+        if received is None:
+            return
+        plan, texts, offsets, timings = received
+        stats: Optional[CommandStats] = dispatcher.pipeline.stats
+        positions = [0] * len(texts)
+        cursors = [0] * len(texts)
+        output: List[str] = []
+        for cmd, target in plan:
+            if target >= 0:
+                end = offsets[target][cursors[target]]
+                output.append(texts[target][positions[target]:end])
+                if stats is not None and timings[target] is not None:
+                    stats.histogram(cmd).record(timings[target][cursors[target]])
+                positions[target] = end
+                cursors[target] += 1
+                continue
+            parts = []
+            elapsed = 0
+            for shard, text in enumerate(texts):
+                end = offsets[shard][cursors[shard]]
+                parts.append(text[positions[shard]:end])
+                if timings[shard] is not None:
+                    elapsed = max(elapsed, timings[shard][cursors[shard]])
+                positions[shard] = end
+                cursors[shard] += 1
+            output.append(self._merge_output(cmd, parts))
+            if stats is not None and timings[0] is not None:
+                stats.histogram(cmd).record(elapsed)
+        dispatcher._write(''.join(output))
+
+    @staticmethod
+    def _merge_output(cmd: str, parts: List[str]) -> str:
+        """
+        Объединяет вывод рассылаемой команды от всех шардов.
+        :param cmd: Команда
+        :param parts: Вывод каждого шарда
+        """
+        if cmd == 'COUNTS':
+            return f'{sum(int(part) for part in parts)}\n'
+        if cmd == 'FIND':
+            keys = sorted(chain.from_iterable(part.split() for part in parts if part != 'NULL\n'))
+            return f"{' '.join(keys)}\n" if keys else 'NULL\n'
+        return parts[0]
+
+    def _shard_of(self, normalized_key: str) -> int:
+        """
+        Номер шарда ключа.
+        :param normalized_key: Нормализованный ключ
+        """
+        return crc32(normalized_key.encode('utf-8')) % self.workers
+
+    def _call_key(self, key: str, method: str, *args: Any) -> Any:
+        """
+        Вызывает метод хранилища в шарде ключа.
+        """
+        connection = self._connections[self._shard_of(key.lower())]
+        self._send(connection, ('call', method, args))
+        return self._receive(connection)
+
+    def _broadcast(self, method: str, *args: Any) -> List[Any]:
+        """
+        Вызывает метод во всех шардах параллельно.
+        :return: Результаты шардов по порядку
+        """
+        for connection in self._connections:
+            self._send(connection, ('call', method, args))
+        return [self._receive(connection) for connection in self._connections]
+
+    def _scatter(self, method: str, items: List[Any], keys: List[str]) -> List[Any]:
+        """
+        Раскладывает элементы пакетной операции по шардам и собирает результаты
+        в исходном порядке.
+        :param method: Пакетный метод хранилища (mset, mget, munset)
+        :param items: Элементы (пары или ключи)
+        :param keys: Ключ каждого элемента
+        """
+        per_shard: Dict[int, List[int]] = {}
+        for position, key in enumerate(keys):
+            per_shard.setdefault(self._shard_of(key.lower()), []).append(position)
+        for shard, positions in per_shard.items():
+            self._send(self._connections[shard], ('call', method, ([items[p] for p in positions],)))
+        results: List[Any] = [None] * len(items)
+        for shard, positions in per_shard.items():
+            for position, result in zip(positions, self._receive(self._connections[shard])):
+                results[position] = result
+        return results
+
+    @staticmethod
+    def _send(connection, message: Tuple) -> None:
+        """
+        Отправляет сообщение шарду.
+        :raises RuntimeError: если процесс шарда завершился и канал закрыт
+        """
+        try:
+            connection.send(message)
+        except OSError as e:
+            raise RuntimeError('Процесс-шард завершился') from e
+
+    @staticmethod
+    def _recv(connection) -> Any:
+        """
+        Получает сообщение шарда.
+        :raises RuntimeError: если процесс шарда завершился и канал закрыт
+        """
+        try:
+            return connection.recv()
+        except (EOFError, OSError) as e:
+            raise RuntimeError('Процесс-шард завершился') from e
+
+    @staticmethod
+    def _receive(connection) -> Any:
+        """
+        Получает ответ шарда на вызов метода; ошибки шарда пробрасываются
+        (ValueError — неверные аргументы, RuntimeError — сбой шарда).
+        """
+        status, result = ShardedStore._recv(connection)
+        if status == 'error':
+            raise result
+        return result
@@ -0,0 +1,242 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from typing import Any, Iterable, Iterator, List, Optional, Set, Tuple
+from utils.key_value_store import KeyValueStore
+from utils.logger_config import logger
+
+# Формат снимка:
+#   MAGIC
+#   раздел сроков жизни: uint32 число сроков, для каждого —
+#     uint32 длина ключа, ключ (UTF-8), float64 момент истечения;
+#   далее записи-корзины до конца файла, каждая:
+#     uint32 длина значения, значение (UTF-8),
+#     uint32 число ключей, uint32 длина блока ключей,
+#     блок ключей (UTF-8, ключи разделены KEY_SEPARATOR).
+# Все числа little-endian. Одно значение может встречаться в нескольких
+# записях: крупные корзины режутся на части по KEYS_PER_RECORD ключей.
+# Снимки первой версии (LEGACY_MAGIC) раздела сроков не содержат и читаются без сроков.
+MAGIC = b'KVSNAP\x00\x02'
+LEGACY_MAGIC = b'KVSNAP\x00\x01'
+KEY_SEPARATOR = '\n'
+KEYS_PER_RECORD = 65536
+_HEADER = struct.Struct('<I')
+_KEYS_HEADER = struct.Struct('<II')
+_DEADLINE = struct.Struct('<d')
+
+# Пути, в которые сейчас пишут фоновые сохранения: общие для всех сессий процесса
+_background_paths: Set[str] = set()
+_background_lock = threading.Lock()
+
+
+def save_snapshot(store: KeyValueStore, path: str) -> int:
+    """
+    Сохраняет зафиксированное состояние хранилища в бинарный снимок.
+    Файл пишется во временный файл и атомарно подменяет прежний снимок.
+    :param store: Хранилище
+    :param path: Путь к файлу снимка
+    :return: Количество сохранённых ключей
+    """
+    saved = write_snapshot(store.committed_buckets(), path, deadlines=store.committed_deadlines())
+    logger.debug('Снимок сохранён: %s, ключей: %d', path, saved)
+    return saved
+
+
+def write_snapshot(buckets: Iterable[Tuple[str, Iterable[str]]], path: str,
+                   tmp_suffix: str = '.tmp', deadlines: Iterable[Tuple[str, float]] = ()) -> int:
+    """
+    Записывает корзины (значение, ключи) в файл снимка через временный файл.
+    Временный файл уникален (mkstemp в каталоге снимка), поэтому одновременные
+    записи в один путь не портят друг другу данные: побеждает последняя.
+    :param buckets: Пары (значение, ключи); значение может повторяться
+    :param path: Путь к файлу снимка
+    :param tmp_suffix: Суффикс временного файла
+    :param deadlines: Сроки жизни: пары (ключ, момент истечения)
+    :return: Количество сохранённых ключей
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    descriptor, tmp_path = tempfile.mkstemp(prefix=f'{name}.', suffix=tmp_suffix, dir=directory)
+    saved = 0
+    try:
+        with os.fdopen(descriptor, 'wb') as snapshot_file:
+            snapshot_file.write(MAGIC + encode_deadlines(deadlines))
+            for record, count in encode_records(buckets):
+                snapshot_file.write(record)
+                saved += count
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return saved
+
+
+def encode_deadlines(deadlines: Iterable[Tuple[str, float]]) -> bytes:
+    """
+    Кодирует раздел сроков жизни снимка.
+    :param deadlines: Пары (ключ, момент истечения)
+    :return: Байты раздела (идут сразу после MAGIC)
+    """
+    parts = [b'']
+    for key_name, deadline in deadlines:
+        encoded_key = key_name.encode('utf-8')
+        parts.append(_HEADER.pack(len(encoded_key)) + encoded_key + _DEADLINE.pack(deadline))
+    parts[0] = _HEADER.pack(len(parts) - 1)
+    return b''.join(parts)
+
+
+def encode_records(buckets: Iterable[Tuple[str, Iterable[str]]]) -> Iterator[Tuple[bytes, int]]:
+    """
+    Кодирует корзины в записи снимка (без MAGIC); крупные корзины режутся по KEYS_PER_RECORD.
+    :param buckets: Пары (значение, ключи)
+    :return: Итератор пар (байты записи, число ключей в ней)
+    :raises ValueError: если ключ содержит перевод строки
+    """
+    for value, keys in buckets:
+        keys = list(keys)
+        encoded_value = value.encode('utf-8')
+        for start in range(0, len(keys), KEYS_PER_RECORD):
+            chunk = keys[start:start + KEYS_PER_RECORD]
+            blob = KEY_SEPARATOR.join(chunk).encode('utf-8')
+            if blob.count(b'\n') != len(chunk) - 1:
+                raise ValueError('Ключи с переводом строки нельзя сохранить в снимок')
+            yield (_HEADER.pack(len(encoded_value)) + encoded_value
+                   + _KEYS_HEADER.pack(len(chunk), len(blob)) + blob), len(chunk)
+
+
+class BackgroundSave:
+    """
+    Сохранение снимка в фоновом потоке: хранилище замораживается (freeze) в момент
+    запуска, и поток пишет этот срез, пока команды продолжают менять хранилище.
+    Снимок точно соответствует моменту запуска; дополнительная память пропорциональна
+    числу ключей, изменённых за время записи. Поток не демонический: процесс при выходе
+    дожидается окончания записи. В один путь одновременно пишет только одно
+    фоновое сохранение процесса, даже если BGSAVE пришли из разных соединений.
+    """
+
+    def __init__(self, store: Any, path: str) -> None:
+        """
+        Замораживает хранилище (в потоке-владельце хранилища) и запускает запись.
+        :param store: Хранилище с методом freeze()
+        :param path: Путь к файлу снимка
+        :raises ValueError: если в этот путь уже идёт фоновое сохранение
+            или хранилище не поддерживает заморозку
+        """
+        self.path = path
+        self.saved: Optional[int] = None
+        self.error: Optional[str] = None
+        self._key = os.path.abspath(path)
+        with _background_lock:
+            if self._key in _background_paths:
+                raise ValueError(f'Фоновое сохранение снимка {path} уже выполняется')
+            _background_paths.add(self._key)
+        try:
+            self._frozen = store.freeze()
+        except BaseException:
+            self._finish()
+            raise
+        self._thread = threading.Thread(target=self._run, name='background-save')
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        """
+        Идёт ли запись.
+        """
+        return self._thread.is_alive()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Дожидается окончания записи.
+        :param timeout: Наибольшее время ожидания в секундах (None — без ограничения)
+        :return: Количество сохранённых ключей (None — запись не закончена или не удалась)
+        """
+        self._thread.join(timeout)
+        return self.saved
+
+    def _run(self) -> None:
+        try:
+            # Свой временный файл: одновременный SAVE в тот же путь не помешает
+            self.saved = write_snapshot(self._frozen.buckets(), self.path, '.bgsave.tmp',
+                                        self._frozen.deadlines)
+            logger.info('Фоновое сохранение: снимок %s записан, ключей: %d', self.path, self.saved)
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            logger.warning('Ошибка фонового сохранения снимка %s: %s', self.path, e)
+        finally:
+            self._frozen.close()
+            self._finish()
+
+    def _finish(self) -> None:
+        """
+        Освобождает путь для следующего фонового сохранения.
+        """
+        with _background_lock:
+            _background_paths.discard(self._key)
+
+
+def iter_snapshot(path: str, deadlines: Optional[List[Tuple[str, float]]] = None
+                  ) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Потоково читает снимок через mmap, по одной записи-корзине за раз.
+    :param path: Путь к файлу снимка
+    :param deadlines: Список, в который до первой корзины добавляются сроки жизни снимка
+    :return: Итератор пар (значение, ключи)
+    :raises ValueError: если файл не является снимком или повреждён
+    """
+    with open(path, 'rb') as snapshot_file:
+        if os.fstat(snapshot_file.fileno()).st_size < len(MAGIC):
+            raise ValueError(f'Файл {path} не является снимком хранилища')
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(MAGIC)] not in (MAGIC, LEGACY_MAGIC):
+                raise ValueError(f'Файл {path} не является снимком хранилища')
+            offset = len(MAGIC)
+            size = len(data)
+            try:
+                if data[:len(MAGIC)] == MAGIC:
+                    (count,) = _HEADER.unpack_from(data, offset)
+                    offset += _HEADER.size
+                    for _ in range(count):
+                        (key_len,) = _HEADER.unpack_from(data, offset)
+                        offset += _HEADER.size
+                        key_name = data[offset:offset + key_len].decode('utf-8')
+                        offset += key_len
+                        (deadline,) = _DEADLINE.unpack_from(data, offset)
+                        offset += _DEADLINE.size
+                        if deadlines is not None:
+                            deadlines.append((key_name, deadline))
+                while offset < size:
+                    (value_len,) = _HEADER.unpack_from(data, offset)
+                    offset += _HEADER.size
+                    value = data[offset:offset + value_len].decode('utf-8')
+                    offset += value_len
+                    key_count, blob_len = _KEYS_HEADER.unpack_from(data, offset)
+                    offset += _KEYS_HEADER.size
+                    if offset + blob_len > size:
+                        raise ValueError(f'Снимок {path} обрезан')
+                    keys = data[offset:offset + blob_len].decode('utf-8').split(KEY_SEPARATOR)
+                    offset += blob_len
+                    if len(keys) != key_count:
+                        raise ValueError(f'Снимок {path} повреждён')
+                    yield value, keys
+            except struct.error as e:
+                raise ValueError(f'Снимок {path} обрезан') from e
+
+
+def load_snapshot(store: KeyValueStore, path: str) -> int:
+    """
+    Заменяет содержимое хранилища данными из снимка, включая сроки жизни ключей.
+    :param store: Хранилище (без открытых транзакций)
+    :param path: Путь к файлу снимка
+    :return: Количество загруженных ключей
+    """
+    deadlines: List[Tuple[str, float]] = []
+    loaded = store.load_buckets(iter_snapshot(path, deadlines), deadlines)
+    logger.debug('Снимок загружен: %s, ключей: %d', path, loaded)
+    return loaded
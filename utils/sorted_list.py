@@ -0,0 +1,289 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+class SortedList:
+    """
+    Отсортированное множество строк, разбитое на блоки ограниченного размера.
+    Вставка и удаление стоят O(log n + LOAD), проверка наличия — O(log n),
+    перебор с произвольного места — O(log n + k) без пересортировки.
+    Перебор по страницам (page) устойчив к изменениям между вызовами:
+    каждая страница заново ищет позицию по последнему выданному элементу.
+    """
+
+    # Целевой размер блока; блок делится при превышении 2 * LOAD
+    LOAD = 1000
+
+    __slots__ = ('_lists', '_maxes', '_len')
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        """
+        Инициализация из произвольного набора строк (дубликаты отбрасываются).
+        :param values: Начальные элементы
+        """
+        self._lists: List[List[str]] = []
+        self._maxes: List[str] = []
+        self._len = 0
+        self._rebuild(sorted(set(values)))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk in self._lists:
+            yield from chunk
+
+    def __contains__(self, value: str) -> bool:
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return False
+        chunk = self._lists[pos]
+        idx = bisect_left(chunk, value)
+        return chunk[idx] == value
+
+    def __repr__(self) -> str:
+        return f'SortedList({list(self)!r})'
+
+    def add(self, value: str) -> None:
+        """
+        Добавляет элемент, если его ещё нет.
+        :param value: Элемент
+        """
+        maxes = self._maxes
+        if not maxes:
+            self._lists.append([value])
+            maxes.append(value)
+            self._len = 1
+            return
+        pos = bisect_left(maxes, value)
+        if pos == len(maxes):
+            pos -= 1
+            chunk = self._lists[pos]
+            chunk.append(value)
+            maxes[pos] = value
+        else:
+            chunk = self._lists[pos]
+            idx = bisect_left(chunk, value)
+            if chunk[idx] == value:
+                return
+            chunk.insert(idx, value)
+        self._len += 1
+        if len(chunk) > 2 * self.LOAD:
+            half = chunk[self.LOAD:]
+            del chunk[self.LOAD:]
+            maxes[pos] = chunk[-1]
+            self._lists.insert(pos + 1, half)
+            maxes.insert(pos + 1, half[-1])
+
+    def discard(self, value: str) -> None:
+        """
+        Удаляет элемент, если он есть.
+        :param value: Элемент
+        """
+        maxes = self._maxes
+        pos = bisect_left(maxes, value)
+        if pos == len(maxes):
+            return
+        chunk = self._lists[pos]
+        idx = bisect_left(chunk, value)
+        if chunk[idx] != value:
+            return
+        del chunk[idx]
+        self._len -= 1
+        if not chunk:
+            del self._lists[pos]
+            del maxes[pos]
+            return
+        if idx == len(chunk):
+            maxes[pos] = chunk[-1]
+        if len(chunk) < self.LOAD // 4 and pos + 1 < len(self._lists) \
+                and len(chunk) + len(self._lists[pos + 1]) <= 2 * self.LOAD:
+            chunk.extend(self._lists.pop(pos + 1))
+            del maxes[pos + 1]
+            maxes[pos] = chunk[-1]
+
+    def update(self, values: Iterable[str]) -> None:
+        """
+        Добавляет несколько элементов; крупные пачки вливаются слиянием за один проход.
+        :param values: Элементы
+        """
+        values = list(values)
+        if len(values) * 8 < self._len:
+            for value in values:
+                self.add(value)
+            return
+        self._rebuild(sorted(set(self).union(values)))
+
+    def difference_update(self, values: Iterable[str]) -> None:
+        """
+        Удаляет несколько элементов; крупные пачки удаляются одним проходом.
+        :param values: Элементы
+        """
+        values = list(values)
+        if len(values) * 8 < self._len:
+            for value in values:
+                self.discard(value)
+            return
+        removed = set(values)
+        self._rebuild([value for value in self if value not in removed])
+
+    def page(self, after: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """
+        Возвращает до limit элементов, строго больших after, по возрастанию.
+        :param after: Курсор — последний элемент предыдущей страницы (None — с начала)
+        :param limit: Размер страницы (None — до конца)
+        """
+        return self.range_page(None, None, after, limit)
+
+    def range_page(self, start: Optional[str] = None, stop: Optional[str] = None,
+                   after: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """
+        Возвращает до limit элементов x из диапазона start <= x < stop, строго больших after.
+        Стоимость — O(log n + размер результата): начало ищется бинарным поиском,
+        конец диапазона — бинарным поиском в последнем затронутом блоке.
+        :param start: Нижняя граница включительно (None — без неё)
+        :param stop: Верхняя граница не включительно (None — без неё)
+        :param after: Курсор — последний элемент предыдущей страницы (None — с начала)
+        :param limit: Размер страницы (None — до конца диапазона)
+        """
+        result: List[str] = []
+        maxes = self._maxes
+        if after is not None and (start is None or after >= start):
+            pos = bisect_right(maxes, after)
+            if pos == len(maxes):
+                return result
+            idx = bisect_right(self._lists[pos], after)
+        elif start is not None:
+            pos = bisect_left(maxes, start)
+            if pos == len(maxes):
+                return result
+            idx = bisect_left(self._lists[pos], start)
+        else:
+            pos, idx = 0, 0
+        lists = self._lists
+        while pos < len(lists) and (limit is None or len(result) < limit):
+            chunk = lists[pos]
+            end = len(chunk) if limit is None else min(len(chunk), idx + limit - len(result))
+            if stop is not None and chunk[end - 1] >= stop:
+                result.extend(chunk[idx:bisect_left(chunk, stop, idx, end)])
+                return result
+            result.extend(chunk[idx:end])
+            pos, idx = pos + 1, 0
+        return result
+
+    def _rebuild(self, ordered: List[str]) -> None:
+        """
+        Перестраивает блоки из уже отсортированного списка без дубликатов.
+        :param ordered: Отсортированные элементы
+        """
+        load = self.LOAD
+        self._lists = [ordered[start:start + load] for start in range(0, len(ordered), load)]
+        self._maxes = [chunk[-1] for chunk in self._lists]
+        self._len = len(ordered)
+
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+    """
+    Наименьшая строка, большая всех строк с данным префиксом.
+    :param prefix: Префикс
+    :return: Граница или None, если её нет (пустой префикс или из одних максимальных символов)
+    """
+    stripped = prefix.rstrip('\U0010ffff')
+    if not stripped:
+        return None
+    return stripped[:-1] + chr(ord(stripped[-1]) + 1)
+
+
+def scan_bounds(prefix: Optional[str], start: Optional[str],
+                end: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Сводит фильтры сканирования к одному диапазону [low, high).
+    :param prefix: Префикс (None — без него)
+    :param start: Нижняя граница включительно (None — без неё)
+    :param end: Верхняя граница не включительно (None — без неё)
+    :return: (low, high); None означает отсутствие границы
+    """
+    low, high = start, end
+    if prefix:
+        low = prefix if low is None else max(low, prefix)
+        upper = prefix_end(prefix)
+        if upper is not None:
+            high = upper if high is None else min(high, upper)
+    return low, high
+
+
+class RankedSortedList(SortedList):
+    """
+    SortedList с быстрым рангом: дерево Фенвика по размерам блоков даёт число
+    элементов меньше заданного за O(log n), поэтому подсчёт элементов в диапазоне —
+    разность двух рангов без перебора. Дерево обновляется точечно при вставке
+    и удалении и перестраивается, только когда блоки делятся или сливаются.
+    """
+
+    __slots__ = ('_tree',)
+
+    def add(self, value) -> None:
+        blocks, size = len(self._lists), self._len
+        super().add(value)
+        if self._len == size:
+            return
+        if len(self._lists) != blocks:
+            self._build_tree()
+        else:
+            self._tree_add(bisect_left(self._maxes, value), 1)
+
+    def discard(self, value) -> None:
+        blocks, size = len(self._lists), self._len
+        pos = bisect_left(self._maxes, value)
+        super().discard(value)
+        if self._len == size:
+            return
+        if len(self._lists) != blocks:
+            self._build_tree()
+        else:
+            self._tree_add(pos, -1)
+
+    def rank(self, value) -> int:
+        """
+        Количество элементов, строго меньших value.
+        :param value: Граница
+        """
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return self._len
+        total = 0
+        index = pos
+        tree = self._tree
+        while index > 0:
+            total += tree[index]
+            index &= index - 1
+        return total + bisect_left(self._lists[pos], value)
+
+    def _rebuild(self, ordered) -> None:
+        super()._rebuild(ordered)
+        self._build_tree()
+
+    def _build_tree(self) -> None:
+        """
+        Строит дерево Фенвика по размерам блоков за O(число блоков).
+        """
+        tree = [0] + [len(chunk) for chunk in self._lists]
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self._tree = tree
+
+    def _tree_add(self, pos: int, delta: int) -> None:
+        """
+        Изменяет размер блока pos в дереве Фенвика.
+        """
+        tree = self._tree
+        index = pos + 1
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
@@ -0,0 +1,259 @@
+import json
+import os
+import threading
+import time
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from utils.logger_config import logger
+
+# Подынтервалов на каждую степень двойки: относительная погрешность гистограммы не больше 1/16
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Число корзин, достаточное для задержек до 2**64 нс
+BUCKET_COUNT = (64 - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+# Перцентили в отчёте о задержках
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Период записи статистики в файл по умолчанию (секунды)
+DEFAULT_DUMP_INTERVAL = 10.0
+
+# Статистика хранилища: имя показателя -> значение
+StoreStats = Dict[str, int]
+
+
+def bucket_index(ns: int) -> int:
+    """
+    Номер корзины гистограммы для задержки: до SUB_BUCKETS нс — линейно, дальше
+    SUB_BUCKETS корзин на каждую степень двойки (как в HdrHistogram).
+    :param ns: Задержка в наносекундах
+    """
+    if ns < SUB_BUCKETS:
+        return ns
+    shift = ns.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (ns >> shift) - SUB_BUCKETS
+
+
+def bucket_upper(index: int) -> int:
+    """
+    Наибольшая задержка (нс), попадающая в корзину.
+    :param index: Номер корзины
+    """
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return ((SUB_BUCKETS + (index & (SUB_BUCKETS - 1))) << shift) + (1 << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с логарифмически-линейными корзинами: запись — O(1) без выделения
+    памяти, перцентили — с погрешностью не больше 1/SUB_BUCKETS от значения.
+    """
+
+    __slots__ = ('counts', 'count', 'total_ns', 'max_ns')
+
+    def __init__(self) -> None:
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns: int) -> None:
+        """
+        Учитывает одну задержку.
+        :param ns: Задержка в наносекундах
+        """
+        if ns < SUB_BUCKETS:
+            self.counts[ns] += 1
+        else:
+            # То же, что bucket_index, без вызова функции на горячем пути
+            shift = ns.bit_length() - SUB_BUCKET_BITS - 1
+            self.counts[((shift + 1) << SUB_BUCKET_BITS) + (ns >> shift) - SUB_BUCKETS] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, percent: float) -> int:
+        """
+        Задержка (верхняя граница корзины, нс), не превышаемая percent процентами вызовов.
+        :param percent: Перцентиль от 0 до 100
+        """
+        if not self.count:
+            return 0
+        threshold = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return min(bucket_upper(index), self.max_ns)
+        return self.max_ns
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Сводка в микросекундах: число вызовов, среднее, перцентили и максимум.
+        """
+        result: Dict[str, float] = {'calls': self.count,
+                                    'mean_us': self.total_ns / self.count / 1000 if self.count else 0.0}
+        for percent in PERCENTILES:
+            result[f'p{percent:g}_us'] = self.percentile(percent) / 1000
+        result['max_us'] = self.max_ns / 1000
+        return result
+
+
+class CommandStats:
+    """
+    Счётчики вызовов и гистограммы задержек по командам. Фронтенды включают её, подменяя
+    обработчики в своих таблицах команд обёртками instrument, поэтому при выключенной
+    статистике на пути команды нет ни обёрток, ни проверок.
+    При записи из нескольких потоков отдельные вызовы могут не попасть в счётчики.
+    """
+
+    def __init__(self) -> None:
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.started = time.time()
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        """
+        Гистограмма команды (создаётся при первом обращении).
+        :param name: Имя команды
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        return histogram
+
+    def instrument(self, name: str, handler: Callable[[List[str]], Any]) -> Callable[[List[str]], Any]:
+        """
+        Обёртка обработчика, измеряющая его время (в том числе при исключении).
+        :param name: Имя команды
+        :param handler: Обработчик от списка аргументов
+        :return: Обёрнутый обработчик; исходный доступен как __wrapped__
+        """
+        record = self.histogram(name).record
+
+        def timed(args: List[str]) -> Any:
+            started = perf_counter_ns()
+            try:
+                return handler(args)
+            finally:
+                record(perf_counter_ns() - started)
+        timed.__wrapped__ = handler  # type: ignore[attr-defined]
+        return timed
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Сводки по вызывавшимся командам, по имени.
+        """
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())
+                if histogram.count}
+
+    def reset(self) -> None:
+        """
+        Обнуляет все счётчики.
+        """
+        self.histograms.clear()
+        self.started = time.time()
+
+
+def collect_stats(store: Any, stats: Optional[CommandStats]) -> Dict[str, Any]:
+    """
+    Полный отчёт STATS: показатели хранилища и, если статистика включена, задержки команд.
+    :param store: Хранилище с методом stats()
+    :param stats: Статистика команд или None
+    """
+    report: Dict[str, Any] = {'store': store.stats() if store is not None else {}, 'commands': {}}
+    if stats is not None:
+        report['uptime_s'] = time.time() - stats.started
+        report['commands'] = stats.report()
+    return report
+
+
+def merge_store_stats(parts: Iterable[StoreStats]) -> StoreStats:
+    """
+    Сумма показателей частей хранилища (полос, шардов); глубина транзакций — наибольшая.
+    :param parts: Показатели частей
+    """
+    total: StoreStats = {}
+    for part in parts:
+        for name, value in part.items():
+            if name == 'transaction_depth':
+                total[name] = max(total.get(name, 0), value)
+            else:
+                total[name] = total.get(name, 0) + value
+    return total
+
+
+def render_stats(report: Dict[str, Any]) -> str:
+    """
+    Текст ответа STATS: строка «имя значение» на показатель хранилища
+    и строка на команду со сводкой задержек.
+    :param report: Результат collect_stats
+    """
+    lines = []
+    if 'uptime_s' in report:
+        lines.append(f"uptime_s {report['uptime_s']:.1f}")
+    lines.extend(f'{name} {value}' for name, value in report['store'].items())
+    for name, summary in report['commands'].items():
+        fields = ' '.join(f'{field}={value:.2f}' if isinstance(value, float) else f'{field}={value}'
+                          for field, value in summary.items())
+        lines.append(f'{name} {fields}')
+    return '\n'.join(lines) + '\n'
+
+
+class StatsDumper:
+    """
+    Фоновый поток, периодически записывающий отчёт STATS в JSON-файл
+    (через временный файл и os.replace, поэтому читатель не видит недописанный отчёт).
+    """
+
+    def __init__(self, stats: CommandStats, path: str, interval: float = DEFAULT_DUMP_INTERVAL,
+                 store: Any = None) -> None:
+        """
+        :param stats: Статистика команд
+        :param path: Путь к файлу отчёта
+        :param interval: Период записи в секундах
+        :param store: Хранилище для показателей размеров; None — только задержки команд
+            (для хранилищ, которые нельзя опрашивать из другого потока)
+        """
+        self.stats = stats
+        self.path = path
+        self.interval = interval
+        self.store = store
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Запускает периодическую запись.
+        """
+        self._thread = threading.Thread(target=self._dump_loop, name='stats-dump', daemon=True)
+        self._thread.start()
+
+    def dump(self) -> None:
+        """
+        Записывает текущий отчёт.
+        """
+        report = collect_stats(self.store, self.stats)
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2)
+        os.replace(temporary_path, self.path)
+
+    def close(self) -> None:
+        """
+        Останавливает поток и записывает итоговый отчёт.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.dump()
+
+    def _dump_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except OSError as e:
+                logger.warning('Не удалось записать статистику в %s: %s', self.path, e)
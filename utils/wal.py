@@ -0,0 +1,370 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from utils.key_value_store import KeyValueStore
+from utils.logger_config import logger
+from utils.snapshot import iter_snapshot, save_snapshot
+
+# Формат журнала: последовательность кадров, каждый кадр —
+#   uint32 длина полезной нагрузки, uint32 CRC32 полезной нагрузки, полезная нагрузка.
+# Полезная нагрузка — записи, применяемые атомарно (одна операция вне транзакции
+# или весь COMMIT транзакции верхнего уровня):
+#   OP_SET   uint32 длина ключа, ключ, uint32 длина значения, значение
+#   OP_UNSET uint32 длина ключа, ключ
+#   OP_RESET — очистка хранилища (перед полной загрузкой данных)
+#   OP_EXPIRE  uint32 длина ключа, ключ, float64 момент истечения (по часам хранилища)
+#   OP_PERSIST uint32 длина ключа, ключ — снятие срока жизни
+# OP_SET снимает срок жизни ключа, поэтому срок записывается после значения.
+# Недописанный или повреждённый хвост при восстановлении отбрасывается.
+OP_SET = b'S'
+OP_UNSET = b'U'
+OP_RESET = b'R'
+OP_EXPIRE = b'E'
+OP_PERSIST = b'P'
+_FRAME_HEADER = struct.Struct('<II')
+FRAME_HEADER_SIZE = _FRAME_HEADER.size
+_LENGTH = struct.Struct('<I')
+_DEADLINE = struct.Struct('<d')
+
+Change = Tuple[str, Optional[str]]
+
+
+class Expiry(NamedTuple):
+    """
+    Запись срока жизни: момент истечения ключа или None, если срок снят.
+    """
+    key: str
+    deadline: Optional[float]
+
+
+# Декодированная запись кадра: изменение значения, срок жизни или None (очистка хранилища)
+Record = Union[Change, Expiry, None]
+
+
+def encode_changes(changes: List[Change]) -> bytes:
+    """
+    Кодирует пары (ключ, значение или None) в полезную нагрузку кадра.
+    :param changes: Изменения
+    :return: Байты записей
+    """
+    parts: List[bytes] = []
+    for key_name, value in changes:
+        encoded_key = key_name.encode('utf-8')
+        if value is None:
+            parts.append(OP_UNSET + _LENGTH.pack(len(encoded_key)) + encoded_key)
+        else:
+            encoded_value = value.encode('utf-8')
+            parts.append(OP_SET + _LENGTH.pack(len(encoded_key)) + encoded_key
+                         + _LENGTH.pack(len(encoded_value)) + encoded_value)
+    return b''.join(parts)
+
+
+def encode_expiry(deadlines: List[Tuple[str, Optional[float]]]) -> bytes:
+    """
+    Кодирует сроки жизни в полезную нагрузку кадра.
+    :param deadlines: Пары (ключ, момент истечения или None, если срок снят)
+    :return: Байты записей
+    """
+    parts: List[bytes] = []
+    for key_name, deadline in deadlines:
+        encoded_key = key_name.encode('utf-8')
+        if deadline is None:
+            parts.append(OP_PERSIST + _LENGTH.pack(len(encoded_key)) + encoded_key)
+        else:
+            parts.append(OP_EXPIRE + _LENGTH.pack(len(encoded_key)) + encoded_key + _DEADLINE.pack(deadline))
+    return b''.join(parts)
+
+
+def decode_changes(payload: bytes) -> List[Record]:
+    """
+    Декодирует полезную нагрузку кадра.
+    :param payload: Байты записей
+    :return: Изменения и сроки жизни (Expiry); None в списке означает очистку хранилища
+    :raises ValueError: если запись повреждена
+    """
+    changes: List[Record] = []
+    offset = 0
+    size = len(payload)
+    try:
+        while offset < size:
+            op = payload[offset:offset + 1]
+            offset += 1
+            if op == OP_RESET:
+                changes.append(None)
+                continue
+            (key_len,) = _LENGTH.unpack_from(payload, offset)
+            offset += _LENGTH.size
+            key_name = payload[offset:offset + key_len].decode('utf-8')
+            offset += key_len
+            if op == OP_UNSET:
+                changes.append((key_name, None))
+            elif op == OP_PERSIST:
+                changes.append(Expiry(key_name, None))
+            elif op == OP_EXPIRE:
+                (deadline,) = _DEADLINE.unpack_from(payload, offset)
+                offset += _DEADLINE.size
+                changes.append(Expiry(key_name, deadline))
+            elif op == OP_SET:
+                (value_len,) = _LENGTH.unpack_from(payload, offset)
+                offset += _LENGTH.size
+                changes.append((key_name, payload[offset:offset + value_len].decode('utf-8')))
+                offset += value_len
+            else:
+                raise ValueError(f'Неизвестная операция журнала: {op!r}')
+    except struct.error as e:
+        raise ValueError('Запись журнала обрезана') from e
+    return changes
+
+
+def unpack_frame_header(header: bytes) -> Tuple[int, int]:
+    """
+    Разбирает заголовок кадра.
+    :param header: FRAME_HEADER_SIZE байт
+    :return: (длина полезной нагрузки, CRC32)
+    """
+    return _FRAME_HEADER.unpack(header)
+
+
+def check_frame(payload: bytes, checksum: int) -> List[Record]:
+    """
+    Проверяет контрольную сумму кадра и декодирует его.
+    :param payload: Полезная нагрузка
+    :param checksum: CRC32 из заголовка
+    :raises ValueError: если кадр повреждён
+    """
+    if zlib.crc32(payload) != checksum:
+        raise ValueError('Контрольная сумма кадра не совпадает')
+    return decode_changes(payload)
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """
+    Оборачивает полезную нагрузку в кадр с длиной и контрольной суммой.
+    :param payload: Полезная нагрузка
+    """
+    return _FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class WriteAheadLog:
+    """
+    Журнал упреждающей записи для зафиксированных изменений KeyValueStore.
+    Пишет только изменения, дошедшие до базового состояния (через слушателей изменений
+    и сроков жизни хранилища), поэтому данные незафиксированных транзакций на диск не попадают.
+    Сроки хранятся абсолютными моментами, поэтому ключ, истёкший за время простоя,
+    после восстановления удаляется.
+    fsync выполняется группами: каждые sync_every_records записей или
+    не реже, чем раз в sync_interval_ms миллисекунд.
+    """
+
+    def __init__(self, path: str, snapshot_path: Optional[str] = None,
+                 sync_every_records: int = 1000, sync_interval_ms: Optional[float] = 100,
+                 compact_bytes: Optional[int] = 64 << 20) -> None:
+        """
+        Инициализация журнала.
+        :param path: Путь к файлу журнала
+        :param snapshot_path: Путь к снимку, в который сворачивается журнал при уплотнении
+        :param sync_every_records: fsync после стольких записей (1 — после каждой)
+        :param sync_interval_ms: Максимальная задержка fsync в миллисекундах (None — без таймера)
+        :param compact_bytes: Размер журнала, после которого он сворачивается в снимок
+        """
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.sync_every_records = max(1, sync_every_records)
+        self.sync_interval = sync_interval_ms / 1000 if sync_interval_ms else None
+        self.compact_bytes = compact_bytes if snapshot_path else None
+        self._store: Optional[KeyValueStore] = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._pending_records = 0
+        self._last_sync = time.monotonic()
+        self._stop = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+
+    def attach(self, store: KeyValueStore) -> int:
+        """
+        Восстанавливает хранилище из снимка и журнала, затем начинает журналировать его изменения.
+        :param store: Пустое хранилище без открытых транзакций
+        :return: Количество применённых записей журнала
+        """
+        deadlines: List[Tuple[str, float]] = []
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            # Сроки снимка назначаются после журнала, который может их изменить
+            store.load_buckets(iter_snapshot(self.snapshot_path, deadlines))
+        replayed = self.replay(store, dict(deadlines))
+        self._store = store
+        self._file = open(self.path, 'ab')
+        store.add_listener(self.on_changes)
+        store.add_expiry_listener(self.on_expiry)
+        if self.sync_interval:
+            self._syncer = threading.Thread(target=self._sync_loop, name='wal-sync', daemon=True)
+            self._syncer.start()
+        return replayed
+
+    def replay(self, store: KeyValueStore, deadlines: Optional[Dict[str, float]] = None) -> int:
+        """
+        Применяет записи журнала к хранилищу. Недописанный хвост обрезается.
+        Сроки жизни собираются за весь журнал и назначаются в конце: иначе ключ, срок
+        которого истёк за время простоя, удалился бы до записи, снимающей этот срок.
+        :param store: Хранилище без сроков жизни
+        :param deadlines: Сроки, действовавшие до журнала (из снимка)
+        :return: Количество применённых записей
+        """
+        deadlines = {} if deadlines is None else deadlines
+        if not os.path.exists(self.path):
+            self._restore_deadlines(store, deadlines)
+            return 0
+        applied = 0
+        valid_end = 0
+        with open(self.path, 'rb') as wal_file:
+            data = wal_file.read()
+        offset = 0
+        while offset + _FRAME_HEADER.size <= len(data):
+            payload_len, checksum = _FRAME_HEADER.unpack_from(data, offset)
+            start = offset + _FRAME_HEADER.size
+            payload = data[start:start + payload_len]
+            if len(payload) != payload_len or zlib.crc32(payload) != checksum:
+                break
+            try:
+                changes = decode_changes(payload)
+            except ValueError:
+                break
+            for change in changes:
+                if change is None:
+                    store.load_buckets([])
+                    deadlines.clear()
+                elif isinstance(change, Expiry):
+                    if change.deadline is None:
+                        deadlines.pop(change.key, None)
+                    else:
+                        deadlines[change.key] = change.deadline
+                else:
+                    deadlines.pop(change[0], None)
+                    if change[1] is None:
+                        store.unset(change[0])
+                    else:
+                        store.set(change[0], change[1])
+                applied += 1
+            offset = valid_end = start + payload_len
+        if valid_end < len(data):
+            logger.warning('Журнал %s: отброшен повреждённый хвост (%d байт)',
+                           self.path, len(data) - valid_end)
+            with open(self.path, 'r+b') as wal_file:
+                wal_file.truncate(valid_end)
+        self._restore_deadlines(store, deadlines)
+        return applied
+
+    @staticmethod
+    def _restore_deadlines(store: KeyValueStore, deadlines: Dict[str, float]) -> None:
+        """
+        Назначает восстановленные сроки; истёкшие ключи удаляются при обращении, как обычно.
+        :param store: Хранилище
+        :param deadlines: Ключ -> момент истечения
+        """
+        for key_name, deadline in deadlines.items():
+            store.expire_at(key_name, deadline)
+
+    def on_changes(self, changes: Optional[List[Change]]) -> None:
+        """
+        Слушатель хранилища: дописывает зафиксированные изменения в журнал.
+        :param changes: Изменения или None при полной замене данных
+        """
+        if changes is None:
+            self._on_reset()
+            return
+        self._append(encode_frame(encode_changes(changes)), len(changes))
+        if self.compact_bytes is not None and self._file.tell() >= self.compact_bytes:
+            self.compact()
+
+    def on_expiry(self, deadlines: List[Tuple[str, Optional[float]]]) -> None:
+        """
+        Слушатель сроков жизни хранилища: дописывает зафиксированные сроки в журнал.
+        :param deadlines: Пары (ключ, момент истечения или None)
+        """
+        self._append(encode_frame(encode_expiry(deadlines)), len(deadlines))
+
+    def sync(self) -> None:
+        """
+        Сбрасывает буфер журнала на диск (flush + fsync).
+        """
+        with self._lock:
+            self._sync_locked()
+
+    def compact(self) -> None:
+        """
+        Сворачивает журнал в снимок и очищает журнал.
+        Если сбой произойдёт между записью снимка и очисткой журнала,
+        повторное применение журнала поверх снимка даст то же состояние.
+        """
+        if self.snapshot_path is None or self._store is None:
+            return
+        save_snapshot(self._store, self.snapshot_path)
+        with self._lock:
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._sync_locked()
+        logger.debug('Журнал %s свёрнут в снимок %s', self.path, self.snapshot_path)
+
+    def close(self) -> None:
+        """
+        Останавливает фоновую синхронизацию, сбрасывает журнал и отписывается от хранилища.
+        """
+        self._stop.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        if self._store is not None:
+            self._store.remove_listener(self.on_changes)
+            self._store.remove_expiry_listener(self.on_expiry)
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _on_reset(self) -> None:
+        """
+        Обрабатывает полную замену данных: уплотнение, а без снимка — кадр очистки
+        со всем новым содержимым и сроками жизни.
+        """
+        if self.snapshot_path is not None:
+            self.compact()
+            return
+        changes: List[Change] = [(key_name, value)
+                                 for value, keys in self._store.committed_buckets()
+                                 for key_name in keys]
+        deadlines = self._store.committed_deadlines()
+        payload = OP_RESET + encode_changes(changes) + encode_expiry(deadlines)
+        self._append(encode_frame(payload), len(changes) + len(deadlines) + 1)
+
+    def _append(self, frame: bytes, records: int) -> None:
+        """
+        Дописывает кадр и выполняет fsync по политике группового сброса.
+        :param frame: Кадр
+        :param records: Число записей в кадре
+        """
+        with self._lock:
+            self._file.write(frame)
+            self._pending_records += records
+            if (self._pending_records >= self.sync_every_records
+                    or (self.sync_interval is not None
+                        and time.monotonic() - self._last_sync >= self.sync_interval)):
+                self._sync_locked()
+
+    def _sync_locked(self) -> None:
+        """
+        flush + fsync; вызывается под блокировкой.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending_records = 0
+        self._last_sync = time.monotonic()
+
+    def _sync_loop(self) -> None:
+        """
+        Фоновый поток: сбрасывает ожидающие записи не реже, чем раз в sync_interval.
+        """
+        while not self._stop.wait(self.sync_interval):
+            with self._lock:
+                if self._pending_records and self._file is not None:
+                    self._sync_locked()